@@ -9,13 +9,37 @@ from __future__ import unicode_literals
 from abc import ABCMeta, abstractproperty
 from warnings import warn
 
+from ripozo.adapters.representation import represent, ResourceNode
+from ripozo.instrumentation.base import observed_formatted_body, observed_iter_formatted_body
 from ripozo.utilities import join_url_parts
 
 import json
 import six
+import types
 
 
-@six.add_metaclass(ABCMeta)
+class AdapterMeta(ABCMeta):
+    """
+    The metaclass of the AdapterBase.  It wraps the ``formatted_body``
+    property and the ``iter_formatted_body`` method defined by each
+    subclass so that the ``render`` stage of an observed request
+    is measured while the body is rendered (see
+    ``ripozo.instrumentation.base.RenderObservation``).
+    """
+    def __new__(mcs, name, bases, attrs):
+        body = attrs.get('formatted_body')
+        if isinstance(body, property) and body.fget is not None \
+                and not getattr(body, '__isabstractmethod__', False) \
+                and not getattr(body.fget, '__instrumented__', False):
+            attrs['formatted_body'] = property(observed_formatted_body(body.fget),
+                                               body.fset, body.fdel, body.__doc__)
+        func = attrs.get('iter_formatted_body')
+        if isinstance(func, types.FunctionType) and not getattr(func, '__instrumented__', False):
+            attrs['iter_formatted_body'] = observed_iter_formatted_body(func)
+        return super(AdapterMeta, mcs).__new__(mcs, name, bases, attrs)
+
+
+@six.add_metaclass(AdapterMeta)
 class AdapterBase(object):
     """
     The adapter base is responsible for specifying how
@@ -31,18 +55,32 @@ class AdapterBase(object):
         to in the appropriate manner.  Any of the strings in the list will be
         considered the appropriate format for the adapter on which they are
         specified.
+    :param RequestContainer request: The request that the resource
+        was constructed for.  The dispatcher sets it after constructing
+        the adapter so adapters overriding ``__init__`` keep working.
+    :param RenderObservation render_observation: Set by the dispatcher
+        when the request is observed.  The request is finished once
+        the body is rendered.
     """
     formats = None
+    request = None
+    render_observation = None
 
-    def __init__(self, resource, base_url=''):
+    def __init__(self, resource, base_url='', request=None):
         """
         Simple sets the resource on the instance.
 
         :param resource: The resource that is being formatted.
         :type resource: rest.viewsets.resource_base.ResourceBase
+        :param unicode base_url: The base url that is prepended
+            to the resource urls.
+        :param RequestContainer request: The request that the resource
+            was constructed for.  Some adapters use it to tailor
+            the response (e.g. sparse fieldsets in JSON API).
         """
         self.base_url = base_url
         self.resource = resource
+        self.request = request
 
     @abstractproperty
     def formatted_body(self):
@@ -58,6 +96,21 @@ class AdapterBase(object):
         """
         raise NotImplementedError
 
+    def iter_formatted_body(self, chunk_size=8192):
+        """
+        Yields the formatted body in chunks so that a web framework
+        can stream the response instead of holding the entire
+        body in memory.  This is primarily useful when a manager
+        returns a generator or cursor from retrieve_list.  By default
+        it simply yields the ``formatted_body``.  Adapters that can
+        encode their documents lazily should override this.
+
+        :param int chunk_size: The approximate size of each chunk
+        :return: A generator that yields the response body in pieces.
+        :rtype: types.GeneratorType
+        """
+        yield self.formatted_body
+
     @abstractproperty
     def extra_headers(self):
         """
@@ -84,6 +137,100 @@ class AdapterBase(object):
         """
         return join_url_parts(self.base_url, resource_url)
 
+    @property
+    def representation(self):
+        """
+        :return: The intermediate representation of the resource
+            being formatted.
+        :rtype: ripozo.adapters.representation.ResourceNode
+        """
+        return self.represent(self.resource)
+
+    def represent(self, resource):
+        """
+        Gets the intermediate representation of a resource using this
+        adapter's base url.  The representation is cached on the resource
+        so it is only built once regardless of how many adapters
+        format the resource.  The urls are built with
+        ``combine_base_url_with_resource_url`` when an adapter overrides it.
+
+        :param ResourceBase|ResourceNode resource: The resource.
+        :return: The node representing the resource.
+        :rtype: ripozo.adapters.representation.ResourceNode
+        """
+        combine_url = self.combine_base_url_with_resource_url
+        if six.get_method_function(combine_url) is \
+                six.get_unbound_function(AdapterBase.combine_base_url_with_resource_url):
+            combine_url = None
+        return represent(resource, base_url=self.base_url, combine_url=combine_url)
+
+    def render_memoized(self, resource, embedded, build):
+        """
+        Builds the representation of a resource at most once per render.
+        Resources are identified by their class, primary keys and whether
+        they are embedded.  The first time a resource is seen ``build``
+        is called and its result is remembered.  Any later occurrence
+        of the same resource is passed to ``render_reference`` instead
+        of being built again.  Resources that do not have primary keys
+        (or are missing some of them) are always built.
+
+        :param ResourceBase resource: The resource to render.
+        :param bool embedded: Whether the resource is embedded.
+        :param function build: A function that takes the resource
+            and returns its representation.
+        :return: The representation of the resource.
+        """
+        key = self._memo_key(resource, embedded)
+        if key is None:
+            return build(resource)
+        memo = self.__dict__.setdefault('_render_memo', {})
+        if key in memo:
+            return self.render_reference(resource, embedded, memo[key])
+        memo[key] = None  # The resource is being rendered
+        memo[key] = rendered = build(resource)
+        return rendered
+
+    def render_reference(self, resource, embedded, rendered):
+        """
+        Called for a resource that has already been seen in this render.
+        By default it reuses the representation that was already built.
+        Adapters whose format allows referring to a resource (e.g. by
+        its url) can override this to emit a reference instead of a copy.
+
+        :param ResourceBase resource: The repeated resource.
+        :param bool embedded: Whether the resource is embedded.
+        :param rendered: The representation that was built the first
+            time.  It is None if the resource is still being rendered,
+            for example when it is embedded in itself.
+        :return: The representation to use for this occurrence.
+        """
+        return rendered
+
+    def reset_render_memo(self):
+        """
+        Forgets the resources rendered so far.  Adapters
+        call this at the start of each render.
+        """
+        self._render_memo = {}
+
+    @staticmethod
+    def _memo_key(resource, embedded):
+        """
+        :return: The key identifying the resource in the render
+            memo or None if it can not be identified.
+        :rtype: tuple
+        """
+        if not resource.pks or resource.no_pks or not resource.has_all_pks:
+            return None
+        item_pks = resource.item_pks
+        resource_class = type(resource.resource if isinstance(resource, ResourceNode) else resource)
+        key = (resource_class, tuple(item_pks[pk] for pk in resource.pks), embedded)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
     @classmethod
     def format_exception(cls, exc):
         """
@@ -8,7 +8,9 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 from ripozo.adapters import AdapterBase
+from ripozo.utilities import is_iterator, iter_json, json_default
 
+import itertools
 import json
 import six
 
@@ -51,12 +53,31 @@ class BasicJSONAdapter(AdapterBase):
             relationships
         :rtype: unicode
         """
+        return json.dumps(self._construct_document(), default=json_default)
+
+    def iter_formatted_body(self, chunk_size=8192):
+        """
+        Lazily encodes the body.  List relationships constructed
+        from a generator are consumed one resource at a time.
+
+        :param int chunk_size: The approximate size of each chunk
+        :return: A generator that yields the response body in pieces.
+        :rtype: types.GeneratorType
+        """
+        return iter_json(self._construct_document(), chunk_size=chunk_size)
+
+    def _construct_document(self):
+        """
+        :return: The dictionary that will be dumped as the response
+        :rtype: dict
+        """
+        node = self.representation
         response = dict()
-        parent_properties = self.resource.properties.copy()
-        self._append_relationships_to_list(response, self.resource.related_resources)
-        self._append_relationships_to_list(response, self.resource.linked_resources)
+        parent_properties = node.properties.copy()
+        self._append_relationships_to_list(response, node.related_resources)
+        self._append_relationships_to_list(response, node.linked_resources)
         response.update(parent_properties)
-        return json.dumps({self.resource.resource_name: response})
+        return {node.resource_name: response}
 
     @staticmethod
     def _append_relationships_to_list(rel_dict, relationships):
@@ -65,6 +86,9 @@ class BasicJSONAdapter(AdapterBase):
         a json ready list of dictionaries.  Side effect
         of updating the dictionary with the relationships
 
+        Lazily constructed list relationships are added as
+        generators of the properties.
+
         :param dict rel_dict:
         :param list relationships:
         :return: A list of the resources in dictionary format.
@@ -73,6 +97,12 @@ class BasicJSONAdapter(AdapterBase):
         for resource, name, embedded in relationships:
             if name not in rel_dict:
                 rel_dict[name] = []
+            if is_iterator(resource) or is_iterator(rel_dict[name]):
+                if not is_iterator(resource):
+                    resource = resource if isinstance(resource, (list, tuple)) else [resource]
+                properties = (res.properties for res in resource)
+                rel_dict[name] = itertools.chain(rel_dict[name], properties)
+                continue
             if isinstance(resource, (list, tuple)):
                 for res in resource:
                     rel_dict[name].append(res.properties)
@@ -7,6 +7,7 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 from ripozo.adapters import AdapterBase
+from ripozo.utilities import is_iterator, iter_json, json_default
 
 import json
 import six
@@ -29,21 +30,48 @@ class HalAdapter(AdapterBase):
         :return: The response body for the resource.
         :rtype: unicode
         """
-        response = self._construct_resource(self.resource)
-        return json.dumps(response)
+        self.reset_render_memo()
+        response = self._construct_resource(self.representation)
+        return json.dumps(response, default=json_default)
+
+    def iter_formatted_body(self, chunk_size=8192):
+        """
+        Lazily encodes the body.  Embedded list relationships
+        constructed from a generator are consumed one resource
+        at a time.
+
+        :param int chunk_size: The approximate size of each chunk
+        :return: A generator that yields the response body in pieces.
+        :rtype: types.GeneratorType
+        """
+        self.reset_render_memo()
+        return iter_json(self._construct_resource(self.representation), chunk_size=chunk_size)
 
     def _construct_resource(self, resource):
         """
         Constructs a full resource.  This can be used
-        for either the primary resource or embedded resources
+        for either the primary resource or embedded resources.
+        A resource that appears multiple times in the
+        response is only constructed once.
+
+        :param ripozo.resources.resource_base.ResourceBase resource: The resource
+            that will be constructed.
+        :return: The resource represented according to the
+            Hal specification
+        :rtype: dict
+        """
+        return self.render_memoized(resource, True, self._build_resource)
 
+    def _build_resource(self, resource):
+        """
         :param ripozo.resources.resource_base.ResourceBase resource: The resource
             that will be constructed.
         :return: The resource represented according to the
             Hal specification
         :rtype: dict
         """
-        resource_url = self.combine_base_url_with_resource_url(resource.url)
+        resource = self.represent(resource)
+        resource_url = resource.url
         parent_properties = resource.properties.copy()
 
         embedded, links = self.generate_relationship(resource.related_resources)
@@ -56,6 +84,22 @@ class HalAdapter(AdapterBase):
         response.update(parent_properties)
         return response
 
+    def render_reference(self, resource, embedded, rendered):
+        """
+        Reuses the resource if it has already been constructed.  A
+        resource embedded in itself (e.g. the ``created`` link) is
+        represented by its self link instead of a second copy.
+
+        :param ResourceBase resource: The repeated resource.
+        :param bool embedded: Whether the resource is embedded.
+        :param dict rendered: The resource constructed the first
+            time or None if it is still being constructed.
+        :rtype: dict
+        """
+        if rendered is not None:
+            return rendered
+        return dict(_links=dict(self=dict(href=self.represent(resource).url)))
+
     def generate_relationship(self, relationship_list):
         """
         Generates an appropriately formated embedded relationship
@@ -90,9 +134,12 @@ class HalAdapter(AdapterBase):
         :param bool embedded: Whether or not the related resource
             should be embedded.
         :return: A list of dictionaries or dictionary representing
-            the relationship(s)
-        :rtype: list|dict
+            the relationship(s).  If the relationship is a generator
+            then a generator is returned.
+        :rtype: list|dict|types.GeneratorType
         """
+        if is_iterator(relationship):
+            return self._iter_relationships(relationship, embedded)
         if isinstance(relationship, list):
             response = []
             for res in relationship:
@@ -105,7 +152,22 @@ class HalAdapter(AdapterBase):
         if embedded:
             return self._construct_resource(relationship)
         else:
-            return dict(href=self.combine_base_url_with_resource_url(relationship.url))
+            return dict(href=self.represent(relationship).url)
+
+    def _iter_relationships(self, relationships, embedded):
+        """
+        Lazily generates the relationships for a generator of
+        resources.  Resources without all of their pks are skipped.
+
+        :param types.GeneratorType relationships: The resources
+        :param bool embedded: Whether or not the related resources
+            should be embedded.
+        :rtype: types.GeneratorType
+        """
+        for res in relationships:
+            if not res.has_all_pks:
+                continue
+            yield self._generate_relationship(res, embedded)
 
     @classmethod
     def format_exception(cls, exc):
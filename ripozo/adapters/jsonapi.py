@@ -7,17 +7,25 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+from collections import OrderedDict
+
+import itertools
 import json
+import re
 
 import six
 
 from ripozo import ResourceBase
 from ripozo.adapters.base import AdapterBase
+from ripozo.adapters.representation import ResourceNode
 from ripozo.exceptions import JSONAPIFormatException
 from ripozo.resources.constructor import ResourceMetaClass
-from ripozo.utilities import join_url_parts
+from ripozo.utilities import join_url_parts, is_iterator, iter_json, json_default
 
 _CONTENT_TYPE = 'application/vnd.api+json'
+_FIELDSET_QUERY_ARG = 'fields'
+_INCLUDE_QUERY_ARG = 'include'
+_FIELDSET_RE = re.compile(r'^fields\[([^\]]+)\]$')
 
 
 class JSONAPIAdapter(AdapterBase):
@@ -26,6 +34,16 @@ class JSONAPIAdapter(AdapterBase):
     instance in an appropriate format.  See the
     `specification <http://jsonapi.org/format/>`_
     for more details on what format it will return.
+
+    If the client passes the ``include`` query argument (e.g.
+    ``include=customer,customer.address``) a
+    `compound document <http://jsonapi.org/format/#document-compound-documents>`_
+    is returned.  The relationships only contain the resource linkage
+    (the type and id) and the related resources are in the top-level
+    ``included`` list.  Each related resource is only included once
+    regardless of how many resources refer to it.  For list resources,
+    the include paths are relative to the individual items in the list.
+    Paths that do not match a relationship are ignored.
     """
     formats = [_CONTENT_TYPE]
     extra_headers = {'Content-Type': _CONTENT_TYPE}
@@ -39,8 +57,53 @@ class JSONAPIAdapter(AdapterBase):
         :return: The appropriately formatted string
         :rtype: unicode|str
         """
-        data = self._construct_data(self.resource, embedded=True)
-        return json.dumps(dict(data=data))
+        return json.dumps(self._construct_document(), default=json_default)
+
+    def iter_formatted_body(self, chunk_size=8192):
+        """
+        Lazily encodes the body.  Relationships constructed
+        from a generator are consumed one resource at a time.
+
+        :param int chunk_size: The approximate size of each chunk
+        :return: A generator that yields the response body in pieces.
+        :rtype: types.GeneratorType
+        """
+        return iter_json(self._construct_document(), chunk_size=chunk_size)
+
+    def _construct_document(self):
+        """
+        Constructs the top-level document.  If include paths were
+        requested, it is a compound document with the related resources
+        in the ``included`` list.
+
+        :return: The document that will be dumped as the response
+        :rtype: dict
+        """
+        include_tree = self.include_tree
+        if not include_tree:
+            return dict(data=self._construct_data(self.representation, embedded=True))
+        included = OrderedDict()
+        data = self._construct_compound_data(self.representation, include_tree, included)
+        # data may be lazy so included must be encoded after it.
+        return OrderedDict([('data', data), ('included', self._iter_included(included))])
+
+    @property
+    def include_tree(self):
+        """
+        The include paths requested by the client as a tree.  For
+        example ``['customer', 'customer.address', 'items']`` becomes
+        ``{'customer': {'address': {}}, 'items': {}}``
+
+        :return: The tree of relationship names to include.
+        :rtype: dict
+        """
+        tree = {}
+        options = getattr(self.request, 'adapter_options', None) or {}
+        for path in options.get(_INCLUDE_QUERY_ARG, ()):
+            node = tree
+            for name in path.split('.'):
+                node = node.setdefault(name, {})
+        return tree
 
     def _construct_data(self, resource, embedded=True):
         """
@@ -54,16 +117,57 @@ class JSONAPIAdapter(AdapterBase):
             according to the specification
         :rtype: dict
         """
+        resource = self.represent(resource)
         id_ = self._construct_id(resource)
         data = dict(id=id_, type=resource.resource_name)
         if embedded:
             data['relationships'] = self._construct_relationships(resource)
             data['links'] = self._construct_links(resource)
-            data['attributes'] = resource.properties
+            data['attributes'] = self._construct_attributes(resource)
         else:
-            data['links'] = {'self': self.combine_base_url_with_resource_url(resource.url)}
+            data['links'] = {'self': resource.url}
         return data
 
+    def _construct_attributes(self, resource):
+        """
+        Constructs the attributes of the resource object.  If a
+        `sparse fieldset <http://jsonapi.org/format/#fetching-sparse-fieldsets>`_
+        was requested for the resource's type, only those fields are included.
+
+        :param ResourceBase resource: The resource whose attributes
+            are being constructed.
+        :return: The attributes
+        :rtype: dict
+        """
+        fieldset = self.fieldsets.get(resource.resource_name)
+        if fieldset is None:
+            return resource.properties
+        return dict((key, value) for key, value in six.iteritems(resource.properties)
+                    if key in fieldset)
+
+    @property
+    def fieldsets(self):
+        """
+        The sparse fieldsets requested by the client keyed by
+        the resource type.  The ``fields[type]`` query arguments
+        are collected by ``format_request``.
+
+        :return: A dictionary of the resource names to the set
+            of fields requested.
+        :rtype: dict
+        """
+        fieldsets = {}
+        query_args = self.request.query_args if self.request is not None else {}
+        requested = query_args.get(_FIELDSET_QUERY_ARG)
+        if not isinstance(requested, dict):
+            return fieldsets
+        for resource_name, fields in six.iteritems(requested):
+            if isinstance(fields, six.string_types):
+                fields = [fields]
+            fieldsets[resource_name] = set(field.strip() for part in fields
+                                           for field in part.split(','))
+        return fieldsets
+
     def _construct_links(self, resource):
         """
         Constructs the links object according
@@ -74,10 +178,10 @@ class JSONAPIAdapter(AdapterBase):
         :return: A dictionary representing the links object
         :rtype: dict
         """
-        self_url = self.combine_base_url_with_resource_url(resource.url)
-        links = {'self': self_url}
+        resource = self.represent(resource)
+        links = {'self': resource.url}
         for link, name, embedded in resource.linked_resources:
-            links[name] = self.combine_base_url_with_resource_url(link.url)
+            links[name] = link.url
         return links
 
     @staticmethod
@@ -117,17 +221,146 @@ class JSONAPIAdapter(AdapterBase):
         """
         # TODO docs
         relationships = dict()
-        for resource, name, embedded in resource.related_resources:
+        for resource, name, embedded in self.represent(resource).related_resources:
             if name not in relationships:
                 relationships[name] = dict(data=[])
             data = relationships[name]['data']
-            if isinstance(resource, ResourceBase):
+            if is_iterator(resource) or is_iterator(data):
+                if isinstance(resource, (ResourceBase, ResourceNode)):
+                    resource = [resource]
+                lazy_data = (self._construct_data(res, embedded=embedded) for res in resource)
+                relationships[name]['data'] = itertools.chain(data, lazy_data)
+            elif isinstance(resource, (ResourceBase, ResourceNode)):
                 data.append(self._construct_data(resource, embedded=embedded))
             else:
                 for res in resource:
                     data.append(self._construct_data(res, embedded=embedded))
         return relationships
 
+    def _construct_compound_data(self, resource, include_tree, included):
+        """
+        Constructs a resource object for a compound document.  The
+        relationships only contain the resource linkage.
+
+        :param ResourceBase resource: The resource to format
+        :param dict include_tree: The relationships to include
+            relative to this resource.
+        :param OrderedDict included: The resources that have been
+            included so far keyed by their type and id.
+        :return: A dictionary representing the resource
+        :rtype: dict
+        """
+        resource = self.represent(resource)
+        data = dict(id=self._construct_id(resource), type=resource.resource_name)
+        data['relationships'] = self._construct_compound_relationships(resource, include_tree, included)
+        data['links'] = self._construct_links(resource)
+        data['attributes'] = self._construct_attributes(resource)
+        return data
+
+    def _construct_compound_relationships(self, resource, include_tree, included):
+        """
+        Constructs the relationships object containing only the resource
+        linkage.  The related resources that match the include_tree
+        are added to the included dictionary.
+
+        :param ResourceBase resource: The resource whose relationships
+            are being constructed.
+        :param dict include_tree: The relationships to include
+            relative to this resource.
+        :param OrderedDict included: The resources that have been
+            included so far keyed by their type and id.
+        :rtype: dict
+        """
+        relationships = dict()
+        for related, name, embedded in self.represent(resource).related_resources:
+            existing = relationships.get(name, {}).get('data', [])
+            linkage = self._iter_linkage(resource, related, name, include_tree, included)
+            if is_iterator(related) or is_iterator(existing):
+                relationships[name] = dict(data=itertools.chain(existing, linkage))
+            else:
+                relationships[name] = dict(data=existing + list(linkage))
+        return relationships
+
+    def _iter_linkage(self, parent, related, name, include_tree, included):
+        """
+        Yields the resource linkage for each of the related resources.
+        The items of a list resource are fully constructed instead.
+
+        :param ResourceBase parent: The resource that the related
+            resources belong to.
+        :param ResourceBase|list related: The related resource(s)
+        :param unicode name: The name of the relationship
+        :param dict include_tree: The relationships to include
+            relative to the parent.
+        :param OrderedDict included: The resources that have been
+            included so far keyed by their type and id.
+        :rtype: types.GeneratorType
+        """
+        if isinstance(related, (ResourceBase, ResourceNode)):
+            related = [related]
+        parent = self.represent(parent)
+        for res in related:
+            res = self.represent(res)
+            if parent.no_pks and type(res.resource) is type(parent.resource):
+                yield self._construct_compound_data(res, include_tree, included)
+            elif res.no_pks:
+                yield self._construct_data(res, embedded=False)
+            elif res.has_all_pks:
+                yield dict(type=res.resource_name, id=self._construct_id(res))
+                if name in include_tree:
+                    self._include(res, include_tree[name], included)
+
+    def _include(self, resource, include_tree, included):
+        """
+        Adds the resource to the included resources unless a resource
+        with the same type and id has already been included.  The
+        linkage of included resources is expanded immediately so that
+        the resources included through lazily constructed relationships
+        are known before ``included`` is encoded.
+
+        :param ResourceBase resource: The resource to include
+        :param dict include_tree: The relationships to include
+            relative to this resource.
+        :param OrderedDict included: The resources that have been
+            included so far keyed by their type and id.
+        """
+        key = (resource.resource_name, self._construct_id(resource))
+        if key not in included:
+            included[key] = None  # Prevents recursively including it again
+            data = self._construct_compound_data(resource, include_tree, included)
+            self._expand_linkage(data['relationships'])
+            included[key] = data
+        elif include_tree:
+            # The nested paths may differ from when it was first included
+            self._expand_linkage(self._construct_compound_relationships(resource, include_tree, included))
+
+    @staticmethod
+    def _expand_linkage(relationships):
+        """
+        Consumes the lazily constructed resource linkage in
+        the relationships, including the related resources
+        that match the include tree on the way.
+
+        :param dict relationships: The relationships object
+            from ``_construct_compound_relationships``
+        """
+        for relationship in relationships.values():
+            if is_iterator(relationship['data']):
+                relationship['data'] = list(relationship['data'])
+
+    @staticmethod
+    def _iter_included(included):
+        """
+        Yields the included resources.  This is lazy so that
+        it is not evaluated until the primary data has been
+        encoded (and all of the included resources are known).
+
+        :param OrderedDict included: The included resources
+        :rtype: types.GeneratorType
+        """
+        for data in list(included.values()):
+            yield data
+
     @classmethod
     def format_exception(cls, exc):
         """
@@ -156,11 +389,18 @@ class JSONAPIAdapter(AdapterBase):
         Basically, it reformats the attributes and relationships to
         be top level and dot formatted instead of an underlying dictionary.
 
+        Additionally, the ``fields[type]=a,b`` sparse fieldset query arguments
+        are collected into a dictionary in the ``fields`` query argument and
+        the ``include`` query argument is moved to the request's
+        ``adapter_options`` so that it is not passed to the manager.
+
         :param RequestContainer request: The request whose request
             body should be updated
         :return: The updated request ready for ripozo.
         :rtype: RequestContainer
         """
+        cls._format_fieldsets(request)
+        cls._format_include(request)
         if request.body_args:
             try:
                 data = request.body_args['data']
@@ -185,6 +425,44 @@ class JSONAPIAdapter(AdapterBase):
             request.body_args = body
         return request
 
+    @staticmethod
+    def _format_fieldsets(request):
+        """
+        Collects the ``fields[type]`` query arguments into a
+        single ``fields`` query argument that is a dictionary
+        keyed by the type.  This is the format that the
+        ``BaseManager.get_projection`` method expects.
+
+        :param RequestContainer request: The request to update.
+        """
+        query_args = request.query_args
+        fieldsets = {}
+        for key in list(query_args):
+            match = _FIELDSET_RE.match(key)
+            if match:
+                fieldsets[match.group(1)] = query_args.pop(key)
+        if fieldsets:
+            query_args[_FIELDSET_QUERY_ARG] = fieldsets
+            request.query_args = query_args
+
+    @staticmethod
+    def _format_include(request):
+        """
+        Moves the comma delimited ``include`` query argument into
+        the request's ``adapter_options`` as a list of paths.
+
+        :param RequestContainer request: The request to update.
+        """
+        query_args = request.query_args
+        if _INCLUDE_QUERY_ARG not in query_args:
+            return
+        include = query_args.pop(_INCLUDE_QUERY_ARG)
+        if isinstance(include, six.string_types):
+            include = [include]
+        paths = [path.strip() for part in include for path in part.split(',') if path.strip()]
+        request.query_args = query_args
+        request.adapter_options[_INCLUDE_QUERY_ARG] = paths
+
     @staticmethod
     def _parse_id(id_, resource_name):
         if resource_name not in ResourceMetaClass.registered_resource_names_map:
@@ -0,0 +1,127 @@
+"""
+An adapter neutral intermediate representation of a resource graph.
+The representation is built once for a resource (and base url) and
+can then be encoded by any adapter.  Adapters do not need to
+walk the resource's relationships or recompute the urls
+and primary keys themselves.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from collections import namedtuple
+
+from ripozo.utilities import is_iterator, join_url_parts
+
+
+RelationNode = namedtuple('RelationNode', 'resource, name, embedded')
+"""
+A relationship in the representation.  It has the same shape as the
+tuples in ``ResourceBase.related_resources`` and ``linked_resources``
+except that ``resource`` is a ``ResourceNode``, a list of them or, for
+lazily constructed lists, a generator of them.
+"""
+
+
+class ResourceNode(object):
+    """
+    A node in the intermediate representation.  It exposes the
+    attributes of a ResourceBase instance that the adapters use
+    with everything precomputed.  The ``url`` is absolute (it
+    already includes the base url).
+
+    :param ResourceBase resource: The resource represented.
+    :param unicode resource_name: The resource's name.
+    :param tuple pks: The names of the primary keys.
+    :param dict item_pks: The primary keys and their values.
+    :param bool no_pks: Whether the resource is not an individual item.
+    :param bool has_all_pks: Whether all of the pks are available.
+    :param unicode url: The absolute url of the resource.
+    :param dict properties: The resource's properties.
+    :param list related_resources: The RelationNodes for the
+        resource's relationships.
+    :param list linked_resources: The RelationNodes for the
+        resource's links.
+    """
+    __slots__ = ('resource', 'resource_name', 'pks', 'item_pks', 'no_pks',
+                 'has_all_pks', 'url', 'properties', 'related_resources',
+                 'linked_resources')
+
+    def __init__(self, resource, base_url='', combine_url=None):
+        """
+        Builds the node for the resource and, recursively,
+        the nodes for its related and linked resources.
+
+        :param ResourceBase resource: The resource to represent.
+        :param unicode base_url: The base url prepended to the
+            resource urls.
+        :param function combine_url: Takes a resource url and returns
+            the absolute url (e.g. an adapter's
+            ``combine_base_url_with_resource_url``).  By default the
+            ``base_url`` is joined with ``join_url_parts``.
+        """
+        self.resource = resource
+        self.resource_name = resource.resource_name
+        self.pks = resource.pks
+        self.item_pks = resource.item_pks
+        self.no_pks = resource.no_pks
+        self.has_all_pks = resource.has_all_pks
+        if combine_url is None:
+            self.url = join_url_parts(base_url, resource.url)
+        else:
+            self.url = combine_url(resource.url)
+        self.properties = resource.properties
+        self.related_resources = _represent_relations(resource.related_resources, base_url, combine_url)
+        self.linked_resources = _represent_relations(resource.linked_resources, base_url, combine_url)
+
+
+def represent(resource, base_url='', combine_url=None):
+    """
+    Gets the intermediate representation of the resource.  It is
+    built the first time and cached on the resource for the
+    base url (and ``combine_url`` function) so that every adapter
+    encoding the resource shares it.  Lists constructed lazily from
+    a generator can only be consumed once, just like the generator itself.
+
+    :param ResourceBase|ResourceNode resource: The resource to represent.
+        Nodes are returned as is.
+    :param unicode base_url: The base url prepended to the resource urls.
+    :param function combine_url: Takes a resource url and returns
+        the absolute url.  By default the ``base_url`` is joined
+        with ``join_url_parts``.
+    :return: The root node of the representation.
+    :rtype: ResourceNode
+    """
+    if isinstance(resource, ResourceNode):
+        return resource
+    key = base_url
+    if combine_url is not None:
+        key = base_url, getattr(combine_url, '__func__', combine_url)
+    cache = vars(resource).setdefault('_representations', {})
+    node = cache.get(key)
+    if node is None:
+        node = cache[key] = ResourceNode(resource, base_url=base_url, combine_url=combine_url)
+    return node
+
+
+def _represent_relations(relations, base_url, combine_url=None):
+    """
+    :param list relations: The related or linked resources
+        of a resource.
+    :param unicode base_url: The base url prepended to the resource urls.
+    :param function combine_url: Takes a resource url and
+        returns the absolute url.
+    :return: A list of RelationNodes
+    :rtype: list
+    """
+    nodes = []
+    for related, name, embedded in relations:
+        if is_iterator(related):
+            related = (represent(res, base_url, combine_url) for res in related)
+        elif isinstance(related, (list, tuple)):
+            related = [represent(res, base_url, combine_url) for res in related]
+        else:
+            related = represent(related, base_url, combine_url)
+        nodes.append(RelationNode(related, name, embedded))
+    return nodes
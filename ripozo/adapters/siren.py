@@ -7,10 +7,11 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 from ripozo.adapters import AdapterBase
-from ripozo.utilities import titlize_endpoint
+from ripozo.utilities import titlize_endpoint, is_iterator, iter_json, json_default
 from ripozo.resources.resource_base import create_url
 from ripozo.resources.constants import input_categories
 
+import itertools
 import json
 import six
 
@@ -40,16 +41,39 @@ class SirenAdapter(AdapterBase):
         # 204's are supposed to be empty responses
         if self.status_code == 204:
             return ''
+        return json.dumps(self._construct_document(), default=json_default)
 
+    def iter_formatted_body(self, chunk_size=8192):
+        """
+        Lazily encodes the body.  Entities constructed from
+        a generator are consumed one resource at a time.
+
+        :param int chunk_size: The approximate size of each chunk
+        :return: A generator that yields the response body in pieces.
+        :rtype: types.GeneratorType
+        """
+        if self.status_code == 204:
+            return iter([''])
+        return iter_json(self._construct_document(), chunk_size=chunk_size)
+
+    def _construct_document(self):
+        """
+        :return: The dictionary that will be dumped as the response
+        :rtype: dict
+        """
+        self.reset_render_memo()
+        # The primary resource is never repeated as an entity.
+        node = self.representation
+        self.render_memoized(node, True, lambda resource: None)
         links = self.generate_links()
 
         entities = self.get_entities()
-        response = dict(properties=self.resource.properties, actions=self._actions,
+        response = dict(properties=node.properties, actions=self._actions,
                         links=links, entities=entities)
 
         # need to do this separately since class is a reserved keyword
-        response['class'] = [self.resource.resource_name]
-        return json.dumps(response)
+        response['class'] = [node.resource_name]
+        return response
 
     @property
     def _actions(self):
@@ -103,46 +127,84 @@ class SirenAdapter(AdapterBase):
         :return: The list of Siren formatted links.
         :rtype: list
         """
-        href = self.combine_base_url_with_resource_url(self.resource.url)
-        links = [dict(rel=['self'], href=href)]
-        for link, link_name, embedded in self.resource.linked_resources:
-            links.append(dict(rel=[link_name],
-                              href=self.combine_base_url_with_resource_url(link.url)))
+        node = self.representation
+        links = [dict(rel=['self'], href=node.url)]
+        for link, link_name, embedded in node.linked_resources:
+            links.append(dict(rel=[link_name], href=link.url))
         return links
 
     def get_entities(self):
         """
-        Gets a list of related entities in an appropriate SIREN format
+        Gets a list of related entities in an appropriate SIREN format.
+        If any of the related resources are lazily constructed a generator
+        is returned instead so that they are only consumed when encoding.
 
         :return: A list of entities
-        :rtype: list
+        :rtype: list|types.GeneratorType
         """
         entities = []
-        for resource, name, embedded in self.resource.related_resources:
-            for ent in self.generate_entity(resource, name, embedded):
-                entities.append(ent)
-        return entities
+        lazy = False
+        for resource, name, embedded in self.representation.related_resources:
+            lazy = lazy or is_iterator(resource)
+            entities.append(self.generate_entity(resource, name, embedded))
+        entities = itertools.chain.from_iterable(entities)
+        return entities if lazy else list(entities)
 
     def generate_entity(self, resource, name, embedded):
         """
-        A generator that yields entities
+        A generator that yields entities.  An embedded resource
+        that appears multiple times is only constructed once.
         """
-        if isinstance(resource, list):
+        if isinstance(resource, list) or is_iterator(resource):
             for res in resource:
                 for ent in self.generate_entity(res, name, embedded):
                     yield ent
         else:
             if not resource.has_all_pks:
                 return
-            ent = {'class': [resource.resource_name], 'rel': [name]}
-            resource_url = self.combine_base_url_with_resource_url(resource.url)
             if not embedded:
-                ent['href'] = resource_url
+                ent = self._build_linked_entity(resource)
             else:
-                ent['properties'] = resource.properties
-                ent['links'] = [dict(rel=['self'], href=resource_url)]
+                ent = self.render_memoized(resource, embedded, self._build_embedded_entity)
+            ent = dict(ent)
+            ent['rel'] = [name]
             yield ent
 
+    def _build_embedded_entity(self, resource):
+        """
+        :return: The embedded representation of the entity
+            without its rel.
+        :rtype: dict
+        """
+        resource = self.represent(resource)
+        return {'class': [resource.resource_name], 'properties': resource.properties,
+                'links': [dict(rel=['self'], href=resource.url)]}
+
+    def _build_linked_entity(self, resource):
+        """
+        :return: The embedded link representation of the entity
+            without its rel.
+        :rtype: dict
+        """
+        resource = self.represent(resource)
+        return {'class': [resource.resource_name], 'href': resource.url}
+
+    def render_reference(self, resource, embedded, rendered):
+        """
+        Reuses the entity if it has already been constructed.
+        The primary resource is referred to with an embedded
+        link instead of being repeated.
+
+        :param ResourceBase resource: The repeated resource.
+        :param bool embedded: Whether the resource is embedded.
+        :param dict rendered: The entity constructed the first
+            time or None if it is the primary resource.
+        :rtype: dict
+        """
+        if rendered is not None:
+            return rendered
+        return self._build_linked_entity(resource)
+
     @classmethod
     def format_exception(cls, exc):
         """
@@ -0,0 +1,173 @@
+"""
+Aggregations computed by the managers instead of the clients.
+The ``aggregate`` query argument is a comma delimited list of
+``count``, ``count(field)``, ``sum(field)``, ``min(field)`` and
+``max(field)`` and the ``group_by`` query argument is a comma
+delimited list of fields:
+
+.. code-block:: text
+
+    ?aggregate=count,sum(price),max(price)&group_by=team&price__gte=10
+
+Like SQL, ``count`` counts the rows, the other functions ignore
+None and ``sum``, ``min`` and ``max`` are None when there are no
+values.  Without a ``group_by`` there is a single result even if
+no row matched.  ``aggregate_rows`` computes the aggregations
+in python for managers that can not compute them natively.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo.exceptions import ValidationException
+
+import re
+
+import six
+
+COUNT = 'count'
+SUM = 'sum'
+MIN = 'min'
+MAX = 'max'
+FUNCTIONS = (COUNT, SUM, MIN, MAX)
+
+_AGGREGATION = re.compile(r'^\s*(\w+)\s*(?:\(\s*([^()\s]*)\s*\))?\s*$', re.UNICODE)
+
+
+class Aggregation(object):
+    """
+    An aggregate function of a field.
+
+    :param unicode function: One of the functions.
+    :param unicode field: The name of the field or None
+        to count the rows.
+    """
+    __slots__ = ('function', 'field')
+
+    def __init__(self, function, field=None):
+        self.function = function
+        self.field = field
+
+    def __eq__(self, other):
+        return isinstance(other, Aggregation) and (self.function, self.field) == (other.function, other.field)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.function, self.field))
+
+    def __repr__(self):
+        return 'Aggregation({0!r}, {1!r})'.format(self.function, self.field)
+
+    @property
+    def name(self):
+        """
+        :return: The key of the aggregation in the results
+            (e.g. ``count`` or ``sum_price``).
+        :rtype: unicode
+        """
+        return self.function if self.field is None else '{0}_{1}'.format(self.function, self.field)
+
+
+def parse_aggregates(aggregates, fields):
+    """
+    Parses the aggregate functions.
+
+    .. code-block:: python
+
+        >>> parse_aggregates('count,sum(price)', ['price'])
+        [Aggregation('count', None), Aggregation('sum', 'price')]
+
+    :param unicode|list aggregates: A comma delimited string
+        or a list of them.
+    :param list fields: The names of the fields that can be aggregated.
+    :return: The aggregations in the order they were given
+        without duplicates.
+    :rtype: list
+    :raises: ValidationException
+    """
+    if isinstance(aggregates, six.string_types):
+        aggregates = [aggregates]
+    aggregations = []
+    for part in aggregates:
+        for text in re.split(r',(?![^(]*\))', six.text_type(part)):
+            if not text.strip():
+                continue
+            match = _AGGREGATION.match(text)
+            if match is None or match.group(1).lower() not in FUNCTIONS:
+                raise ValidationException('"{0}" is not an aggregation.  The functions are '
+                                          '{1}'.format(text.strip(), list(FUNCTIONS)))
+            function, field = match.group(1).lower(), match.group(2) or None
+            if field is None and function != COUNT:
+                raise ValidationException('The aggregation "{0}" requires a field'.format(text.strip()))
+            if field is not None and field not in fields:
+                raise ValidationException('The field "{0}" can not be aggregated.  The fields {1} may be '
+                                          'aggregated'.format(field, list(fields)))
+            aggregation = Aggregation(function, field)
+            if aggregation not in aggregations:
+                aggregations.append(aggregation)
+    return aggregations
+
+
+def _group_key(values):
+    """
+    :return: A key that orders the groups with None first.
+    :rtype: tuple
+    """
+    return tuple((0,) if value is None else (1, value) for value in values)
+
+
+def aggregate_rows(rows, aggregations, group_by=()):
+    """
+    Computes the aggregations in a single pass over the rows.
+
+    :param collections.Iterable rows: The rows (dictionaries)
+        that matched the filters.
+    :param list aggregations: The Aggregation instances.
+    :param list group_by: The fields to group the rows by.
+    :return: A dictionary per group with the group_by fields and the
+        names of the aggregations.  The groups are ordered by
+        the group_by fields.
+    :rtype: list
+    """
+    group_by = tuple(group_by or ())
+    groups = {}
+    if not group_by:
+        groups[()] = [0] + [None] * len(aggregations)
+    for row in rows:
+        key = tuple(row.get(field) for field in group_by)
+        state = groups.get(key)
+        if state is None:
+            state = groups[key] = [0] + [None] * len(aggregations)
+        state[0] += 1
+        for position, aggregation in enumerate(aggregations, 1):
+            if aggregation.field is None:
+                continue
+            value = row.get(aggregation.field)
+            if value is None:
+                continue
+            current = state[position]
+            function = aggregation.function
+            if function == COUNT:
+                state[position] = (current or 0) + 1
+            elif current is None:
+                state[position] = value
+            elif function == SUM:
+                state[position] = current + value
+            elif function == MIN:
+                state[position] = min(current, value)
+            else:
+                state[position] = max(current, value)
+    results = []
+    for key in sorted(groups, key=_group_key):
+        state = groups[key]
+        result = dict(six.moves.zip(group_by, key))
+        for position, aggregation in enumerate(aggregations, 1):
+            value = state[position]
+            if aggregation.function == COUNT:
+                value = state[0] if aggregation.field is None else value or 0
+            result[aggregation.name] = value
+        results.append(result)
+    return results
@@ -12,6 +12,8 @@ import warnings
 
 import six
 
+from ripozo.instrumentation.base import stage, PREPROCESSORS, POSTPROCESSORS
+
 
 _logger = logging.getLogger(__name__)
 
@@ -102,6 +104,7 @@ class _apiclassmethod(object):
             if len(args) == 0 or not isinstance(args[0], type):
                 return self.func(klass, *args)
             return self.func(*args)
+        newfunc.resource_class = klass
         return newfunc
 
     def __call__(self, cls, *args, **kwargs):
@@ -193,11 +196,15 @@ class apimethod(object):
             """
             Runs the preo/postprocessors
             """
-            for proc in cls.preprocessors:
-                proc(cls, func.__name__, request, *args, **kwargs)
+            if cls.preprocessors:
+                with stage(PREPROCESSORS):
+                    for proc in cls.preprocessors:
+                        proc(cls, func.__name__, request, *args, **kwargs)
             resource = func(cls, request, *args, **kwargs)
-            for proc in cls.postprocessors:
-                proc(cls, func.__name__, request, resource, *args, **kwargs)
+            if cls.postprocessors:
+                with stage(POSTPROCESSORS):
+                    for proc in cls.postprocessors:
+                        proc(cls, func.__name__, request, resource, *args, **kwargs)
             return resource
         return wrapped
 
@@ -11,11 +11,15 @@ from __future__ import unicode_literals
 from abc import ABCMeta, abstractmethod, abstractproperty
 
 from ripozo.exceptions import AdapterFormatAlreadyRegisteredException
+from ripozo.instrumentation.base import RequestContext, RenderObservation, observe_request, \
+    stage, NEGOTIATION, FORMAT_REQUEST, APIMETHOD, ADAPTER
 from ripozo.resources.constructor import ResourceMetaClass
+from ripozo.resources.request import request_scope
 from ripozo.resources.restmixins import AllOptionsResource
 
 import logging
 import six
+import sys
 import warnings
 
 _logger = logging.getLogger(__name__)
@@ -36,8 +40,9 @@ class DispatcherBase(object):
     """
     _adapter_formats = None
     _default_adapter = None
+    observers = ()
 
-    def __init__(self, auto_options=True, auto_options_name='AutoOptionsResource'):
+    def __init__(self, auto_options=True, auto_options_name='AutoOptionsResource', observers=None):
         """
 
         :param bool auto_options: Automatically builds out an
@@ -46,7 +51,11 @@ class DispatcherBase(object):
         :param unicode auto_options_name: The name of the auto
             options resource class.  Available in cases of
             multiple dispatchers.
+        :param list observers: A list of DispatchObserver instances
+            (e.g. the ``MemoryProfiler``) that observe the stages
+            of the dispatched requests.
         """
+        self.observers = list(observers or [])
         self.auto_options = auto_options
         if self.auto_options:
             cls = ResourceMetaClass(str(auto_options_name), (AllOptionsResource,),
@@ -104,6 +113,14 @@ class DispatcherBase(object):
         _logger.info('Setting the default adapter for a Dispatcher as %s', adapter_class)
         self._default_adapter = adapter_class
 
+    def add_observer(self, observer):
+        """
+        Adds an observer of the dispatched requests.
+
+        :param DispatchObserver observer: The observer to add.
+        """
+        self.observers = list(self.observers) + [observer]
+
     def register_adapters(self, *adapter_classes):
         """
         Registers a list of valid adapter classes with this dispatcher.
@@ -155,6 +172,7 @@ class DispatcherBase(object):
                 and klass not in self.auto_options_class.linked_resource_classes\
                 and klass is not self.auto_options_class:
             self.auto_options_class.linked_resource_classes.append(klass)
+            self.auto_options_class.invalidate_options()
         self._check_relationships(klass)
         for endpoint, routes in six.iteritems(klass.endpoint_dictionary()):
             endpoint = '{0}__{1}'.format(klass.__name__, endpoint)
@@ -207,12 +225,59 @@ class DispatcherBase(object):
         """
         _logger.info('Dispatching request to endpoint function: %s with args:'
                      ' %s and kwargs:%s', endpoint_func, args, kwargs)
-        adapter_class = self.get_adapter_for_type(accepted_mimetypes)
-        request = adapter_class.format_request(request)
-        result = endpoint_func(request, *args, **kwargs)
-        _logger.info('Using adapter %s to format response for format'
-                     ' type %s', adapter_class, accepted_mimetypes)
-        adapter = adapter_class(result, base_url=self.base_url)
+        with request_scope(request):
+            if self.observers:
+                observers = [observer for observer in self.observers
+                             if observer.should_observe(endpoint_func, request)]
+                if observers:
+                    return self._observed_dispatch(observers, endpoint_func, accepted_mimetypes,
+                                                   request, *args, **kwargs)
+            adapter_class = self.get_adapter_for_type(accepted_mimetypes)
+            request = adapter_class.format_request(request)
+            result = endpoint_func(request, *args, **kwargs)
+            _logger.info('Using adapter %s to format response for format'
+                         ' type %s', adapter_class, accepted_mimetypes)
+            adapter = adapter_class(result, base_url=self.base_url)
+            adapter.request = request
+            return adapter
+
+    def _observed_dispatch(self, observers, endpoint_func, accepted_mimetypes, request, *args, **kwargs):
+        """
+        The same as ``dispatch`` except that each stage is reported to the
+        observers.  The request is finished once the adapter has rendered
+        the body (see ``RenderObservation``) so that rendering, including
+        streaming the body, is observed as well.
+
+        :param list observers: The observers that are observing this request.
+        :param method endpoint_func: The endpoint_func is responsible
+            for actually get the ResourceBase response
+        :param list accepted_mimetypes: The mime types accepted by
+            the client.
+        :param RequestContainer request: The request object
+        :return: an instance of an AdapterBase subclass whose
+            ``render_observation`` finishes the request.
+        :rtype: AdapterBase
+        """
+        context = RequestContext(observers, endpoint_func, request)
+        observation = observe_request(context)
+        observation.__enter__()
+        try:
+            with stage(NEGOTIATION):
+                adapter_class = self.get_adapter_for_type(accepted_mimetypes)
+            context.adapter_class = adapter_class
+            with stage(FORMAT_REQUEST):
+                request = adapter_class.format_request(request)
+            context.request = request
+            with stage(APIMETHOD):
+                result = endpoint_func(request, *args, **kwargs)
+            with stage(ADAPTER):
+                adapter = adapter_class(result, base_url=self.base_url)
+                adapter.request = request
+        except Exception:
+            exc_info = sys.exc_info()
+            observation.__exit__(*exc_info)
+            six.reraise(*exc_info)
+        adapter.render_observation = RenderObservation(observation)
         return adapter
 
     def get_adapter_for_type(self, accept_mimetypes):
@@ -61,6 +61,22 @@ class TranslationException(ValidationException):
     pass
 
 
+class BatchValidationException(ValidationException):
+    """
+    An exception raised when translating or validating many
+    values at once fails.  It holds every failure instead of
+    only the first one.
+
+    :param list errors: A list of ``(index, field_name, exception)``
+        tuples sorted by the index of the value (or record) that failed.
+    """
+    def __init__(self, errors, message=None, status_code=400, *args, **kwargs):
+        self.errors = errors
+        if message is None:
+            message = '; '.join('{0} ({1}): {2}'.format(index, name, exc) for index, name, exc in errors)
+        super(BatchValidationException, self).__init__(message, status_code=status_code, *args, **kwargs)
+
+
 class DispatchException(RestException):
     """
     An exception for when something is wrong with the Dispatcher
@@ -85,3 +101,13 @@ class JSONAPIFormatException(RestException):
     """
     def __init__(self, message, status_code=400, *args, **kwargs):
         super(JSONAPIFormatException, self).__init__(message, status_code=status_code, *args, **kwargs)
+
+
+class ManagerCallBudgetExceeded(RestException):
+    """
+    This exception is raised by the ManagerCallCounter when
+    a request calls the managers more times than its budget
+    allows.  It usually means that something is retrieving
+    related models one at a time (N+1 queries).
+    """
+    pass
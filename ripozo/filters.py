@@ -0,0 +1,564 @@
+"""
+Filters parsed from the query arguments of a request.  They are
+parsed once into a tree of ``Condition``, ``And`` and ``Or`` nodes
+whose values have been translated by the fields' validators.
+Managers compile the tree to whatever their persistence mechanism
+evaluates (e.g. a python predicate or a SQL WHERE clause) with a
+``FilterCompiler``.
+
+There are two syntaxes.  Query arguments named after a field
+(``name=bob``) or a field followed by ``__`` and an operator
+(``age__gte=10``, ``team__in=a,b``) must all be satisfied.  The
+``filter`` query argument takes an expression:
+
+.. code-block:: text
+
+    age >= 10 and (team in (a, 'b c') or name != bob) and not email is null
+
+The comparisons are ``=``, ``!=``, ``>``, ``>=``, ``<``, ``<=``,
+``in (...)``, ``not in (...)``, ``is null`` and ``is not null``.
+Values may be quoted with single or double quotes and ``null``
+is None.  ``not`` is pushed down to the conditions when the
+expression is parsed so the tree never contains it.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo.exceptions import ValidationException
+
+import re
+
+import six
+
+EQUAL = 'eq'
+NOT_EQUAL = 'ne'
+IN = 'in'
+NOT_IN = 'nin'
+GREATER = 'gt'
+GREATER_EQUAL = 'gte'
+LESS = 'lt'
+LESS_EQUAL = 'lte'
+OPERATORS = (EQUAL, NOT_EQUAL, IN, NOT_IN, GREATER, GREATER_EQUAL, LESS, LESS_EQUAL)
+RANGE_OPERATORS = (GREATER, GREATER_EQUAL, LESS, LESS_EQUAL)
+
+_NEGATIONS = {
+    EQUAL: NOT_EQUAL,
+    NOT_EQUAL: EQUAL,
+    IN: NOT_IN,
+    NOT_IN: IN,
+    GREATER: LESS_EQUAL,
+    GREATER_EQUAL: LESS,
+    LESS: GREATER_EQUAL,
+    LESS_EQUAL: GREATER,
+}
+
+_COMPARISON_OPERATORS = {
+    '=': EQUAL,
+    '!=': NOT_EQUAL,
+    '>': GREATER,
+    '>=': GREATER_EQUAL,
+    '<': LESS,
+    '<=': LESS_EQUAL,
+}
+
+
+class Condition(object):
+    """
+    A comparison of a field to a value.
+
+    :param unicode field: The name of the field.
+    :param unicode operator: One of the operators.
+    :param object value: The value (a tuple for ``in``
+        and ``nin``) to compare to.
+    """
+    __slots__ = ('field', 'operator', 'value')
+
+    def __init__(self, field, operator, value):
+        self.field = field
+        self.operator = operator
+        self.value = value
+
+    def __eq__(self, other):
+        return isinstance(other, Condition) and (self.field, self.operator, self.value) == \
+            (other.field, other.operator, other.value)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'Condition({0!r}, {1!r}, {2!r})'.format(self.field, self.operator, self.value)
+
+    def matches(self, row):
+        """
+        :param dict row: A row
+        :return: Whether the row's value satisfies the condition.
+        :rtype: bool
+        """
+        return self.test(row.get(self.field))
+
+    def test(self, value):
+        """
+        :param object value: A value of the field.
+        :return: Whether the value satisfies the condition.
+            None only satisfies ``eq``, ``ne``, ``in`` and ``nin``.
+        :rtype: bool
+        """
+        operator = self.operator
+        if operator == EQUAL:
+            return value == self.value
+        if operator == NOT_EQUAL:
+            return value != self.value
+        if operator == IN:
+            return value in self.value
+        if operator == NOT_IN:
+            return value not in self.value
+        if value is None:
+            return False
+        try:
+            if operator == GREATER:
+                return value > self.value
+            if operator == GREATER_EQUAL:
+                return value >= self.value
+            if operator == LESS:
+                return value < self.value
+            return value <= self.value
+        except TypeError:
+            return False
+
+    def negate(self):
+        """
+        :return: The node that is satisfied when this condition
+            is not.  The negation of a range includes None.
+        :rtype: Condition|Or
+        """
+        negated = Condition(self.field, _NEGATIONS[self.operator], self.value)
+        if self.operator in RANGE_OPERATORS:
+            return Or([negated, Condition(self.field, EQUAL, None)])
+        return negated
+
+
+class _Junction(object):
+    """
+    The base class of And and Or.
+
+    :param list children: The nodes.
+    """
+    __slots__ = ('children',)
+
+    def __init__(self, children):
+        self.children = tuple(children)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.children == other.children
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(type(self).__name__, list(self.children))
+
+
+class And(_Junction):
+    """
+    Satisfied when every child is.
+    """
+    __slots__ = ()
+
+    def matches(self, row):
+        return all(child.matches(row) for child in self.children)
+
+    def negate(self):
+        return Or([child.negate() for child in self.children])
+
+
+class Or(_Junction):
+    """
+    Satisfied when any child is.
+    """
+    __slots__ = ()
+
+    def matches(self, row):
+        return any(child.matches(row) for child in self.children)
+
+    def negate(self):
+        return And([child.negate() for child in self.children])
+
+
+def conjunction(nodes):
+    """
+    :param list nodes: Nodes or None.
+    :return: A node satisfied when every node is.  Nested Ands are
+        flattened.  None is returned if there are no nodes.
+    :rtype: Condition|And|Or
+    """
+    children = []
+    for node in nodes:
+        if isinstance(node, And):
+            children.extend(node.children)
+        elif node is not None:
+            children.append(node)
+    if not children:
+        return None
+    return children[0] if len(children) == 1 else And(children)
+
+
+def conjuncts(node):
+    """
+    :param Condition|And|Or node: A node or None.
+    :return: The nodes that must all be satisfied.  Managers
+        can answer the conditions among them with indexes.
+    :rtype: list
+    """
+    if node is None:
+        return []
+    return list(node.children) if isinstance(node, And) else [node]
+
+
+class FilterCompiler(object):
+    """
+    Compiles a tree bottom up.  Subclasses implement
+    ``compile_condition``, ``compile_and`` and ``compile_or``.
+    """
+    def compile(self, node):
+        """
+        :param Condition|And|Or node: The tree.
+        :return: Whatever the compile methods return.
+        """
+        if isinstance(node, And):
+            return self.compile_and(node, [self.compile(child) for child in node.children])
+        if isinstance(node, Or):
+            return self.compile_or(node, [self.compile(child) for child in node.children])
+        return self.compile_condition(node)
+
+    def compile_condition(self, condition):
+        raise NotImplementedError
+
+    def compile_and(self, node, children):
+        raise NotImplementedError
+
+    def compile_or(self, node, children):
+        raise NotImplementedError
+
+
+class PredicateCompiler(FilterCompiler):
+    """
+    Compiles a tree to a function that takes a row
+    (a dictionary) and returns whether it satisfies the tree.
+    """
+    def compile_condition(self, condition):
+        field, test = condition.field, condition.test
+        return lambda row: test(row.get(field))
+
+    def compile_and(self, node, children):
+        return lambda row: all(child(row) for child in children)
+
+    def compile_or(self, node, children):
+        return lambda row: any(child(row) for child in children)
+
+
+class SelectivityCompiler(FilterCompiler):
+    """
+    Compiles a tree to an estimate of the fraction of the rows
+    that satisfy it.  Equality is estimated from the number of
+    distinct values of the field (when it is known) assuming they
+    are uniformly distributed and the conditions are assumed to
+    be independent.
+
+    :param dict distinct: The number of distinct values of the
+        fields that have statistics.
+    """
+    equal_selectivity = 0.1
+    range_selectivity = 1 / 3
+
+    def __init__(self, distinct=None):
+        self.distinct = distinct or {}
+
+    def compile_condition(self, condition):
+        distinct = self.distinct.get(condition.field)
+        equal = 1 / distinct if distinct else self.equal_selectivity
+        operator = condition.operator
+        if operator == EQUAL:
+            return equal
+        if operator == NOT_EQUAL:
+            return 1 - equal
+        if operator in (IN, NOT_IN):
+            selectivity = min(1, len(set(condition.value)) * equal)
+            return selectivity if operator == IN else 1 - selectivity
+        return self.range_selectivity
+
+    def compile_and(self, node, children):
+        selectivity = 1
+        for child in children:
+            selectivity *= child
+        return selectivity
+
+    def compile_or(self, node, children):
+        excluded = 1
+        for child in children:
+            excluded *= 1 - child
+        return 1 - excluded
+
+
+def _validators_by_name(validators):
+    return dict((field.name, field) for field in validators or [] if field is not None)
+
+
+def _translate(name, operator, value, validator):
+    """
+    :return: The value translated by the validator.  The items
+        of ``in`` and ``nin`` values are translated.
+    :raises: ValidationException
+    """
+    if operator in (IN, NOT_IN):
+        return tuple(item if item is None or validator is None else validator.translate(item)
+                     for item in value)
+    if value is None:
+        if operator in RANGE_OPERATORS:
+            raise ValidationException('The filter "{0}" requires a value'.format(name))
+        return None
+    return value if validator is None else validator.translate(value)
+
+
+def _field_operator(name, fields):
+    """
+    :return: The field and operator of a query argument or
+        (None, None) if it does not filter a field.
+    :rtype: tuple
+    """
+    field, operator = name, EQUAL
+    if name not in fields and '__' in name:
+        field, _, operator = name.rpartition('__')
+        if operator not in OPERATORS:
+            return None, None
+    if field not in fields:
+        return None, None
+    return field, operator
+
+
+def filter_query_arg_names(fields):
+    """
+    :param list fields: The names of the fields that can be filtered.
+    :return: Every query argument name that ``parse_query_args``
+        accepts for the fields.
+    :rtype: tuple
+    """
+    names = tuple(fields)
+    for operator in OPERATORS:
+        names += tuple('{0}__{1}'.format(field, operator) for field in fields)
+    return names
+
+
+def filter_query_args(filters, fields):
+    """
+    The query arguments that ``parse_query_args`` would parse.
+    Lists are joined with commas so that the arguments can be put in
+    a link (e.g. the next page of a list) and parsed the same way.
+
+    :param dict filters: The query arguments.
+    :param list fields: The names of the fields that can be filtered.
+    :return: The query arguments that filter the fields.
+    :rtype: dict
+    """
+    args = {}
+    for name, value in six.iteritems(filters):
+        if _field_operator(name, fields)[0] is None:
+            continue
+        if isinstance(value, (list, tuple)):
+            value = ','.join(six.text_type(item) for item in value)
+        args[name] = value
+    return args
+
+
+def parse_query_args(filters, fields, validators=None):
+    """
+    Parses the query arguments named after fields.  The keys are
+    either a field's name (equality) or the name followed by ``__``
+    and one of the operators (``eq``, ``ne``, ``in``, ``nin``, ``gt``,
+    ``gte``, ``lt`` or ``lte``).  ``in`` and ``nin`` take a list or a
+    comma separated string.  The values are translated with the field's
+    validator.  Keys that are not fields are ignored.
+
+    :param dict filters: The query arguments.
+    :param list fields: The names of the fields that can be filtered.
+    :param list validators: The BaseField instances used to translate
+        the values.
+    :return: The conditions or None if there are not any.
+    :rtype: Condition|And
+    :raises: ValidationException
+    """
+    validators = _validators_by_name(validators)
+    conditions = []
+    for name, value in sorted(six.iteritems(filters)):
+        field, operator = _field_operator(name, fields)
+        if field is None:
+            continue
+        if operator in (IN, NOT_IN):
+            if isinstance(value, six.string_types):
+                value = value.split(',')
+            elif not isinstance(value, (list, tuple, set)):
+                value = [value]
+        elif isinstance(value, (list, tuple)) and len(value) == 1:
+            value = value[0]
+        value = _translate(name, operator, value, validators.get(field))
+        conditions.append(Condition(field, operator, value))
+    return conjunction(conditions)
+
+
+_TOKEN = re.compile(r'''
+    \s*(?:
+        (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+        |(?P<operator>>=|<=|!=|=|>|<)
+        |(?P<punctuation>[(),])
+        |(?P<word>[^\s()<>=!,'"]+)
+    )''', re.VERBOSE | re.UNICODE)
+_KEYWORDS = ('and', 'or', 'not', 'in', 'is', 'null')
+
+
+def _tokenize(text):
+    """
+    :param unicode text: A filter expression.
+    :return: The ``(kind, text, position)`` of each token.
+    :rtype: list
+    :raises: ValidationException
+    """
+    tokens, position = [], 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None:
+            raise ValidationException('Unexpected "{0}" at position {1} of the filter'.format(
+                text[position:].strip()[:1], position))
+        kind = match.lastgroup
+        value, start = match.group(kind), match.start(kind)
+        if kind == 'string':
+            value = re.sub(r'\\(.)', r'\1', value[1:-1])
+        elif kind == 'word' and value.lower() in _KEYWORDS:
+            kind = 'keyword'
+        tokens.append((kind, value, start))
+        position = match.end()
+    return tokens
+
+
+class _ExpressionParser(object):
+    """
+    A recursive descent parser for filter expressions.
+    """
+    def __init__(self, text, fields, validators):
+        self.tokens = _tokenize(text)
+        self.index = 0
+        self.fields = fields
+        self.validators = validators
+
+    def parse(self):
+        if not self.tokens:
+            return None
+        node = self._or()
+        if self.index < len(self.tokens):
+            self._error()
+        return node
+
+    def _peek(self):
+        return self.tokens[self.index] if self.index < len(self.tokens) else (None, None, None)
+
+    def _accept(self, kind, value=None):
+        token_kind, token_value, _ = self._peek()
+        if token_kind == kind and (value is None or token_value.lower() == value):
+            self.index += 1
+            return token_value
+        return None
+
+    def _expect(self, kind, value=None):
+        accepted = self._accept(kind, value)
+        if accepted is None:
+            self._error()
+        return accepted
+
+    def _error(self):
+        kind, value, position = self._peek()
+        if kind is None:
+            raise ValidationException('The filter ended unexpectedly')
+        raise ValidationException('Unexpected "{0}" at position {1} of the '
+                                  'filter'.format(value, position))
+
+    def _or(self):
+        nodes = [self._and()]
+        while self._accept('keyword', 'or'):
+            nodes.append(self._and())
+        return nodes[0] if len(nodes) == 1 else Or(nodes)
+
+    def _and(self):
+        nodes = [self._not()]
+        while self._accept('keyword', 'and'):
+            nodes.append(self._not())
+        return conjunction(nodes)
+
+    def _not(self):
+        if self._accept('keyword', 'not'):
+            return self._not().negate()
+        if self._accept('punctuation', '('):
+            node = self._or()
+            self._expect('punctuation', ')')
+            return node
+        return self._comparison()
+
+    def _comparison(self):
+        kind, field, _ = self._peek()
+        if kind not in ('word', 'string'):
+            self._error()
+        if field not in self.fields:
+            raise ValidationException('The filter can not use the field "{0}".  The fields '
+                                      '{1} may be used'.format(field, list(self.fields)))
+        self.index += 1
+        if self._accept('keyword', 'is'):
+            operator = NOT_EQUAL if self._accept('keyword', 'not') else EQUAL
+            self._expect('keyword', 'null')
+            return Condition(field, operator, None)
+        if self._accept('keyword', 'not'):
+            self._expect('keyword', 'in')
+            operator, value = NOT_IN, self._list()
+        elif self._accept('keyword', 'in'):
+            operator, value = IN, self._list()
+        else:
+            operator = _COMPARISON_OPERATORS[self._expect('operator')]
+            value = self._value()
+        value = _translate(field, operator, value, self.validators.get(field))
+        return Condition(field, operator, value)
+
+    def _list(self):
+        self._expect('punctuation', '(')
+        values = [self._value()]
+        while self._accept('punctuation', ','):
+            values.append(self._value())
+        self._expect('punctuation', ')')
+        return values
+
+    def _value(self):
+        if self._accept('keyword', 'null'):
+            return None
+        kind, value, _ = self._peek()
+        if kind not in ('word', 'string', 'keyword'):
+            self._error()
+        self.index += 1
+        return value
+
+
+def parse_expression(text, fields, validators=None):
+    """
+    Parses a filter expression.
+
+    .. code-block:: python
+
+        >>> parse_expression('age >= 10 and not team in (a, b)', ['age', 'team'])
+        And([Condition('age', 'gte', '10'), Condition('team', 'nin', ('a', 'b'))])
+
+    :param unicode text: The expression.
+    :param list fields: The names of the fields that can be filtered.
+    :param list validators: The BaseField instances used to translate
+        the values.
+    :return: The tree or None if the expression is empty.
+    :rtype: Condition|And|Or
+    :raises: ValidationException
+    """
+    return _ExpressionParser(six.text_type(text), fields, _validators_by_name(validators)).parse()
@@ -0,0 +1,16 @@
+"""
+Hooks for observing the requests dispatched by a
+DispatcherBase and the observers that use them.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from .base import DispatchObserver, RequestContext, current_context, stage
+from .memory import MemoryProfiler, LoggingSink, ListSink
+from .managers import ManagerCallCounter
+from .metrics import DispatchMetrics, Histogram
+from .profiler import SlowRequestProfiler
+from .tracing import Tracer, Span, SpanContext, InMemoryExporter, FileExporter, span, current_span, \
+    parse_traceparent
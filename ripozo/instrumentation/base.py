@@ -0,0 +1,435 @@
+"""
+The hooks that the dispatcher uses to let observers (profilers,
+metrics, tracers etc...) watch the stages of a request.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from functools import wraps
+from timeit import default_timer
+
+import logging
+import threading
+
+_logger = logging.getLogger(__name__)
+
+NEGOTIATION = 'negotiation'
+FORMAT_REQUEST = 'format_request'
+APIMETHOD = 'apimethod'
+PREPROCESSORS = 'preprocessors'
+POSTPROCESSORS = 'postprocessors'
+RESOURCE = 'resource'
+ADAPTER = 'adapter'
+RENDER = 'render'
+
+STAGES = (NEGOTIATION, FORMAT_REQUEST, APIMETHOD, PREPROCESSORS,
+          POSTPROCESSORS, RESOURCE, ADAPTER, RENDER)
+
+_local = threading.local()
+
+
+class DispatchObserver(object):
+    """
+    The base class for objects that observe the requests dispatched
+    by a ``DispatcherBase``.  Observers are passed to the dispatcher's
+    constructor (or ``add_observer``).  When no observer wants to observe
+    a request the dispatcher takes the same path it always has.
+
+    The stages are ``negotiation`` (finding the adapter), ``format_request``,
+    ``apimethod`` (which contains ``preprocessors``, ``resource`` construction
+    and ``postprocessors``), ``adapter`` (constructing the adapter)
+    and ``render`` (the adapter's ``formatted_body`` or ``iter_formatted_body``).
+    An observed request is finished once its body has been rendered so the
+    ``render`` stage of a streamed body lasts until the last chunk was
+    yielded.  Stages may be nested but a stage is never nested in itself.
+    Observers are also notified of the calls to the methods of managers
+    (see ``ripozo.manager_base.INSTRUMENTED_METHODS``).
+    """
+
+    def should_observe(self, endpoint_func, request):
+        """
+        Whether this observer wants to observe the request.
+        Override this to sample requests.
+
+        :param function endpoint_func: The apimethod being dispatched.
+        :param RequestContainer request: The request.
+        :rtype: bool
+        """
+        return True
+
+    def request_started(self, context):
+        """
+        Called before anything else is done for the request.
+
+        :param RequestContext context: The observed request.
+        """
+        pass
+
+    def stage_started(self, context, stage_name):
+        """
+        :param RequestContext context: The observed request.
+        :param unicode stage_name: The stage that is starting.
+        """
+        pass
+
+    def stage_finished(self, context, stage_name, duration):
+        """
+        :param RequestContext context: The observed request.
+        :param unicode stage_name: The stage that finished.
+        :param float duration: The seconds the stage took.
+        """
+        pass
+
+    def manager_call_started(self, context, manager, method_name):
+        """
+        Called before a manager's method is called.  Exceptions
+        raised here are raised instead of calling the method.
+
+        :param RequestContext context: The observed request.
+        :param BaseManager manager: The manager being called.
+        :param unicode method_name: The name of the method called.
+        """
+        pass
+
+    def manager_call_finished(self, context, manager, method_name, duration, exc=None):
+        """
+        :param RequestContext context: The observed request.
+        :param BaseManager manager: The manager that was called.
+        :param unicode method_name: The name of the method called.
+        :param float duration: The seconds the call took.
+        :param Exception exc: The exception raised by the call if any.
+        """
+        pass
+
+    def request_finished(self, context, exc=None):
+        """
+        Called once the response is rendered or when
+        dispatching raised an exception.
+
+        :param RequestContext context: The observed request.
+        :param Exception exc: The exception raised if any.
+        """
+        pass
+
+
+class RequestContext(object):
+    """
+    The state of an observed request.  It is available to
+    any code running for the request with ``current_context``.
+
+    :param list observers: The observers watching the request.
+    :param function endpoint_func: The apimethod being dispatched.
+    :param unicode endpoint: The name of the endpoint in the
+        ``<ResourceClass>__<apimethod>`` format that the dispatcher
+        registers routes with.
+    :param RequestContainer request: The request.  It is replaced
+        with the formatted request after ``format_request``.
+    :param type adapter_class: The adapter class once negotiated.
+    :param float start: When the request started.
+    :param float duration: The seconds the request took
+        once it is finished.
+    :param dict data: Storage for the observers keyed by
+        whatever the observer chooses (usually itself).
+    """
+    def __init__(self, observers, endpoint_func, request):
+        self.observers = observers
+        self.endpoint_func = endpoint_func
+        self.endpoint = endpoint_name(endpoint_func)
+        self.request = request
+        self.adapter_class = None
+        self.start = default_timer()
+        self.duration = None
+        self.data = {}
+        self.stages = []
+        self.manager_calls = []
+
+
+class stage(object):
+    """
+    A context manager that notifies the observers of the current
+    request that a stage started and finished.  It does almost
+    nothing if the request is not observed.
+
+    .. code-block:: python
+
+        with stage(RENDER):
+            body = adapter.formatted_body
+
+    :param unicode name: The name of the stage.
+    """
+    __slots__ = ('name', 'context', 'start')
+
+    def __init__(self, name):
+        self.name = name
+        self.context = None
+        self.start = None
+
+    def __enter__(self):
+        context = getattr(_local, 'context', None)
+        if context is None or self.name in context.stages:
+            return self
+        self.context = context
+        context.stages.append(self.name)
+        for observer in context.observers:
+            observer.stage_started(context, self.name)
+        self.start = default_timer()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        context = self.context
+        if context is None:
+            return False
+        duration = default_timer() - self.start
+        context.stages.pop()
+        for observer in reversed(context.observers):
+            observer.stage_finished(context, self.name, duration)
+        return False
+
+
+class manager_call(object):
+    """
+    A context manager that notifies the observers of the current
+    request of a call to a manager's method.  A call made while
+    the same method of the same manager is running (i.e. a
+    call to the super class's method) is not reported.
+
+    :param BaseManager manager: The manager being called.
+    :param unicode method_name: The name of the method.
+    """
+    __slots__ = ('manager', 'method_name', 'key', 'context', 'start')
+
+    def __init__(self, manager, method_name):
+        self.manager = manager
+        self.method_name = method_name
+        self.key = (id(manager), method_name)
+        self.context = None
+        self.start = None
+
+    def __enter__(self):
+        context = getattr(_local, 'context', None)
+        if context is None or self.key in context.manager_calls:
+            return self
+        context.manager_calls.append(self.key)
+        try:
+            for observer in context.observers:
+                observer.manager_call_started(context, self.manager, self.method_name)
+        except Exception:
+            context.manager_calls.pop()
+            raise
+        self.context = context
+        self.start = default_timer()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        context = self.context
+        if context is None:
+            return False
+        duration = default_timer() - self.start
+        context.manager_calls.pop()
+        for observer in reversed(context.observers):
+            observer.manager_call_finished(context, self.manager, self.method_name,
+                                           duration, exc=exc_val)
+        return False
+
+
+class observe_request(object):
+    """
+    A context manager that makes the context current and
+    notifies its observers that the request started and finished.
+
+    :param RequestContext context: The request being observed.
+    """
+    def __init__(self, context):
+        self.context = context
+        self.previous = None
+
+    def __enter__(self):
+        self.previous = getattr(_local, 'context', None)
+        _local.context = self.context
+        for observer in self.context.observers:
+            observer.request_started(self.context)
+        return self.context
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        context = self.context
+        context.duration = default_timer() - context.start
+        try:
+            for observer in reversed(context.observers):
+                observer.request_finished(context, exc=exc_val)
+        finally:
+            _local.context = self.previous
+        return False
+
+
+def current_context():
+    """
+    :return: The context of the request being observed
+        in this thread or None.
+    :rtype: RequestContext
+    """
+    return getattr(_local, 'context', None)
+
+
+def endpoint_name(endpoint_func):
+    """
+    :param function endpoint_func: An apimethod
+    :return: The ``<ResourceClass>__<apimethod>`` name of the endpoint.
+    :rtype: unicode
+    """
+    name = getattr(endpoint_func, '__name__', None) or repr(endpoint_func)
+    klass = getattr(endpoint_func, 'resource_class', None)
+    if klass is None:
+        return name
+    return '{0}__{1}'.format(klass.__name__, name)
+
+
+class RenderObservation(object):
+    """
+    Keeps an observed request open until the adapter has rendered
+    the response body so that the ``render`` stage is measured while
+    the body is rendered, even when it is streamed with
+    ``iter_formatted_body``.  The dispatcher sets it as the
+    adapter's ``render_observation`` and the adapter calls ``start``,
+    ``call`` and ``finish`` (see ``ripozo.adapters.base.AdapterMeta``).
+    The request's context is only current while the adapter is
+    rendering.  If the adapter is discarded without rendering
+    the body the request is finished without a ``render`` stage.
+
+    :param observe_request observation: The observation of the
+        request.  It must have been entered.
+    """
+    def __init__(self, observation):
+        self.observation = observation
+        self.stage = stage(RENDER)
+        self.started = False
+        self.finished = False
+        _local.context = observation.previous
+
+    @property
+    def waiting(self):
+        """
+        :return: Whether the body has not started rendering.
+        :rtype: bool
+        """
+        return not self.started and not self.finished
+
+    def call(self, func, *args, **kwargs):
+        """
+        Calls the function with the request's context.
+
+        :param function func: The function to call.
+        :return: Whatever the function returned.
+        """
+        previous = getattr(_local, 'context', None)
+        _local.context = self.observation.context
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.context = previous
+
+    def start(self):
+        """
+        Starts the ``render`` stage.
+        """
+        self.started = True
+        self.call(self.stage.__enter__)
+
+    def finish(self, exc=None):
+        """
+        Finishes the ``render`` stage (if it was started) and the
+        request.  Only the first call does anything.
+
+        :param Exception exc: The exception raised while rendering if any.
+        """
+        if self.finished:
+            return
+        self.finished = True
+        exc_type = type(exc) if exc is not None else None
+        self.observation.previous = getattr(_local, 'context', None)
+        _local.context = self.observation.context
+        try:
+            if self.started:
+                self.stage.__exit__(exc_type, exc, None)
+        finally:
+            self.observation.__exit__(exc_type, exc, None)
+
+    def __del__(self):
+        if not self.finished:
+            try:
+                self.finish()
+            except Exception:  # pragma: no cover
+                _logger.exception('Failed to finish the observed request %s', self.observation.context.endpoint)
+
+
+def observed_formatted_body(fget):
+    """
+    Wraps the getter of an adapter's ``formatted_body`` so that an
+    observed request's ``render`` stage is the rendering of the body.
+
+    :param function fget: The getter of the property.
+    :return: The wrapped getter.
+    :rtype: function
+    """
+    @wraps(fget)
+    def formatted_body(adapter):
+        observation = getattr(adapter, 'render_observation', None)
+        if observation is None or not observation.waiting:
+            return fget(adapter)
+        observation.start()
+        try:
+            body = observation.call(fget, adapter)
+        except Exception as exc:
+            observation.finish(exc)
+            raise
+        observation.finish()
+        return body
+    formatted_body.__instrumented__ = True
+    return formatted_body
+
+
+def observed_iter_formatted_body(func):
+    """
+    Wraps an adapter's ``iter_formatted_body`` so that an observed
+    request's ``render`` stage lasts until the last chunk of the
+    body was yielded (or the generator was closed).  Each chunk is
+    rendered with the request's context so that lazily retrieved
+    models are attributed to the request.
+
+    :param function func: The iter_formatted_body method.
+    :return: The wrapped method.
+    :rtype: function
+    """
+    @wraps(func)
+    def iter_formatted_body(adapter, *args, **kwargs):
+        observation = getattr(adapter, 'render_observation', None)
+        if observation is None or not observation.waiting:
+            return func(adapter, *args, **kwargs)
+        observation.start()
+        return _iter_observed(observation, func, adapter, args, kwargs)
+    iter_formatted_body.__instrumented__ = True
+    return iter_formatted_body
+
+
+def _iter_observed(observation, func, adapter, args, kwargs):
+    """
+    :return: A generator yielding the chunks of the body and
+        finishing the observed request once it is done.
+    :rtype: types.GeneratorType
+    """
+    try:
+        chunks = iter(observation.call(func, adapter, *args, **kwargs))
+        while True:
+            try:
+                chunk = observation.call(next, chunks)
+            except StopIteration:
+                break
+            yield chunk
+    except GeneratorExit:
+        observation.finish()
+        raise
+    except Exception as exc:
+        observation.finish(exc)
+        raise
+    observation.finish()
@@ -0,0 +1,119 @@
+"""
+A dispatch observer that counts the calls to managers made by each
+request to catch requests that call them once per related model.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo.exceptions import ManagerCallBudgetExceeded
+from ripozo.instrumentation.base import DispatchObserver
+
+import logging
+import threading
+
+_logger = logging.getLogger(__name__)
+
+LOG = 'log'
+RAISE = 'raise'
+
+
+class ManagerCallCounter(DispatchObserver):
+    """
+    Counts the calls to the methods of managers for each request
+    and keeps per endpoint statistics of them.  When a request makes
+    more calls than the budget the call is either logged (once per request)
+    or a ManagerCallBudgetExceeded exception is raised instead of
+    making the call.
+
+    .. code-block:: python
+
+        counter = ManagerCallCounter(budget=10, on_exceeded=RAISE)
+        dispatcher = MyDispatcher(observers=[counter])
+        ...
+        counter.stats('MyResource__retrieve_list')
+
+    :param int budget: The maximum number of manager calls in a request
+        or None for no budget.
+    :param unicode on_exceeded: ``log`` or ``raise``
+    :param dict budgets: Budgets for specific endpoints keyed
+        by the ``<ResourceClass>__<apimethod>`` name.
+    :param logging.Logger logger: The logger to warn with.
+    """
+    def __init__(self, budget=None, on_exceeded=LOG, budgets=None, logger=None):
+        if on_exceeded not in (LOG, RAISE):
+            raise ValueError('on_exceeded must be "{0}" or "{1}" not {2}'.format(LOG, RAISE, on_exceeded))
+        self.budget = budget
+        self.on_exceeded = on_exceeded
+        self.budgets = budgets or {}
+        self.logger = logger or _logger
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def request_started(self, context):
+        context.data[self] = dict(count=0, calls={})
+
+    def manager_call_started(self, context, manager, method_name):
+        counts = context.data[self]
+        counts['count'] += 1
+        budget = self.budgets.get(context.endpoint, self.budget)
+        if budget is None or counts['count'] <= budget:
+            return
+        message = ('The request to {0} exceeded its budget of {1} manager calls calling '
+                   '{2}.{3}'.format(context.endpoint, budget, type(manager).__name__, method_name))
+        if self.on_exceeded == RAISE:
+            raise ManagerCallBudgetExceeded(message)
+        if counts['count'] == budget + 1:
+            self.logger.warning(message)
+
+    def manager_call_finished(self, context, manager, method_name, duration, exc=None):
+        key = '{0}.{1}'.format(type(manager).__name__, method_name)
+        calls = context.data[self]['calls']
+        count, seconds = calls.get(key, (0, 0.0))
+        calls[key] = (count + 1, seconds + duration)
+
+    def request_finished(self, context, exc=None):
+        counts = context.data.pop(self)
+        with self._lock:
+            stats = self._stats.get(context.endpoint)
+            if stats is None:
+                stats = self._stats[context.endpoint] = dict(requests=0, calls=0, max_calls=0, methods={})
+            stats['requests'] += 1
+            stats['calls'] += counts['count']
+            stats['max_calls'] = max(stats['max_calls'], counts['count'])
+            for key, (count, seconds) in counts['calls'].items():
+                method = stats['methods'].get(key)
+                if method is None:
+                    method = stats['methods'][key] = dict(calls=0, seconds=0.0, max_calls=0)
+                method['calls'] += count
+                method['seconds'] += seconds
+                method['max_calls'] = max(method['max_calls'], count)
+
+    def stats(self, endpoint=None):
+        """
+        :param unicode endpoint: The endpoint's name or None for all of them.
+        :return: A dictionary with the number of ``requests``, the total
+            manager ``calls``, the ``max_calls`` made by a single request and
+            ``methods`` (the ``calls``, total ``seconds`` and ``max_calls``
+            per request of each ``<Manager>.<method>``).  When the endpoint is
+            None a dictionary of them keyed by the endpoint is returned.
+        :rtype: dict
+        """
+        with self._lock:
+            if endpoint is not None:
+                return _copy_stats(self._stats.get(endpoint))
+            return dict((name, _copy_stats(stats)) for name, stats in self._stats.items())
+
+
+def _copy_stats(stats):
+    """
+    :param dict stats: An endpoint's statistics
+    :return: A copy of the statistics
+    :rtype: dict
+    """
+    if stats is None:
+        return dict(requests=0, calls=0, max_calls=0, methods={})
+    copied = dict(stats)
+    copied['methods'] = dict((key, dict(value)) for key, value in stats['methods'].items())
+    return copied
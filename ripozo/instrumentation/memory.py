@@ -0,0 +1,248 @@
+"""
+A dispatch observer that uses tracemalloc to attribute the memory
+allocated by a request to its stages and to the modules that
+allocated it.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo.instrumentation.base import DispatchObserver
+
+import importlib
+import logging
+import os
+import random
+import threading
+
+import six
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: no cover
+    tracemalloc = None
+
+_logger = logging.getLogger(__name__)
+
+OTHER_MODULES = '<other>'
+
+_tracing_lock = threading.Lock()
+_tracing = dict(active=False, started=False)
+
+
+def _start_tracing(frames):
+    """
+    Starts tracing for a request unless another request is already
+    being profiled.  The traced memory and its peak are process wide
+    so overlapping requests would be attributed each other's
+    allocations.  Every successful call must be paired with a call
+    to ``_stop_tracing``.
+
+    :param int frames: The number of frames tracemalloc stores.
+    :return: Whether the request can be profiled.
+    :rtype: bool
+    """
+    with _tracing_lock:
+        if _tracing['active']:
+            return False
+        _tracing['active'] = True
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            _tracing['started'] = True
+        return True
+
+
+def _stop_tracing():
+    """
+    Stops tracing when the profiled request finishes,
+    unless it was started by someone else.
+    """
+    with _tracing_lock:
+        _tracing['active'] = False
+        if _tracing['started']:
+            _tracing['started'] = False
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+
+class LoggingSink(object):
+    """
+    A sink that logs each report.
+
+    :param logging.Logger logger: The logger to use.  Defaults
+        to this module's logger.
+    :param int level: The level to log the reports at.
+    """
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or _logger
+        self.level = level
+
+    def __call__(self, report):
+        self.logger.log(self.level, 'Memory profile for %s: %s', report['endpoint'], report)
+
+
+class ListSink(object):
+    """
+    A sink that keeps the reports in the ``reports`` list.
+    Mostly useful for tests.
+    """
+    def __init__(self):
+        self.reports = []
+
+    def __call__(self, report):
+        self.reports.append(report)
+
+
+class MemoryProfiler(DispatchObserver):
+    """
+    Takes a tracemalloc snapshot around each stage of a sampled
+    fraction of the requests.  A report is passed to the sink
+    for each profiled request.
+
+    .. code-block:: python
+
+        dispatcher = MyDispatcher(observers=[MemoryProfiler(sample_rate=0.01)])
+
+    The report is a dictionary with the ``endpoint``, the ``adapter``,
+    the ``error`` (if any) and a list of ``stages``.  Each stage has its
+    ``name``, the ``peak`` bytes allocated during the stage, the bytes
+    ``retained`` at the end of it and ``modules``, the retained bytes
+    keyed by the module that allocated them.  Modules that are not
+    in one of the packages are grouped as ``<other>``.
+
+    Tracing is only started for profiled requests (unless it
+    was already started) and is expensive so the sample rate
+    should be low in production.  Only one request is profiled at
+    a time since tracemalloc measures the whole process.  Requests
+    sampled while another request is being profiled (e.g. in a
+    threaded worker) are skipped, and so are requests during which
+    something else stops tracing.  No report is made for them.
+
+    :param float sample_rate: The fraction of requests to profile.
+    :param function sink: Called with each report.  Defaults
+        to a LoggingSink.
+    :param tuple packages: The packages whose modules are reported
+        individually.
+    :param int frames: The number of frames tracemalloc stores
+        for each allocation.
+    """
+    def __init__(self, sample_rate=1.0, sink=None, packages=('ripozo',), frames=1):
+        if tracemalloc is None:
+            raise RuntimeError('tracemalloc is required for the MemoryProfiler (Python 3.4+)')
+        self.sample_rate = sample_rate
+        self.sink = sink or LoggingSink()
+        self.frames = frames
+        self.package_paths = []
+        for package in packages:
+            path = os.path.dirname(importlib.import_module(package).__file__)
+            self.package_paths.append((package, path + os.sep))
+        self._module_names = {}
+
+    def should_observe(self, endpoint_func, request):
+        return random.random() < self.sample_rate
+
+    def request_started(self, context):
+        started = _start_tracing(self.frames)
+        context.data[self] = dict(started=started, skipped=not started, open_stages=[], stages=[])
+
+    @staticmethod
+    def _is_tracing(state):
+        """
+        Marks the request as skipped when tracing was stopped
+        by something else while it was being profiled.
+
+        :param dict state: The state of the request.
+        :return: Whether the request can still be profiled.
+        :rtype: bool
+        """
+        if not state['skipped'] and not tracemalloc.is_tracing():
+            state['skipped'] = True
+        return not state['skipped']
+
+    def stage_started(self, context, stage_name):
+        state = context.data[self]
+        if not self._is_tracing(state):
+            return
+        open_stages = state['open_stages']
+        current, peak = tracemalloc.get_traced_memory()
+        for parent in open_stages:
+            parent['peak'] = max(parent['peak'], peak)
+        _reset_peak()
+        open_stages.append(dict(name=stage_name, start=current, peak=current,
+                                snapshot=self._take_snapshot()))
+
+    def stage_finished(self, context, stage_name, duration):
+        state = context.data[self]
+        if not self._is_tracing(state):
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        opened = state['open_stages'].pop()
+        opened['peak'] = max(opened['peak'], peak)
+        for parent in state['open_stages']:
+            parent['peak'] = max(parent['peak'], opened['peak'])
+        modules = {}
+        for stat in self._take_snapshot().compare_to(opened['snapshot'], 'filename'):
+            module = self._module_name(stat.traceback[0].filename)
+            modules[module] = modules.get(module, 0) + stat.size_diff
+        state['stages'].append(dict(name=stage_name, duration=duration,
+                                    peak=opened['peak'] - opened['start'],
+                                    retained=current - opened['start'], modules=modules))
+
+    def request_finished(self, context, exc=None):
+        state = context.data.pop(self)
+        if not state['started']:
+            _logger.debug('Another request was being profiled during %s', context.endpoint)
+            return
+        _stop_tracing()
+        if state['skipped']:
+            _logger.debug('Tracing was stopped while profiling %s', context.endpoint)
+            return
+        adapter_class = context.adapter_class
+        report = dict(endpoint=context.endpoint, duration=context.duration,
+                      adapter=adapter_class.__name__ if adapter_class else None,
+                      error=six.text_type(exc) if exc is not None else None,
+                      stages=state['stages'])
+        self.sink(report)
+
+    @staticmethod
+    def _take_snapshot():
+        """
+        :return: A snapshot without tracemalloc's own allocations.
+        :rtype: tracemalloc.Snapshot
+        """
+        snapshot = tracemalloc.take_snapshot()
+        return snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+    def _module_name(self, filename):
+        """
+        :param unicode filename: The file that allocated memory.
+        :return: The dotted name of the module if it is
+            in one of the packages otherwise ``<other>``
+        :rtype: unicode
+        """
+        try:
+            return self._module_names[filename]
+        except KeyError:
+            pass
+        name = OTHER_MODULES
+        for package, path in self.package_paths:
+            if filename.startswith(path):
+                relative = os.path.splitext(filename[len(path):])[0]
+                name = '.'.join([package] + relative.split(os.sep))
+                if name.endswith('.__init__'):
+                    name = name[:-len('.__init__')]
+                break
+        self._module_names[filename] = name
+        return name
+
+
+def _reset_peak():
+    """
+    Resets the traced peak so that it can be measured for a stage.
+    ``tracemalloc.reset_peak`` is only available in Python 3.9+.
+    Before that the peak is the peak since tracing started.
+    """
+    reset_peak = getattr(tracemalloc, 'reset_peak', None)
+    if reset_peak is not None:
+        reset_peak()
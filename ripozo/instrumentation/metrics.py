@@ -0,0 +1,262 @@
+"""
+A dispatch observer that records the latency of each stage of a
+request in per endpoint histograms and exposes them in the
+Prometheus text format.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from bisect import bisect_left
+
+from ripozo.instrumentation.base import DispatchObserver
+
+import threading
+
+import six
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST = 'request'
+
+
+class _Shard(object):
+    """
+    The counts recorded by a single thread.
+    """
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self, size):
+        self.counts = [0] * size
+        self.total = 0.0
+        self.count = 0
+
+
+class Histogram(object):
+    """
+    A histogram of durations.  Each thread records into its own
+    shard so recording a value never takes a lock.  The shards are
+    only merged when the histogram is read.  The merged values may
+    be off by the values being recorded while it is read.
+
+    :param tuple buckets: The sorted upper bounds of the buckets.
+        An implicit ``+Inf`` bucket is added.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._shards = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _get_shard(self):
+        """
+        :return: The shard for the current thread.
+        :rtype: _Shard
+        """
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = _Shard(len(self.buckets) + 1)
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def observe(self, value):
+        """
+        Records a value.
+
+        :param float value: The value (usually seconds) to record.
+        """
+        shard = self._get_shard()
+        shard.counts[bisect_left(self.buckets, value)] += 1
+        shard.total += value
+        shard.count += 1
+
+    def snapshot(self):
+        """
+        Merges the shards.
+
+        :return: The cumulative count of each bucket (the last one
+            is ``+Inf``), the sum of the values and the count.
+        :rtype: tuple
+        """
+        with self._lock:
+            shards = list(self._shards)
+        counts = [0] * (len(self.buckets) + 1)
+        total, count = 0.0, 0
+        for shard in shards:
+            for index, bucket_count in enumerate(shard.counts):
+                counts[index] += bucket_count
+            total += shard.total
+            count += shard.count
+        cumulative, running = [], 0
+        for bucket_count in counts:
+            running += bucket_count
+            cumulative.append(running)
+        return cumulative, total, count
+
+    @property
+    def count(self):
+        """
+        :return: The number of recorded values.
+        :rtype: int
+        """
+        return self.snapshot()[2]
+
+    def quantile(self, quantile):
+        """
+        Estimates a quantile by interpolating linearly within
+        the bucket that contains it (like Prometheus'
+        ``histogram_quantile``).
+
+        :param float quantile: The quantile between 0 and 1 (e.g. 0.99)
+        :return: The estimated value or None if nothing was recorded.
+            Values in the ``+Inf`` bucket are reported as the
+            largest bucket bound.
+        :rtype: float
+        """
+        cumulative, _, count = self.snapshot()
+        if not count:
+            return None
+        rank = quantile * count
+        lower_bound, lower_count = 0.0, 0
+        for bound, bucket_count in zip(self.buckets, cumulative):
+            if bucket_count >= rank:
+                if bucket_count == lower_count:
+                    return bound
+                return lower_bound + (bound - lower_bound) * (rank - lower_count) / (bucket_count - lower_count)
+            lower_bound, lower_count = bound, bucket_count
+        return self.buckets[-1]
+
+
+class DispatchMetrics(DispatchObserver):
+    """
+    Records the duration of each stage of the dispatched requests
+    in a Histogram per endpoint and stage.  The duration of the
+    whole request is recorded as the ``request`` stage.  The stages
+    are nested so that ``apimethod`` includes ``preprocessors``,
+    ``resource`` and ``postprocessors``.
+    Every request is observed.  The body is still streamed when the
+    dispatcher uses ``iter_formatted_body`` and ``render`` is the time
+    until its last chunk was yielded.
+
+    .. code-block:: python
+
+        metrics = DispatchMetrics()
+        dispatcher = MyDispatcher(observers=[metrics])
+        ...
+        metrics.histogram('MyResource__retrieve', 'render').quantile(0.99)
+        text = metrics.exposition()
+
+    :param tuple buckets: The upper bounds of the histogram buckets in seconds.
+    :param unicode prefix: The prefix of the metric names in the exposition.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS, prefix='ripozo_dispatch'):
+        self.buckets = buckets
+        self.prefix = prefix
+        self._histograms = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, endpoint, stage_name):
+        """
+        :param unicode endpoint: The ``<ResourceClass>__<apimethod>`` name.
+        :param unicode stage_name: The name of the stage or ``request``.
+        :return: The histogram for the endpoint's stage.  It is
+            created if it does not exist.
+        :rtype: Histogram
+        """
+        key = (endpoint, stage_name)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(self.buckets)
+        return histogram
+
+    def stage_finished(self, context, stage_name, duration):
+        self.histogram(context.endpoint, stage_name).observe(duration)
+
+    def request_finished(self, context, exc=None):
+        self.histogram(context.endpoint, REQUEST).observe(context.duration)
+        if exc is not None:
+            key = (context.endpoint, type(exc).__name__)
+            with self._lock:
+                self._errors[key] = self._errors.get(key, 0) + 1
+
+    def collect(self):
+        """
+        :return: A list of dictionaries with the ``endpoint``, ``stage``,
+            ``buckets`` (a list of ``(upper_bound, cumulative_count)``
+            with ``float('inf')`` as the last bound), ``sum`` and ``count``
+            of each histogram sorted by endpoint and stage.
+        :rtype: list
+        """
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+        collected = []
+        for (endpoint, stage_name), histogram in histograms:
+            cumulative, total, count = histogram.snapshot()
+            bounds = histogram.buckets + (float('inf'),)
+            collected.append(dict(endpoint=endpoint, stage=stage_name, sum=total, count=count,
+                                  buckets=list(zip(bounds, cumulative))))
+        return collected
+
+    def errors(self):
+        """
+        :return: The number of requests that raised, keyed by
+            ``(endpoint, exception class name)``
+        :rtype: dict
+        """
+        with self._lock:
+            return dict(self._errors)
+
+    def exposition(self):
+        """
+        :return: The metrics in the Prometheus text exposition format.
+            The ``<prefix>_stage_seconds`` histogram has ``endpoint`` and
+            ``stage`` labels and ``<prefix>_errors_total`` counts the
+            requests that raised by ``endpoint`` and ``exception``.
+        :rtype: unicode
+        """
+        name = '{0}_stage_seconds'.format(self.prefix)
+        lines = ['# HELP {0} The seconds spent in each stage of dispatching a request.'.format(name),
+                 '# TYPE {0} histogram'.format(name)]
+        for histogram in self.collect():
+            labels = 'endpoint="{0}",stage="{1}"'.format(_escape(histogram['endpoint']),
+                                                         _escape(histogram['stage']))
+            for bound, count in histogram['buckets']:
+                lines.append('{0}_bucket{{{1},le="{2}"}} {3}'.format(name, labels, _format_bound(bound), count))
+            lines.append('{0}_sum{{{1}}} {2}'.format(name, labels, repr(histogram['sum'])))
+            lines.append('{0}_count{{{1}}} {2}'.format(name, labels, histogram['count']))
+        name = '{0}_errors_total'.format(self.prefix)
+        lines.append('# HELP {0} The requests that raised an exception.'.format(name))
+        lines.append('# TYPE {0} counter'.format(name))
+        for (endpoint, exception), count in sorted(self.errors().items()):
+            lines.append('{0}{{endpoint="{1}",exception="{2}"}} {3}'.format(
+                name, _escape(endpoint), _escape(exception), count))
+        return '\n'.join(lines) + '\n'
+
+
+def _format_bound(bound):
+    """
+    :param float bound: A bucket's upper bound
+    :return: The bound formatted for the ``le`` label.
+    :rtype: unicode
+    """
+    if bound == float('inf'):
+        return '+Inf'
+    return repr(float(bound))
+
+
+def _escape(value):
+    """
+    :param unicode value: A label value
+    :return: The value escaped for the exposition format.
+    :rtype: unicode
+    """
+    value = six.text_type(value)
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,172 @@
+"""
+A dispatch observer that captures cProfile profiles of an
+endpoint after one of its requests was slow.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo.instrumentation.base import ADAPTER, DispatchObserver
+
+import cProfile
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+_UNSAFE_CHARACTERS = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+class SlowRequestProfiler(DispatchObserver):
+    """
+    Times every request.  When a request to an endpoint takes longer
+    than the threshold the next ``captures`` requests to that endpoint
+    are profiled with cProfile.  Each profile is saved in the directory
+    as ``<endpoint>-<timestamp>-<n>.prof`` (readable with ``pstats``)
+    with a ``.json`` file of the request's metadata next to it.
+    Only the newest ``max_files`` profiles are kept.
+
+    The profile covers the dispatch, up to and including constructing
+    the adapter, and is stopped on the dispatching thread before
+    ``dispatch`` returns.  The body may be rendered (or streamed) by
+    another thread, and cProfile can only be disabled on the thread
+    that enabled it, so rendering is not profiled.
+
+    .. code-block:: python
+
+        profiler = SlowRequestProfiler('/var/tmp/ripozo-profiles', threshold=0.5)
+        dispatcher = MyDispatcher(observers=[profiler])
+
+    :param unicode directory: Where to save the profiles.  It is
+        created if it does not exist.
+    :param float threshold: The seconds after which a request is slow.
+    :param int captures: The number of requests to profile after
+        a slow request.
+    :param int max_files: The number of profiles to keep.
+    :param dict thresholds: Thresholds for specific endpoints keyed
+        by the ``<ResourceClass>__<apimethod>`` name.
+    """
+    def __init__(self, directory, threshold=1.0, captures=1, max_files=50, thresholds=None):
+        self.directory = directory
+        self.threshold = threshold
+        self.captures = captures
+        self.max_files = max_files
+        self.thresholds = thresholds or {}
+        self._armed = {}
+        self._lock = threading.Lock()
+        self._counter = 0
+
+    def armed(self, endpoint):
+        """
+        :param unicode endpoint: The endpoint's name.
+        :return: The number of requests to the endpoint that will be profiled.
+        :rtype: int
+        """
+        return self._armed.get(endpoint, 0)
+
+    def request_started(self, context):
+        if not self._armed.get(context.endpoint):
+            return
+        with self._lock:
+            remaining = self._armed.get(context.endpoint, 0)
+            if not remaining:
+                return
+            self._armed[context.endpoint] = remaining - 1
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active in this thread
+            _logger.debug('Could not profile %s since a profiler is already active', context.endpoint)
+            return
+        context.data[self] = dict(profile=profile, thread=threading.current_thread().ident, enabled=True)
+
+    def stage_finished(self, context, stage_name, duration):
+        if stage_name == ADAPTER and self in context.data:
+            self._disable(context.data[self])
+
+    def request_finished(self, context, exc=None):
+        state = context.data.pop(self, None)
+        if state is not None:
+            if not self._disable(state):
+                _logger.warning('The profile of %s was not stopped by the thread that started it',
+                                context.endpoint)
+                return
+            self._save(context, state['profile'], exc)
+            return
+        threshold = self.thresholds.get(context.endpoint, self.threshold)
+        if context.duration > threshold:
+            _logger.info('Request to %s took %.3f seconds.  Profiling the next %s requests',
+                         context.endpoint, context.duration, self.captures)
+            with self._lock:
+                self._armed[context.endpoint] = self.captures
+
+    @staticmethod
+    def _disable(state):
+        """
+        Disables the request's profile if this is the
+        thread that enabled it.
+
+        :param dict state: The request's profile, the thread that
+            enabled it and whether it is still enabled.
+        :return: Whether the profile is disabled.
+        :rtype: bool
+        """
+        if state['enabled'] and state['thread'] == threading.current_thread().ident:
+            state['profile'].disable()
+            state['enabled'] = False
+        return not state['enabled']
+
+    def _save(self, context, profile, exc):
+        """
+        Saves the profile and its metadata and removes
+        the oldest profiles.
+
+        :param RequestContext context: The profiled request.
+        :param cProfile.Profile profile: The request's profile.
+        :param Exception exc: The exception raised if any.
+        """
+        with self._lock:
+            self._counter += 1
+            counter = self._counter
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        name = '{0}-{1}-{2}'.format(_UNSAFE_CHARACTERS.sub('_', context.endpoint),
+                                    time.strftime('%Y%m%dT%H%M%S'), counter)
+        filename = os.path.join(self.directory, name + '.prof')
+        profile.dump_stats(filename)
+        request = context.request
+        adapter_class = context.adapter_class
+        metadata = dict(endpoint=context.endpoint, duration=context.duration, time=time.time(),
+                        adapter=adapter_class.__name__ if adapter_class else None,
+                        method=getattr(request, 'method', None),
+                        url_params=len(getattr(request, 'url_params', None) or {}),
+                        query_args=len(getattr(request, 'query_args', None) or {}),
+                        body_args=len(getattr(request, 'body_args', None) or {}),
+                        error=repr(exc) if exc is not None else None,
+                        profile=os.path.basename(filename))
+        with open(os.path.join(self.directory, name + '.json'), 'w') as metadata_file:
+            json.dump(metadata, metadata_file, sort_keys=True)
+        self._rotate()
+
+    def _rotate(self):
+        """
+        Removes the oldest profiles (and their metadata) so
+        that at most ``max_files`` profiles are kept.
+        """
+        profiles = [os.path.join(self.directory, filename) for filename in os.listdir(self.directory)
+                    if filename.endswith('.prof')]
+        if len(profiles) <= self.max_files:
+            return
+        profiles.sort(key=lambda filename: (os.path.getmtime(filename), filename))
+        for filename in profiles[:len(profiles) - self.max_files]:
+            for path in (filename, os.path.splitext(filename)[0] + '.json'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
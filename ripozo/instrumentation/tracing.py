@@ -0,0 +1,405 @@
+"""
+A dispatch observer that records a trace of each request.  The
+trace is a tree of spans: a root span for the request, a child
+for each stage of dispatching and spans for the manager calls
+and relationship construction in them.  Finished traces are
+passed to a pluggable exporter.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo.instrumentation.base import DispatchObserver, current_context
+
+import binascii
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import six
+
+_logger = logging.getLogger(__name__)
+
+TRACEPARENT_HEADER = 'traceparent'
+
+_TRACEPARENT_RE = re.compile(r'^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+_INVALID_TRACE_ID = '0' * 32
+_INVALID_SPAN_ID = '0' * 16
+
+
+def _random_id(size):
+    """
+    :param int size: The number of random bytes.
+    :return: The bytes as lowercase hex.
+    :rtype: unicode
+    """
+    return binascii.hexlify(os.urandom(size)).decode('ascii')
+
+
+class SpanContext(object):
+    """
+    The identifiers that are propagated between services.
+
+    :param unicode trace_id: The 32 hex character id of the trace.
+    :param unicode span_id: The 16 hex character id of the span.
+    :param bool sampled: Whether the caller sampled the trace.
+    """
+    __slots__ = ('trace_id', 'span_id', 'sampled')
+
+    def __init__(self, trace_id, span_id, sampled=True):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+    @property
+    def traceparent(self):
+        """
+        :return: The W3C ``traceparent`` header value to send
+            with requests made on behalf of this span.
+        :rtype: unicode
+        """
+        return '00-{0}-{1}-{2}'.format(self.trace_id, self.span_id, '01' if self.sampled else '00')
+
+    def __eq__(self, other):
+        return isinstance(other, SpanContext) and self.trace_id == other.trace_id \
+            and self.span_id == other.span_id and self.sampled == other.sampled
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '<SpanContext {0}>'.format(self.traceparent)
+
+
+def parse_traceparent(value):
+    """
+    Parses a W3C ``traceparent`` header.
+
+    :param unicode value: The header's value.
+    :return: The context or None if the value is missing or invalid.
+    :rtype: SpanContext
+    """
+    if not value:
+        return None
+    match = _TRACEPARENT_RE.match(value.strip().lower())
+    if match is None:
+        return None
+    version, trace_id, span_id, flags = match.groups()
+    if version == 'ff' or trace_id == _INVALID_TRACE_ID or span_id == _INVALID_SPAN_ID:
+        return None
+    return SpanContext(trace_id, span_id, sampled=bool(int(flags, 16) & 1))
+
+
+def extract_trace_context(headers):
+    """
+    :param dict headers: The headers of a request.
+    :return: The context from the ``traceparent`` header if
+        it is available and valid otherwise None.
+    :rtype: SpanContext
+    """
+    if not headers:
+        return None
+    value = headers.get(TRACEPARENT_HEADER)
+    if value is None:
+        for name, header_value in six.iteritems(headers):
+            if name.lower() == TRACEPARENT_HEADER:
+                value = header_value
+                break
+    return parse_traceparent(value)
+
+
+class Span(object):
+    """
+    A timed operation in a trace.
+
+    :param unicode name: The name of the operation.
+    :param SpanContext context: The span's ids.
+    :param unicode parent_id: The span id of the parent or None.
+    :param dict attributes: Details of the operation.
+    :param float start: The unix time the span started.
+    :param float end: The unix time the span finished.
+    :param unicode error: The exception raised in the span if any.
+    """
+    __slots__ = ('name', 'context', 'parent_id', 'attributes', 'start', 'end', 'error')
+
+    def __init__(self, name, context, parent_id=None, attributes=None):
+        self.name = name
+        self.context = context
+        self.parent_id = parent_id
+        self.attributes = attributes or {}
+        self.start = time.time()
+        self.end = None
+        self.error = None
+
+    @property
+    def duration(self):
+        """
+        :return: The seconds the span took or None if it is not finished.
+        :rtype: float
+        """
+        if self.end is None:
+            return None
+        return self.end - self.start
+
+    def finish(self, exc=None):
+        """
+        :param Exception exc: The exception that ended the span.
+        """
+        self.end = time.time()
+        if exc is not None:
+            self.error = '{0}: {1}'.format(type(exc).__name__, exc)
+
+    def to_dict(self):
+        """
+        :return: The span as a json serializable dictionary.
+        :rtype: dict
+        """
+        return dict(name=self.name, trace_id=self.context.trace_id, span_id=self.context.span_id,
+                    parent_id=self.parent_id, start=self.start, end=self.end,
+                    duration=self.duration, attributes=self.attributes, error=self.error)
+
+
+class InMemoryExporter(object):
+    """
+    Keeps the exported traces in the ``traces`` list.
+    Each trace is a list of finished spans, the root first.
+    """
+    def __init__(self):
+        self.traces = []
+        self._lock = threading.Lock()
+
+    def __call__(self, spans):
+        with self._lock:
+            self.traces.append(spans)
+
+    @property
+    def spans(self):
+        """
+        :return: All of the exported spans.
+        :rtype: list
+        """
+        return [span for trace in self.traces for span in trace]
+
+
+class FileExporter(object):
+    """
+    Appends each span of the exported traces to a file as a
+    line of json.
+
+    :param unicode filename: The file to append to.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self._lock = threading.Lock()
+
+    def __call__(self, spans):
+        lines = [json.dumps(span.to_dict(), default=six.text_type, sort_keys=True) for span in spans]
+        with self._lock:
+            with open(self.filename, 'a') as trace_file:
+                for line in lines:
+                    trace_file.write(line + '\n')
+
+
+class _Trace(object):
+    """
+    The spans of a request being traced.
+    """
+    __slots__ = ('spans', 'open_spans')
+
+    def __init__(self):
+        self.spans = []
+        self.open_spans = []
+
+
+class Tracer(DispatchObserver):
+    """
+    Traces the dispatched requests.  The root span is a child of the
+    ``traceparent`` header if the request has one.  The request's
+    ``trace_context`` is set to the root span's context so that it can
+    be propagated to downstream services (``request.trace_context.traceparent``).
+    Managers and other code running for the request can use ``span``
+    to add spans and ``current_span`` to propagate the current span.
+
+    .. code-block:: python
+
+        exporter = InMemoryExporter()
+        dispatcher = MyDispatcher(observers=[Tracer(exporter)])
+
+    :param function exporter: Called with the list of spans of each
+        finished trace.  Defaults to an InMemoryExporter.
+    :param bool respect_sampled: Whether to skip requests whose
+        ``traceparent`` header is not sampled.
+    """
+    def __init__(self, exporter=None, respect_sampled=True):
+        self.exporter = exporter if exporter is not None else InMemoryExporter()
+        self.respect_sampled = respect_sampled
+
+    def should_observe(self, endpoint_func, request):
+        if not self.respect_sampled or request is None:
+            return True
+        parent = getattr(request, 'trace_context', None)
+        return parent is None or parent.sampled
+
+    def request_started(self, context):
+        request = context.request
+        parent = getattr(request, 'trace_context', None)
+        if parent is None:
+            span_context, parent_id = SpanContext(_random_id(16), _random_id(8)), None
+        else:
+            span_context, parent_id = SpanContext(parent.trace_id, _random_id(8)), parent.span_id
+        trace = context.data[self] = _Trace()
+        root = Span(context.endpoint, span_context, parent_id=parent_id,
+                    attributes=dict(endpoint=context.endpoint))
+        if request is not None:
+            request.trace_context = span_context
+            root.attributes['method'] = getattr(request, 'method', None)
+        trace.spans.append(root)
+        trace.open_spans.append(root)
+
+    def start_span(self, context, name, attributes=None):
+        """
+        Starts a child of the current span of the request.
+
+        :param RequestContext context: The traced request.
+        :param unicode name: The name of the span.
+        :param dict attributes: The details of the span.
+        :return: The started span
+        :rtype: Span
+        """
+        trace = context.data[self]
+        parent = trace.open_spans[-1]
+        started = Span(name, SpanContext(parent.context.trace_id, _random_id(8)),
+                       parent_id=parent.context.span_id, attributes=attributes)
+        trace.spans.append(started)
+        trace.open_spans.append(started)
+        return started
+
+    def finish_span(self, context, finished, exc=None):
+        """
+        :param RequestContext context: The traced request.
+        :param Span finished: The span started by start_span.
+        :param Exception exc: The exception raised in the span if any.
+        """
+        finished.finish(exc=exc)
+        context.data[self].open_spans.remove(finished)
+
+    def current_span(self, context):
+        """
+        :param RequestContext context: The traced request.
+        :return: The innermost unfinished span.
+        :rtype: Span
+        """
+        return context.data[self].open_spans[-1]
+
+    def stage_started(self, context, stage_name):
+        self.start_span(context, stage_name, attributes=dict(stage=stage_name))
+
+    def stage_finished(self, context, stage_name, duration):
+        self._finish_named(context, stage_name)
+
+    def manager_call_started(self, context, manager, method_name):
+        manager_name = type(manager).__name__
+        self.start_span(context, '{0}.{1}'.format(manager_name, method_name),
+                        attributes=dict(manager=manager_name, method=method_name))
+
+    def manager_call_finished(self, context, manager, method_name, duration, exc=None):
+        self._finish_named(context, '{0}.{1}'.format(type(manager).__name__, method_name), exc=exc)
+
+    def _finish_named(self, context, name, exc=None):
+        """
+        Finishes the innermost unfinished span with the name.
+
+        :param RequestContext context: The traced request.
+        :param unicode name: The name of the span.
+        :param Exception exc: The exception raised in the span if any.
+        """
+        open_spans = context.data[self].open_spans
+        for index in range(len(open_spans) - 1, 0, -1):
+            if open_spans[index].name == name:
+                self.finish_span(context, open_spans[index], exc=exc)
+                break
+
+    def request_finished(self, context, exc=None):
+        trace = context.data.pop(self)
+        root = trace.spans[0]
+        if context.adapter_class is not None:
+            root.attributes['adapter'] = context.adapter_class.__name__
+        for unfinished in reversed(trace.open_spans):
+            unfinished.finish(exc=exc)
+        try:
+            self.exporter(trace.spans)
+        except Exception:  # pylint: disable=broad-except
+            _logger.exception('Failed to export the trace %s', root.context.trace_id)
+
+
+def _tracers(context):
+    """
+    :param RequestContext context: The observed request.
+    :return: The tracers tracing the request.
+    :rtype: list
+    """
+    return [observer for observer in context.observers
+            if isinstance(observer, Tracer) and observer in context.data]
+
+
+class span(object):
+    """
+    A context manager that records a span in the trace of the
+    current request.  It does nothing if the request is not traced.
+    A span is not nested in a span with the same name (e.g. when an
+    overridden manager method calls the super method).
+
+    .. code-block:: python
+
+        with span('geocode', address=address):
+            ...
+
+    :param unicode name: The name of the span.
+    :param dict attributes: The details of the span.
+    """
+    __slots__ = ('name', 'attributes', 'context', 'started')
+
+    def __init__(self, name, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self.context = None
+        self.started = None
+
+    def __enter__(self):
+        context = current_context()
+        if context is None:
+            return self
+        started = []
+        for tracer in _tracers(context):
+            if tracer.current_span(context).name != self.name:
+                started.append((tracer, tracer.start_span(context, self.name, dict(self.attributes))))
+        if started:
+            self.context, self.started = context, started
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.started is None:
+            return False
+        for tracer, started in reversed(self.started):
+            tracer.finish_span(self.context, started, exc=exc_val)
+        return False
+
+
+def current_span():
+    """
+    :return: The innermost unfinished span of the request being
+        traced in this thread or None.  Its ``context.traceparent``
+        can be sent to downstream services.
+    :rtype: Span
+    """
+    context = current_context()
+    if context is None:
+        return None
+    for tracer in _tracers(context):
+        return tracer.current_span(context)
+    return None
+
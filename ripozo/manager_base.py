@@ -9,16 +9,138 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 from abc import ABCMeta, abstractmethod
+from functools import wraps
 
 from ripozo.decorators import classproperty
+from ripozo.aggregates import COUNT, Aggregation, aggregate_rows, parse_aggregates
+from ripozo.exceptions import ValidationException
+from ripozo.filters import PredicateCompiler, SelectivityCompiler, conjunction, filter_query_args, \
+    parse_expression, parse_query_args
+from ripozo.instrumentation.base import current_context, manager_call
+from ripozo.resources.request import current_request
+
+from collections import OrderedDict
 
 import logging
+import threading
+import time
+import types
+
 import six
 
 _logger = logging.getLogger(__name__)
 
+INSTRUMENTED_METHODS = ('create', 'retrieve', 'retrieve_list', 'update', 'delete',
+                        'bulk_create', 'bulk_update', 'bulk_delete', 'aggregate')
+IDENTITY_MAP_WRITES = ('update', 'delete', 'bulk_update', 'bulk_delete')
+
+COUNT_NONE = 'none'
+COUNT_EXACT = 'exact'
+COUNT_ESTIMATED = 'estimated'
+COUNT_CACHED = 'cached'
+COUNT_STRATEGIES = (COUNT_NONE, COUNT_EXACT, COUNT_ESTIMATED, COUNT_CACHED)
+
+_count_cache_lock = threading.Lock()
+
+
+def _instrument_method(method_name, func):
+    """
+    Wraps a manager method so that the observers of the
+    current request (if it is observed) are notified of each call.
+
+    :param unicode method_name: The name of the method.
+    :param function func: The method
+    :return: The wrapped method
+    :rtype: function
+    """
+    @wraps(func)
+    def wrapped(self, *args, **kwargs):
+        if current_context() is None:
+            return func(self, *args, **kwargs)
+        with manager_call(self, method_name):
+            return func(self, *args, **kwargs)
+    wrapped.__instrumented__ = True
+    return wrapped
+
+
+def _identity_mapped_retrieve(func):
+    """
+    Wraps a manager's retrieve method so that a manager with
+    ``use_identity_map`` only retrieves a model once per request.
+    The cached model is copied so that callers may modify it.
 
-@six.add_metaclass(ABCMeta)
+    :param function func: The retrieve method
+    :return: The wrapped method
+    :rtype: function
+    """
+    @wraps(func)
+    def wrapped(self, lookup_keys, *args, **kwargs):
+        request = current_request() if self.use_identity_map else None
+        if request is None or args or set(kwargs) - set(['fields']):
+            return func(self, lookup_keys, *args, **kwargs)
+        key = request.identity_map.key(lookup_keys, fields=kwargs.get('fields'))
+        if key is None:
+            return func(self, lookup_keys, *args, **kwargs)
+        model = request.identity_map.get(self, key)
+        if model is None:
+            model = func(self, lookup_keys, *args, **kwargs)
+            if not isinstance(model, dict):
+                return model
+            request.identity_map.set(self, key, model)
+        return dict(model)
+    return wrapped
+
+
+def _identity_mapped_write(method_name, func):
+    """
+    Wraps a method that modifies models so that the modified
+    models are evicted from the request's identity map.  The
+    bulk methods evict all of the manager's models.
+
+    :param unicode method_name: The name of the method.
+    :param function func: The method
+    :return: The wrapped method
+    :rtype: function
+    """
+    @wraps(func)
+    def wrapped(self, *args, **kwargs):
+        request = current_request() if self.use_identity_map else None
+        if request is None:
+            return func(self, *args, **kwargs)
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            lookup_keys = args[0] if args and method_name in ('update', 'delete') else None
+            request.identity_map.evict(self, lookup_keys=lookup_keys)
+    return wrapped
+
+
+class ManagerMeta(ABCMeta):
+    """
+    The metaclass of the BaseManager.  It wraps the create, retrieve,
+    retrieve_list, update and delete methods (and their bulk variants)
+    and the aggregate method defined by each subclass so that the observers of a request are
+    notified of every call (e.g. the Tracer records a span for it).
+    Calls to the method of the super class are not reported separately.
+    The retrieve and write methods of managers with ``use_identity_map``
+    also use the identity map of the request being dispatched.
+    """
+    def __new__(mcs, name, bases, attrs):
+        for method_name in INSTRUMENTED_METHODS:
+            func = attrs.get(method_name)
+            if isinstance(func, types.FunctionType) \
+                    and not getattr(func, '__isabstractmethod__', False) \
+                    and not getattr(func, '__instrumented__', False):
+                func = _instrument_method(method_name, func)
+                if method_name == 'retrieve':
+                    func = _identity_mapped_retrieve(func)
+                elif method_name in IDENTITY_MAP_WRITES:
+                    func = _identity_mapped_write(method_name, func)
+                attrs[method_name] = func
+        return super(ManagerMeta, mcs).__new__(mcs, name, bases, attrs)
+
+
+@six.add_metaclass(ManagerMeta)
 class BaseManager(object):
     """
     The BaseManager implements some common methods that are valuable across all databases
@@ -35,6 +157,38 @@ class BaseManager(object):
         to return in a list retrieval
     :param unicode pagination_next: The meta parameter to return that
         specifies the next query parameters
+    :param unicode projection_query_arg: The name of the query parameter
+        that specifies a comma delimited list of the fields that should
+        be returned (i.e. a sparse fieldset).
+    :param unicode filter_query_arg: The name of the query parameter
+        with a filter expression (see ``ripozo.filters``).
+    :param unicode sort_query_arg: The name of the query parameter
+        with a comma delimited list of the fields to order a list by
+        (``sort=-created,name``).  It overrides the ``order_by``.
+    :param tuple sortable_fields: The fields the ``sort_query_arg``
+        may order by.  Defaults to all of the ``fields``.  Managers
+        that can only order efficiently by indexed fields should only
+        list those.
+    :param unicode aggregate_query_arg: The name of the query parameter
+        with the aggregate functions (see ``ripozo.aggregates``).
+    :param unicode group_by_query_arg: The name of the query parameter
+        with a comma delimited list of the fields to group the
+        aggregations by.
+    :param unicode count_strategy: How the total number of models
+        matching the filters of a list is counted: ``none`` (it is not
+        counted), ``exact``, ``estimated`` (from the ``statistics``) or
+        ``cached`` (exact counts cached for ``count_cache_ttl`` seconds).
+    :param int count_cache_ttl: The number of seconds a ``cached``
+        count is reused for the same filters.
+    :param int count_cache_size: The maximum number of cached counts.
+    :param unicode search_query_arg: The name of the query parameter
+        with the text to search for in managers that support searching.
+        The ``next`` and ``previous`` links of lists keep it.
+    :param bool use_identity_map: Whether retrieve should return the model
+        already retrieved with the same lookup keys (and fields) during
+        the request being dispatched instead of retrieving it again.
+        Updates and deletes evict the model.  Only enable it if nothing
+        else modifies the models while a request is dispatched.
     :param int paginate_by: The number of results to return by default.
         This gets overridden by pagination_count_query_arg
     :param list order_by: A list of the fields to order the results by.
@@ -57,6 +211,17 @@ class BaseManager(object):
     pagination_count_query_arg = 'count'
     pagination_next = 'next'
     pagination_prev = 'previous'
+    projection_query_arg = 'fields'
+    filter_query_arg = 'filter'
+    sort_query_arg = 'sort'
+    sortable_fields = None
+    aggregate_query_arg = 'aggregate'
+    group_by_query_arg = 'group_by'
+    count_strategy = COUNT_NONE
+    count_cache_ttl = 60
+    count_cache_size = 256
+    search_query_arg = None
+    use_identity_map = False
     paginate_by = 10000
     order_by = None
     model = None
@@ -77,7 +242,10 @@ class BaseManager(object):
     @abstractmethod
     def retrieve(self, lookup_keys, *args, **kwargs):
         """
-        Retrieve a single model and nothing more as a python dictionary
+        Retrieve a single model and nothing more as a python dictionary.
+        If the client requested a sparse fieldset, the list of fields
+        is passed as the ``fields`` keyword argument.  Managers should
+        only select those fields when it is passed.
 
         :param dict lookup_keys: The lookup keys for the model and the associated values
         :return: The dictionary of arguments that should be returned by the serializer
@@ -91,12 +259,18 @@ class BaseManager(object):
     @abstractmethod
     def retrieve_list(self, filters, *args, **kwargs):
         """
-        Retrieves a list of dictionaries containing the fields for the associated model
+        Retrieves a list of dictionaries containing the fields for the associated model.
+        Instead of a list, an iterator (e.g. a generator or a server-side cursor)
+        may be returned.  In that case the resources are constructed and
+        encoded lazily so that large lists do not need to be held in memory.
+        If the client requested a sparse fieldset, the list of fields
+        is passed as the ``fields`` keyword argument.
 
         :param dictlookup_keys: The lookup keys for the model and the associated values
         :return: The dictionary of arguments that should be returned by the serializer
-        :return: A a list of dictionaries of key value pairs according to the fields list
-        :rtype: list
+        :return: A a list (or iterator) of dictionaries of key value pairs according
+            to the fields list
+        :rtype: list|collections.Iterator
         """
         pass
 
@@ -124,6 +298,139 @@ class BaseManager(object):
         """
         pass
 
+    def aggregate(self, filters, aggregations, group_by=None, *args, **kwargs):
+        """
+        Computes the aggregations over the models matching the filters
+        instead of returning the models.  Managers should compute them
+        where the models are (e.g. with a SQL GROUP BY).  By default every
+        page of ``retrieve_list`` is retrieved and the aggregations are
+        computed in python with ``ripozo.aggregates.aggregate_rows``.
+        The filter from ``get_filter`` is passed as the ``filter``
+        keyword argument if there is one.
+
+        :param dict filters: The filters
+        :param list aggregations: The ``ripozo.aggregates.Aggregation``
+            instances to compute.
+        :param list group_by: The fields to group the models by.
+        :return: A dictionary per group with the group_by fields
+            and the names of the aggregations.
+        :rtype: list
+        """
+        return aggregate_rows(self._retrieve_all(filters), aggregations, group_by)
+
+    def _retrieve_all(self, filters):
+        """
+        Retrieves every model matching the filters by following
+        the ``next`` links of ``retrieve_list``.
+
+        :param dict filters: The filters
+        :return: A generator of the models.
+        :rtype: types.GeneratorType
+        """
+        ignored = (self.pagination_pk_query_arg, self.pagination_count_query_arg)
+        filters = dict((name, value) for name, value in six.iteritems(filters)
+                       if name not in ignored)
+        query, previous = filters, None
+        while True:
+            models, meta = self.retrieve_list(query)
+            retrieved = False
+            for model in models:
+                retrieved = True
+                yield model
+            next_page = ((meta or {}).get('links') or {}).get(self.pagination_next)
+            if not retrieved or not next_page or next_page == previous:
+                return
+            query, previous = dict(filters, **next_page), next_page
+
+    def count(self, filters, *args, **kwargs):
+        """
+        Counts the models matching the filters.  By default
+        it is the ``count`` computed by ``aggregate``.
+
+        :param dict filters: The filters
+        :return: The number of models.
+        :rtype: int
+        """
+        return self.aggregate(filters, [Aggregation(COUNT)], **kwargs)[0][COUNT]
+
+    def statistics(self):
+        """
+        The statistics used to estimate counts.  Managers that
+        support the ``estimated`` count_strategy should return
+        statistics that are cheap to get (e.g. kept by their indexes).
+
+        :return: tuple of (number of models, distinct) where distinct
+            is a dictionary of the number of distinct values of the
+            fields that have statistics.
+        :rtype: tuple
+        :raises: NotImplementedError
+        """
+        raise NotImplementedError('The manager {0} does not have '
+                                  'statistics'.format(type(self).__name__))
+
+    def estimate_count(self, filters, *args, **kwargs):
+        """
+        Estimates the number of models matching the filters from the
+        ``statistics`` with a ``ripozo.filters.SelectivityCompiler``.
+        The filter from ``get_filter`` is used if it is passed as the
+        ``filter`` keyword argument.  Managers without statistics
+        count the models instead.
+
+        :param dict filters: The filters
+        :return: The estimated number of models.
+        :rtype: int
+        """
+        node = kwargs.get('filter')
+        if node is None:
+            node, _ = self.get_filter(filters)
+        try:
+            rows, distinct = self.statistics()
+        except NotImplementedError:
+            return self.count(filters, **kwargs)
+        if node is None:
+            return rows
+        return int(round(rows * SelectivityCompiler(distinct).compile(node)))
+
+    def get_total_count(self, filters, strategy=None, *args, **kwargs):
+        """
+        Counts the models matching the filters of a list with the
+        strategy.  The pagination, projection and sort args are ignored.
+
+        :param dict filters: All of the args
+        :param unicode strategy: One of ``COUNT_STRATEGIES``.
+            Defaults to the ``count_strategy``.
+        :return: The total or None if the strategy is ``none``.
+        :rtype: int
+        :raises: ValueError
+        """
+        strategy = strategy or self.count_strategy
+        if strategy == COUNT_NONE:
+            return None
+        if strategy == COUNT_EXACT:
+            return self.count(filters, **kwargs)
+        if strategy == COUNT_ESTIMATED:
+            return self.estimate_count(filters, **kwargs)
+        if strategy != COUNT_CACHED:
+            raise ValueError('"{0}" is not a count strategy.  The strategies are '
+                             '{1}'.format(strategy, list(COUNT_STRATEGIES)))
+        ignored = (self.pagination_pk_query_arg, self.pagination_count_query_arg,
+                   self.projection_query_arg, self.sort_query_arg)
+        key = tuple(sorted((name, repr(value)) for name, value in six.iteritems(filters)
+                           if name not in ignored))
+        cache = self.__dict__.setdefault('_count_cache', OrderedDict())
+        now = time.time()
+        with _count_cache_lock:
+            cached = cache.get(key)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        total = self.count(filters, **kwargs)
+        with _count_cache_lock:
+            cache.pop(key, None)
+            cache[key] = (now + self.count_cache_ttl, total)
+            while len(cache) > self.count_cache_size:
+                cache.popitem(last=False)
+        return total
+
     @classmethod
     def get_field_type(cls, name):
         """
@@ -216,11 +523,20 @@ class BaseManager(object):
         :type filters: dict
         :return: tuple of (pagination_count, updated_filters
         :rtype: tuple
+        :raises: ValidationException
         """
         # get the pagination count or else use the default
         filters = filters.copy()
         pagination_count = filters.pop(self.pagination_count_query_arg, self.paginate_by)
-        pagination_count = int(pagination_count)
+        if isinstance(pagination_count, (list, tuple)) and len(pagination_count) == 1:
+            pagination_count = pagination_count[0]
+        try:
+            pagination_count = int(pagination_count)
+        except (TypeError, ValueError):
+            pagination_count = 0
+        if pagination_count <= 0:
+            raise ValidationException('The {0} must be a positive '
+                                      'integer'.format(self.pagination_count_query_arg))
         _logger.debug('Paginating list by %s', pagination_count)
         return pagination_count, filters
 
@@ -236,6 +552,202 @@ class BaseManager(object):
         last_pagination_pk = filters.pop(self.pagination_pk_query_arg, None)
         return last_pagination_pk, filters
 
+    def get_projection(self, filters, valid_fields=None, resource_name=None):
+        """
+        Get the requested projection (sparse fieldset) from the args.
+        The projection may be a comma delimited string, a list of
+        strings or a dictionary of resource names to either of those
+        (JSON API style ``fields[type]=a,b``).  Every requested field
+        must be in the valid_fields.
+
+        .. code-block:: python
+
+            >>> manager.get_projection({'fields': 'id,name', 'name': 'bob'})
+            (['id', 'name'], {'name': 'bob'})
+
+        :param dict filters: All of the args
+        :param list valid_fields: The fields that may be requested.
+            Defaults to ``self.fields``
+        :param unicode resource_name: The name of the resource used
+            to look up the projection when it is keyed by resource name.
+        :return: tuple of (projection, updated_filters).  The
+            projection is None if no projection was requested.
+        :rtype: tuple
+        :raises: ValidationException
+        """
+        filters = filters.copy()
+        projection = filters.pop(self.projection_query_arg, None)
+        if isinstance(projection, dict):
+            projection = projection.get(resource_name)
+        if projection is None:
+            return None, filters
+        if isinstance(projection, six.string_types):
+            projection = [projection]
+        fields = []
+        for part in projection:
+            for field in six.text_type(part).split(','):
+                field = field.strip()
+                if field and field not in fields:
+                    fields.append(field)
+        valid_fields = self.fields if valid_fields is None else valid_fields
+        invalid = [field for field in fields if field not in valid_fields]
+        if invalid:
+            raise ValidationException('The fields {0} are not valid.  Only the fields {1} may be '
+                                      'requested'.format(invalid, list(valid_fields)))
+        _logger.debug('Projecting the fields %s', fields)
+        return fields, filters
+
+    def get_filter(self, filters):
+        """
+        Parses the filters in the args into a tree of
+        ``ripozo.filters`` nodes.  The args named after fields
+        (``name=bob``, ``age__gte=10``...) and the expression in the
+        ``filter_query_arg`` must all be satisfied.  The values are
+        translated by the ``field_validators``.
+
+        .. code-block:: python
+
+            >>> node, filters = manager.get_filter({'age__gte': '10', 'filter': 'name != bob',
+            ...                                     'count': 5})
+            >>> node
+            And([Condition('age', 'gte', 10), Condition('name', 'ne', 'bob')])
+            >>> filters
+            {'age__gte': '10', 'count': 5}
+
+        :param dict filters: All of the args
+        :return: tuple of (filter, updated_filters).  The filter
+            is None if nothing is filtered.
+        :rtype: tuple
+        :raises: ValidationException
+        """
+        filters = filters.copy()
+        expressions = filters.pop(self.filter_query_arg, None)
+        if not isinstance(expressions, (list, tuple)):
+            expressions = [expressions]
+        validators = self.field_validators
+        nodes = [parse_query_args(filters, self.fields, validators)]
+        nodes.extend(parse_expression(expression, self.fields, validators)
+                     for expression in expressions if expression)
+        return conjunction(nodes), filters
+
+    def get_filter_args(self, filters):
+        """
+        Gets the args that ``get_filter`` parses so that they can be
+        kept by the links to the other pages of a list.  Several
+        ``filter_query_arg`` expressions are combined into one.
+
+        .. code-block:: python
+
+            >>> manager.get_filter_args({'age__in': ['1', '2'], 'filter': 'name != bob',
+            ...                          'count': 5})
+            {'age__in': '1,2', 'filter': 'name != bob'}
+
+        :param dict filters: All of the args
+        :return: The args that filter the models.
+        :rtype: dict
+        """
+        args = filter_query_args(filters, self.fields)
+        expressions = filters.get(self.filter_query_arg)
+        if isinstance(expressions, (list, tuple)):
+            expressions = [expression for expression in expressions if expression]
+            if len(expressions) > 1:
+                expressions = ' and '.join('({0})'.format(expression) for expression in expressions)
+            else:
+                expressions = expressions[0] if expressions else None
+        if expressions:
+            args[self.filter_query_arg] = expressions
+        return args
+
+    def compile_filter(self, node):
+        """
+        Compiles a filter from ``get_filter`` to something the
+        persistence mechanism can evaluate (e.g. a SQL WHERE
+        clause).  By default it is a function that takes
+        a model's dictionary and returns whether it matches.
+
+        :param Condition|And|Or node: The filter.
+        :return: The compiled filter.
+        """
+        return PredicateCompiler().compile(node)
+
+    def get_sort(self, filters):
+        """
+        Gets the requested order from the args.  The sort may be
+        a comma delimited string or a list of strings.  Prefix a field
+        with ``-`` to order it in descending order.  Every field must be
+        in the ``sortable_fields``.
+
+        .. code-block:: python
+
+            >>> manager.get_sort({'sort': '-created,name', 'name': 'bob'})
+            (['-created', 'name'], {'name': 'bob'})
+
+        :param dict filters: All of the args
+        :return: tuple of (sort, updated_filters).  The sort is
+            None if no order was requested.
+        :rtype: tuple
+        :raises: ValidationException
+        """
+        filters = filters.copy()
+        sort = filters.pop(self.sort_query_arg, None)
+        if not sort:
+            return None, filters
+        if isinstance(sort, six.string_types):
+            sort = [sort]
+        sortable = self.fields if self.sortable_fields is None else self.sortable_fields
+        order, names = [], set()
+        for part in sort:
+            for name in six.text_type(part).split(','):
+                name = name.strip()
+                field = name.lstrip('-')
+                if not name:
+                    continue
+                if field not in sortable:
+                    raise ValidationException('The list can not be sorted by "{0}".  It may be '
+                                              'sorted by {1}'.format(field, list(sortable)))
+                if field in names:
+                    raise ValidationException('The list can not be sorted by "{0}" '
+                                              'twice'.format(field))
+                names.add(field)
+                order.append(name)
+        _logger.debug('Sorting by %s', order)
+        return order or None, filters
+
+    def get_aggregates(self, filters):
+        """
+        Gets the requested aggregations and the fields to group
+        them by from the args.  The rows are counted if no
+        aggregation is requested.
+
+        .. code-block:: python
+
+            >>> manager.get_aggregates({'aggregate': 'sum(price)', 'group_by': 'team',
+            ...                         'name': 'bob'})
+            ([Aggregation('sum', 'price')], ['team'], {'name': 'bob'})
+
+        :param dict filters: All of the args
+        :return: tuple of (aggregations, group_by, updated_filters)
+        :rtype: tuple
+        :raises: ValidationException
+        """
+        filters = filters.copy()
+        aggregations = parse_aggregates(filters.pop(self.aggregate_query_arg, None) or [],
+                                        self.fields)
+        group_by = filters.pop(self.group_by_query_arg, None) or []
+        if isinstance(group_by, six.string_types):
+            group_by = [group_by]
+        fields = []
+        for part in group_by:
+            for field in six.text_type(part).split(','):
+                field = field.strip()
+                if field and field not in fields:
+                    fields.append(field)
+        invalid = [field for field in fields if field not in self.fields]
+        if invalid:
+            raise ValidationException('The list can not be grouped by {0}.  It may be grouped '
+                                      'by {1}'.format(invalid, list(self.fields)))
+        return aggregations or [Aggregation(COUNT)], fields, filters
+
     def dot_field_list_to_dict(self, fields=None):
         """
         Converts a list of dot delimited fields (and related fields)
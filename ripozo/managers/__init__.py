@@ -0,0 +1,12 @@
+"""
+Managers for persistence mechanisms that do not need
+anything outside of the standard library.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from .columnar import ColumnarManager
+from .memory import InMemoryManager
+from .sqlite import SqliteManager
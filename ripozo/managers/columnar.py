@@ -0,0 +1,753 @@
+"""
+An in-memory manager that stores each field in a column.  It
+is intended for large read mostly tables with few fields.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from array import array
+from bisect import bisect_right
+from functools import reduce
+from itertools import compress, islice, repeat
+
+from ripozo.aggregates import aggregate_rows
+from ripozo.decorators import classproperty
+from ripozo.exceptions import NotFoundException, ValidationException
+from ripozo.manager_base import BaseManager
+from ripozo.filters import EQUAL, NOT_EQUAL, IN, NOT_IN, GREATER, GREATER_EQUAL, LESS, LESS_EQUAL, \
+    And, Condition, Or
+from ripozo.resources.fields.base import BaseField
+from ripozo.resources.fields.common import IntegerField, FloatField, StringField
+
+import logging
+import operator
+import threading
+
+import six
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+_logger = logging.getLogger(__name__)
+
+INTEGER = 'integer'
+FLOAT = 'float'
+STRING = 'string'
+OBJECT = 'object'
+
+try:
+    array('q')
+    _INTEGER_TYPECODE = 'q'
+except ValueError:  # pragma: no cover
+    # Python 2 does not have long long arrays
+    _INTEGER_TYPECODE = 'l'
+
+_NEGATED = {
+    NOT_EQUAL: EQUAL,
+    NOT_IN: IN,
+}
+
+_COMPARISONS = {
+    EQUAL: operator.eq,
+    GREATER: operator.gt,
+    GREATER_EQUAL: operator.ge,
+    LESS: operator.lt,
+    LESS_EQUAL: operator.le,
+}
+
+
+def _numpy_view(values, lo, hi):
+    """
+    :param array values: An array.
+    :param int lo: The first position.
+    :param int hi: The position after the last.
+    :return: A numpy array sharing the memory of the array's slice.
+    :rtype: numpy.ndarray
+    """
+    dtype = numpy.dtype('{0}{1}'.format('f' if values.typecode == 'd' else 'i', values.itemsize))
+    return numpy.frombuffer(values, dtype=dtype, count=hi - lo, offset=lo * values.itemsize)
+
+
+def _numpy_bytes(values, lo, hi):
+    """
+    :param bytearray values: A bytearray of flags.
+    :return: The flags between lo and hi as a numpy boolean array.
+    :rtype: numpy.ndarray
+    """
+    return numpy.frombuffer(values, dtype=numpy.uint8, count=hi - lo, offset=lo).astype(bool)
+
+
+class _NumberColumn(object):
+    """
+    A column of integers or floats in an array.  None is stored
+    as 0 and flagged in the nulls bytearray.
+
+    :param unicode typecode: The array's typecode.
+    """
+    __slots__ = ('values', 'nulls', 'null_count')
+
+    def __init__(self, typecode, values=(), nulls=()):
+        self.values = array(typecode, values)
+        self.nulls = bytearray(nulls)
+        self.null_count = self.nulls.count(1)
+
+    def __len__(self):
+        return len(self.values)
+
+    def check(self, value):
+        """
+        :param object value: A value to store.
+        :raises: ValidationException
+        """
+        if value is None:
+            return
+        try:
+            array(self.values.typecode, [value])
+        except (TypeError, OverflowError):
+            column_type = FLOAT if self.values.typecode == 'd' else INTEGER
+            raise ValidationException('{0!r} can not be stored in a column of '
+                                      '{1}'.format(value, column_type))
+
+    def append(self, value):
+        if value is None:
+            self.values.append(0)
+            self.nulls.append(1)
+            self.null_count += 1
+        else:
+            self.values.append(value)
+            self.nulls.append(0)
+
+    def get(self, position):
+        return None if self.nulls[position] else self.values[position]
+
+    def set(self, position, value):
+        self.null_count += (value is None) - self.nulls[position]
+        self.nulls[position] = value is None
+        self.values[position] = 0 if value is None else value
+
+    def take(self, positions):
+        """
+        :param list positions: The positions to keep.
+        :return: A column with only the values at the positions.
+        :rtype: _NumberColumn
+        """
+        values, nulls = self.values, self.nulls
+        return _NumberColumn(values.typecode, (values[position] for position in positions),
+                             (nulls[position] for position in positions))
+
+    def mask(self, condition, lo, hi):
+        """
+        :param Condition condition: The condition.
+        :param int lo: The first position.
+        :param int hi: The position after the last.
+        :return: An iterator of whether each value between lo and
+            hi satisfies the condition or None if none of them can.
+        :rtype: collections.Iterator
+        """
+        values = islice(self.values, lo, hi)
+        if condition.operator == EQUAL and condition.value is None:
+            return islice(self.nulls, lo, hi) if self.null_count else None
+        if condition.operator == IN:
+            mask = six.moves.map(frozenset(condition.value).__contains__, values)
+            if None in condition.value and self.null_count:
+                nulls = six.moves.map(bool, islice(self.nulls, lo, hi))
+                return six.moves.map(operator.or_, nulls, mask)
+        else:
+            mask = six.moves.map(_COMPARISONS[condition.operator], values, repeat(condition.value))
+        if self.null_count:
+            not_nulls = six.moves.map(operator.not_, islice(self.nulls, lo, hi))
+            mask = six.moves.map(operator.and_, mask, not_nulls)
+        return mask
+
+    def numpy_mask(self, condition, lo, hi):
+        """
+        :return: The mask as a numpy boolean array.
+        :rtype: numpy.ndarray
+        """
+        if condition.operator == EQUAL and condition.value is None:
+            return _numpy_bytes(self.nulls, lo, hi) if self.null_count else None
+        values = _numpy_view(self.values, lo, hi)
+        if condition.operator == IN:
+            mask = numpy.isin(values, [value for value in condition.value if value is not None])
+            if None in condition.value and self.null_count:
+                return mask | _numpy_bytes(self.nulls, lo, hi)
+        else:
+            mask = _COMPARISONS[condition.operator](values, condition.value)
+        if self.null_count:
+            mask &= ~_numpy_bytes(self.nulls, lo, hi)
+        return mask
+
+
+class _StringColumn(object):
+    """
+    A dictionary encoded column.  Each distinct value is stored
+    once and the column is an array of the values' codes.
+    """
+    __slots__ = ('codes', 'dictionary', 'lookup')
+
+    def __init__(self, values=()):
+        self.codes = array(_INTEGER_TYPECODE)
+        self.dictionary = []
+        self.lookup = {}
+        for value in values:
+            self.append(value)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def check(self, value):
+        if value is not None and not isinstance(value, six.string_types):
+            raise ValidationException('{0!r} can not be stored in a column of '
+                                      '{1}'.format(value, STRING))
+
+    def _code(self, value):
+        """
+        :param unicode value: A value.
+        :return: The value's code.  It is added to the
+            dictionary if it is not already in it.
+        :rtype: int
+        """
+        code = self.lookup.get(value)
+        if code is None:
+            code = self.lookup[value] = len(self.dictionary)
+            self.dictionary.append(value)
+        return code
+
+    def append(self, value):
+        self.codes.append(self._code(value))
+
+    def get(self, position):
+        return self.dictionary[self.codes[position]]
+
+    def set(self, position, value):
+        self.codes[position] = self._code(value)
+
+    def take(self, positions):
+        """
+        :param list positions: The positions to keep.
+        :return: A column with only the values at the positions.
+            Values that are no longer used are removed from the dictionary.
+        :rtype: _StringColumn
+        """
+        codes, dictionary = self.codes, self.dictionary
+        return _StringColumn(dictionary[codes[position]] for position in positions)
+
+    def matching_codes(self, condition):
+        """
+        :param Condition condition: A condition.
+        :return: The codes of the distinct values that satisfy
+            the condition.  The condition is only evaluated once
+            per distinct value.
+        :rtype: set
+        """
+        if condition.operator == EQUAL:
+            code = self.lookup.get(condition.value)
+            return set() if code is None else set([code])
+        if condition.operator == IN:
+            return set(self.lookup[value] for value in condition.value if value in self.lookup)
+        return set(code for code, value in enumerate(self.dictionary) if condition.test(value))
+
+    def mask(self, condition, lo, hi):
+        codes = self.matching_codes(condition)
+        if not codes:
+            return None
+        codes_slice = islice(self.codes, lo, hi)
+        if len(codes) == 1:
+            return six.moves.map(operator.eq, codes_slice, repeat(codes.pop()))
+        return six.moves.map(frozenset(codes).__contains__, codes_slice)
+
+    def numpy_mask(self, condition, lo, hi):
+        codes = self.matching_codes(condition)
+        if not codes:
+            return None
+        codes_slice = _numpy_view(self.codes, lo, hi)
+        if len(codes) == 1:
+            return codes_slice == codes.pop()
+        return numpy.isin(codes_slice, list(codes))
+
+
+class _ObjectColumn(object):
+    """
+    A column of any other values in a list.
+    """
+    __slots__ = ('values',)
+
+    def __init__(self, values=()):
+        self.values = list(values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def check(self, value):
+        pass
+
+    def append(self, value):
+        self.values.append(value)
+
+    def get(self, position):
+        return self.values[position]
+
+    def set(self, position, value):
+        self.values[position] = value
+
+    def take(self, positions):
+        values = self.values
+        return _ObjectColumn(values[position] for position in positions)
+
+    def mask(self, condition, lo, hi):
+        return six.moves.map(condition.test, islice(self.values, lo, hi))
+
+    def numpy_mask(self, condition, lo, hi):
+        return numpy.fromiter(self.mask(condition, lo, hi), dtype=bool, count=hi - lo)
+
+
+def _new_column(column_type):
+    """
+    :param unicode column_type: One of the column types.
+    :return: An empty column of the type.
+    """
+    if column_type == INTEGER:
+        return _NumberColumn(_INTEGER_TYPECODE)
+    if column_type == FLOAT:
+        return _NumberColumn('d')
+    if column_type == STRING:
+        return _StringColumn()
+    return _ObjectColumn()
+
+
+class ColumnarManager(BaseManager):
+    """
+    A manager that stores each field in a column instead of a
+    dictionary per row.  Integer and float fields are stored in arrays
+    and string fields are dictionary encoded (an array of codes for
+    the distinct values) so a table of millions of rows uses a
+    fraction of the memory.  The type of each column is taken from the
+    field's validator (``IntegerField``, ``FloatField`` and ``StringField``)
+    and can be overridden with ``column_types``.  Other fields are
+    stored in lists.
+
+    ``retrieve_list`` accepts the same filters as the InMemoryManager
+    (``name=bob``, ``age__gte=10``, ``team__in=a,b``...).  Each filter is
+    evaluated as a pass over its column: with numpy (when it is installed
+    and ``use_numpy`` is True) ``chunk_size`` rows at a time, otherwise
+    with lazy iterators that stop as soon as the page is full.  Filters on
+    string columns are evaluated once per distinct value.  Dictionaries are
+    only built for the rows on the returned page.  Rows are listed in the
+    order they were created and the ``next`` link's
+    ``pagination_pk_query_arg`` is the sequence number of the last row.
+    Lists can not be sorted with the ``sort_query_arg``.
+
+    Deleted rows are flagged and removed when more than half of
+    the rows are deleted.
+
+    .. code-block:: python
+
+        class PriceManager(ColumnarManager):
+            _fields = ('id', 'symbol', 'price', 'volume')
+            _field_validators = {
+                'id': IntegerField('id'),
+                'symbol': StringField('symbol'),
+                'price': FloatField('price'),
+                'volume': IntegerField('volume'),
+            }
+
+    :param tuple pks: The names of the primary key fields.  If there
+        is a single pk, rows created without it get the next integer.
+    :param dict column_types: Overrides the types of the columns.
+        The types are ``integer``, ``float``, ``string`` and ``object``.
+    :param bool use_numpy: Whether to use numpy when it is installed.
+    :param int chunk_size: The number of rows filtered at once with numpy.
+    :param tuple _fields: The fields of the rows.
+    """
+    pks = ('id',)
+    column_types = None
+    use_numpy = True
+    chunk_size = 65536
+    sortable_fields = ()
+    _fields = ()
+
+    def __init__(self):
+        super(ColumnarManager, self).__init__()
+        self._lock = threading.RLock()
+        fields = self.fields + [name for name in self.pks if name not in self.fields]
+        self._columns = dict((field, _new_column(self.column_type(field))) for field in fields)
+        self._sequence = array(_INTEGER_TYPECODE)
+        self._alive = bytearray()
+        self._positions = {}
+        self._deleted = 0
+        self._next_sequence = 0
+        self._next_id = 1
+
+    @classproperty
+    def fields(cls):
+        """
+        :return: The ``_fields`` of the manager.
+        :rtype: list
+        """
+        return list(cls._fields)
+
+    @classmethod
+    def get_field_type(cls, name):
+        """
+        :param unicode name: The name of the field.
+        :return: A BaseField.  Set ``_field_validators`` to
+            use other fields.
+        :rtype: BaseField
+        """
+        return BaseField(name)
+
+    @classmethod
+    def column_type(cls, name):
+        """
+        :param unicode name: The name of a field.
+        :return: The type of the field's column.
+        :rtype: unicode
+        """
+        if cls.column_types and name in cls.column_types:
+            return cls.column_types[name]
+        validator = (cls._field_validators or {}).get(name)
+        if isinstance(validator, IntegerField):
+            return INTEGER
+        if isinstance(validator, FloatField):
+            return FLOAT
+        if isinstance(validator, StringField):
+            return STRING
+        return OBJECT
+
+    def __len__(self):
+        return len(self._positions)
+
+    def create(self, values, *args, **kwargs):
+        """
+        Appends a row.
+
+        :param dict values: The row's values.  Only the ``create_fields``
+            and pks are kept.
+        :return: The created row.
+        :rtype: dict
+        :raises: ValidationException
+        """
+        row = self.valid_fields(values, set(self.create_fields) | set(self.pks))
+        with self._lock:
+            if len(self.pks) == 1 and row.get(self.pks[0]) is None:
+                row[self.pks[0]] = self._next_id
+            pk = self._pk(row)
+            if None in pk:
+                raise ValidationException(
+                    'The primary keys {0} are required'.format(list(self.pks)))
+            if pk in self._positions:
+                raise ValidationException(
+                    'A row with the primary keys {0} already exists'.format(pk))
+            for field, column in six.iteritems(self._columns):
+                column.check(row.get(field))
+            for field, column in six.iteritems(self._columns):
+                column.append(row.get(field))
+            if len(pk) == 1 and isinstance(pk[0], six.integer_types) and pk[0] >= self._next_id:
+                self._next_id = pk[0] + 1
+            self._positions[pk] = len(self._sequence)
+            self._sequence.append(self._next_sequence)
+            self._next_sequence += 1
+            self._alive.append(1)
+            return self._row(self._positions[pk])
+
+    def retrieve(self, lookup_keys, *args, **kwargs):
+        """
+        :param dict lookup_keys: The pks of the row.
+        :param list fields: The fields to return (the ``fields``
+            keyword argument).  Defaults to all of the fields.
+        :return: The row.
+        :rtype: dict
+        :raises: NotFoundException
+        """
+        with self._lock:
+            return self._row(self._position(lookup_keys), kwargs.get('fields'))
+
+    def retrieve_list(self, filters, *args, **kwargs):
+        """
+        :param dict filters: The filters, pagination and
+            count query arguments.
+        :param list fields: The fields to return (the ``fields``
+            keyword argument).  Defaults to the ``list_fields``.
+        :param Condition|And|Or filter: The filter from ``get_filter``
+            (the ``filter`` keyword argument).  The filters are
+            parsed if it is not given.
+        :return: A page of rows and the meta data with the link
+            to the next page.
+        :rtype: tuple
+        :raises: ValidationException
+        """
+        if kwargs.get('sort') or self.get_sort(filters)[0]:
+            raise ValidationException('The list can not be sorted')
+        token, filters = self.get_pagination_pks(filters)
+        count, filters = self.get_pagination_count(filters)
+        node = kwargs.get('filter')
+        if node is None:
+            node, _ = self.get_filter(filters)
+        fields = kwargs.get('fields') or self.list_fields
+        with self._lock:
+            start = 0
+            if token is not None:
+                start = bisect_right(self._sequence, self._decode_token(token))
+            positions = self._find(node, start, count + 1)
+            links = {}
+            if len(positions) > count:
+                positions = positions[:count]
+                next_page = links[self.pagination_next] = self.get_filter_args(filters)
+                next_page.update({self.pagination_pk_query_arg: self._sequence[positions[-1]],
+                                  self.pagination_count_query_arg: count})
+            return [self._row(position, fields) for position in positions], {'links': links}
+
+    def aggregate(self, filters, aggregations, group_by=None, *args, **kwargs):
+        """
+        Finds the matching rows with a pass over the columns and
+        aggregates them.  Only the grouped and aggregated fields
+        are read.
+
+        :param dict filters: The filters.
+        :param list aggregations: The Aggregation instances.
+        :param list group_by: The fields to group the rows by.
+        :param Condition|And|Or filter: The filter from ``get_filter``
+            (the ``filter`` keyword argument).  The filters are
+            parsed if it is not given.
+        :return: A dictionary per group.
+        :rtype: list
+        :raises: ValidationException
+        """
+        node = kwargs.get('filter')
+        if node is None:
+            node, _ = self.get_filter(filters)
+        group_by = list(group_by or ())
+        fields = group_by + [aggregation.field for aggregation in aggregations
+                             if aggregation.field is not None and aggregation.field not in group_by]
+        with self._lock:
+            positions = self._find(node, 0, len(self._sequence))
+            columns = [(field, self._columns[field]) for field in fields]
+            rows = (dict((field, column.get(position)) for field, column in columns)
+                    for position in positions)
+            return aggregate_rows(rows, aggregations, group_by)
+
+    def statistics(self):
+        """
+        :return: The number of rows and the number of distinct
+            values of the pk and the string columns (the size of
+            their dictionaries, which may include deleted values).
+        :rtype: tuple
+        """
+        with self._lock:
+            distinct = dict((name, len(column.dictionary))
+                            for name, column in six.iteritems(self._columns)
+                            if isinstance(column, _StringColumn))
+            if len(self.pks) == 1:
+                distinct[self.pks[0]] = len(self)
+            return len(self), distinct
+
+    def update(self, lookup_keys, updates, *args, **kwargs):
+        """
+        :param dict lookup_keys: The pks of the row.
+        :param dict updates: The new values.  Only the ``update_fields``
+            are updated.  The pks can not be changed.
+        :return: The updated row.
+        :rtype: dict
+        :raises: NotFoundException
+        :raises: ValidationException
+        """
+        updates = self.valid_fields(updates, self.update_fields)
+        with self._lock:
+            position = self._position(lookup_keys)
+            for name in self.pks:
+                if name in updates and updates[name] != self._columns[name].get(position):
+                    raise ValidationException(
+                        'The primary key "{0}" can not be updated'.format(name))
+            for name, value in six.iteritems(updates):
+                self._columns[name].check(value)
+            for name, value in six.iteritems(updates):
+                self._columns[name].set(position, value)
+            return self._row(position)
+
+    def delete(self, lookup_keys, *args, **kwargs):
+        """
+        :param dict lookup_keys: The pks of the row.
+        :raises: NotFoundException
+        """
+        with self._lock:
+            position = self._position(lookup_keys)
+            del self._positions[self._pk(lookup_keys)]
+            self._alive[position] = 0
+            self._deleted += 1
+            if self._deleted > 1024 and self._deleted * 2 > len(self._sequence):
+                self.compact()
+
+    def compact(self):
+        """
+        Removes the deleted rows from the columns.
+        """
+        with self._lock:
+            alive = self._alive
+            positions = [position for position in six.moves.range(len(alive)) if alive[position]]
+            self._columns = dict((field, column.take(positions))
+                                 for field, column in six.iteritems(self._columns))
+            sequence = self._sequence
+            self._sequence = array(sequence.typecode,
+                                   (sequence[position] for position in positions))
+            self._alive = bytearray(b'\x01' * len(positions))
+            self._positions = dict((self._pk_at(position), position)
+                                   for position in six.moves.range(len(positions)))
+            self._deleted = 0
+
+    def _pk(self, values):
+        """
+        :param dict values: A row or lookup keys.
+        :return: The values of the pks.
+        :rtype: tuple
+        """
+        return tuple(values.get(name) for name in self.pks)
+
+    def _pk_at(self, position):
+        """
+        :param int position: The position of a row.
+        :return: The row's pks.
+        :rtype: tuple
+        """
+        return tuple(self._columns[name].get(position) for name in self.pks)
+
+    def _position(self, lookup_keys):
+        """
+        :param dict lookup_keys: The pks of the row.
+        :return: The row's position.
+        :rtype: int
+        :raises: NotFoundException
+        """
+        position = self._positions.get(self._pk(lookup_keys))
+        if position is None:
+            raise NotFoundException('No row with the primary keys {0} exists'.format(lookup_keys))
+        return position
+
+    def _row(self, position, fields=None):
+        """
+        :param int position: The position of the row.
+        :param list fields: The fields to include.  Defaults
+            to all of them.
+        :return: The row as a dictionary.
+        :rtype: dict
+        """
+        columns = self._columns
+        return dict((field, columns[field].get(position)) for field in fields or self.fields)
+
+    def _decode_token(self, token):
+        """
+        :param unicode token: The sequence number of the last
+            row of the previous page.
+        :return: The sequence number
+        :rtype: int
+        :raises: ValidationException
+        """
+        if isinstance(token, (list, tuple)):
+            token = token[0] if token else None
+        try:
+            return int(token)
+        except (TypeError, ValueError):
+            raise ValidationException('The {0} "{1}" is not valid'.format(
+                self.pagination_pk_query_arg, token))
+
+    def _find(self, node, start, limit):
+        """
+        :param Condition|And|Or node: The filter or None.
+        :param int start: The first position to consider.
+        :param int limit: The maximum number of positions to return.
+        :return: The positions of the rows that match the filter.
+        :rtype: list
+        """
+        end = len(self._sequence)
+        if numpy is None or not self.use_numpy:
+            return self._find_python(node, start, end, limit)
+        positions = []
+        for lo in six.moves.range(start, end, self.chunk_size):
+            positions.extend(self._find_numpy(node, lo, min(lo + self.chunk_size, end),
+                                              limit - len(positions)))
+            if len(positions) >= limit:
+                break
+        return positions
+
+    def _find_python(self, node, lo, hi, limit):
+        """
+        Combines lazy iterators over the columns so that the
+        columns are only read until enough rows are found.
+        """
+        mask = self._python_mask(node, lo, hi) if node is not None else True
+        if mask is None:
+            return []
+        if self._deleted:
+            alive = islice(self._alive, lo, hi)
+            mask = alive if mask is True else six.moves.map(operator.and_, alive, mask)
+        positions = six.moves.range(lo, hi)
+        if mask is not True:
+            positions = compress(positions, mask)
+        return list(islice(positions, limit))
+
+    def _python_mask(self, node, lo, hi):
+        """
+        :return: An iterator of whether each row between lo and hi
+            satisfies the node, None if none of them do or True
+            if all of them do.
+        """
+        if isinstance(node, (And, Or)):
+            masks = [self._python_mask(child, lo, hi) for child in node.children]
+            return _combine(masks, isinstance(node, And), lambda left, right: six.moves.map(
+                operator.and_ if isinstance(node, And) else operator.or_, left, right))
+        if node.operator in _NEGATED:
+            negated = Condition(node.field, _NEGATED[node.operator], node.value)
+            mask = self._columns[node.field].mask(negated, lo, hi)
+            return True if mask is None else six.moves.map(operator.not_, mask)
+        return self._columns[node.field].mask(node, lo, hi)
+
+    def _find_numpy(self, node, lo, hi, limit):
+        """
+        Evaluates the filter over the columns between
+        lo and hi with numpy.
+        """
+        mask = self._numpy_mask(node, lo, hi) if node is not None else True
+        if mask is None:
+            return []
+        if self._deleted:
+            alive = _numpy_bytes(self._alive, lo, hi)
+            mask = alive if mask is True else mask & alive
+        elif mask is True:
+            return list(six.moves.range(lo, min(hi, lo + limit)))
+        return (numpy.flatnonzero(mask)[:limit] + lo).tolist()
+
+    def _numpy_mask(self, node, lo, hi):
+        """
+        :return: A numpy boolean array of whether each row between
+            lo and hi satisfies the node, None if none of them do
+            or True if all of them do.
+        """
+        if isinstance(node, (And, Or)):
+            masks = [self._numpy_mask(child, lo, hi) for child in node.children]
+            return _combine(masks, isinstance(node, And),
+                            operator.and_ if isinstance(node, And) else operator.or_)
+        if node.operator in _NEGATED:
+            negated = Condition(node.field, _NEGATED[node.operator], node.value)
+            mask = self._columns[node.field].numpy_mask(negated, lo, hi)
+            return True if mask is None else ~mask
+        return self._columns[node.field].numpy_mask(node, lo, hi)
+
+
+def _combine(masks, conjunction, combine):
+    """
+    :param list masks: The masks of the children of a node.
+    :param bool conjunction: Whether the node is an And.
+    :param function combine: Combines two masks.
+    :return: The mask of the node, None if no row satisfies
+        it or True if every row does.
+    """
+    absorbing, identity = (None, True) if conjunction else (True, None)
+    if any(mask is absorbing for mask in masks):
+        return absorbing
+    masks = [mask for mask in masks if mask is not identity]
+    if not masks:
+        return identity
+    return reduce(combine, masks)
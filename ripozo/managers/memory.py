@@ -0,0 +1,998 @@
+"""
+An indexed in-memory manager.  It is intended for reference
+data and caches that fit in memory and for testing.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from bisect import bisect_left, bisect_right, insort
+
+from ripozo.aggregates import COUNT, aggregate_rows
+from ripozo.decorators import classproperty
+from ripozo.exceptions import NotFoundException, ValidationException
+from ripozo.manager_base import BaseManager
+from ripozo.filters import EQUAL, IN, GREATER, GREATER_EQUAL, LESS, LESS_EQUAL, Condition, \
+    conjunction, conjuncts
+from ripozo.resources.fields.base import BaseField
+
+import base64
+import binascii
+import json
+import logging
+import re
+import threading
+
+import six
+
+_logger = logging.getLogger(__name__)
+
+_LOWER = (GREATER, GREATER_EQUAL)
+_UPPER = (LESS, LESS_EQUAL)
+
+
+def _key(value):
+    """
+    :param object value: A field's value.
+    :return: A key that sorts None before every other value.
+    :rtype: tuple
+    """
+    return (0,) if value is None else (1, value)
+
+
+class _Top(object):
+    """
+    Compares greater than anything else.  Appending it
+    to a key gives a key that sorts after every key
+    that starts with it.
+    """
+    __slots__ = ()
+
+    def __lt__(self, other):
+        return False
+
+    def __gt__(self, other):
+        return other is not self
+
+    def __eq__(self, other):
+        return other is self
+
+    def __ne__(self, other):
+        return other is not self
+
+    def __hash__(self):
+        return 0
+
+_TOP = _Top()
+
+
+class _Descending(object):
+    """
+    Wraps a key so that it sorts in the reverse order.
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __gt__(self, other):
+        return self.value < other.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __ne__(self, other):
+        return self.value != other.value
+
+    def __hash__(self):
+        return hash(self.value)
+
+
+class SortedList(object):
+    """
+    A sorted list of unique keys.  The keys are kept in sublists
+    of at most ``2 * load`` keys (like the sortedcontainers package)
+    so finding a key is two binary searches and adding or removing
+    one only moves the keys of a single sublist.
+
+    :param int load: The size sublists are split at.
+    """
+    def __init__(self, load=256):
+        self.load = load
+        self._lists = []
+        self._maxes = []
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for sublist in self._lists:
+            for key in sublist:
+                yield key
+
+    def add(self, key):
+        """
+        :param object key: The key to add.
+        """
+        lists, maxes = self._lists, self._maxes
+        if not maxes:
+            lists.append([key])
+            maxes.append(key)
+            self._len = 1
+            return
+        position = bisect_left(maxes, key)
+        if position == len(maxes):
+            position -= 1
+            lists[position].append(key)
+            maxes[position] = key
+        else:
+            insort(lists[position], key)
+        self._len += 1
+        sublist = lists[position]
+        if len(sublist) > 2 * self.load:
+            half = sublist[self.load:]
+            del sublist[self.load:]
+            maxes[position] = sublist[-1]
+            lists.insert(position + 1, half)
+            maxes.insert(position + 1, half[-1])
+
+    def remove(self, key):
+        """
+        :param object key: The key to remove.
+        :raises: ValueError
+        """
+        lists, maxes = self._lists, self._maxes
+        position = bisect_left(maxes, key)
+        if position == len(maxes):
+            raise ValueError('{0!r} is not in the list'.format(key))
+        sublist = lists[position]
+        index = bisect_left(sublist, key)
+        if sublist[index] != key:
+            raise ValueError('{0!r} is not in the list'.format(key))
+        del sublist[index]
+        self._len -= 1
+        if sublist:
+            maxes[position] = sublist[-1]
+        else:
+            del lists[position]
+            del maxes[position]
+
+    def irange(self, start=None, inclusive=True, reverse=False):
+        """
+        Iterates over the keys from the start key.
+
+        :param object start: The key to start at.  Every key
+            is iterated if it is None.
+        :param bool inclusive: Whether to include the start key.
+        :param bool reverse: Iterate over the keys less than
+            the start key in descending order instead of over
+            the keys greater than it in ascending order.
+        :return: A generator of keys
+        :rtype: generator
+        """
+        lists, maxes = self._lists, self._maxes
+        if not reverse:
+            position, index = 0, 0
+            if start is not None:
+                position = bisect_left(maxes, start)
+                if position < len(maxes):
+                    sublist = lists[position]
+                    find = bisect_left if inclusive else bisect_right
+                    index = find(sublist, start)
+            for position in six.moves.range(position, len(lists)):
+                sublist = lists[position]
+                for index in six.moves.range(index, len(sublist)):
+                    yield sublist[index]
+                index = 0
+            return
+        if not lists:
+            return
+        position, index = len(lists) - 1, len(lists[-1])
+        if start is not None:
+            position = min(bisect_left(maxes, start), len(lists) - 1)
+            sublist = lists[position]
+            index = bisect_right(sublist, start) if inclusive else bisect_left(sublist, start)
+        while position >= 0:
+            sublist = lists[position]
+            for index in six.moves.range(index - 1, -1, -1):
+                yield sublist[index]
+            position -= 1
+            index = len(lists[position]) if position >= 0 else 0
+
+
+class TextIndex(object):
+    """
+    An inverted index from the lowercased words in some text to
+    the pks of the rows containing them.  The words are also kept in
+    a SortedList so the words starting with a prefix are a range.
+
+    A query is a list of terms separated by anything that is not a
+    word character.  A term ending in ``*`` is a prefix.  The pks that
+    contain every term are found by intersecting the posting sets,
+    starting with the smallest.
+    """
+    _word = re.compile(r'\w+', re.UNICODE)
+    _query_term = re.compile(r'(\w+)(\*?)', re.UNICODE)
+
+    def __init__(self):
+        self._postings = {}
+        self._terms = SortedList()
+
+    def __len__(self):
+        return len(self._postings)
+
+    def tokenize(self, text):
+        """
+        :param unicode text: A value of an indexed field.
+        :return: The distinct words in the text.
+        :rtype: set
+        """
+        if text is None:
+            return set()
+        return set(self._word.findall(six.text_type(text).lower()))
+
+    def add(self, pk, terms):
+        """
+        :param tuple pk: The pk of a row.
+        :param set terms: The words to add the row to.
+        """
+        for term in terms:
+            pks = self._postings.get(term)
+            if pks is None:
+                pks = self._postings[term] = set()
+                self._terms.add(term)
+            pks.add(pk)
+
+    def remove(self, pk, terms):
+        """
+        :param tuple pk: The pk of a row.
+        :param set terms: The words to remove the row from.
+        """
+        for term in terms:
+            pks = self._postings.get(term)
+            if pks is None:
+                continue
+            pks.discard(pk)
+            if not pks:
+                del self._postings[term]
+                self._terms.remove(term)
+
+    def search(self, query):
+        """
+        :param unicode query: The terms to search for.
+        :return: The pks of the rows containing every term or
+            None if the query does not have any terms.
+        :rtype: set
+        """
+        terms, prefixes = set(), set()
+        for term, star in self._query_term.findall(six.text_type(query).lower()):
+            (prefixes if star else terms).add(term)
+        if not terms and not prefixes:
+            return None
+        postings = sorted((self._postings.get(term, ()) for term in terms), key=len)
+        candidates = None
+        if postings:
+            candidates = set(postings[0])
+            for pks in postings[1:]:
+                candidates &= pks
+        for prefix in prefixes:
+            if candidates is not None and not candidates:
+                break
+            candidates = self._prefix_search(prefix, candidates)
+        return candidates
+
+    def _prefix_search(self, prefix, candidates=None):
+        """
+        :param unicode prefix: The start of a word.
+        :param set candidates: Only these pks are returned
+            if they are given.
+        :return: The pks of the rows with a word starting
+            with the prefix.
+        :rtype: set
+        """
+        matched = set()
+        for term in self._terms.irange(prefix):
+            if not term.startswith(prefix):
+                break
+            pks = self._postings[term]
+            matched.update(pks if candidates is None else candidates.intersection(pks))
+        return matched
+
+
+class InMemoryManager(BaseManager):
+    """
+    A manager that keeps its rows in memory.  Rows are found by
+    their primary keys in a dictionary.  Fields listed in ``indexes``
+    have hash indexes that are used for equality (``name=bob``) and
+    ``in`` (``name__in=bob,sue``) filters.  Fields listed in
+    ``sorted_indexes`` have sorted indexes that are used for the
+    range filters (``age__gt``, ``age__gte``, ``age__lt`` and ``age__lte``)
+    and when the list is ordered by the field.  Filters on fields without
+    an index are evaluated for every candidate row.  The filter values
+    are translated with the manager's ``field_validators``.
+
+    Lists are paginated with keyset pagination: the ``next`` link's
+    ``pagination_pk_query_arg`` is a token containing the position of
+    the last row in the ordering, so a page costs the same no matter how
+    deep it is and rows created or deleted between requests do not
+    shift the pages.  Lists are ordered by the ``sort_query_arg``
+    (``?sort=-age``) or else the ``order_by`` (prefix a field with ``-`` to
+    order it in descending order) and then by the pks.  Only a ``next``
+    link is returned and it keeps the sort.  By default the lists can
+    only be sorted by the pks and the fields with sorted indexes.
+
+    Fields listed in ``text_indexes`` are tokenized into a TextIndex
+    and searched with the ``search_query_arg`` (``?q=blue wid*`` finds the
+    rows containing the word "blue" and a word starting with "wid" in any
+    of the fields).  The search is combined with the other filters and
+    pagination.
+
+    Updating or deleting a row only touches the indexes of the fields
+    that changed (``O(log n)`` for the sorted indexes).  The
+    manager is thread safe.
+
+    .. code-block:: python
+
+        class CountryManager(InMemoryManager):
+            _fields = ('id', 'code', 'name', 'population')
+            indexes = ('code',)
+            sorted_indexes = ('population',)
+            order_by = ('-population',)
+
+    :param tuple pks: The names of the primary key fields.  If there
+        is a single pk, rows created without it get the next integer.
+    :param tuple indexes: The fields with hash indexes.
+    :param tuple sorted_indexes: The fields with sorted indexes.
+    :param tuple text_indexes: The fields searched with the
+        ``search_query_arg``.
+    :param unicode search_query_arg: The query argument with the text
+        to search for.
+    :param tuple _fields: The fields of the rows.
+    """
+    pks = ('id',)
+    indexes = ()
+    sorted_indexes = ()
+    text_indexes = ()
+    search_query_arg = 'q'
+    _fields = ()
+
+    def __init__(self):
+        super(InMemoryManager, self).__init__()
+        self._lock = threading.RLock()
+        self._rows = {}
+        self._pk_index = SortedList()
+        self._hash_indexes = dict((field, {}) for field in self.indexes)
+        self._sorted_indexes = dict((field, SortedList()) for field in self.sorted_indexes)
+        self._text_index = TextIndex() if self.text_indexes else None
+        self._next_id = 1
+
+    @classproperty
+    def fields(cls):
+        """
+        :return: The ``_fields`` of the manager.
+        :rtype: list
+        """
+        return list(cls._fields)
+
+    @classproperty
+    def sortable_fields(cls):
+        """
+        :return: The pks and the fields with sorted indexes.
+        :rtype: tuple
+        """
+        return tuple(cls.pks) + tuple(cls.sorted_indexes)
+
+    @classmethod
+    def get_field_type(cls, name):
+        """
+        :param unicode name: The name of the field.
+        :return: A BaseField.  Set ``_field_validators`` to
+            use other fields.
+        :rtype: BaseField
+        """
+        return BaseField(name)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def create(self, values, *args, **kwargs):
+        """
+        Adds a row.
+
+        :param dict values: The row's values.  Only the ``create_fields``
+            and pks are kept.
+        :return: A copy of the created row.
+        :rtype: dict
+        :raises: ValidationException
+        """
+        row = self.valid_fields(values, set(self.create_fields) | set(self.pks))
+        with self._lock:
+            pk = self._new_pk(row)
+            self._add(pk, row)
+            return dict(row)
+
+    def retrieve(self, lookup_keys, *args, **kwargs):
+        """
+        :param dict lookup_keys: The pks of the row.
+        :param list fields: The fields to return (the ``fields``
+            keyword argument).  Defaults to all of the fields.
+        :return: A copy of the row.
+        :rtype: dict
+        :raises: NotFoundException
+        """
+        with self._lock:
+            row = self._get_row(lookup_keys)
+            return self._project(row, kwargs.get('fields'))
+
+    def retrieve_list(self, filters, *args, **kwargs):
+        """
+        :param dict filters: The filters, pagination and
+            count query arguments.
+        :param list fields: The fields to return (the ``fields``
+            keyword argument).  Defaults to the ``list_fields``.
+        :param Condition|And|Or filter: The filter from ``get_filter``
+            (the ``filter`` keyword argument).  The filters are
+            parsed if it is not given.
+        :param list sort: The order from ``get_sort`` (the ``sort``
+            keyword argument).  The filters are parsed if it is
+            not given.
+        :return: A page of rows and the meta data with the link
+            to the next page.
+        :rtype: tuple
+        :raises: ValidationException
+        """
+        sort = kwargs.get('sort')
+        if sort is None:
+            sort, filters = self.get_sort(filters)
+        token, filters = self.get_pagination_pks(filters)
+        count, filters = self.get_pagination_count(filters)
+        query = None
+        if self._text_index is not None:
+            filters = dict(filters)
+            query = filters.pop(self.search_query_arg, None)
+            if isinstance(query, (list, tuple)):
+                query = ' '.join(query)
+        node = kwargs.get('filter')
+        if node is None:
+            node, _ = self.get_filter(filters)
+        conditions = conjuncts(node)
+        order = self._order(sort)
+        fields = kwargs.get('fields') or self.list_fields
+        with self._lock:
+            start = self._decode_token(token, order) if token else None
+            matched = self._text_index.search(query) if query else None
+            try:
+                rows = self._find(conditions, order, start, count + 1, matched=matched)
+            except TypeError:
+                if start is None:
+                    raise
+                # The token's values can not be compared with the rows' values.
+                raise ValidationException('The {0} "{1}" is not valid'.format(
+                    self.pagination_pk_query_arg, token))
+            links = {}
+            if len(rows) > count:
+                rows = rows[:count]
+                next_page = links[self.pagination_next] = self.get_filter_args(filters)
+                next_page.update({self.pagination_pk_query_arg: self._encode_token(rows[-1], order),
+                                  self.pagination_count_query_arg: count})
+                if query:
+                    next_page[self.search_query_arg] = query
+                if sort:
+                    next_page[self.sort_query_arg] = ','.join(sort)
+            return [self._project(row, fields) for row in rows], {'links': links}
+
+    def aggregate(self, filters, aggregations, group_by=None, *args, **kwargs):
+        """
+        Finds the matching rows with the indexes like ``retrieve_list``
+        and aggregates them in a single pass.  Counting the rows
+        without grouping them only uses the indexes when they answer
+        every filter.
+
+        :param dict filters: The filters and the search query argument.
+        :param list aggregations: The Aggregation instances.
+        :param list group_by: The fields to group the rows by.
+        :param Condition|And|Or filter: The filter from ``get_filter``
+            (the ``filter`` keyword argument).  The filters are
+            parsed if it is not given.
+        :return: A dictionary per group.
+        :rtype: list
+        :raises: ValidationException
+        """
+        query = filters.get(self.search_query_arg) if self._text_index is not None else None
+        if isinstance(query, (list, tuple)):
+            query = ' '.join(query)
+        node = kwargs.get('filter')
+        if node is None:
+            node, _ = self.get_filter(filters)
+        with self._lock:
+            candidates, residual = self._hash_candidates(conjuncts(node))
+            matched = self._text_index.search(query) if query else None
+            if matched is not None:
+                candidates = matched if candidates is None else candidates & matched
+            if candidates is None:
+                range_field = self._range_field(residual)
+                if range_field is None:
+                    candidates = self._rows
+                else:
+                    candidates = self._range_candidates(residual, range_field)
+            if not residual and not group_by and all(
+                    aggregation.function == COUNT and aggregation.field is None
+                    for aggregation in aggregations):
+                return [dict((aggregation.name, len(candidates)) for aggregation in aggregations)]
+            rows = self._rows
+            return aggregate_rows((rows[pk] for pk in self._filter_pks(candidates, residual)),
+                                  aggregations, group_by)
+
+    def statistics(self):
+        """
+        :return: The number of rows and the number of distinct
+            values of the pk and the fields with hash indexes.
+        :rtype: tuple
+        """
+        with self._lock:
+            distinct = dict((name, len(index)) for name, index in six.iteritems(self._hash_indexes))
+            if len(self.pks) == 1:
+                distinct[self.pks[0]] = len(self._rows)
+            return len(self._rows), distinct
+
+    def update(self, lookup_keys, updates, *args, **kwargs):
+        """
+        :param dict lookup_keys: The pks of the row.
+        :param dict updates: The new values.  Only the ``update_fields``
+            are updated.  The pks can not be changed.
+        :return: A copy of the updated row.
+        :rtype: dict
+        :raises: NotFoundException
+        :raises: ValidationException
+        """
+        updates = self.valid_fields(updates, self.update_fields)
+        with self._lock:
+            row = self._get_row(lookup_keys)
+            pk = self._pk(row)
+            for name in self.pks:
+                if name in updates and updates[name] != row.get(name):
+                    raise ValidationException(
+                        'The primary key "{0}" can not be updated'.format(name))
+            text_changed = self._text_index is not None and any(
+                name in self.text_indexes and updates[name] != row.get(name) for name in updates)
+            if text_changed:
+                old_terms = self._text_terms(row)
+            for name, value in six.iteritems(updates):
+                old_value = row.get(name)
+                if name in row and old_value == value:
+                    continue
+                if name in self._hash_indexes:
+                    self._unindex_hash(name, old_value, pk)
+                    self._hash_indexes[name].setdefault(value, set()).add(pk)
+                if name in self._sorted_indexes:
+                    index = self._sorted_indexes[name]
+                    index.remove((_key(old_value), pk))
+                    index.add((_key(value), pk))
+                row[name] = value
+            if text_changed:
+                new_terms = self._text_terms(row)
+                self._text_index.remove(pk, old_terms - new_terms)
+                self._text_index.add(pk, new_terms - old_terms)
+            return dict(row)
+
+    def delete(self, lookup_keys, *args, **kwargs):
+        """
+        :param dict lookup_keys: The pks of the row.
+        :raises: NotFoundException
+        """
+        with self._lock:
+            row = self._get_row(lookup_keys)
+            self._remove(self._pk(row), row)
+
+    def _new_pk(self, row):
+        """
+        Gets the pk of a new row and generates it if needed.
+
+        :param dict row: The row being created
+        :return: The pk tuple
+        :rtype: tuple
+        :raises: ValidationException
+        """
+        if len(self.pks) == 1 and row.get(self.pks[0]) is None:
+            row[self.pks[0]] = self._next_id
+        pk = self._pk(row)
+        if None in pk:
+            raise ValidationException('The primary keys {0} are required'.format(list(self.pks)))
+        if pk in self._rows:
+            raise ValidationException('A row with the primary keys {0} already exists'.format(pk))
+        value = pk[0]
+        if len(pk) == 1 and isinstance(value, six.integer_types) and value >= self._next_id:
+            self._next_id = value + 1
+        return pk
+
+    def _pk(self, values):
+        """
+        :param dict values: A row or lookup keys.
+        :return: The values of the pks.
+        :rtype: tuple
+        """
+        return tuple(values.get(name) for name in self.pks)
+
+    def _get_row(self, lookup_keys):
+        """
+        :param dict lookup_keys: The pks of the row.
+        :return: The stored row.
+        :rtype: dict
+        :raises: NotFoundException
+        """
+        row = self._rows.get(self._pk(lookup_keys))
+        if row is None:
+            raise NotFoundException('No row with the primary keys {0} exists'.format(lookup_keys))
+        return row
+
+    def _add(self, pk, row):
+        """
+        Stores the row and indexes it.
+        """
+        self._rows[pk] = row
+        self._pk_index.add(pk)
+        for name, index in six.iteritems(self._hash_indexes):
+            index.setdefault(row.get(name), set()).add(pk)
+        for name, index in six.iteritems(self._sorted_indexes):
+            index.add((_key(row.get(name)), pk))
+        if self._text_index is not None:
+            self._text_index.add(pk, self._text_terms(row))
+
+    def _remove(self, pk, row):
+        """
+        Removes the row and its index entries.
+        """
+        del self._rows[pk]
+        self._pk_index.remove(pk)
+        for name in self._hash_indexes:
+            self._unindex_hash(name, row.get(name), pk)
+        for name, index in six.iteritems(self._sorted_indexes):
+            index.remove((_key(row.get(name)), pk))
+        if self._text_index is not None:
+            self._text_index.remove(pk, self._text_terms(row))
+
+    def _text_terms(self, row):
+        """
+        :param dict row: A row.
+        :return: The words in the row's ``text_indexes`` fields.
+        :rtype: set
+        """
+        terms = set()
+        for name in self.text_indexes:
+            terms.update(self._text_index.tokenize(row.get(name)))
+        return terms
+
+    def _unindex_hash(self, name, value, pk):
+        """
+        Removes the pk from the hash index entry for the value.
+        """
+        index = self._hash_indexes[name]
+        pks = index.get(value)
+        if pks is not None:
+            pks.discard(pk)
+            if not pks:
+                del index[value]
+
+    def _project(self, row, fields=None):
+        """
+        :param dict row: A stored row.
+        :param list fields: The fields to copy.
+        :return: A copy of the row with only the fields
+        :rtype: dict
+        """
+        if not fields:
+            return dict(row)
+        return dict((field, row[field]) for field in fields if field in row)
+
+    def _order(self, sort=None):
+        """
+        :param list sort: The requested order or None
+        :return: The sort (or else the ``order_by``) fields as
+            a list of ``(field, descending)`` tuples.
+        :rtype: list
+        """
+        order = []
+        for name in sort or self.order_by or ():
+            descending = name.startswith('-')
+            order.append((name.lstrip('-'), descending))
+        return order
+
+    def _sort_key(self, row, order):
+        """
+        :param dict row: A row.
+        :param list order: The order from _order.
+        :return: The key of the row in the ordering.  Ties
+            are ordered by the pks in the direction of the last field.
+        :rtype: tuple
+        """
+        key = [_Descending(_key(row.get(field))) if descending else _key(row.get(field))
+               for field, descending in order]
+        pk = self._pk(row)
+        key.append(_Descending(pk) if order and order[-1][1] else pk)
+        return tuple(key)
+
+    def _find(self, conditions, order, start, limit, matched=None):
+        """
+        Finds the rows matching the conditions that come after
+        the start position in the order.  When no condition can use a
+        hash index and the rows are ordered by a field with a sorted
+        index (or the pks) the index is walked until enough rows are
+        found.  Otherwise the candidate rows are found with the indexes
+        and sorted.
+
+        :param list conditions: The conjuncts of the filter.
+        :param list order: The order from _order.
+        :param tuple start: The ``(order values, pk)`` of the row to
+            start after or None.
+        :param int limit: The maximum number of rows to return.
+        :param set matched: The pks found by a text search or None.
+        :return: The rows.
+        :rtype: list
+        """
+        candidates, residual = self._hash_candidates(conditions)
+        if matched is not None:
+            candidates = matched if candidates is None else candidates & matched
+        if candidates is None:
+            walkable = len(order) <= 1 and (not order or order[0][0] in self._sorted_indexes)
+            range_field = self._range_field(residual)
+            if walkable and (range_field is None or order and range_field == order[0][0]):
+                return self._walk(residual, order, start, limit)
+            if range_field is not None:
+                candidates = self._range_candidates(residual, range_field)
+            else:
+                candidates = self._rows
+        rows = self._rows
+        matched = self._filter_pks(candidates, residual)
+        if not order:
+            matched.sort()
+            position = bisect_right(matched, tuple(start[1])) if start is not None else 0
+            return [rows[pk] for pk in matched[position:position + limit]]
+        ordered = sorted((self._sort_key(rows[pk], order), pk) for pk in matched)
+        position = 0
+        if start is not None:
+            values, pk = start
+            start_row = dict(six.moves.zip(self.pks, pk))
+            for (field, _), value in six.moves.zip(order, values):
+                start_row[field] = value
+            position = bisect_right(ordered, (self._sort_key(start_row, order), _TOP))
+        return [rows[pk] for _, pk in ordered[position:position + limit]]
+
+    def _filter_pks(self, candidates, residual):
+        """
+        :param collections.Iterable candidates: The candidate pks.
+        :param list residual: The conditions the indexes did not answer.
+        :return: The candidate pks whose rows satisfy the conditions.
+        :rtype: list
+        """
+        if not residual:
+            return list(candidates)
+        rows = self._rows
+        predicate = self.compile_filter(conjunction(residual))
+        return [pk for pk in candidates if predicate(rows[pk])]
+
+    def _hash_candidates(self, conditions):
+        """
+        Uses the pks and hash indexes to find the rows that
+        match the equality and ``in`` conditions.
+
+        :param list conditions: The conjuncts of the filter.
+        :return: The candidate pks (or None if no condition
+            could use an index) and the conditions that still
+            need to be evaluated.
+        :rtype: tuple
+        """
+        candidates, residual = None, []
+        for condition in conditions:
+            if not isinstance(condition, Condition) or condition.operator not in (EQUAL, IN):
+                residual.append(condition)
+                continue
+            field, operator = condition.field, condition.operator
+            values = (condition.value,) if operator == EQUAL else condition.value
+            if len(self.pks) == 1 and field == self.pks[0]:
+                matched = set((value,) for value in values if (value,) in self._rows)
+            elif field in self._hash_indexes:
+                index = self._hash_indexes[field]
+                matched = set()
+                for value in values:
+                    matched.update(index.get(value, ()))
+            else:
+                residual.append(condition)
+                continue
+            candidates = matched if candidates is None else candidates & matched
+        return candidates, residual
+
+    def _range_field(self, conditions):
+        """
+        :param list conditions: The conditions not answered
+            by a hash index.
+        :return: The first field with a sorted index
+            that has range conditions or None.
+        :rtype: unicode
+        """
+        for condition in conditions:
+            if isinstance(condition, Condition) and condition.operator in _LOWER + _UPPER \
+                    and condition.field in self._sorted_indexes:
+                return condition.field
+        return None
+
+    def _range_candidates(self, conditions, field):
+        """
+        :param list conditions: The conditions not answered
+            by a hash index.
+        :param unicode field: A field with a sorted index
+            and range conditions.
+        :return: The pks found by scanning the field's
+            sorted index between the bounds of the conditions.
+        :rtype: set
+        """
+        lower, lower_inclusive, upper, upper_inclusive = _bounds(conditions, field)
+        start, inclusive = (((1,),), True)
+        if lower is not None:
+            start, inclusive = _start_key(lower, lower_inclusive, False)
+        pks = set()
+        for key, pk in self._sorted_indexes[field].irange(start, inclusive=inclusive):
+            if upper is not None and _is_past(key, upper, upper_inclusive, False):
+                break
+            pks.add(pk)
+        return pks
+
+    def _walk(self, conditions, order, start, limit):
+        """
+        Walks the sorted index of the order field (or the pks)
+        from the start position and evaluates the conditions on
+        each row until enough rows are found.
+
+        :param list conditions: The conditions to evaluate.
+        :param list order: The order from _order with at most one field.
+        :param tuple start: The ``(order values, pk)`` of the row to
+            start after or None.
+        :param int limit: The maximum number of rows to return.
+        :return: The rows.
+        :rtype: list
+        """
+        field, descending = order[0] if order else (None, False)
+        if field is None:
+            index, start_key, far = self._pk_index, start and tuple(start[1]), None
+            inclusive = start_key is None
+        else:
+            index = self._sorted_indexes[field]
+            start_key = (_key(start[0][0]), tuple(start[1])) if start else None
+            inclusive = start_key is None
+            lower, lower_inclusive, upper, upper_inclusive = _bounds(conditions, field)
+            near, far = (upper, upper_inclusive), (lower, lower_inclusive)
+            if not descending:
+                near, far = far, near
+            if near[0] is not None:
+                bound_key, bound_inclusive = _start_key(near[0], near[1], descending)
+                if start_key is None or \
+                        (bound_key < start_key if descending else bound_key > start_key):
+                    start_key, inclusive = bound_key, bound_inclusive
+            if far[0] is None:
+                far = None
+        predicate = self.compile_filter(conjunction(conditions)) if conditions else None
+        rows = []
+        for entry in index.irange(start_key, inclusive=inclusive, reverse=descending):
+            if far is not None and _is_past(entry[0], far[0], far[1], descending):
+                break
+            row = self._rows[entry if field is None else entry[1]]
+            if predicate is None or predicate(row):
+                rows.append(row)
+                if len(rows) >= limit:
+                    break
+        return rows
+
+    def _encode_token(self, row, order):
+        """
+        :param dict row: The last row of a page.
+        :param list order: The order from _order.
+        :return: The pagination token for the next page.  It has
+            the row's order values and pks.
+        :rtype: unicode
+        """
+        position = [[row.get(field) for field, _ in order], list(self._pk(row))]
+        try:
+            encoded = json.dumps(position)
+        except TypeError:
+            # The row is looked up when the values are not json serializable.
+            encoded = json.dumps([position[1]])
+        return base64.urlsafe_b64encode(encoded.encode('utf-8')).decode('ascii')
+
+    def _decode_token(self, token, order):
+        """
+        :param unicode token: A token from _encode_token
+        :param list order: The order from _order.
+        :return: The ``(order values, pk)`` of the position.
+        :rtype: tuple
+        :raises: ValidationException
+        """
+        if isinstance(token, (list, tuple)):
+            token = token[0] if token else ''
+        invalid = ValidationException('The {0} "{1}" is not valid'.format(
+            self.pagination_pk_query_arg, token))
+        try:
+            decoded = base64.urlsafe_b64decode(six.text_type(token).encode('ascii'))
+            position = json.loads(decoded.decode('utf-8'))
+        except (ValueError, TypeError, binascii.Error, UnicodeError):
+            raise invalid
+        if not isinstance(position, list) or len(position) not in (1, 2) \
+                or not all(isinstance(part, list) for part in position):
+            raise invalid
+        if len(position) == 1:
+            row = self._rows.get(tuple(position[0]))
+            if row is None:
+                raise ValidationException('The row at the {0} "{1}" no longer '
+                                          'exists'.format(self.pagination_pk_query_arg, token))
+            return [row.get(field) for field, _ in order], self._pk(row)
+        values, pk = position
+        if len(values) != len(order) or len(pk) != len(self.pks) \
+                or not all(_is_scalar(value) for value in values + pk):
+            raise invalid
+        return values, tuple(pk)
+
+
+def _is_scalar(value):
+    """
+    :return: Whether the value decoded from a token is
+        a string, number, boolean or None.
+    :rtype: bool
+    """
+    return value is None or isinstance(value, (six.string_types, six.integer_types, float))
+
+
+def _bounds(conditions, field):
+    """
+    :param list conditions: The conditions.
+    :param unicode field: The name of a field.
+    :return: The greatest lower bound, whether it is inclusive, the
+        least upper bound and whether it is inclusive of the
+        range conditions on the field.
+    :rtype: tuple
+    """
+    lower = upper = None
+    lower_inclusive = upper_inclusive = True
+    for condition in conditions:
+        if not isinstance(condition, Condition) or condition.field != field:
+            continue
+        value, operator = condition.value, condition.operator
+        if operator in _LOWER:
+            if lower is None or value > lower or (value == lower and operator == GREATER):
+                lower, lower_inclusive = value, operator == GREATER_EQUAL
+        elif operator in _UPPER:
+            if upper is None or value < upper or (value == upper and operator == LESS):
+                upper, upper_inclusive = value, operator == LESS_EQUAL
+    return lower, lower_inclusive, upper, upper_inclusive
+
+
+def _start_key(bound, inclusive, reverse):
+    """
+    :param object bound: The bound on the near side of a walk
+        over a sorted index.
+    :param bool inclusive: Whether the bound is inclusive.
+    :param bool reverse: Whether the walk is in descending order.
+    :return: The key and inclusive arguments for SortedList.irange
+        to start at the first entry within the bound.
+    :rtype: tuple
+    """
+    if reverse:
+        return ((_key(bound), _TOP), True) if inclusive else ((_key(bound),), False)
+    return ((_key(bound),), True) if inclusive else ((_key(bound), _TOP), True)
+
+
+def _is_past(key, bound, inclusive, reverse):
+    """
+    :param tuple key: The key of a sorted index entry.
+    :param object bound: The bound on the far side of the walk.
+    :param bool inclusive: Whether the bound is inclusive.
+    :param bool reverse: Whether the walk is in descending order.
+    :return: Whether the entry is past the bound.
+    :rtype: bool
+    """
+    bound = _key(bound)
+    if reverse:
+        return key < bound or (not inclusive and key == bound)
+    return key > bound or (not inclusive and key == bound)
@@ -0,0 +1,899 @@
+"""
+A manager for sqlite databases using the standard
+library's sqlite3 module.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from ripozo.decorators import classproperty
+from ripozo.exceptions import NotFoundException, ValidationException
+from ripozo.manager_base import BaseManager
+from ripozo.filters import EQUAL, NOT_EQUAL, IN, NOT_IN, GREATER, GREATER_EQUAL, LESS, LESS_EQUAL, \
+    FilterCompiler
+from ripozo.resources.fields.base import BaseField
+from ripozo.resources.fields.common import BooleanField, FloatField, IntegerField, StringField
+
+import base64
+import binascii
+import json
+import logging
+import sqlite3
+import threading
+
+import six
+
+_logger = logging.getLogger(__name__)
+
+_OPERATORS = {
+    GREATER: '>',
+    GREATER_EQUAL: '>=',
+    LESS: '<',
+    LESS_EQUAL: '<=',
+}
+
+
+def _quote(name):
+    """
+    :param unicode name: The name of a table or column.
+    :return: The quoted identifier.
+    :rtype: unicode
+    """
+    return '"{0}"'.format(name.replace('"', '""'))
+
+
+class SqlCompiler(FilterCompiler):
+    """
+    Compiles a filter to the SQL for a WHERE clause and its
+    parameters.  NULL satisfies the same conditions it does in
+    python: ``ne`` and ``nin`` conditions unless they exclude
+    it and never the ranges.
+    """
+    def compile_condition(self, condition):
+        column, operator, value = _quote(condition.field), condition.operator, condition.value
+        if operator in (IN, NOT_IN):
+            values = [item for item in value if item is not None]
+            placeholders = ', '.join('?' * len(values))
+            if operator == IN:
+                sql = '{0} IN ({1})'.format(column, placeholders) if values else '0'
+                template = '({0} OR {1} IS NULL)' if None in value else '{0}'
+            else:
+                sql = '{0} NOT IN ({1})'.format(column, placeholders) if values else '1'
+                template = '({0} AND {1} IS NOT NULL)' if None in value else '({0} OR {1} IS NULL)'
+            return template.format(sql, column), values
+        if value is None:
+            return '{0} {1} NULL'.format(column, 'IS' if operator == EQUAL else 'IS NOT'), []
+        if operator == EQUAL:
+            return '{0} = ?'.format(column), [value]
+        if operator == NOT_EQUAL:
+            return '{0} IS NOT ?'.format(column), [value]
+        return '{0} {1} ?'.format(column, _OPERATORS[operator]), [value]
+
+    def compile_and(self, node, children):
+        return self._join(' AND ', children)
+
+    def compile_or(self, node, children):
+        return self._join(' OR ', children)
+
+    @staticmethod
+    def _join(separator, children):
+        return '({0})'.format(separator.join(sql for sql, _ in children)), \
+            [param for _, params in children for param in params]
+
+
+class ConnectionPool(object):
+    """
+    A thread safe pool of sqlite3 connections.  A thread that
+    already holds a connection gets the same connection when it asks
+    for one again, so nested calls (e.g. retrieving a model while a
+    list is streamed) share a transaction and can not deadlock the
+    pool.  The transaction is committed when the outermost
+    ``connection`` block exits and rolled back if it raises.
+
+    An in-memory database only exists for the connection that
+    created it so the pool has a single connection for ``:memory:``.
+
+    .. code-block:: python
+
+        pool = ConnectionPool('app.db', size=4)
+        with pool.connection() as connection:
+            connection.execute('DELETE FROM person')
+
+    :param unicode database: The path of the database file.
+    :param int size: The maximum number of connections.
+    :param int cached_statements: The number of prepared statements
+        each connection keeps.
+    :param float timeout: The seconds to wait for a connection and for
+        the database to be unlocked by another connection.
+    :param function on_connect: Called with each new connection
+        (e.g. to set pragmas).
+    """
+    def __init__(self, database, size=5, cached_statements=256, timeout=5.0, on_connect=None):
+        self.database = database
+        self.size = 1 if database == ':memory:' else size
+        self.cached_statements = cached_statements
+        self.timeout = timeout
+        self.on_connect = on_connect
+        self._idle = six.moves.queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def connection(self):
+        """
+        :return: A context manager that holds a connection for
+            the current thread.
+        :rtype: sqlite3.Connection
+        :raises: sqlite3.OperationalError if no connection is
+            released before the timeout.
+        """
+        held = getattr(self._local, 'connection', None)
+        if held is not None:
+            yield held
+            return
+        connection = self._acquire()
+        self._local.connection = connection
+        try:
+            yield connection
+        except BaseException:
+            connection.rollback()
+            raise
+        else:
+            connection.commit()
+        finally:
+            self._local.connection = None
+            self._idle.put(connection)
+
+    def close(self):
+        """
+        Closes the idle connections.
+        """
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except six.moves.queue.Empty:
+                return
+            connection.close()
+            with self._lock:
+                self._opened -= 1
+
+    def _acquire(self):
+        """
+        :return: An idle connection or a new one if the pool
+            is not full.
+        :rtype: sqlite3.Connection
+        """
+        try:
+            return self._idle.get_nowait()
+        except six.moves.queue.Empty:
+            pass
+        with self._lock:
+            opening = self._opened < self.size
+            if opening:
+                self._opened += 1
+        if not opening:
+            try:
+                return self._idle.get(timeout=self.timeout)
+            except six.moves.queue.Empty:
+                raise sqlite3.OperationalError('No connection to {0} was released within {1} '
+                                               'seconds'.format(self.database, self.timeout))
+        try:
+            connection = sqlite3.connect(self.database, timeout=self.timeout,
+                                         check_same_thread=False,
+                                         cached_statements=self.cached_statements)
+            if self.on_connect is not None:
+                self.on_connect(connection)
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+            raise
+        return connection
+
+
+class SqliteManager(BaseManager):
+    """
+    A manager for a table in a sqlite database.  The filters are the
+    same as the InMemoryManager's (``name=bob``, ``age__gte=10``,
+    ``team__in=a,b``...) and are compiled to a WHERE clause with
+    parameters, so the SQL for the same kind of query is the same and
+    the connections reuse its prepared statement.  The manager also
+    caches the SQL of the ``statement_cache_size`` statements used
+    most recently.
+
+    Lists are ordered by the ``sort_query_arg`` (``?sort=-age``) or else
+    the ``order_by`` (prefix a field with ``-`` to order it in descending
+    order) and then by the pks and are paginated with keyset pagination:
+    the ``next`` link's ``pagination_pk_query_arg`` is a token with the
+    position of the last row.  By default the lists can only be sorted by
+    the pks and the first field of each of the ``indexes``.  Pages of at most
+    ``fetch_size`` rows are returned as lists.  Larger pages are returned
+    as iterators that fetch ``fetch_size`` rows at a time while the
+    response is encoded.
+
+    ``bulk_create``, ``bulk_update`` and ``bulk_delete`` write many rows
+    with ``executemany`` in a single transaction and ``aggregate``
+    is computed with a ``GROUP BY`` query.
+
+    .. code-block:: python
+
+        class PersonManager(SqliteManager):
+            database = 'people.db'
+            table = 'person'
+            _fields = ('id', 'name', 'age')
+            _field_validators = {
+                'id': IntegerField('id'),
+                'name': StringField('name'),
+                'age': IntegerField('age'),
+            }
+            indexes = ('age',)
+
+        manager = PersonManager()
+        manager.create_table()
+
+    :param unicode database: The path of the database file.
+    :param unicode table: The name of the table.
+    :param tuple pks: The names of the primary key fields.
+    :param tuple indexes: The fields (or tuples of fields) that
+        ``create_table`` indexes.
+    :param dict column_types: Overrides the SQL types of the
+        columns created by ``create_table``.
+    :param int pool_size: The maximum number of connections.
+    :param int fetch_size: The number of rows fetched at once.
+    :param int statement_cache_size: The maximum number of statements
+        whose SQL is cached.  The least recently used are evicted.
+    :param tuple _fields: The fields of the rows.
+    """
+    database = ':memory:'
+    table = None
+    pks = ('id',)
+    indexes = ()
+    column_types = None
+    pool_size = 5
+    fetch_size = 500
+    statement_cache_size = 256
+    _fields = ()
+
+    def __init__(self, pool=None):
+        """
+        :param ConnectionPool pool: The pool to use.  Managers for
+            tables in the same database may share a pool.  A pool for
+            the ``database`` is created if it is not given.
+        """
+        super(SqliteManager, self).__init__()
+        self.pool = pool or ConnectionPool(self.database, size=self.pool_size)
+        self._statements = OrderedDict()
+        self._statements_lock = threading.Lock()
+
+    @classproperty
+    def fields(cls):
+        """
+        :return: The ``_fields`` of the manager.
+        :rtype: list
+        """
+        return list(cls._fields)
+
+    @classproperty
+    def sortable_fields(cls):
+        """
+        :return: The pks and the first field of each index.
+        :rtype: tuple
+        """
+        fields = list(cls.pks)
+        for index in cls.indexes:
+            field = index if isinstance(index, six.string_types) else index[0]
+            if field not in fields:
+                fields.append(field)
+        return tuple(fields)
+
+    @classmethod
+    def get_field_type(cls, name):
+        """
+        :param unicode name: The name of the field.
+        :return: A BaseField.  Set ``_field_validators`` to
+            use other fields.
+        :rtype: BaseField
+        """
+        return BaseField(name)
+
+    @classmethod
+    def column_type(cls, name):
+        """
+        :param unicode name: The name of a field.
+        :return: The SQL type of the field's column.
+        :rtype: unicode
+        """
+        if cls.column_types and name in cls.column_types:
+            return cls.column_types[name]
+        validator = (cls._field_validators or {}).get(name)
+        if isinstance(validator, (IntegerField, BooleanField)):
+            return 'INTEGER'
+        if isinstance(validator, FloatField):
+            return 'REAL'
+        if isinstance(validator, StringField):
+            return 'TEXT'
+        if validator is None and tuple(cls.pks) == (name,):
+            return 'INTEGER'
+        return ''
+
+    @property
+    def columns(self):
+        """
+        :return: The fields and the pks.
+        :rtype: list
+        """
+        return self.fields + [name for name in self.pks if name not in self.fields]
+
+    def create_table(self):
+        """
+        Creates the table and its indexes if they do not exist.
+        A single INTEGER pk is the table's rowid so rows created
+        without it get the next integer.
+        """
+        definitions = []
+        for name in self.columns:
+            column_type = self.column_type(name)
+            definition = '{0} {1}'.format(_quote(name), column_type).strip()
+            if tuple(self.pks) == (name,) and column_type == 'INTEGER':
+                definition += ' PRIMARY KEY'
+            elif name in self.pks:
+                definition += ' NOT NULL'
+            definitions.append(definition)
+        if tuple(self.pks) != (self.pks[0],) or self.column_type(self.pks[0]) != 'INTEGER':
+            pks = ', '.join(_quote(name) for name in self.pks)
+            definitions.append('PRIMARY KEY ({0})'.format(pks))
+        with self.pool.connection() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS {0} ({1})'.format(
+                _quote(self.table), ', '.join(definitions)))
+            for index in self.indexes:
+                index = (index,) if isinstance(index, six.string_types) else tuple(index)
+                connection.execute('CREATE INDEX IF NOT EXISTS {0} ON {1} ({2})'.format(
+                    _quote('{0}_{1}'.format(self.table, '_'.join(index))), _quote(self.table),
+                    ', '.join(_quote(name) for name in index)))
+
+    def create(self, values, *args, **kwargs):
+        """
+        Inserts a row.
+
+        :param dict values: The row's values.  Only the ``create_fields``
+            and pks are inserted.
+        :return: The created row.
+        :rtype: dict
+        :raises: ValidationException
+        """
+        row = self.valid_fields(values, set(self.create_fields) | set(self.pks))
+        names = tuple(sorted(row))
+        with self.pool.connection() as connection:
+            cursor = self._execute(connection, self._insert_sql(names),
+                                   [row[name] for name in names])
+            if len(self.pks) == 1 and row.get(self.pks[0]) is None:
+                row[self.pks[0]] = cursor.lastrowid
+            return self._retrieve(connection, self._lookup(row), self.fields)
+
+    def retrieve(self, lookup_keys, *args, **kwargs):
+        """
+        :param dict lookup_keys: The pks of the row.
+        :param list fields: The fields to select (the ``fields``
+            keyword argument).  Defaults to all of the fields.
+        :return: The row.
+        :rtype: dict
+        :raises: NotFoundException
+        """
+        with self.pool.connection() as connection:
+            return self._retrieve(connection, lookup_keys, kwargs.get('fields') or self.fields)
+
+    def retrieve_list(self, filters, *args, **kwargs):
+        """
+        :param dict filters: The filters, pagination and
+            count query arguments.
+        :param list fields: The fields to select (the ``fields``
+            keyword argument).  Defaults to the ``list_fields``.
+        :param Condition|And|Or filter: The filter from ``get_filter``
+            (the ``filter`` keyword argument).  The filters are
+            parsed if it is not given.
+        :param list sort: The order from ``get_sort`` (the ``sort``
+            keyword argument).  The filters are parsed if it is
+            not given.
+        :return: A page of rows (an iterator if there are more
+            than ``fetch_size``) and the meta data with the link
+            to the next page.
+        :rtype: tuple
+        :raises: ValidationException
+        """
+        sort = kwargs.get('sort')
+        if sort is None:
+            sort, filters = self.get_sort(filters)
+        token, filters = self.get_pagination_pks(filters)
+        count, filters = self.get_pagination_count(filters)
+        node = kwargs.get('filter')
+        if node is None:
+            node, _ = self.get_filter(filters)
+        where = self.compile_filter(node) if node is not None else None
+        fields = list(kwargs.get('fields') or self.list_fields)
+        keys = self._keys(sort)
+        with self.pool.connection() as connection:
+            start = self._decode_token(connection, token, keys) if token else None
+            if count <= self.fetch_size:
+                rows = self._select(connection, where, keys, start, None, fields, count + 1)
+                last = len(rows) > count and self._key_values(rows[count - 1], keys)
+                rows = [self._project(row, fields) for row in rows[:count]]
+            else:
+                positions = self._select(connection, where, keys, start, None,
+                                         [name for name, _ in keys], 2, offset=count - 1)
+                last = len(positions) > 1 and self._key_values(positions[0], keys)
+                end = positions and self._key_values(positions[0], keys) or None
+                rows = self._stream(where, keys, start, end, fields, count)
+        links = {}
+        if last:
+            next_page = links[self.pagination_next] = self.get_filter_args(filters)
+            next_page.update({self.pagination_pk_query_arg: self._encode_token(last),
+                              self.pagination_count_query_arg: count})
+            if sort:
+                next_page[self.sort_query_arg] = ','.join(sort)
+        return rows, {'links': links}
+
+    def update(self, lookup_keys, updates, *args, **kwargs):
+        """
+        :param dict lookup_keys: The pks of the row.
+        :param dict updates: The new values.  Only the ``update_fields``
+            are updated.  The pks can not be changed.
+        :return: The updated row.
+        :rtype: dict
+        :raises: NotFoundException
+        :raises: ValidationException
+        """
+        updates = self._valid_updates(lookup_keys, updates)
+        with self.pool.connection() as connection:
+            if updates:
+                names = tuple(sorted(updates))
+                params = [updates[name] for name in names] + self._pk_values(lookup_keys)
+                cursor = self._execute(connection, self._update_sql(names), params)
+                if not cursor.rowcount:
+                    raise NotFoundException(
+                        'No row with the primary keys {0} exists'.format(lookup_keys))
+            return self._retrieve(connection, lookup_keys, self.fields)
+
+    def delete(self, lookup_keys, *args, **kwargs):
+        """
+        :param dict lookup_keys: The pks of the row.
+        :raises: NotFoundException
+        """
+        with self.pool.connection() as connection:
+            cursor = self._execute(connection, self._delete_sql(), self._pk_values(lookup_keys))
+            if not cursor.rowcount:
+                raise NotFoundException(
+                    'No row with the primary keys {0} exists'.format(lookup_keys))
+
+    def bulk_create(self, values_list, *args, **kwargs):
+        """
+        Inserts the rows with one ``executemany`` per set of
+        fields in a single transaction.  If any row can not be
+        inserted none of them are.
+
+        :param list values_list: The rows' values.
+        :return: The number of rows inserted.
+        :rtype: int
+        :raises: ValidationException
+        """
+        valid = set(self.create_fields) | set(self.pks)
+        groups = {}
+        for values in values_list:
+            row = self.valid_fields(values, valid)
+            names = tuple(sorted(row))
+            groups.setdefault(names, []).append([row[name] for name in names])
+        with self.pool.connection() as connection:
+            for names, params in six.iteritems(groups):
+                self._execute(connection, self._insert_sql(names), params, many=True)
+        return sum(len(params) for params in groups.values())
+
+    def bulk_update(self, updates_list, *args, **kwargs):
+        """
+        Updates the rows with one ``executemany`` per set of
+        updated fields in a single transaction.
+
+        :param list updates_list: A list of ``(lookup_keys, updates)``
+            tuples.  Only the ``update_fields`` are updated.
+        :return: The number of rows updated.  Rows that do not
+            exist are skipped.
+        :rtype: int
+        :raises: ValidationException
+        """
+        groups = {}
+        for lookup_keys, updates in updates_list:
+            updates = self._valid_updates(lookup_keys, updates)
+            if updates:
+                names = tuple(sorted(updates))
+                groups.setdefault(names, []).append([updates[name] for name in names] +
+                                                    self._pk_values(lookup_keys))
+        updated = 0
+        with self.pool.connection() as connection:
+            for names, params in six.iteritems(groups):
+                cursor = self._execute(connection, self._update_sql(names), params, many=True)
+                updated += cursor.rowcount
+        return updated
+
+    def bulk_delete(self, lookup_keys_list, *args, **kwargs):
+        """
+        Deletes the rows with ``executemany`` in a single transaction.
+
+        :param list lookup_keys_list: The pks of the rows.
+        :return: The number of rows deleted.  Rows that do not
+            exist are skipped.
+        :rtype: int
+        """
+        params = [self._pk_values(lookup_keys) for lookup_keys in lookup_keys_list]
+        with self.pool.connection() as connection:
+            return self._execute(connection, self._delete_sql(), params, many=True).rowcount
+
+    def aggregate(self, filters, aggregations, group_by=None, *args, **kwargs):
+        """
+        Computes the aggregations with a single SELECT grouped by the
+        ``group_by`` fields so only the results leave the database.
+
+        :param dict filters: The filters.
+        :param list aggregations: The Aggregation instances.
+        :param list group_by: The fields to group the rows by.
+        :param Condition|And|Or filter: The filter from ``get_filter``
+            (the ``filter`` keyword argument).  The filters are
+            parsed if it is not given.
+        :return: A dictionary per group ordered by the group_by fields.
+        :rtype: list
+        :raises: ValidationException
+        """
+        node = kwargs.get('filter')
+        if node is None:
+            node, _ = self.get_filter(filters)
+        where = self.compile_filter(node) if node is not None else None
+        group_by, aggregations = tuple(group_by or ()), tuple(aggregations)
+        key = ('aggregate', where and where[0], group_by, aggregations)
+        sql = self._statement(key, lambda: self._aggregate_sql(where, group_by, aggregations))
+        names = list(group_by) + [aggregation.name for aggregation in aggregations]
+        with self.pool.connection() as connection:
+            cursor = self._execute(connection, sql, list(where[1]) if where else [])
+            return [dict(six.moves.zip(names, row)) for row in cursor.fetchall()]
+
+    def analyze(self):
+        """
+        Runs ANALYZE on the table so that sqlite (and
+        ``statistics``) know the number of rows and how
+        selective the indexes are.  Run it again after the
+        table changed significantly.
+        """
+        with self.pool.connection() as connection:
+            connection.execute('ANALYZE {0}'.format(_quote(self.table)))
+
+    def statistics(self):
+        """
+        Reads the statistics gathered by ``analyze`` from the
+        ``sqlite_stat1`` table.  The number of distinct values is
+        known for the first field of each index.  If the table has
+        not been analyzed the number of rows is the largest rowid.
+
+        :return: The number of rows and the number of distinct
+            values of the fields.
+        :rtype: tuple
+        """
+        first_fields = {}
+        for index in self.indexes:
+            index = (index,) if isinstance(index, six.string_types) else tuple(index)
+            first_fields['{0}_{1}'.format(self.table, '_'.join(index))] = index[0]
+        rows, distinct = None, {}
+        with self.pool.connection() as connection:
+            try:
+                stats = connection.execute('SELECT idx, stat FROM sqlite_stat1 WHERE tbl = ?',
+                                           [self.table]).fetchall()
+            except sqlite3.OperationalError:
+                stats = []
+            for index, stat in stats:
+                numbers = [int(number) for number in stat.split()[:2]]
+                rows = numbers[0]
+                if index in first_fields and len(numbers) > 1 and numbers[1]:
+                    distinct[first_fields[index]] = max(1, rows // numbers[1])
+            if rows is None:
+                sql = 'SELECT MAX(rowid) FROM {0}'.format(_quote(self.table))
+                rows = connection.execute(sql).fetchone()[0] or 0
+        if len(self.pks) == 1:
+            distinct[self.pks[0]] = rows
+        return rows, distinct
+
+    def _valid_updates(self, lookup_keys, updates):
+        """
+        :return: The updates of the ``update_fields`` without
+            the pks.
+        :rtype: dict
+        :raises: ValidationException
+        """
+        updates = self.valid_fields(updates, self.update_fields)
+        for name in self.pks:
+            if name in updates:
+                if updates[name] != lookup_keys.get(name):
+                    raise ValidationException(
+                        'The primary key "{0}" can not be updated'.format(name))
+                del updates[name]
+        return updates
+
+    def _execute(self, connection, sql, params, many=False):
+        """
+        Executes the statement and translates integrity
+        errors to ValidationExceptions.
+
+        :rtype: sqlite3.Cursor
+        """
+        try:
+            if many:
+                return connection.executemany(sql, params)
+            return connection.execute(sql, params)
+        except sqlite3.IntegrityError as exc:
+            raise ValidationException(six.text_type(exc))
+
+    def _statement(self, key, build):
+        """
+        :param tuple key: Identifies the kind of statement.
+        :param function build: Returns the SQL for the key.
+        :return: The SQL.  It is only built again once the key
+            has been evicted from the cache.
+        :rtype: unicode
+        """
+        with self._statements_lock:
+            sql = self._statements.pop(key, None)
+            if sql is not None:
+                self._statements[key] = sql
+                return sql
+        sql = build()
+        with self._statements_lock:
+            self._statements[key] = sql
+            while len(self._statements) > self.statement_cache_size:
+                self._statements.popitem(last=False)
+        return sql
+
+    def _insert_sql(self, names):
+        return self._statement(('insert', names), lambda: (
+            'INSERT INTO {0} ({1}) VALUES ({2})'.format(
+                _quote(self.table), ', '.join(_quote(name) for name in names),
+                ', '.join('?' * len(names)))))
+
+    def _update_sql(self, names):
+        return self._statement(('update', names), lambda: 'UPDATE {0} SET {1} WHERE {2}'.format(
+            _quote(self.table), ', '.join('{0} = ?'.format(_quote(name)) for name in names),
+            self._pk_where()))
+
+    def _delete_sql(self):
+        return self._statement(('delete',), lambda: 'DELETE FROM {0} WHERE {1}'.format(
+            _quote(self.table), self._pk_where()))
+
+    def _pk_where(self):
+        return ' AND '.join('{0} = ?'.format(_quote(name)) for name in self.pks)
+
+    def _pk_values(self, values):
+        return [values.get(name) for name in self.pks]
+
+    def _lookup(self, row):
+        return dict((name, row.get(name)) for name in self.pks)
+
+    def _retrieve(self, connection, lookup_keys, fields):
+        """
+        :return: The fields of the row with the lookup keys.
+        :rtype: dict
+        :raises: NotFoundException
+        """
+        fields = tuple(fields)
+        sql = self._statement(('retrieve', fields), lambda: 'SELECT {0} FROM {1} WHERE {2}'.format(
+            ', '.join(_quote(name) for name in fields), _quote(self.table), self._pk_where()))
+        row = connection.execute(sql, self._pk_values(lookup_keys)).fetchone()
+        if row is None:
+            raise NotFoundException('No row with the primary keys {0} exists'.format(lookup_keys))
+        return dict(six.moves.zip(fields, row))
+
+    def _keys(self, sort=None):
+        """
+        :param list sort: The requested order or None
+        :return: The ``(field, descending)`` tuples the lists are
+            ordered by.  Ties are ordered by the pks in the
+            direction of the last field.
+        :rtype: list
+        """
+        keys = [(name.lstrip('-'), name.startswith('-')) for name in sort or self.order_by or ()]
+        descending = bool(keys) and keys[-1][1]
+        names = set(name for name, _ in keys)
+        return keys + [(name, descending) for name in self.pks if name not in names]
+
+    def compile_filter(self, node):
+        """
+        :param Condition|And|Or node: The filter.
+        :return: The SQL for the WHERE clause and its parameters.
+        :rtype: tuple
+        """
+        return SqlCompiler().compile(node)
+
+    def _select(self, connection, where, keys, start, end, fields, limit, offset=0):
+        """
+        :param tuple where: The compiled filter or None.
+        :param list keys: The keys from _keys.
+        :param list start: The key values of the row to start
+            after or None.
+        :param list end: The key values of the last row to
+            select or None.
+        :param list fields: The fields to return.
+        :param int limit: The maximum number of rows or None.
+        :param int offset: The number of rows to skip.
+        :return: The rows with the fields and the keys.
+        :rtype: list
+        """
+        cursor, names = self._list_cursor(connection, where, keys, start, end, fields, limit,
+                                          offset)
+        return [dict(six.moves.zip(names, row)) for row in cursor.fetchall()]
+
+    def _stream(self, where, keys, start, end, fields, limit):
+        """
+        A generator of the rows between the start and end that
+        fetches ``fetch_size`` rows at a time.  The connection is
+        only held while the rows are iterated.
+        """
+        with self.pool.connection() as connection:
+            cursor, names = self._list_cursor(connection, where, keys, start, end, fields,
+                                              None if end else limit)
+            try:
+                while True:
+                    rows = cursor.fetchmany(self.fetch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield dict(six.moves.zip(fields, row))
+            finally:
+                cursor.close()
+
+    def _list_cursor(self, connection, where, keys, start, end, fields, limit, offset=0):
+        """
+        :return: The cursor of the query for the list and
+            the names of its columns.
+        :rtype: tuple
+        """
+        names = list(fields) + [name for name, _ in keys if name not in fields]
+        params = list(where[1]) if where else []
+        if start is not None:
+            params.extend(_keyset(keys, start)[1])
+        if end is not None:
+            params.extend(_keyset(keys, end, before=True)[1])
+            end_row = dict(six.moves.zip((name for name, _ in keys), end))
+            params.extend(self._pk_values(end_row))
+        if limit is not None:
+            params.extend([limit, offset])
+        key = ('list', where and where[0], tuple(keys), tuple(names),
+               start and tuple(value is None for value in start),
+               end and tuple(value is None for value in end), limit is not None)
+        sql = self._statement(key, lambda: self._list_sql(where, keys, start, end, names,
+                                                          limit is not None))
+        return connection.execute(sql, params), names
+
+    def _list_sql(self, where, keys, start, end, names, limited):
+        """
+        :return: The SELECT statement for a list query.
+        :rtype: unicode
+        """
+        where = [where[0]] if where else []
+        if start is not None:
+            where.append(_keyset(keys, start)[0])
+        if end is not None:
+            where.append('({0} OR ({1}))'.format(_keyset(keys, end, before=True)[0],
+                                                 self._pk_where()))
+        sql = 'SELECT {0} FROM {1}'.format(', '.join(_quote(name) for name in names),
+                                           _quote(self.table))
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY ' + ', '.join('{0}{1}'.format(_quote(name), ' DESC' if descending else '')
+                                        for name, descending in keys)
+        if limited:
+            sql += ' LIMIT ? OFFSET ?'
+        return sql
+
+    def _aggregate_sql(self, where, group_by, aggregations):
+        """
+        :return: The SELECT statement for the aggregations.
+        :rtype: unicode
+        """
+        columns = [_quote(name) for name in group_by]
+        columns.extend('COUNT(*)' if aggregation.field is None else
+                       '{0}({1})'.format(aggregation.function.upper(), _quote(aggregation.field))
+                       for aggregation in aggregations)
+        sql = 'SELECT {0} FROM {1}'.format(', '.join(columns), _quote(self.table))
+        if where:
+            sql += ' WHERE ' + where[0]
+        if group_by:
+            grouped = ', '.join(_quote(name) for name in group_by)
+            sql += ' GROUP BY {0} ORDER BY {0}'.format(grouped)
+        return sql
+
+    @staticmethod
+    def _key_values(row, keys):
+        return [row[name] for name, _ in keys]
+
+    def _project(self, row, fields):
+        return dict((name, row[name]) for name in fields)
+
+    def _encode_token(self, values):
+        """
+        :param list values: The key values of the last row of a page.
+        :return: The pagination token for the next page.  The row is
+            looked up by its pks when the values are not json serializable.
+        :rtype: unicode
+        """
+        try:
+            encoded = json.dumps([values])
+        except TypeError:
+            encoded = json.dumps([values[len(values) - len(self.pks):], True])
+        return base64.urlsafe_b64encode(encoded.encode('utf-8')).decode('ascii')
+
+    def _decode_token(self, connection, token, keys):
+        """
+        :param unicode token: A token from _encode_token.
+        :return: The key values of the position.
+        :rtype: list
+        :raises: ValidationException
+        """
+        if isinstance(token, (list, tuple)):
+            token = token[0] if token else ''
+        invalid = ValidationException('The {0} "{1}" is not valid'.format(
+            self.pagination_pk_query_arg, token))
+        try:
+            decoded = base64.urlsafe_b64decode(six.text_type(token).encode('ascii'))
+            position = json.loads(decoded.decode('utf-8'))
+        except (ValueError, TypeError, binascii.Error, UnicodeError):
+            raise invalid
+        scalars = (six.string_types, six.integer_types, float)
+        if not isinstance(position, list) or len(position) not in (1, 2) \
+                or not isinstance(position[0], list) \
+                or not all(value is None or isinstance(value, scalars) for value in position[0]):
+            raise invalid
+        values = position[0]
+        if len(position) == 2:
+            if len(values) != len(self.pks):
+                raise invalid
+            try:
+                row = self._retrieve(connection, dict(six.moves.zip(self.pks, values)),
+                                     [name for name, _ in keys])
+            except NotFoundException:
+                raise ValidationException('The row at the {0} "{1}" no longer '
+                                          'exists'.format(self.pagination_pk_query_arg, token))
+            return self._key_values(row, keys)
+        if len(values) != len(keys):
+            raise invalid
+        return values
+
+
+def _keyset(keys, values, before=False):
+    """
+    NULLs sort before every other value like they do in sqlite.
+
+    :param list keys: The ``(field, descending)`` tuples the
+        rows are ordered by.
+    :param list values: The key values of a row.
+    :param bool before: Whether the rows before the row are
+        wanted instead of the rows after it.
+    :return: The SQL for the rows strictly after (or before)
+        the row and its parameters.
+    :rtype: tuple
+    """
+    disjuncts, params, equal, equal_params = [], [], [], []
+    for (name, descending), value in six.moves.zip(keys, values):
+        column = _quote(name)
+        if descending == before:
+            strict = '{0} IS NOT NULL'.format(column) if value is None else '{0} > ?'.format(column)
+        else:
+            strict = None if value is None else '({0} < ? OR {0} IS NULL)'.format(column)
+        if strict is not None:
+            disjuncts.append(' AND '.join(equal + [strict]))
+            params.extend(equal_params)
+            if value is not None:
+                params.append(value)
+        if value is None:
+            equal.append('{0} IS NULL'.format(column))
+        else:
+            equal.append('{0} = ?'.format(column))
+            equal_params.append(value)
+    if not disjuncts:
+        return '0', params
+    return '(({0}))'.format(') OR ('.join(disjuncts)), params
@@ -7,7 +7,7 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from ripozo.exceptions import ValidationException
+from ripozo.exceptions import ValidationException, BatchValidationException
 
 
 class BaseField(object):
@@ -44,6 +44,30 @@ class BaseField(object):
             obj = self._validate(obj, skip_required=skip_required)
         return obj
 
+    def translate_many(self, values, skip_required=False, validate=False):
+        """
+        Translates (and validates) each of the values.  Unlike
+        calling translate for each value it does not stop at the
+        first failure.
+
+        :param list values: The values to translate.
+        :param bool skip_required: Passed to translate.
+        :param bool validate: Passed to translate.
+        :return: The translated values in the same order.
+        :rtype: list
+        :raises: ripozo.exceptions.BatchValidationException
+        """
+        translated, errors = [], []
+        for index, obj in enumerate(values):
+            try:
+                translated.append(self.translate(obj, skip_required=skip_required, validate=validate))
+            except ValidationException as exc:
+                translated.append(None)
+                errors.append((index, self.name, exc))
+        if errors:
+            raise BatchValidationException(errors)
+        return translated
+
     def _translate(self, obj, skip_required=False):
         """
         This method is responsible for translating an input
@@ -173,3 +197,41 @@ def translate_fields(request, fields=None, skip_required=False, validate=False):
             request.set(field.name, field_value, location=field.arg_type)
 
     return updated_url_params, updated_query_args, updated_body_args
+
+
+def translate_records(records, fields=None, skip_required=False, validate=False):
+    """
+    Translates (and validates) many records (e.g. the items of a
+    bulk request body) one field at a time with the fields'
+    translate_many.  A field that is missing from a record is
+    handled the same way as translate_fields handles it.
+
+    :param list records: A list of dictionaries.
+    :param list fields: The BaseField instances to translate.
+    :param bool skip_required: A flag that indicates the required fields
+        are not required.
+    :param bool validate: A flag that indicates whether the field validations
+        should be run.
+    :return: Copies of the records with the translated values.
+    :rtype: list
+    :raises: ripozo.exceptions.BatchValidationException
+    """
+    translated_records = [dict(record) for record in records]
+    errors = []
+    for field in fields or []:
+        name = field.name
+        indexes = [index for index, record in enumerate(records)
+                   if not skip_required or name in record]
+        try:
+            values = field.translate_many([records[index].get(name) for index in indexes],
+                                          skip_required=skip_required, validate=validate)
+        except BatchValidationException as exc:
+            errors.extend((indexes[position], field_name, error) for position, field_name, error in exc.errors)
+            continue
+        for index, value in zip(indexes, values):
+            if name in records[index]:
+                translated_records[index][name] = value
+    if errors:
+        errors.sort(key=lambda error: error[0])
+        raise BatchValidationException(errors)
+    return translated_records
@@ -8,12 +8,87 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 from datetime import datetime
-from ripozo.exceptions import ValidationException, TranslationException
+from ripozo.exceptions import ValidationException, TranslationException, \
+    BatchValidationException
 from ripozo.resources.fields.base import BaseField
+from ripozo.resources.fields.datetime_parser import DateTimeParser
 
 import six
 
 
+_NUMBER_METHODS = ('translate', '_translate', '_validate', '_validate_required', '_validate_type')
+
+
+def _overrides_number_methods(field, cls):
+    """
+    Whether the field's class overrides any of the methods that
+    translate and validate a value of ``cls``.  The column fast path
+    of ``_translate_many_numbers`` would skip the overrides.
+
+    :param BaseField field: An IntegerField or FloatField.
+    :param type cls: IntegerField or FloatField.
+    :rtype: bool
+    """
+    field_class = type(field)
+    for name in _NUMBER_METHODS:
+        method = six.get_unbound_function(getattr(field_class, name))
+        if method is not six.get_unbound_function(getattr(cls, name)):
+            return True
+    return False
+
+
+def _translate_many_numbers(field, values, cast, skip_required=False, validate=False):
+    """
+    The translate_many of the numeric fields.  Values that can be
+    cast directly (the common case) are cast in a single loop and the
+    minimum and maximum are checked against the column's min and max
+    so that only a column with a value out of range is checked value
+    by value.  Any other value (None, lists or values that fail to
+    cast) is passed to the field's translate so the results and
+    errors are the same.  It is not used for fields that override
+    the translation or validation (see ``_overrides_number_methods``).
+
+    :param BaseField field: An IntegerField or FloatField.
+    :param list values: The values to translate.
+    :param type cast: ``int`` or ``float``.
+    :param bool skip_required: Passed to translate.
+    :param bool validate: Whether to validate the values.
+    :return: The translated values.
+    :rtype: list
+    :raises: BatchValidationException
+    """
+    translated, errors, cast_indexes = [], [], []
+    for index, obj in enumerate(values):
+        if obj is not None and not isinstance(obj, (list, set)):
+            try:
+                obj = cast(obj)
+            except (ValueError, TypeError):
+                pass
+            else:
+                translated.append(obj)
+                if obj == obj:  # NaN is never out of range
+                    cast_indexes.append(index)
+                continue
+        try:
+            translated.append(field.translate(obj, skip_required=skip_required, validate=validate))
+        except ValidationException as exc:
+            translated.append(None)
+            errors.append((index, field.name, exc))
+    if validate and cast_indexes and (field.minimum or field.maximum):
+        column = [translated[index] for index in cast_indexes]
+        if (field.minimum and min(column) < field.minimum) or (field.maximum and max(column) > field.maximum):
+            for index in cast_indexes:
+                try:
+                    field._validate_size(translated[index], translated[index])
+                except ValidationException as exc:
+                    translated[index] = None
+                    errors.append((index, field.name, exc))
+            errors.sort(key=lambda error: error[0])
+    if errors:
+        raise BatchValidationException(errors)
+    return translated
+
+
 class StringField(BaseField):
     """
     Used for casting and validating string fields.
@@ -91,6 +166,11 @@ class IntegerField(BaseField):
             raise TranslationException(self.error_message or
                                        'Not a valid integer type: {0}'.format(obj))
 
+    def translate_many(self, values, skip_required=False, validate=False):
+        if _overrides_number_methods(self, IntegerField):
+            return super(IntegerField, self).translate_many(values, skip_required=skip_required, validate=validate)
+        return _translate_many_numbers(self, values, int, skip_required=skip_required, validate=validate)
+
     def _validate(self, obj, skip_required=False):
         obj = super(IntegerField, self)._validate(obj, skip_required=skip_required)
         if obj is None:
@@ -118,6 +198,11 @@ class FloatField(BaseField):
             raise TranslationException(self.error_message or
                                        'obj is not castable to float: {0}'.format(obj))
 
+    def translate_many(self, values, skip_required=False, validate=False):
+        if _overrides_number_methods(self, FloatField):
+            return super(FloatField, self).translate_many(values, skip_required=skip_required, validate=validate)
+        return _translate_many_numbers(self, values, float, skip_required=skip_required, validate=validate)
+
     def _validate(self, obj, skip_required=False):
         obj = super(FloatField, self)._validate(obj, skip_required=skip_required)
         if obj is None:
@@ -161,9 +246,15 @@ class DateTimeField(BaseField):
 
     If you need other formats simply pass a list of valid formats
     into the valid_formats parameter on initialization
+
+    The formats are parsed with a DateTimeParser which gives the
+    same results as ``datetime.strptime`` but precompiles the formats
+    and, when no string can match more than one of the formats,
+    tries the format that matched last first.
     """
     field_type = datetime
     valid_formats = ['%Y-%m-%dT%H:%M:%S.%fZ']
+    _parser = None
 
     def __init__(self, name, valid_formats=None, **kwargs):
         """
@@ -179,7 +270,7 @@ class DateTimeField(BaseField):
         First checks if the obj is None or already a datetime object
         Returns that if true.  Otherwise assumes that it is a string
         and attempts to parse it out using the formats in self.valid_formats
-        and the datetime.strptime method
+        (giving the same result as the datetime.strptime method)
 
         Additionally it strips out any whitespace from the beginning and
         end of the input before attempting to parse out a datetime string
@@ -191,15 +282,25 @@ class DateTimeField(BaseField):
         if obj is None or isinstance(obj, datetime):
             return obj
         obj = obj.strip()
-        for date_format in self.valid_formats:
-            try:
-                return datetime.strptime(obj, date_format)
-            except ValueError:
-                continue
+        parsed = self.parser.parse(obj)
+        if parsed is not None:
+            return parsed
         raise TranslationException(self.error_message or
                                    'The object ({0}) could not be parsed as a datetime '
                                    'string using the formats {1}'.format(obj, self.valid_formats))
 
+    @property
+    def parser(self):
+        """
+        :return: The parser for the valid_formats.  It is
+            rebuilt if the valid_formats change.
+        :rtype: DateTimeParser
+        """
+        parser = self._parser
+        if parser is None or parser.formats != tuple(self.valid_formats):
+            parser = self._parser = DateTimeParser(self.valid_formats)
+        return parser
+
     def _validate(self, obj, skip_required=False):
         """
         Just makes a size check on top of instance type check
@@ -243,11 +344,11 @@ class ListField(BaseField):
         obj = super(ListField, self).translate(obj, **kwargs)
         if obj is None:
             return obj
-        translated_list = []
-        for field in obj:
-            translated_field = self.indv_field.translate(field, **kwargs)
-            translated_list.append(translated_field)
-        return translated_list
+        try:
+            return self.indv_field.translate_many(obj, **kwargs)
+        except BatchValidationException as exc:
+            # Raise the same exception as translating the items one at a time
+            raise exc.errors[0][2]
 
     def _translate(self, obj, skip_required=False):
         if obj is None:  # let the validation handle it.
@@ -0,0 +1,308 @@
+"""
+Precompiled parsers for the formats accepted by the DateTimeField.
+They give the same results as ``datetime.strptime`` without
+raising (and catching) a ValueError for every format that
+does not match.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from datetime import datetime
+
+import re
+
+# The same patterns (and flags) that ``_strptime`` uses for the directives.
+_DIRECTIVES = {
+    'd': r'(?P<d>3[0-1]|[1-2]\d|0[1-9]|[1-9]| [1-9])',
+    'f': r'(?P<f>[0-9]{1,6})',
+    'H': r'(?P<H>2[0-3]|[0-1]\d|\d)',
+    'm': r'(?P<m>1[0-2]|0[1-9]|[1-9])',
+    'M': r'(?P<M>[0-5]\d|\d)',
+    'S': r'(?P<S>6[0-1]|[0-5]\d|\d)',
+    'y': r'(?P<y>\d\d)',
+    'Y': r'(?P<Y>\d\d\d\d)',
+}
+_FAST_DIRECTIVES = dict(d='([0-9]{2})', f='([0-9]{1,6})', H='([0-9]{2})', m='([0-9]{2})',
+                       M='([0-9]{2})', S='([0-9]{2})', y='([0-9]{2})', Y='([0-9]{4})')
+_REGEX_CHARS = re.compile(r'([\\.^$*+?\(\){}\[\]|])')
+_WHITESPACE = re.compile(r'\s+')
+_ISO_ORDER = ('Y', 'm', 'd', 'H', 'M', 'S', 'f')
+_SLOTS = dict(Y=0, y=0, m=1, d=2, H=3, M=4, S=5, f=6)
+
+_FORMAT_PARSERS = {}
+
+
+class _UnsupportedFormat(Exception):
+    """
+    Raised when a format uses directives that can
+    only be parsed by ``strptime``.
+    """
+
+
+class FormatParser(object):
+    """
+    A parser for a single ``strptime`` format that only uses the
+    numeric directives (``%Y``, ``%y``, ``%m``, ``%d``, ``%H``, ``%M``,
+    ``%S`` and ``%f``).  The format is compiled to the regular expression
+    ``strptime`` would use.
+
+    Strings where every field has its canonical width (e.g. ISO-8601
+    timestamps like ``2015-02-10T18:15:15.123Z``) are first matched by
+    a stricter expression.  When it matches, the general expression
+    would match the same fields so the datetime is built directly.
+    When the fields are in ISO-8601 order they are converted in a single
+    pass.  The fast path is not used when ``%f`` is followed by
+    another directive since the general expression may split the
+    digits differently.
+
+    :param unicode date_format: The format.
+    :param list directives: The directives in the order they appear.
+    :param unicode skeleton: The literal characters that are neither
+        digits nor whitespace (lowercased).  A string can only match two
+        formats if their skeletons are the same.  It is None if the
+        literals are not ASCII since case insensitive matching of
+        other characters is not as simple.
+    """
+    __slots__ = ('date_format', 'regex', 'fast_regex', 'directives', 'skeleton', 'build')
+
+    def __init__(self, date_format):
+        self.date_format = date_format
+        tokens = _tokenize(date_format)
+        self.directives = tuple(token for is_directive, token in tokens if is_directive)
+        if len(set(self.directives)) != len(self.directives) \
+                or 'Y' in self.directives and 'y' in self.directives:
+            raise _UnsupportedFormat(date_format)
+        pattern, fast_pattern, literals = [], [], []
+        for is_directive, token in tokens:
+            if is_directive:
+                pattern.append(_DIRECTIVES[token])
+                fast_pattern.append(_FAST_DIRECTIVES[token])
+            else:
+                pattern.append(_WHITESPACE.sub(r'\\s+', _REGEX_CHARS.sub(r'\\\1', token)))
+                fast_pattern.append(re.escape(token))
+                literals.append(token)
+        self.regex = re.compile(''.join(pattern), re.IGNORECASE)
+        self.fast_regex = None
+        if _fast_path_is_exact(tokens):
+            self.fast_regex = re.compile(''.join(fast_pattern) + r'\Z', re.IGNORECASE)
+        self.skeleton = _skeleton(''.join(literals))
+        if len(self.directives) >= 3 and self.directives == _ISO_ORDER[:len(self.directives)]:
+            self.build = _build_iso_ordered
+        else:
+            self.build = _make_builder(self.directives)
+
+    def parse(self, value):
+        """
+        :param unicode value: The string to parse.
+        :return: The same datetime as ``datetime.strptime`` or
+            None if strptime would raise a ValueError.
+        :rtype: datetime
+        """
+        if self.fast_regex is not None:
+            match = self.fast_regex.match(value)
+            if match is not None:
+                parsed = self.build(match.groups())
+                if parsed is not None:
+                    return parsed
+        match = self.regex.match(value)
+        if match is None or match.end() != len(value):
+            return None
+        return self.build(match.groups())
+
+
+class StrptimeFormatParser(object):
+    """
+    Parses formats with directives that FormatParser
+    does not support (e.g. ``%b`` or ``%z``) with strptime.
+
+    :param unicode date_format: The format.
+    """
+    __slots__ = ('date_format',)
+    skeleton = None
+
+    def __init__(self, date_format):
+        self.date_format = date_format
+
+    def parse(self, value):
+        """
+        :param unicode value: The string to parse.
+        :return: The parsed datetime or None.
+        :rtype: datetime
+        """
+        try:
+            return datetime.strptime(value, self.date_format)
+        except ValueError:
+            return None
+
+
+def get_format_parser(date_format):
+    """
+    Gets the parser for the format.  Parsers are compiled
+    once and shared.
+
+    :param unicode date_format: A ``strptime`` format.
+    :return: A FormatParser or, for formats that it can
+        not parse, a StrptimeFormatParser.
+    :rtype: FormatParser|StrptimeFormatParser
+    """
+    parser = _FORMAT_PARSERS.get(date_format)
+    if parser is None:
+        try:
+            parser = FormatParser(date_format)
+        except _UnsupportedFormat:
+            parser = StrptimeFormatParser(date_format)
+        _FORMAT_PARSERS[date_format] = parser
+    return parser
+
+
+class DateTimeParser(object):
+    """
+    Parses a string with the first of the formats that matches
+    it.  The formats are tried in order except that, when no string
+    can match more than one of them, the format that matched last
+    is tried first.  This is the case when each format is parsed by
+    a FormatParser and their skeletons are distinct.
+
+    :param list formats: The ``strptime`` formats.
+    """
+    def __init__(self, formats):
+        self.formats = tuple(formats)
+        self.parsers = tuple(get_format_parser(date_format) for date_format in self.formats)
+        skeletons = [parser.skeleton for parser in self.parsers]
+        self.reorder = None not in skeletons and len(set(skeletons)) == len(skeletons)
+        self._order = self.parsers
+
+    def parse(self, value):
+        """
+        :param unicode value: The string to parse
+        :return: The datetime or None if none of the formats match.
+        :rtype: datetime
+        """
+        order = self._order
+        for index, parser in enumerate(order):
+            parsed = parser.parse(value)
+            if parsed is not None:
+                if index and self.reorder:
+                    self._order = (parser,) + order[:index] + order[index + 1:]
+                return parsed
+        return None
+
+
+def _tokenize(date_format):
+    """
+    :param unicode date_format: A strptime format.
+    :return: A list of ``(is_directive, token)`` tuples.  Literals
+        next to each other are joined.
+    :rtype: list
+    :raises: _UnsupportedFormat
+    """
+    tokens, literal, index = [], [], 0
+    while index < len(date_format):
+        char = date_format[index]
+        if char != '%':
+            literal.append(char)
+            index += 1
+            continue
+        if index + 1 >= len(date_format):
+            raise _UnsupportedFormat(date_format)
+        directive = date_format[index + 1]
+        index += 2
+        if directive == '%':
+            literal.append('%')
+            continue
+        if directive not in _DIRECTIVES:
+            raise _UnsupportedFormat(date_format)
+        if literal:
+            tokens.append((False, ''.join(literal)))
+            literal = []
+        tokens.append((True, directive))
+    if literal:
+        tokens.append((False, ''.join(literal)))
+    return tokens
+
+
+def _skeleton(literals):
+    """
+    :param unicode literals: The literal characters of a format.
+    :return: The lowercased characters that are neither digits
+        nor whitespace or None if any of them are not ASCII.
+    :rtype: unicode
+    """
+    if any(ord(char) > 127 for char in literals):
+        return None
+    return ''.join(char for char in literals.lower() if not char.isspace() and not char.isdigit())
+
+
+def _fast_path_is_exact(tokens):
+    """
+    :param list tokens: The tokens from _tokenize
+    :return: Whether ``%f`` is last or followed by a literal
+        that does not start with a digit.
+    :rtype: bool
+    """
+    for index, (is_directive, token) in enumerate(tokens):
+        if not is_directive or token != 'f' or index + 1 == len(tokens):
+            continue
+        next_is_directive, next_token = tokens[index + 1]
+        if next_is_directive or next_token[0].isdigit():
+            return False
+    return True
+
+
+def _convert(directive, text):
+    """
+    Converts the matched text the way ``_strptime`` does.
+
+    :param unicode directive: The directive.
+    :param unicode text: The text it matched.
+    :return: The value for the datetime argument.
+    :rtype: int
+    """
+    if directive == 'y':
+        year = int(text)
+        return year + (2000 if year <= 68 else 1900)
+    if directive == 'f':
+        return int(text + '0' * (6 - len(text)))
+    return int(text)
+
+
+def _make_builder(directives):
+    """
+    :param tuple directives: The directives of a format.
+    :return: A function that builds the datetime from the matched
+        groups or returns None if they are out of range.
+    :rtype: function
+    """
+    plan = tuple((_SLOTS[directive], directive) for directive in directives)
+
+    def build(groups):
+        values = [1900, 1, 1, 0, 0, 0, 0]
+        for (slot, directive), text in zip(plan, groups):
+            values[slot] = _convert(directive, text)
+        try:
+            return datetime(*values)
+        except ValueError:
+            return None
+    return build
+
+
+def _build_iso_ordered(groups):
+    """
+    Builds the datetime for formats whose directives are a
+    prefix (of at least ``%Y%m%d``) of ``%Y%m%d%H%M%S%f``.
+
+    :param tuple groups: The matched groups.
+    :return: The datetime or None if the values are out of range.
+    :rtype: datetime
+    """
+    values = [int(text) for text in groups]
+    if len(groups) == 7:
+        fraction = groups[6]
+        if len(fraction) != 6:
+            values[6] = int(fraction + '0' * (6 - len(fraction)))
+    try:
+        return datetime(*values)
+    except ValueError:
+        return None
@@ -10,6 +10,8 @@ from __future__ import unicode_literals
 from ripozo.resources.relationships.relationship import Relationship
 from ripozo.utilities import get_or_pop
 
+import itertools
+
 
 class ListRelationship(Relationship):
     """
@@ -28,12 +30,20 @@ class ListRelationship(Relationship):
             on the parent model.  The list_name provided in the construction
             of an instance of this class is used to find the list that will be
             iterated over to generate the resources.
-        :return: A generator that yields the relationships.
-        :rtype: types.GeneratorType
+        If the list is not a materialized list, tuple or set (for
+        example a generator or cursor returned by the manager's
+        retrieve_list) the resources are constructed lazily and
+        a generator is returned instead.  Each resource is only
+        constructed when the adapter consumes it.
+
+        :return: A list of the resources or a generator that yields them.
+        :rtype: list|types.GeneratorType
         """
 
         resource_name = self.relation.resource_name
         objects = get_or_pop(properties, resource_name, [], pop=self.remove_properties)
+        if not isinstance(objects, (list, tuple, set)):
+            return self._construct_resources_lazily(objects)
         resources = []
         for obj in objects:
             res = super().construct_resource(obj)
@@ -44,3 +54,34 @@ class ListRelationship(Relationship):
         if not resources:
             return None
         return resources
+
+    def _construct_resources_lazily(self, objects):
+        """
+        Peeks at the first item of the iterable so that
+        an empty iterable still results in None.  Otherwise
+        it returns a generator that constructs the resources
+        one at a time.
+
+        :param Iterable objects: The iterable of properties
+        :return: A generator of the related resources or None
+        :rtype: types.GeneratorType
+        """
+        objects = iter(objects)
+        try:
+            first = next(objects)
+        except StopIteration:
+            return None
+        return self._iter_resources(itertools.chain((first,), objects))
+
+    def _iter_resources(self, objects):
+        """
+        Yields a resource for each set of properties in objects.
+        Properties that can not construct a valid resource are skipped.
+
+        :param Iterable objects: The iterable of properties
+        :rtype: types.GeneratorType
+        """
+        for obj in objects:
+            res = super(ListRelationship, self).construct_resource(obj)
+            if res is not None:
+                yield res
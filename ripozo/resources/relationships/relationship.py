@@ -177,17 +177,18 @@ class Relationship(object):
         :raises: KeyError
         """
         properties = {}
-        parent_properties = parent_properties_orig.copy() # or copy?
-        parprop = parent_properties.copy()
+        parent_properties = parent_properties_orig.copy()
 
         # Use the mapper to translate the properties
         for parent_prop, prop in six.iteritems(self.property_map):
             val = get_or_pop(parent_properties, parent_prop, pop=self.remove_properties)
             if val is not None:
-                _logger.info("Value found for key <{0}> sent to related object <{1}> - <{2}> is available in {3}".format(prop, self._relation, parent_prop, parprop))
+                _logger.info('Value found for key <%s> sent to related object <%s> - <%s> is available',
+                             prop, self._relation, parent_prop)
                 properties[prop] = val
             else:
-                _logger.warn("No value found for key <{0}> sent to related object <{1}> - <{2}> is not available in {3}".format(prop, self._relation, parent_prop, parprop))
+                _logger.warn('No value found for key <%s> sent to related object <%s> - <%s> is not available in %s',
+                             prop, self._relation, parent_prop, parent_properties_orig)
 
         # Also copy the properties where the name is equal to the resource name
         # TODO: Why? What is this for?
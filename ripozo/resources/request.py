@@ -6,8 +6,124 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+from ripozo.instrumentation.tracing import extract_trace_context
 from ripozo.resources.constants import input_categories
 
+import threading
+
+import six
+
+_local = threading.local()
+
+
+class IdentityMap(object):
+    """
+    A request scoped cache of the models retrieved by managers.
+    Managers opt into it with ``use_identity_map``.  Entries
+    are keyed by the manager and the lookup keys (and fields)
+    that were used to retrieve them.
+    """
+    def __init__(self):
+        self._models = {}
+
+    @staticmethod
+    def key(lookup_keys, fields=None):
+        """
+        :param dict lookup_keys: The lookup keys passed to retrieve
+        :param list fields: The requested fields if any.
+        :return: The key for the lookup or None if the
+            lookup keys can not be hashed.
+        :rtype: tuple
+        """
+        try:
+            key = (frozenset(six.iteritems(lookup_keys)), tuple(fields) if fields is not None else None)
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get(self, manager, key):
+        """
+        :param BaseManager manager: The manager
+        :param tuple key: The key from ``IdentityMap.key``
+        :return: The cached model or None
+        :rtype: dict
+        """
+        models = self._models.get(manager)
+        if models is None:
+            return None
+        return models.get(key)
+
+    def set(self, manager, key, model):
+        """
+        :param BaseManager manager: The manager
+        :param tuple key: The key from ``IdentityMap.key``
+        :param dict model: The retrieved model.
+        """
+        self._models.setdefault(manager, {})[key] = model
+
+    def evict(self, manager, lookup_keys=None):
+        """
+        Removes the models retrieved with the lookup keys (for any
+        fields) or all of the manager's models if lookup_keys is None.
+
+        :param BaseManager manager: The manager
+        :param dict lookup_keys: The lookup keys of the model
+        """
+        models = self._models.get(manager)
+        if not models:
+            return
+        lookup = self.key(lookup_keys) if lookup_keys is not None else None
+        if lookup is None:
+            self._models.pop(manager, None)
+            return
+        for key in [key for key in models if key[0] == lookup[0]]:
+            models.pop(key)
+
+    def clear(self):
+        """
+        Removes every model.
+        """
+        self._models.clear()
+
+    def __len__(self):
+        return sum(len(models) for models in six.itervalues(self._models))
+
+
+class request_scope(object):
+    """
+    A context manager that makes the request the current request
+    of the thread while it is dispatched.  The request's identity
+    map is cleared when it exits.
+
+    :param RequestContainer request: The request being dispatched.
+    """
+    __slots__ = ('request', 'previous')
+
+    def __init__(self, request):
+        self.request = request
+        self.previous = None
+
+    def __enter__(self):
+        self.previous = getattr(_local, 'request', None)
+        _local.request = self.request
+        return self.request
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _local.request = self.previous
+        identity_map = getattr(self.request, '_identity_map', None)
+        if isinstance(identity_map, IdentityMap):
+            identity_map.clear()
+        return False
+
+
+def current_request():
+    """
+    :return: The request being dispatched in this thread or None.
+    :rtype: RequestContainer
+    """
+    return getattr(_local, 'request', None)
+
 
 class RequestContainer(object):
     """
@@ -32,12 +148,29 @@ class RequestContainer(object):
         :param dict headers: A dictionary of the headers and their values
         :param unicode method: The method that was used to make
             the request.
+
+        The ``adapter_options`` attribute is a dictionary for options
+        that an adapter extracts from the request in ``format_request``
+        that are only relevant to formatting the response (e.g. the
+        JSON API ``include`` parameter).  They are not passed to
+        the managers.
+
+        The ``trace_context`` is read from the ``traceparent`` header.
+        When the request is traced it is replaced by the context of
+        the request's span so that it can be passed to downstream services.
+
+        The ``identity_map`` is an IdentityMap that managers with
+        ``use_identity_map`` use to avoid retrieving the same model
+        more than once while the request is dispatched.
         """
         self._url_params = url_params or {}
         self._query_args = query_args or {}
         self._body_args = body_args or {}
         self._headers = headers or {}
         self.method = method
+        self.adapter_options = {}
+        self._trace_context = None
+        self._identity_map = None
 
     @property
     def url_params(self):
@@ -87,6 +220,31 @@ class RequestContainer(object):
     def headers(self, value):
         self._headers = value
 
+    @property
+    def trace_context(self):
+        """
+        :return: The trace context from the ``traceparent``
+            header or the one set by the tracer or None.
+        :rtype: ripozo.instrumentation.tracing.SpanContext
+        """
+        if self._trace_context is None:
+            self._trace_context = extract_trace_context(self._headers)
+        return self._trace_context
+
+    @trace_context.setter
+    def trace_context(self, value):
+        self._trace_context = value
+
+    @property
+    def identity_map(self):
+        """
+        :return: The request scoped cache of retrieved models.
+        :rtype: IdentityMap
+        """
+        if self._identity_map is None:
+            self._identity_map = IdentityMap()
+        return self._identity_map
+
     @property
     def content_type(self):
         """
@@ -10,6 +10,8 @@ import re
 from collections import namedtuple
 
 from ripozo.decorators import classproperty
+from ripozo.instrumentation.base import stage, RESOURCE
+from ripozo.instrumentation.tracing import span
 from ripozo.resources.constructor import ResourceMetaClass
 from ripozo.utilities import convert_to_underscore, join_url_parts
 
@@ -125,24 +127,23 @@ class ResourceBase(object):
         self.no_pks = no_pks
         self.route_extension = route_extension
 
-        if include_relationships:
-            self.related_resources = self._generate_links(self.relationships, self.properties) # also pops the related props from properties
+        with stage(RESOURCE):
+            if include_relationships:
+                self.related_resources = self._generate_links(self.relationships, self.properties) # also pops the related props from properties
 
-            # Remove properties which are used for relations
-            relationsships_to_remove = [rel.name for rel in self.relationships if rel.remove_properties]
+                # Remove properties which are used for relations
+                relationsships_to_remove = [rel.name for rel in self.relationships if rel.remove_properties]
 
-            for rr in self.related_resources:
-                if rr.name in relationsships_to_remove:
-                    self.properties.pop(rr.name, None)
+                for rr in self.related_resources:
+                    if rr.name in relationsships_to_remove:
+                        self.properties.pop(rr.name, None)
 
 
-            meta_links = self.meta.get('links', {}).copy()
-            self.linked_resources = self._generate_links(self.links, meta_links)
-        else:
-            self.related_resources = []
-            self.linked_resources = []
-
-        print(self)
+                meta_links = self.meta.get('links', {}).copy()
+                self.linked_resources = self._generate_links(self.links, meta_links)
+            else:
+                self.related_resources = []
+                self.linked_resources = []
 
     @staticmethod
     def _generate_links(relationship_list, links_properties):
@@ -158,13 +159,13 @@ class ResourceBase(object):
         links = []
         relationship_list = relationship_list or []
         for relationship in relationship_list:
-            _logger.debug("Trying to build relationship for: {}".format(relationship.name))
-            res = relationship.construct_resource(links_properties)
+            _logger.debug('Trying to build relationship for: %s', relationship.name)
+            with span('relationship.{0}'.format(relationship.name), relationship=relationship.name):
+                res = relationship.construct_resource(links_properties)
             if res is None: # TODO: PEP-20 'Errors should never pass silently'
-                _logger.warn("No relationsship built for {}".format(relationship.name))
+                _logger.warn('No relationsship built for %s', relationship.name)
                 continue
             links.append(_RelatedTuple(res, relationship.name, relationship.embedded))
-        print(links)
         return links
 
     @property
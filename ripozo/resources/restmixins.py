@@ -10,7 +10,9 @@ from __future__ import unicode_literals
 from ripozo.resources.relationships.relationship import Relationship
 from ripozo.resources.relationships.list_relationship import ListRelationship
 from ripozo.decorators import apimethod, classproperty, translate, manager_translate
+from ripozo.filters import filter_query_arg_names
 from ripozo.resources.resource_base import ResourceBase
+from ripozo.utilities import is_iterator
 
 import logging
 import six
@@ -23,6 +25,13 @@ class AllOptionsResource(ResourceBase):
     This class is not designed to be mixed in
     with other resources.  Instead it is supposed
     to be used as a pointer to other resources.
+
+    The links and the resource returned by ``all_options`` only
+    change when the linked_resource_classes change so they are
+    built once and cached until ``invalidate_options`` is called
+    or the linked_resource_classes are modified.  The same resource
+    instance is returned for every request so postprocessors
+    should not modify it.
     """
     __abstract__ = True
     namespace = ''
@@ -39,10 +48,26 @@ class AllOptionsResource(ResourceBase):
         :return:
         :rtype: ResourceBase
         """
+        key = tuple(cls.linked_resource_classes)
+        cached = cls.__dict__.get('_options_cache')
+        if cached is not None and cached[0] == key:
+            return cached[1]
         linked_resources = {}
         for klass in cls.linked_resource_classes:
             linked_resources[klass.resource_name] = {}
-        return cls(meta=dict(links=linked_resources))
+        resource = cls(meta=dict(links=linked_resources))
+        cls._options_cache = (key, resource)
+        return resource
+
+    @classmethod
+    def invalidate_options(cls):
+        """
+        Discards the cached links and options resource so that they
+        are rebuilt the next time they are needed.  The dispatcher
+        calls this when it registers a resource.
+        """
+        cls._options_cache = None
+        cls._links_cache = None
 
     @classproperty
     def links(cls):
@@ -52,6 +77,10 @@ class AllOptionsResource(ResourceBase):
         :return: A list of links.
         :rtype: list
         """
+        key = tuple(cls.linked_resource_classes)
+        cached = cls.__dict__.get('_links_cache')
+        if cached is not None and cached[0] == key:
+            return list(cached[1])
         _links = []
         for klass in cls.linked_resource_classes:
             has_no_pks = False
@@ -71,7 +100,8 @@ class AllOptionsResource(ResourceBase):
                 rel = Relationship(klass.resource_name, relation=klass.__name__,
                                    no_pks=False, templated=True)
                 _links.append(rel)
-        return _links
+        cls._links_cache = (key, _links)
+        return list(_links)
 
 
 class Create(ResourceBase):
@@ -170,7 +200,10 @@ class Retrieve(ResourceBase):
         :raises: NotFoundException
         """
         _logger.debug('Retrieving a resource using the manager %s', cls.manager)
-        props = cls.manager.retrieve(request.url_params)
+        projection, _ = cls.manager.get_projection(request.query_args,
+                                                   resource_name=cls.resource_name)
+        props = cls.manager.retrieve(request.url_params, **_projection_kwargs(cls, projection))
+        props = _project(cls, props, projection)
         return cls(properties=props, status_code=200)
 
 
@@ -181,8 +214,14 @@ class RetrieveList(ResourceBase):
     that there is an individual retrieve function
     and therefor cannot link between the list
     and an individual resource.
+
+    :param unicode count_strategy: How the total number of resources
+        matching the filters is counted (see
+        ``BaseManager.get_total_count``).  Defaults to the manager's
+        ``count_strategy``.
     """
     __abstract__ = True
+    count_strategy = None
 
     @apimethod(methods=['GET'])
     # @apimethod(methods=['GET'], no_pks=True)
@@ -190,6 +229,18 @@ class RetrieveList(ResourceBase):
     def retrieve_list(cls, request):
         """
         A resource that contains the other resources as properties.
+        If the manager returns an iterator instead of a list, it is
+        passed through untouched so that the adapter can consume it lazily.
+        If a sparse fieldset is requested via the manager's
+        ``projection_query_arg`` it is validated against the manager's
+        ``list_fields`` and passed to the manager as the ``fields``
+        keyword argument.  The filters are parsed once with the manager's
+        ``get_filter`` and, if there are any, passed to the manager as
+        the ``filter`` keyword argument.  The order requested with the
+        manager's ``sort_query_arg`` is validated with ``get_sort`` and
+        passed as the ``sort`` keyword argument.  Unless the
+        ``count_strategy`` is ``none`` the total is in the ``total_count``
+        meta and property and the strategy in the ``count_strategy`` meta.
 
         :param RequestContainer request: The request in the standardized
             ripozo style.
@@ -198,9 +249,30 @@ class RetrieveList(ResourceBase):
         :rtype: RetrieveList
         """
         _logger.debug('Retrieving list of resources using manager %s', cls.manager)
-        props, meta = cls.manager.retrieve_list(request.query_args)
+        projection, filters = cls.manager.get_projection(request.query_args,
+                                                         valid_fields=cls.manager.list_fields,
+                                                         resource_name=cls.resource_name)
+        filter_node, _ = cls.manager.get_filter(filters)
+        sort, _ = cls.manager.get_sort(filters)
+        kwargs = _projection_kwargs(cls, projection)
+        if filter_node is not None:
+            kwargs['filter'] = filter_node
+        if sort is not None:
+            kwargs['sort'] = sort
+        props, meta = cls.manager.retrieve_list(filters, **kwargs)
+        if projection is not None:
+            props = _project_list(cls, props, projection)
+            _add_projection_to_links(cls, meta, projection)
+        if filters.get(cls.manager.filter_query_arg):
+            _add_filter_to_links(cls, meta, filters[cls.manager.filter_query_arg])
+        strategy = cls.count_strategy or cls.manager.count_strategy
+        count_kwargs = dict(filter=filter_node) if filter_node is not None else {}
+        total_count = cls.manager.get_total_count(filters, strategy, **count_kwargs)
         return_props = {cls.resource_name: props}
-        return_props.update(request.query_args)
+        return_props.update(filters)
+        if total_count is not None:
+            meta = dict(meta or {}, total_count=total_count, count_strategy=strategy)
+            return_props['total_count'] = total_count
         return cls(properties=return_props, meta=meta,
                    status_code=200, query_args=cls.manager.fields, no_pks=True)
 
@@ -226,9 +298,14 @@ class RetrieveList(ResourceBase):
         descendant classes.
         """
         if actual_class.manager:
-            fields = tuple(actual_class.manager.fields)
+            fields = filter_query_arg_names(actual_class.manager.fields)
             fields += (actual_class.manager.pagination_pk_query_arg,
-                       actual_class.manager.pagination_count_query_arg)
+                       actual_class.manager.pagination_count_query_arg,
+                       actual_class.manager.projection_query_arg,
+                       actual_class.manager.filter_query_arg,
+                       actual_class.manager.sort_query_arg)
+            if actual_class.manager.search_query_arg:
+                fields += (actual_class.manager.search_query_arg,)
         else:
             fields = tuple()
         return (Relationship('next', relation=actual_class.__name__,
@@ -258,6 +335,44 @@ class RetrieveRetrieveList(RetrieveList, Retrieve):
         return relationships + (ListRelationship(cls.resource_name, relation=cls.__name__),)
 
 
+class Aggregate(ResourceBase):
+    """
+    Adds an ``aggregate`` endpoint to the list of resources
+    (``/resource_name/aggregate``) that returns the aggregations computed
+    by the manager instead of the resources.  Managers that do not
+    implement ``aggregate`` compute them over every page of
+    ``retrieve_list``.
+    """
+    __abstract__ = True
+
+    @apimethod(route='aggregate', methods=['GET'], no_pks=True)
+    @manager_translate(fields_attr='list_fields')
+    def aggregate(cls, request):
+        """
+        Computes the aggregations requested with the manager's
+        ``aggregate_query_arg`` (e.g. ``count,sum(price)``), grouped
+        by the fields in its ``group_by_query_arg``, over the resources
+        that match the filters.  The results are in the ``aggregates``
+        property.
+
+        :param RequestContainer request: The request in the standardized
+            ripozo style.
+        :return: An instance of the class
+            that was called.
+        :rtype: Aggregate
+        :raises: ValidationException
+        """
+        _logger.debug('Aggregating resources using the manager %s', cls.manager)
+        aggregations, group_by, filters = cls.manager.get_aggregates(request.query_args)
+        filter_node, _ = cls.manager.get_filter(filters)
+        kwargs = {}
+        if filter_node is not None:
+            kwargs['filter'] = filter_node
+        results = cls.manager.aggregate(filters, aggregations, group_by=group_by, **kwargs)
+        return cls(properties=dict(aggregates=results), status_code=200,
+                   no_pks=True, route_extension='aggregate')
+
+
 class Update(ResourceBase):
     """
     Adds the ability to do a partial
@@ -341,3 +456,85 @@ class CRUDL(Create, RetrieveRetrieveList, Update, Delete):
     def links(cls):
         links = cls._links or tuple()
         return links + Create.get_base_links(cls) + RetrieveRetrieveList.get_base_links(cls)
+
+
+def _projection_kwargs(klass, projection):
+    """
+    Gets the keyword arguments to pass to the manager
+    for the projection.  The pks are always selected
+    since they are necessary for constructing the urls.
+
+    :param type klass: The ResourceBase subclass
+    :param list projection: The requested fields or None
+    :return: The keyword arguments for the manager.
+    :rtype: dict
+    """
+    if projection is None:
+        return {}
+    fields = list(projection)
+    for primary_key in klass.pks:
+        if primary_key not in fields:
+            fields.append(primary_key)
+    return dict(fields=fields)
+
+
+def _project(klass, properties, projection):
+    """
+    Removes the properties that were not requested
+    in case the manager did not honor the projection.
+    The pks are always kept.
+
+    :param type klass: The ResourceBase subclass
+    :param dict properties: The properties returned by the manager
+    :param list projection: The requested fields or None
+    :return: The projected properties
+    :rtype: dict
+    """
+    if projection is None or properties is None:
+        return properties
+    return dict((key, value) for key, value in six.iteritems(properties)
+                if key in projection or key in klass.pks)
+
+
+def _project_list(klass, properties_list, projection):
+    """
+    Projects every item in the list.  Iterators are
+    projected lazily.
+
+    :param type klass: The ResourceBase subclass
+    :param list properties_list: The list of properties
+    :param list projection: The requested fields
+    :rtype: list|types.GeneratorType
+    """
+    projected = (_project(klass, props, projection) for props in properties_list)
+    return projected if is_iterator(properties_list) else list(projected)
+
+
+def _add_projection_to_links(klass, meta, projection):
+    """
+    Adds the projection to the next and previous links in
+    the meta so that every page has the same fields.
+
+    :param type klass: The ResourceBase subclass
+    :param dict meta: The meta returned by the manager
+    :param list projection: The requested fields
+    """
+    links = meta.get('links', {}) if meta else {}
+    for name in (klass.manager.pagination_next, klass.manager.pagination_prev):
+        if links.get(name) is not None:
+            links[name][klass.manager.projection_query_arg] = ','.join(projection)
+
+
+def _add_filter_to_links(klass, meta, expression):
+    """
+    Adds the filter expression to the next and previous links
+    in the meta so that every page is filtered the same way.
+
+    :param type klass: The ResourceBase subclass
+    :param dict meta: The meta returned by the manager
+    :param unicode expression: The filter expression
+    """
+    links = meta.get('links', {}) if meta else {}
+    for name in (klass.manager.pagination_next, klass.manager.pagination_prev):
+        if links.get(name) is not None:
+            links[name].setdefault(klass.manager.filter_query_arg, expression)
@@ -8,16 +8,28 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 from functools import wraps
+from warnings import warn
 
 import datetime
 import decimal
+import inspect
+import json
 import re
 import six
+import uuid
+
+try:
+    from collections.abc import Iterator
+except ImportError:  # pragma: no cover
+    from collections import Iterator
 
 
 _FIRST_CAP_RE = re.compile('(.)([A-Z][a-z]+)')
 _ALL_CAP_RE = re.compile('([a-z0-9])([A-Z])')
 
+_JSON_HANDLERS = {}
+_JSON_HANDLER_CACHE = {}
+
 
 def convert_to_underscore(toconvert):
     """
@@ -141,17 +153,35 @@ def make_json_safe(obj):
     and is fairly limited.  This is primarily for
     the managers when creating objects.
 
+    .. deprecated:: 1.2.4
+        The adapters convert these values while encoding using
+        ``json_default``.  Register any additional types with
+        ``register_json_type``.  This will be removed in 2.0.0
+
     :param object obj:
     :return: The json safe dictionary.
     :rtype: object|six.text_type|list|dict
     """
+    warn('make_json_safe is deprecated and will be removed in release 2.0.0. '
+         'The adapters convert values while encoding. Use register_json_type '
+         'for additional types.', PendingDeprecationWarning)
+    return _make_json_safe(obj)
+
+
+def _make_json_safe(obj):
+    """
+    The implementation of the deprecated ``make_json_safe``.
+
+    :param object obj:
+    :rtype: object|six.text_type|list|dict
+    """
     if isinstance(obj, dict):
         for key, value in six.iteritems(obj):
-            obj[key] = make_json_safe(value)
+            obj[key] = _make_json_safe(value)
     elif isinstance(obj, (list, set, tuple,)):
         response = []
         for val in obj:
-            response.append(make_json_safe(val))
+            response.append(_make_json_safe(val))
         return response
     elif isinstance(obj, (datetime.datetime, datetime.date, datetime.time, datetime.timedelta)):
         obj = six.text_type(obj)
@@ -180,8 +210,202 @@ def get_or_pop(dictionary, key, default=None, pop=False):
     :rtype: object
     """
     if pop:
-        print("key: {} - default: {} => dict: {}".format(key, default, dictionary))
-        rval = dictionary.pop(key, default)
-        return rval
+        return dictionary.pop(key, default)
 
     return dictionary.get(key, default)
+
+
+def is_iterator(obj):
+    """
+    Determines whether the object is a lazy iterator
+    (for example a generator or a database cursor) as
+    opposed to a materialized list, tuple, dict, or
+    resource.  Lazy iterators can only be consumed once.
+
+    :param object obj: The object to check.
+    :return: True if the object is an iterator
+    :rtype: bool
+    """
+    return isinstance(obj, Iterator)
+
+
+def register_json_type(type_, handler=None):
+    """
+    Registers a function that converts instances of ``type_``
+    (and its subclasses) to a json serializable value.  The handlers
+    are used by ``json_default`` which the adapters pass to ``json.dumps``
+    so values are only converted while the response is encoded.
+    The handler registered for the closest class in the
+    instance's mro is used.
+
+    It can also be used as a decorator.
+
+    .. code-block:: python
+
+        @register_json_type(Money)
+        def encode_money(value):
+            return six.text_type(value.amount)
+
+    :param type type_: The class to convert.
+    :param function handler: A function that takes an instance
+        and returns a json serializable value.
+    :return: The handler
+    :rtype: function
+    """
+    if handler is None:
+        def decorator(func):
+            return register_json_type(type_, func)
+        return decorator
+    _JSON_HANDLERS[type_] = handler
+    _JSON_HANDLER_CACHE.clear()
+    return handler
+
+
+def _get_json_handler(klass):
+    """
+    Finds the handler for the class by walking its mro.  The
+    result (including when there is no handler) is cached
+    for the class.
+
+    :param type klass: The class of the value being encoded.
+    :return: The handler or None
+    :rtype: function
+    """
+    try:
+        return _JSON_HANDLER_CACHE[klass]
+    except KeyError:
+        pass
+    handler = None
+    for base in inspect.getmro(klass):
+        if base in _JSON_HANDLERS:
+            handler = _JSON_HANDLERS[base]
+            break
+    _JSON_HANDLER_CACHE[klass] = handler
+    return handler
+
+
+def json_default(obj):
+    """
+    A ``default`` hook for ``json.dumps``.  It is only called for
+    values the json module can not serialize.  Values whose type
+    has been registered with ``register_json_type`` are converted
+    by the handler.  Iterators are materialized into lists so that
+    documents containing lazily constructed lists can still be
+    dumped in one call.
+
+    :param object obj: The object that the json module could not
+        serialize.
+    :return: A json serializable version of the object
+    :rtype: object
+    :raises: TypeError
+    """
+    handler = _get_json_handler(type(obj))
+    if handler is not None:
+        return handler(obj)
+    if is_iterator(obj):
+        return list(obj)
+    raise TypeError('{0} is not JSON serializable'.format(repr(obj)))
+
+
+register_json_type(datetime.datetime, six.text_type)
+register_json_type(datetime.date, six.text_type)
+register_json_type(datetime.time, six.text_type)
+register_json_type(datetime.timedelta, six.text_type)
+register_json_type(uuid.UUID, six.text_type)
+register_json_type(decimal.Decimal, float)
+register_json_type(set, list)
+register_json_type(frozenset, list)
+
+
+def iter_json(obj, chunk_size=8192, default=json_default):
+    """
+    Encodes the object as JSON and yields the encoded document
+    in chunks instead of building the entire string in memory.
+    Iterators in the object (i.e. generators returned by a manager's
+    retrieve_list) are consumed one item at a time.  Each item of
+    an iterator is encoded with a single ``json.dumps`` call so
+    only one item needs to be held in memory at once.
+
+    .. code-block:: python
+
+        >>> ''.join(iter_json(dict(items=(i for i in range(3)))))
+        '{"items": [0, 1, 2]}'
+
+    :param object obj: The object to encode.
+    :param int chunk_size: The approximate minimum size of each
+        chunk yielded.
+    :param function default: The default hook passed to ``json.dumps``
+    :return: A generator yielding the encoded document in pieces.
+    :rtype: types.GeneratorType
+    """
+    buf = []
+    size = 0
+    for part in _iter_json_parts(obj, default):
+        buf.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield ''.join(buf)
+            buf = []
+            size = 0
+    if buf:
+        yield ''.join(buf)
+
+
+def _iter_json_parts(obj, default):
+    """
+    Helper for iter_json.  Walks dictionaries, lists and iterators
+    yielding the individual encoded parts.
+
+    :param object obj: The object to encode.
+    :param function default: The default hook passed to ``json.dumps``
+    :rtype: types.GeneratorType
+    """
+    if isinstance(obj, dict):
+        yield '{'
+        first = True
+        for key, value in six.iteritems(obj):
+            if not first:
+                yield ', '
+            first = False
+            yield json.dumps(_json_key(key))
+            yield ': '
+            for part in _iter_json_parts(value, default):
+                yield part
+        yield '}'
+    elif isinstance(obj, (list, tuple)):
+        yield '['
+        for index, value in enumerate(obj):
+            if index:
+                yield ', '
+            for part in _iter_json_parts(value, default):
+                yield part
+        yield ']'
+    elif is_iterator(obj):
+        yield '['
+        first = True
+        for value in obj:
+            if not first:
+                yield ', '
+            first = False
+            yield json.dumps(value, default=default)
+        yield ']'
+    else:
+        yield json.dumps(obj, default=default)
+
+
+def _json_key(key):
+    """
+    Converts a dictionary key the same way that ``json.dumps`` does.
+
+    :param object key: The dictionary key
+    :rtype: unicode
+    """
+    if isinstance(key, six.string_types):
+        return key
+    if key is True:
+        return 'true'
+    if key is False:
+        return 'false'
+    if key is None:
+        return 'null'
+    return six.text_type(key)
@@ -1,20 +1,34 @@
+"""
+Benchmarks for the utilities and url building.
+"""
 from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from ripozo.utilities import convert_to_underscore
+from ripozo.resources.resource_base import create_url
+from ripozo.utilities import convert_to_underscore, join_url_parts
 
-from ripozo_tests.helpers.profile import profileit
+from ripozo_profiling.helpers import get_crudl_class
+from ripozo_profiling.runner import benchmark
 
-import six
-import unittest2
 
+@benchmark('utilities.convert_to_underscore', number=10000)
+def convert_to_underscore_benchmark():
+    return lambda: convert_to_underscore('MyThingYeah')
 
-class TestBitsAndPieces(unittest2.TestCase):
-    runs = 1000000
 
-    @profileit
-    def test_convert_to_underscore(self):
-        for i in six.moves.range(self.runs):
-            convert_to_underscore('MyThingYeah')
+@benchmark('urls.join_url_parts', number=10000)
+def join_url_parts_benchmark():
+    return lambda: join_url_parts('http://127.0.0.1:7000/', '/api/', 'resource', '<id>')
+
+
+@benchmark('urls.create_url', number=10000)
+def create_url_benchmark():
+    return lambda: create_url('/api/resource/<id>/<pk>', id=1, pk='something')
+
+
+@benchmark('urls.resource_url', number=1000)
+def resource_url_benchmark():
+    resource_class = get_crudl_class(0)
+    return lambda: resource_class(properties=dict(id=1, first=1, second=2)).url
@@ -1,49 +1,60 @@
+"""
+Benchmarks for dispatching requests through a dispatcher
+and formatting the response with each adapter.
+"""
 from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from ripozo.resources.restmixins import CRUDL
-from ripozo import fields, RequestContainer
-from ripozo.adapters import SirenAdapter, HalAdapter, BoringJSONAdapter
+from ripozo import RequestContainer
+from ripozo.adapters import SirenAdapter, HalAdapter, BasicJSONAdapter, JSONAPIAdapter
 
-from ripozo_tests.helpers.inmemory_manager import InMemoryManager
-from ripozo_tests.helpers.profile import profileit
+from ripozo_profiling.helpers import get_crudl_class
+from ripozo_profiling.runner import benchmark
 from ripozo_tests.helpers.dispatcher import FakeDispatcher
 
-import logging
-import six
-import unittest2
-
-
-class TestEndToEnd(unittest2.TestCase):
-    runs = 10000
-
-    def setUp(self):
-        logging.disable('DEBUG')
-
-        class MyManager(InMemoryManager):
-            _fields = ('id', 'first', 'second',)
-            _field_validators = {
-                'first': fields.IntegerField('first', required=True),
-                'second': fields.IntegerField('second', required=True)
-            }
-
-        class MyClass(CRUDL):
-            resource_name = 'myresource'
-            manager = MyManager()
-
-        self.resource_class = MyClass
-        self.manager = MyClass.manager
-        for i in six.moves.range(100):
-            self.manager.objects[i] = dict(id=i, first=1, second=2)
-        self.dispatcher = FakeDispatcher()
-        self.dispatcher.register_adapters(SirenAdapter, HalAdapter, BoringJSONAdapter)
-
-    @profileit
-    def test_retrieve_list(self):
-        for i in six.moves.range(100):
-            self.manager.objects[i] = dict(id=i, first=1, second=2)
-        req = RequestContainer()
-        for i in six.moves.range(self.runs):
-            self.dispatcher.dispatch(self.resource_class.retrieve_list, ['blah', 'blah', 'blah'], req)
+ADAPTERS = (SirenAdapter, HalAdapter, BasicJSONAdapter, JSONAPIAdapter)
+
+
+def _dispatch(endpoint, url_params=None, body_args=None, count=100):
+    """
+    :param unicode endpoint: The name of the apimethod to dispatch.
+    :param dict url_params: The url parameters of each request.
+    :param dict body_args: The body of each request.
+    :param int count: The number of objects in the manager.
+    :return: A function that dispatches the request and formats
+        the response once for each adapter.
+    :rtype: function
+    """
+    resource_class = get_crudl_class(count)
+    dispatcher = FakeDispatcher()
+    dispatcher.register_adapters(*ADAPTERS)
+    dispatcher.register_resources(resource_class)
+    endpoint_func = getattr(resource_class, endpoint)
+
+    def dispatch():
+        for adapter_class in ADAPTERS:
+            body = body_args
+            if body and adapter_class is JSONAPIAdapter:
+                body = dict(data=dict(attributes=body))
+            request = RequestContainer(url_params=url_params and dict(url_params),
+                                       body_args=body and dict(body))
+            adapter = dispatcher.dispatch(endpoint_func, [adapter_class.formats[0]], request)
+            adapter.formatted_body
+    return dispatch
+
+
+@benchmark('dispatch.retrieve_list')
+def dispatch_retrieve_list():
+    return _dispatch('retrieve_list')
+
+
+@benchmark('dispatch.retrieve', number=1000)
+def dispatch_retrieve():
+    return _dispatch('retrieve', url_params=dict(id=1))
+
+
+@benchmark('dispatch.update', number=1000)
+def dispatch_update():
+    return _dispatch('update', url_params=dict(id=1), body_args=dict(first='2'))
@@ -0,0 +1,49 @@
+"""
+Benchmarks for translating and validating fields.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo import RequestContainer
+from ripozo.resources.constants import input_categories
+from ripozo.resources.fields.base import translate_fields
+from ripozo.resources.fields.common import IntegerField, StringField, DateTimeField, ListField
+
+from ripozo_profiling.runner import benchmark
+
+import six
+
+
+@benchmark('fields.integer', number=10000)
+def integer_field():
+    field = IntegerField('value', required=True, minimum=0, maximum=100)
+    return lambda: field.translate('10', validate=True)
+
+
+@benchmark('fields.datetime', number=10000)
+def datetime_field():
+    field = DateTimeField('value')
+    return lambda: field.translate('2015-11-20T10:15:30.123Z', validate=True)
+
+
+@benchmark('fields.list', number=1000)
+def list_field():
+    field = ListField('value', indv_field=IntegerField('item'))
+    values = [six.text_type(i) for i in six.moves.range(100)]
+    return lambda: field.translate(values, validate=True)
+
+
+@benchmark('fields.translate_fields', number=1000)
+def translate_fields_benchmark():
+    fields = [IntegerField('first', required=True, arg_type=input_categories.BODY_ARGS),
+              StringField('second', arg_type=input_categories.BODY_ARGS),
+              IntegerField('id', arg_type=input_categories.URL_PARAMS)]
+
+    def translate():
+        request = RequestContainer(url_params=dict(id='1'),
+                                   body_args=dict(first='1', second='something'))
+        return translate_fields(request, fields=fields, validate=True)
+    return translate
+
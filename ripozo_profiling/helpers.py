@@ -0,0 +1,54 @@
+"""
+Resources and managers shared by the benchmarks.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo import fields
+from ripozo.resources.restmixins import CRUDL
+
+from ripozo_tests.helpers.inmemory_manager import InMemoryManager
+
+import six
+
+
+def get_crudl_class(count=100):
+    """
+    Creates a CRUDL resource backed by an InMemoryManager
+    with ``count`` objects.
+
+    :param int count: The number of objects in the manager.
+    :return: The resource class.
+    :rtype: type
+    """
+    class BenchmarkManager(InMemoryManager):
+        _fields = ('id', 'first', 'second',)
+        _field_validators = {
+            'first': fields.IntegerField('first', required=True),
+            'second': fields.IntegerField('second', required=True)
+        }
+        paginate_by = count
+
+    class BenchmarkResource(CRUDL):
+        resource_name = 'benchmark'
+        manager = BenchmarkManager()
+
+    for i in six.moves.range(count):
+        BenchmarkResource.manager.objects[i] = dict(id=i, first=1, second=2)
+    return BenchmarkResource
+
+
+def forget_representation(resource):
+    """
+    Removes the intermediate representation that the adapters
+    cache on the resource so that each call builds it again
+    like a new response would.
+
+    :param ResourceBase resource: The resource.
+    :return: The resource
+    :rtype: ResourceBase
+    """
+    vars(resource).pop('_representations', None)
+    return resource
@@ -0,0 +1,309 @@
+"""
+Benchmarks for the managers.  The indexed ``ripozo.managers``
+InMemoryManager is compared to the InMemoryManager test helper,
+the ColumnarManager is timed with and without numpy and the
+SqliteManager uses an in-memory sqlite database.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo import fields
+from ripozo.aggregates import aggregate_rows, parse_aggregates
+from ripozo.managers.columnar import ColumnarManager
+from ripozo.managers.memory import InMemoryManager
+from ripozo.managers.sqlite import SqliteManager
+
+from ripozo_profiling.runner import benchmark, scaling_benchmark
+from ripozo_tests.helpers.inmemory_manager import InMemoryManager as HelperManager
+
+import six
+
+ROWS = 10000
+PAGE = 20
+TEAMS = 50
+AGGREGATES = 'count,sum(age),max(age)'
+EXPRESSION = 'team = team7 and (age >= 60 or name in (name7, name57))'
+
+
+class BenchmarkMemoryManager(InMemoryManager):
+    _fields = ('id', 'name', 'age', 'team')
+    _field_validators = {
+        'age': fields.IntegerField('age'),
+    }
+    indexes = ('team',)
+    sorted_indexes = ('age',)
+
+
+class BenchmarkSearchManager(BenchmarkMemoryManager):
+    text_indexes = ('name', 'team')
+
+
+class BenchmarkColumnarManager(ColumnarManager):
+    _fields = ('id', 'name', 'age', 'team')
+    _field_validators = {
+        'id': fields.IntegerField('id'),
+        'name': fields.StringField('name'),
+        'age': fields.IntegerField('age'),
+        'team': fields.StringField('team'),
+    }
+
+
+class BenchmarkPythonColumnarManager(BenchmarkColumnarManager):
+    use_numpy = False
+
+
+class BenchmarkSqliteManager(SqliteManager):
+    table = 'benchmark'
+    _fields = ('id', 'name', 'age', 'team')
+    _field_validators = {
+        'id': fields.IntegerField('id'),
+        'name': fields.StringField('name'),
+        'age': fields.IntegerField('age'),
+        'team': fields.StringField('team'),
+    }
+    indexes = (('team', 'age'),)
+
+
+def _row(i):
+    return dict(name='name{0}'.format(i), age=i % 90, team='team{0}'.format(i % TEAMS))
+
+
+def _memory_manager(size=ROWS):
+    manager = BenchmarkMemoryManager()
+    for i in six.moves.range(size):
+        manager.create(_row(i))
+    return manager
+
+
+def _columnar_manager(manager_class, size=ROWS):
+    manager = manager_class()
+    for i in six.moves.range(size):
+        manager.create(_row(i))
+    return manager
+
+
+def _sqlite_manager(size=ROWS):
+    manager = BenchmarkSqliteManager()
+    manager.create_table()
+    manager.bulk_create(_row(i) for i in six.moves.range(size))
+    return manager
+
+
+def _helper_manager(size=ROWS):
+    manager = HelperManager()
+    for i in six.moves.range(size):
+        manager.objects[i] = dict(_row(i), id=i)
+    return manager
+
+
+def _last_page_query(manager):
+    """
+    :return: The query for the last page of the manager.
+    :rtype: dict
+    """
+    query = dict(count=PAGE)
+    _, meta = manager.retrieve_list(dict(count=len(manager) - PAGE))
+    query.update(meta['links']['next'])
+    return query
+
+
+@benchmark('managers.helper.retrieve', number=10000)
+def helper_retrieve():
+    manager = _helper_manager()
+    return lambda: manager.retrieve(dict(id=ROWS // 2))
+
+
+@benchmark('managers.memory.retrieve', number=10000)
+def memory_retrieve():
+    manager = _memory_manager()
+    return lambda: manager.retrieve(dict(id=ROWS // 2))
+
+
+@benchmark('managers.helper.retrieve_list_last_page', number=100)
+def helper_last_page():
+    manager = _helper_manager()
+    query = dict(count=PAGE, pagination_pk=ROWS // PAGE - 1)
+    return lambda: manager.retrieve_list(query)
+
+
+@benchmark('managers.memory.retrieve_list_last_page', number=100)
+def memory_last_page():
+    manager = _memory_manager()
+    query = _last_page_query(manager)
+    return lambda: manager.retrieve_list(query)
+
+
+@benchmark('managers.memory.retrieve_list_filtered', number=1000)
+def memory_filtered():
+    manager = _memory_manager()
+    query = dict(count=PAGE, team='team7', age__gte='30')
+    return lambda: manager.retrieve_list(query)
+
+
+@benchmark('managers.memory.retrieve_list_range_ordered', number=1000)
+def memory_range_ordered():
+    manager = _memory_manager()
+    manager.order_by = ('-age',)
+    query = dict(count=PAGE, age__lt='45')
+    return lambda: manager.retrieve_list(query)
+
+
+@benchmark('managers.memory.retrieve_list_expression', number=1000)
+def memory_expression():
+    manager = _memory_manager()
+    query = dict(count=PAGE, filter=EXPRESSION)
+    return lambda: manager.retrieve_list(query)
+
+
+@benchmark('managers.memory.aggregate', number=100)
+def memory_aggregate():
+    manager = _memory_manager()
+    aggregations = parse_aggregates(AGGREGATES, manager.fields)
+    return lambda: manager.aggregate(dict(age__gte='30'), aggregations, group_by=['team'])
+
+
+@benchmark('managers.memory.search_scan', number=100)
+def memory_search_scan():
+    manager = _memory_manager()
+
+    def search():
+        rows, _ = manager.retrieve_list(dict(count=ROWS))
+        return [row for row in rows if 'team7' in row['team'].lower() and 'name7' in row['name'].lower()][:PAGE]
+    return search
+
+
+@benchmark('managers.memory.search', number=1000)
+def memory_search():
+    manager = BenchmarkSearchManager()
+    for i in six.moves.range(ROWS):
+        manager.create(_row(i))
+    query = dict(count=PAGE, q='team7 name7*')
+    return lambda: manager.retrieve_list(query)
+
+
+@benchmark('managers.columnar.retrieve_list_filtered', number=1000)
+def columnar_filtered():
+    manager = _columnar_manager(BenchmarkColumnarManager)
+    query = dict(count=PAGE, team='team7', age__gte='30')
+    return lambda: manager.retrieve_list(query)
+
+
+@benchmark('managers.columnar.retrieve_list_filtered_python', number=1000)
+def columnar_filtered_python():
+    manager = _columnar_manager(BenchmarkPythonColumnarManager)
+    query = dict(count=PAGE, team='team7', age__gte='30')
+    return lambda: manager.retrieve_list(query)
+
+
+@benchmark('managers.columnar.retrieve_list_sparse', number=100)
+def columnar_sparse():
+    manager = _columnar_manager(BenchmarkColumnarManager)
+    query = dict(count=PAGE, team='team7', age='31')
+    return lambda: manager.retrieve_list(query)
+
+
+@benchmark('managers.columnar.retrieve_list_sparse_python', number=100)
+def columnar_sparse_python():
+    manager = _columnar_manager(BenchmarkPythonColumnarManager)
+    query = dict(count=PAGE, team='team7', age='31')
+    return lambda: manager.retrieve_list(query)
+
+
+@benchmark('managers.sqlite.retrieve', number=10000)
+def sqlite_retrieve():
+    manager = _sqlite_manager()
+    return lambda: manager.retrieve(dict(id=ROWS // 2))
+
+
+@benchmark('managers.sqlite.retrieve_list_last_page', number=1000)
+def sqlite_last_page():
+    manager = _sqlite_manager()
+    query = dict(count=PAGE, pagination_pk=manager._encode_token([ROWS - PAGE]))
+    return lambda: manager.retrieve_list(query)
+
+
+@benchmark('managers.sqlite.retrieve_list_filtered', number=1000)
+def sqlite_filtered():
+    manager = _sqlite_manager()
+    query = dict(count=PAGE, team='team7', age__gte='30')
+    return lambda: manager.retrieve_list(query)
+
+
+@benchmark('managers.sqlite.retrieve_list_expression', number=1000)
+def sqlite_expression():
+    manager = _sqlite_manager()
+    query = dict(count=PAGE, filter=EXPRESSION)
+    return lambda: manager.retrieve_list(query)
+
+
+@benchmark('managers.sqlite.aggregate_scan', number=100)
+def sqlite_aggregate_scan():
+    manager = _sqlite_manager()
+    aggregations = parse_aggregates(AGGREGATES, manager.fields)
+
+    def aggregate():
+        rows, _ = manager.retrieve_list(dict(count=ROWS, age__gte='30'))
+        return aggregate_rows(rows, aggregations, ['team'])
+    return aggregate
+
+
+@benchmark('managers.sqlite.aggregate', number=100)
+def sqlite_aggregate():
+    manager = _sqlite_manager()
+    aggregations = parse_aggregates(AGGREGATES, manager.fields)
+    return lambda: manager.aggregate(dict(age__gte='30'), aggregations, group_by=['team'])
+
+
+@benchmark('managers.sqlite.create_100', number=10)
+def sqlite_create():
+    manager = _sqlite_manager(0)
+    rows = [_row(i) for i in six.moves.range(100)]
+
+    def create():
+        for row in rows:
+            manager.create(row)
+    return create
+
+
+@benchmark('managers.sqlite.bulk_create_100', number=10)
+def sqlite_bulk_create():
+    manager = _sqlite_manager(0)
+    rows = [_row(i) for i in six.moves.range(100)]
+    return lambda: manager.bulk_create(rows)
+
+
+@benchmark('managers.helper.update', number=10000)
+def helper_update():
+    manager = _helper_manager()
+    return lambda: manager.update(dict(id=ROWS // 2), dict(age=5))
+
+
+@benchmark('managers.memory.update', number=10000)
+def memory_update():
+    manager = _memory_manager()
+    ages = iter(six.moves.range(10 ** 9))
+    return lambda: manager.update(dict(id=ROWS // 2), dict(age=next(ages) % 90))
+
+
+@scaling_benchmark('scaling.memory_manager_last_page', sizes=[1000, 10000, 100000], expected=0.5)
+def memory_last_page_scaling(size):
+    manager = _memory_manager(size)
+    query = _last_page_query(manager)
+    return lambda: manager.retrieve_list(query)
+
+
+@benchmark('managers.sqlite.count_exact', number=50)
+def sqlite_count_exact():
+    manager = _sqlite_manager()
+    filters = dict(age__gte='30')
+    return lambda: manager.get_total_count(filters, 'exact')
+
+
+@benchmark('managers.sqlite.count_estimated', number=500)
+def sqlite_count_estimated():
+    manager = _sqlite_manager()
+    manager.analyze()
+    filters = dict(age__gte='30')
+    return lambda: manager.get_total_count(filters, 'estimated')
@@ -0,0 +1,41 @@
+"""
+Benchmarks for constructing resources with relationships.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo import ResourceBase, Relationship, ListRelationship
+
+from ripozo_profiling.runner import benchmark
+
+import six
+
+
+class BenchmarkChild(ResourceBase):
+    pks = 'child_id',
+
+
+class BenchmarkParent(ResourceBase):
+    pks = 'id',
+    _relationships = (
+        Relationship('child', relation='BenchmarkChild', embedded=True),
+        ListRelationship('benchmark_child', relation='BenchmarkChild', embedded=True),
+    )
+
+
+@benchmark('relationships.relationship', number=1000)
+def relationship():
+    def construct():
+        return BenchmarkParent(properties=dict(id=1, value=2, child=dict(child_id=3)))
+    return construct
+
+
+@benchmark('relationships.list_relationship')
+def list_relationship():
+    children = [dict(child_id=i, value=i) for i in six.moves.range(100)]
+
+    def construct():
+        return BenchmarkParent(properties=dict(id=1, benchmark_child=list(children)))
+    return construct
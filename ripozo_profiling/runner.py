@@ -0,0 +1,539 @@
+"""
+A small benchmark runner for ripozo.  Benchmarks are registered
+with the ``benchmark`` decorator and timed with warmup and repeated
+runs.  The results can be written to a JSON file and compared
+with the results from another run (for example another branch
+or ripozo release) to find regressions.
+
+.. code-block:: bash
+
+    python -m ripozo_profiling list
+    python -m ripozo_profiling run --output before.json
+    python -m ripozo_profiling run --filter 'adapters.*' --output after.json
+    python -m ripozo_profiling compare before.json after.json --threshold 0.1
+    python -m ripozo_profiling scale --max-size 10000
+
+The scaling benchmarks are timed at increasing sizes (for example the
+number of resources in a list).  The exponent of the growth is fitted
+(``time ~ size ** exponent``) and ``scale`` fails when it exceeds
+the expected exponent.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+from fnmatch import fnmatch
+from timeit import default_timer
+
+import argparse
+import cProfile
+import datetime
+import importlib
+import json
+import logging
+import math
+import platform
+import pstats
+import sys
+import warnings
+
+import six
+
+BENCHMARK_MODULES = (
+    'ripozo_profiling.adapters',
+    'ripozo_profiling.bits_and_pieces',
+    'ripozo_profiling.end_to_end',
+    'ripozo_profiling.fields',
+    'ripozo_profiling.managers',
+    'ripozo_profiling.relationships',
+    'ripozo_profiling.restmixins',
+    'ripozo_profiling.scaling',
+)
+
+_BENCHMARKS = OrderedDict()
+_SCALING_BENCHMARKS = OrderedDict()
+
+
+class Benchmark(object):
+    """
+    A named benchmark.  The setup function prepares everything
+    that should not be timed and returns the function that is
+    timed.
+
+    :param unicode name: The dotted name of the benchmark.  The
+        first part is the group (e.g. ``adapters``).
+    :param function setup: Takes no arguments and returns
+        the function to time.
+    :param int number: The number of times the returned function
+        is called for each timing.
+    """
+    def __init__(self, name, setup, number=100):
+        self.name = name
+        self.setup = setup
+        self.number = number
+
+    @property
+    def group(self):
+        """
+        :return: The first part of the name
+        :rtype: unicode
+        """
+        return self.name.split('.', 1)[0]
+
+
+def benchmark(name, number=100):
+    """
+    Registers the decorated setup function as a benchmark.
+
+    .. code-block:: python
+
+        @benchmark('utilities.convert_to_underscore', number=10000)
+        def convert_to_underscore_benchmark():
+            return lambda: convert_to_underscore('MyThingYeah')
+
+    :param unicode name: The unique name of the benchmark.
+    :param int number: The number of calls per timing.
+    :return: The decorator
+    :rtype: function
+    """
+    def decorator(setup):
+        if name in _BENCHMARKS:
+            raise ValueError('A benchmark named {0} is already registered'.format(name))
+        _BENCHMARKS[name] = Benchmark(name, setup, number=number)
+        return setup
+    return decorator
+
+
+class ScalingBenchmark(object):
+    """
+    A benchmark that is timed at several sizes to find
+    how it grows.
+
+    :param unicode name: The dotted name of the benchmark.
+    :param function setup: Takes the size and returns
+        the function to time.
+    :param list sizes: The sizes to time the benchmark at.
+    :param float expected: The expected exponent of the growth.
+        1 is linear, 2 is quadratic etc...
+    """
+    def __init__(self, name, setup, sizes, expected=1.0):
+        self.name = name
+        self.setup = setup
+        self.sizes = sizes
+        self.expected = expected
+
+
+def scaling_benchmark(name, sizes, expected=1.0):
+    """
+    Registers the decorated setup function as a scaling benchmark.
+    The setup function is called with each size.
+
+    .. code-block:: python
+
+        @scaling_benchmark('scaling.join', sizes=[10, 100, 1000])
+        def join_benchmark(size):
+            parts = ['a'] * size
+            return lambda: ''.join(parts)
+
+    :param unicode name: The unique name of the benchmark.
+    :param list sizes: The sizes to time the benchmark at.
+    :param float expected: The expected exponent of the growth.
+    :return: The decorator
+    :rtype: function
+    """
+    def decorator(setup):
+        if name in _SCALING_BENCHMARKS:
+            raise ValueError('A benchmark named {0} is already registered'.format(name))
+        _SCALING_BENCHMARKS[name] = ScalingBenchmark(name, setup, sizes, expected=expected)
+        return setup
+    return decorator
+
+
+def load_benchmarks(modules=BENCHMARK_MODULES):
+    """
+    Imports the modules that register the benchmarks.
+
+    :param tuple modules: The module names to import.
+    :return: The registered benchmarks keyed by name.
+    :rtype: OrderedDict
+    """
+    for module in modules:
+        importlib.import_module(module)
+    return _BENCHMARKS
+
+
+def select_benchmarks(patterns=None, scaling=False):
+    """
+    :param list patterns: Shell style patterns (e.g. ``adapters.*``)
+        If empty, every benchmark is selected.
+    :param bool scaling: Select the scaling benchmarks
+        instead of the regular benchmarks.
+    :return: The benchmarks whose name matches any of the patterns.
+    :rtype: list
+    """
+    load_benchmarks()
+    registry = _SCALING_BENCHMARKS if scaling else _BENCHMARKS
+    benchmarks = list(registry.values())
+    if not patterns:
+        return benchmarks
+    return [bench for bench in benchmarks
+            if any(fnmatch(bench.name, pattern) for pattern in patterns)]
+
+
+def time_benchmark(bench, repeats=5, warmup=1, number=None):
+    """
+    Times a benchmark.  The function returned by the setup
+    is called ``number`` times per timing.  The warmup timings
+    are discarded.
+
+    :param Benchmark bench: The benchmark to time.
+    :param int repeats: The number of timings to record.
+    :param int warmup: The number of timings to discard first.
+    :param int number: Overrides the benchmark's number of
+        calls per timing.
+    :return: The statistics of the time per call in seconds.
+    :rtype: dict
+    """
+    func = bench.setup()
+    number = number or bench.number
+    for _ in six.moves.range(warmup):
+        _time(func, number)
+    timings = [_time(func, number) / number for _ in six.moves.range(repeats)]
+    return summarize(timings, number=number)
+
+
+def time_scaling_benchmark(bench, repeats=3, max_size=None, min_time=0.05):
+    """
+    Times a scaling benchmark at each of its sizes and fits
+    the exponent of the growth.  At each size the function is
+    called enough times to take at least ``min_time`` seconds
+    and the fastest of the repeats is used.
+
+    :param ScalingBenchmark bench: The benchmark to time.
+    :param int repeats: The number of timings at each size.
+    :param int max_size: Skip sizes larger than this.
+    :param float min_time: The minimum seconds per timing.
+    :return: The sizes, the seconds per call at each size,
+        and the fitted and expected exponents.  The benchmark is
+        ``skipped`` (and the exponent is None) when fewer than two
+        sizes are left since the growth can not be fitted.
+    :rtype: dict
+    """
+    sizes = [size for size in bench.sizes if max_size is None or size <= max_size]
+    if len(sizes) < 2:
+        return dict(sizes=sizes, timings=[], expected=bench.expected, exponent=None, skipped=True)
+    timings = []
+    for size in sizes:
+        func = bench.setup(size)
+        first = _time(func, 1)
+        number = max(1, int(min_time / first)) if first else 1
+        timings.append(min(_time(func, number) / number for _ in six.moves.range(repeats)))
+    return dict(sizes=sizes, timings=timings, expected=bench.expected,
+                exponent=fit_exponent(sizes, timings), skipped=False)
+
+
+def fit_exponent(sizes, timings):
+    """
+    Fits ``timing = c * size ** exponent`` with a least squares
+    fit of the logarithms.
+
+    :param list sizes: The sizes.
+    :param list timings: The time taken at each size.
+    :return: The exponent
+    :rtype: float
+    """
+    if len(sizes) < 2:
+        raise ValueError('At least two sizes are required to fit the growth')
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(timing, 1e-12)) for timing in timings]
+    x_mean = sum(xs) / len(xs)
+    y_mean = sum(ys) / len(ys)
+    covariance = sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys))
+    variance = sum((x - x_mean) ** 2 for x in xs)
+    return covariance / variance
+
+
+def _time(func, number):
+    """
+    :return: The total seconds taken to call func number times.
+    :rtype: float
+    """
+    start = default_timer()
+    for _ in six.moves.range(number):
+        func()
+    return default_timer() - start
+
+
+def summarize(timings, number=1):
+    """
+    Calculates the statistics for a list of timings.
+
+    :param list timings: The seconds per call for each repeat.
+    :param int number: The number of calls per repeat.
+    :return: The number of calls, the timings and their min, max,
+        mean, median and (sample) standard deviation.
+    :rtype: dict
+    """
+    count = len(timings)
+    ordered = sorted(timings)
+    mean = sum(ordered) / count
+    middle = count // 2
+    if count % 2:
+        median = ordered[middle]
+    else:
+        median = (ordered[middle - 1] + ordered[middle]) / 2
+    variance = sum((t - mean) ** 2 for t in ordered) / (count - 1) if count > 1 else 0.0
+    return dict(number=number, repeats=count, timings=timings, min=ordered[0],
+                max=ordered[-1], mean=mean, median=median, stdev=math.sqrt(variance))
+
+
+def run(benchmarks, repeats=5, warmup=1, number=None, stream=sys.stdout):
+    """
+    Times each of the benchmarks and prints a line for each.
+
+    :param list benchmarks: The Benchmarks to run.
+    :param int repeats: The number of timings per benchmark.
+    :param int warmup: The number of discarded timings per benchmark.
+    :param int number: Overrides the calls per timing.
+    :param stream: Where the progress is written.
+    :return: The results document containing the metadata
+        and the statistics keyed by the benchmark name.
+    :rtype: dict
+    """
+    results = OrderedDict()
+    for bench in benchmarks:
+        stats = time_benchmark(bench, repeats=repeats, warmup=warmup, number=number)
+        stats['group'] = bench.group
+        results[bench.name] = stats
+        stream.write('{0:<50} {1:>12} +- {2:>10}\n'.format(
+            bench.name, _format_seconds(stats['median']), _format_seconds(stats['stdev'])))
+    meta = dict(python=platform.python_version(),
+                implementation=platform.python_implementation(),
+                platform=platform.platform(),
+                timestamp=datetime.datetime.utcnow().isoformat(),
+                repeats=repeats, warmup=warmup)
+    return dict(meta=meta, benchmarks=results)
+
+
+def run_scaling(benchmarks, repeats=3, max_size=None, tolerance=0.25, stream=sys.stdout):
+    """
+    Times each of the scaling benchmarks and prints the fitted
+    exponent.  A benchmark fails if the exponent is more than
+    ``tolerance`` greater than expected.
+
+    :param list benchmarks: The ScalingBenchmarks to run.
+    :param int repeats: The number of timings at each size.
+    :param int max_size: Skip sizes larger than this.
+    :param float tolerance: How much the fitted exponent may
+        exceed the expected exponent.
+    :param stream: Where the progress is written.
+    :return: The results document.  Each benchmark's result
+        has a ``failed`` flag.  Skipped benchmarks do not fail.
+    :rtype: dict
+    """
+    results = OrderedDict()
+    for bench in benchmarks:
+        result = time_scaling_benchmark(bench, repeats=repeats, max_size=max_size)
+        results[bench.name] = result
+        if result['skipped']:
+            result['failed'] = False
+            stream.write('{0:<50} SKIPPED (fewer than two sizes)\n'.format(bench.name))
+            continue
+        result['failed'] = result['exponent'] > bench.expected + tolerance
+        stream.write('{0:<50} n^{1:.2f} (expected n^{2:.2f}){3}\n'.format(
+            bench.name, result['exponent'], bench.expected,
+            '  FAILED' if result['failed'] else ''))
+    meta = dict(python=platform.python_version(),
+                implementation=platform.python_implementation(),
+                platform=platform.platform(),
+                timestamp=datetime.datetime.utcnow().isoformat(),
+                repeats=repeats, tolerance=tolerance)
+    return dict(meta=meta, scaling=results)
+
+
+def profile(bench, number=None, limit=20, stream=sys.stdout):
+    """
+    Runs the benchmark once under cProfile and prints the
+    functions with the highest total and cumulative time.
+
+    :param Benchmark bench: The benchmark to profile.
+    :param int number: Overrides the calls per timing.
+    :param int limit: The number of functions to print.
+    :param stream: Where the stats are written.
+    """
+    func = bench.setup()
+    prof = cProfile.Profile()
+    prof.runcall(_time, func, number or bench.number)
+    stats = pstats.Stats(prof, stream=stream)
+    stats.sort_stats('tottime').print_stats(limit)
+    stats.sort_stats('cumtime').print_stats(limit)
+
+
+def compare(baseline, current, threshold=0.1, statistic='median'):
+    """
+    Compares two results documents.  A benchmark is a regression
+    if it became slower by more than the threshold.  Benchmarks
+    that are only in the baseline are ``missing`` (e.g. they were
+    renamed or failed to import) and those only in the current
+    results are ``new``.
+
+    :param dict baseline: The results to compare against.
+    :param dict current: The new results.
+    :param float threshold: The fraction that a benchmark may
+        get slower by before it is considered a regression.
+    :param unicode statistic: The statistic to compare.
+    :return: A list of dictionaries with the name, the baseline and
+        current values (None if missing), the relative change,
+        whether it regressed and whether it is missing or new.
+    :rtype: list
+    """
+    comparisons = []
+    base_benchmarks = baseline['benchmarks']
+    current_benchmarks = current['benchmarks']
+    for name, stats in six.iteritems(current_benchmarks):
+        after = stats[statistic]
+        if name not in base_benchmarks:
+            comparisons.append(dict(name=name, baseline=None, current=after, change=None,
+                                    regression=False, missing=False, new=True))
+            continue
+        before = base_benchmarks[name][statistic]
+        change = (after - before) / before if before else 0.0
+        comparisons.append(dict(name=name, baseline=before, current=after, change=change,
+                                regression=change > threshold, missing=False, new=False))
+    for name, stats in six.iteritems(base_benchmarks):
+        if name not in current_benchmarks:
+            comparisons.append(dict(name=name, baseline=stats[statistic], current=None,
+                                    change=None, regression=False, missing=True, new=False))
+    return comparisons
+
+
+def save_results(results, path):
+    """
+    :param dict results: The results document.
+    :param unicode path: The file to write it to.
+    """
+    with open(path, 'w') as results_file:
+        json.dump(results, results_file, indent=2)
+
+
+def load_results(path):
+    """
+    :param unicode path: The results file.
+    :return: The results document.
+    :rtype: dict
+    """
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+def _format_seconds(seconds):
+    """
+    :return: The seconds in the most readable unit.
+    :rtype: unicode
+    """
+    for unit, scale in (('s', 1), ('ms', 1e3), ('us', 1e6)):
+        if seconds * scale >= 1:
+            return '{0:.3f} {1}'.format(seconds * scale, unit)
+    return '{0:.3f} ns'.format(seconds * 1e9)
+
+
+def _parse_args(argv):
+    """
+    :return: The parsed command line arguments.
+    :rtype: argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(prog='python -m ripozo_profiling',
+                                     description='Runs and compares the ripozo benchmarks.')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    list_parser = commands.add_parser('list', help='List the benchmarks.')
+    list_parser.add_argument('--filter', '-k', action='append', dest='patterns',
+                             help='Only benchmarks matching this pattern (repeatable).')
+
+    run_parser = commands.add_parser('run', help='Run the benchmarks.')
+    run_parser.add_argument('--filter', '-k', action='append', dest='patterns',
+                            help='Only benchmarks matching this pattern (repeatable).')
+    run_parser.add_argument('--repeats', type=int, default=5)
+    run_parser.add_argument('--warmup', type=int, default=1)
+    run_parser.add_argument('--number', type=int, default=None,
+                            help='Overrides the calls per timing.')
+    run_parser.add_argument('--output', '-o', help='Write the results to this JSON file.')
+    run_parser.add_argument('--profile', action='store_true',
+                            help='Print cProfile stats instead of timing.')
+
+    scale_parser = commands.add_parser('scale', help='Run the scaling benchmarks.')
+    scale_parser.add_argument('--filter', '-k', action='append', dest='patterns',
+                              help='Only benchmarks matching this pattern (repeatable).')
+    scale_parser.add_argument('--repeats', type=int, default=3)
+    scale_parser.add_argument('--max-size', type=int, default=None,
+                              help='Skip sizes larger than this.')
+    scale_parser.add_argument('--tolerance', type=float, default=0.25,
+                              help='How much the exponent may exceed the expected one.')
+    scale_parser.add_argument('--output', '-o', help='Write the results to this JSON file.')
+
+    compare_parser = commands.add_parser('compare', help='Compare two results files.')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='The allowed slowdown as a fraction (default 0.1).')
+    compare_parser.add_argument('--statistic', default='median',
+                                choices=['min', 'median', 'mean'])
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    The command line entry point.
+
+    :param list argv: The command line arguments.
+    :return: The exit code.  It is 1 if ``compare`` found a
+        regression or a missing benchmark or if a scaling
+        benchmark failed.
+    :rtype: int
+    """
+    args = _parse_args(argv)
+    if args.command == 'compare':
+        comparisons = compare(load_results(args.baseline), load_results(args.current),
+                              threshold=args.threshold, statistic=args.statistic)
+        for comp in comparisons:
+            if comp['missing']:
+                print('{0:<50} {1:>12} -> {2:>12}  MISSING'.format(
+                    comp['name'], _format_seconds(comp['baseline']), '-'))
+            elif comp['new']:
+                print('{0:<50} {1:>12} -> {2:>12}  NEW'.format(
+                    comp['name'], '-', _format_seconds(comp['current'])))
+            else:
+                print('{0:<50} {1:>12} -> {2:>12} {3:>+8.1%}{4}'.format(
+                    comp['name'], _format_seconds(comp['baseline']),
+                    _format_seconds(comp['current']), comp['change'],
+                    '  REGRESSION' if comp['regression'] else ''))
+        return 1 if any(comp['regression'] or comp['missing'] for comp in comparisons) else 0
+
+    logging.disable(logging.CRITICAL)
+    # The benchmarks register the same resource names repeatedly.
+    warnings.simplefilter('ignore', UserWarning)
+    if args.command == 'scale':
+        results = run_scaling(select_benchmarks(args.patterns, scaling=True), repeats=args.repeats,
+                              max_size=args.max_size, tolerance=args.tolerance)
+        if args.output:
+            save_results(results, args.output)
+        return 1 if any(result['failed'] for result in results['scaling'].values()) else 0
+
+    benchmarks = select_benchmarks(args.patterns)
+    if args.command == 'list':
+        for bench in benchmarks + select_benchmarks(args.patterns, scaling=True):
+            print(bench.name)
+        return 0
+
+    if args.profile:
+        for bench in benchmarks:
+            print(bench.name)
+            profile(bench, number=args.number)
+        return 0
+    results = run(benchmarks, repeats=args.repeats, warmup=args.warmup, number=args.number)
+    if args.output:
+        save_results(results, args.output)
+    return 0
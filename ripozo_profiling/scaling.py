@@ -0,0 +1,132 @@
+"""
+Scaling benchmarks.  Each one is timed at increasing sizes against
+the InMemoryManager and formatted with every adapter so that
+superlinear behavior that only shows up at large sizes is caught.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo import fields, RequestContainer, ResourceBase, Relationship
+from ripozo.resources.restmixins import RetrieveList
+
+from ripozo_profiling.end_to_end import ADAPTERS
+from ripozo_profiling.helpers import get_crudl_class
+from ripozo_profiling.runner import scaling_benchmark
+from ripozo_tests.helpers.inmemory_manager import InMemoryManager
+
+import six
+
+LIST_SIZES = [10, 100, 1000, 10000, 100000]
+RELATIONSHIP_COUNTS = [1, 2, 4, 8, 16, 32]
+DEPTHS = [1, 2, 4, 8, 16, 32]
+FIELD_COUNTS = [4, 16, 64, 256]
+
+
+def _adapter_name(adapter_class):
+    """
+    :return: The name of the adapter used in the benchmark names.
+    :rtype: unicode
+    """
+    return adapter_class.__name__.replace('Adapter', '').lower()
+
+
+def _list_size(adapter_class):
+    """
+    :return: The setup for formatting a RetrieveList
+        response with size resources.
+    :rtype: function
+    """
+    def setup(size):
+        resource_class = get_crudl_class(size)
+        return lambda: adapter_class(resource_class.retrieve_list(RequestContainer())).formatted_body
+    return setup
+
+
+def _relationship_count(adapter_class):
+    """
+    :return: The setup for formatting a resource with
+        size embedded relationships.
+    :rtype: function
+    """
+    def setup(size):
+        class ScalingRelated(ResourceBase):
+            pks = 'related_id',
+
+        names = ['related{0}'.format(i) for i in six.moves.range(size)]
+
+        class ScalingRelationships(ResourceBase):
+            pks = 'id',
+            _relationships = [Relationship(name, relation='ScalingRelated', embedded=True)
+                              for name in names]
+
+        def format_resource():
+            properties = dict((name, dict(related_id=i)) for i, name in enumerate(names))
+            properties['id'] = 1
+            return adapter_class(ScalingRelationships(properties=properties)).formatted_body
+        return format_resource
+    return setup
+
+
+def _depth(adapter_class):
+    """
+    :return: The setup for formatting a resource whose
+        embedded relationships are nested size levels deep.
+    :rtype: function
+    """
+    def setup(size):
+        classes = []
+        for level in six.moves.range(size):
+            relationships = ()
+            if level + 1 < size:
+                relationships = Relationship('child', relation='ScalingLevel{0}'.format(level + 1),
+                                             embedded=True),
+            attrs = dict(pks=('id{0}'.format(level),), _relationships=relationships)
+            classes.append(type(str('ScalingLevel{0}'.format(level)), (ResourceBase,), attrs))
+
+        def format_resource():
+            properties = {}
+            for level in reversed(six.moves.range(size)):
+                properties = dict(properties and dict(child=properties) or {},
+                                  **{'id{0}'.format(level): level})
+            return adapter_class(classes[0](properties=properties)).formatted_body
+        return format_resource
+    return setup
+
+
+def _field_count(adapter_class):
+    """
+    :return: The setup for formatting a RetrieveList response
+        of 100 resources with size fields each.
+    :rtype: function
+    """
+    def setup(size):
+        field_names = tuple('field{0}'.format(i) for i in six.moves.range(size))
+
+        class ScalingFieldsManager(InMemoryManager):
+            _fields = ('id',) + field_names
+            _field_validators = dict((name, fields.IntegerField(name)) for name in field_names)
+
+        class ScalingFields(RetrieveList):
+            resource_name = 'scaling_fields'
+            manager = ScalingFieldsManager()
+
+        for i in six.moves.range(100):
+            obj = dict((name, i) for name in field_names)
+            obj['id'] = i
+            ScalingFields.manager.objects[i] = obj
+        return lambda: adapter_class(ScalingFields.retrieve_list(RequestContainer())).formatted_body
+    return setup
+
+
+for _adapter_class in ADAPTERS:
+    _name = _adapter_name(_adapter_class)
+    scaling_benchmark('scaling.list_size.{0}'.format(_name),
+                      sizes=LIST_SIZES)(_list_size(_adapter_class))
+    scaling_benchmark('scaling.relationships.{0}'.format(_name),
+                      sizes=RELATIONSHIP_COUNTS)(_relationship_count(_adapter_class))
+    scaling_benchmark('scaling.depth.{0}'.format(_name),
+                      sizes=DEPTHS)(_depth(_adapter_class))
+    scaling_benchmark('scaling.fields.{0}'.format(_name),
+                      sizes=FIELD_COUNTS)(_field_count(_adapter_class))
@@ -0,0 +1,44 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo import fields
+from ripozo.managers.memory import InMemoryManager
+
+
+class MemoryPeopleManager(InMemoryManager):
+    """
+    The manager whose lists the other managers'
+    lists are compared to.
+    """
+    _fields = ('id', 'name', 'age', 'score', 'team')
+    _field_validators = {
+        'id': fields.IntegerField('id'),
+        'name': fields.StringField('name'),
+        'age': fields.IntegerField('age'),
+        'score': fields.FloatField('score'),
+    }
+
+
+def retrieve_all(manager, filters, count=7):
+    """
+    Follows the next links of the manager's retrieve_list
+    until the last page.
+
+    :param BaseManager manager: The manager to page through.
+    :param dict filters: The filters of the first page.
+    :param int count: The number of rows per page.
+    :return: The rows of every page.
+    :rtype: list
+    """
+    rows, query = [], dict(filters, count=count)
+    while True:
+        page, meta = manager.retrieve_list(query)
+        page = list(page)
+        assert len(page) <= count, 'The page has more than {0} rows'.format(count)
+        rows.extend(page)
+        next_page = meta['links'].get('next')
+        if not next_page:
+            return rows
+        query = next_page
@@ -4,9 +4,14 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 from ripozo import restmixins, RequestContainer, ResourceBase
+from ripozo.adapters import BasicJSONAdapter, HalAdapter, JSONAPIAdapter, SirenAdapter
+from ripozo.exceptions import ValidationException
 
 from ripozo_tests.helpers.inmemory_manager import InMemoryManager
 
+import json
+import mock
+import types
 import unittest2
 import uuid
 
@@ -104,6 +109,21 @@ class TestRetrieve(TestBase):
         resource = self.resource_class.retrieve(req)
         self.assertDictEqual(resource.properties, model)
 
+    def test_retrieve_projection(self):
+        """Only the requested fields and the pks are returned"""
+        id_ = uuid.uuid4()
+        self.manager.objects[id_] = dict(id=id_, first=1, second=2)
+        req = RequestContainer(url_params=dict(id=id_), query_args=dict(fields='first'))
+        with mock.patch.object(self.manager, 'retrieve', wraps=self.manager.retrieve) as retrieve:
+            resource = self.resource_class.retrieve(req)
+            self.assertListEqual(retrieve.call_args[1]['fields'], ['first', 'id'])
+        self.assertDictEqual(resource.properties, dict(id=id_, first=1))
+
+    def test_retrieve_invalid_projection(self):
+        """Unknown fields are a validation error"""
+        req = RequestContainer(url_params=dict(id=1), query_args=dict(fields='blah'))
+        self.assertRaises(ValidationException, self.resource_class.retrieve, req)
+
 
 class TestRetrieveList(TestBase):
     resource_base = restmixins.RetrieveList
@@ -167,6 +187,27 @@ class TestRetrieveList(TestBase):
         self.assertIn(self.manager.pagination_count_query_arg, prev_resource.get_query_arg_dict())
         self.assertIn(self.manager.pagination_pk_query_arg, prev_resource.get_query_arg_dict())
 
+    def test_retrieve_list_projection(self):
+        """The projection is passed to the manager, applied to every
+        item and kept in the pagination links"""
+        self.create_resources(count=10)
+        req = RequestContainer(query_args=dict(fields='second'))
+        with mock.patch.object(self.manager, 'retrieve_list',
+                               wraps=self.manager.retrieve_list) as retrieve_list:
+            resource = self.resource_class.retrieve_list(req)
+            self.assertNotIn('fields', retrieve_list.call_args[0][0])
+            self.assertListEqual(retrieve_list.call_args[1]['fields'], ['second', 'id'])
+        items = resource.properties.get(self.resource_class.resource_name)
+        if items is None:
+            items = [rel.resource for rel in resource.related_resources
+                     if rel.name == self.resource_class.resource_name][0]
+            items = [res.properties for res in items]
+        self.assertEqual(len(items), self.manager.paginate_by)
+        for item in items:
+            self.assertListEquivalent(['id', 'second'], list(item.keys()))
+        next_link = [r for r in resource.linked_resources if r.name == 'next'][0]
+        self.assertEqual(next_link.resource.get_query_arg_dict()['fields'], 'second')
+
     def test_retrieve_list_manager_fields(self):
         """
         Tests that the manager fields
@@ -214,6 +255,29 @@ class TestRetrieveRetrieveList(TestRetrieve, TestRetrieveList):
             self.assertIn(res.properties, self.manager.objects.values())
             self.assertIsInstance(res, self.resource_class)
 
+    def test_retrieve_list_generator(self):
+        """Ensures that a generator returned by the manager
+        is consumed lazily and streamed by the adapters"""
+        for i in range(3):
+            self.manager.objects[i] = dict(id=i, first=1, second=2)
+
+        class GeneratorManager(self.manager.__class__):
+            def retrieve_list(self, filters, *args, **kwargs):
+                values, meta = super(GeneratorManager, self).retrieve_list(filters, *args, **kwargs)
+                return (value for value in values), meta
+
+        eager_resource = self.resource_class.retrieve_list(RequestContainer())
+        self.resource_class.manager = GeneratorManager()
+        self.resource_class.manager.objects = self.manager.objects
+        for adapter_class in (BasicJSONAdapter, HalAdapter, JSONAPIAdapter, SirenAdapter):
+            resource = self.resource_class.retrieve_list(RequestContainer())
+            for related in resource.related_resources:
+                if related.name == self.resource_class.resource_name:
+                    self.assertIsInstance(related.resource, types.GeneratorType)
+            streamed = ''.join(adapter_class(resource).iter_formatted_body(chunk_size=10))
+            expected = adapter_class(eager_resource).formatted_body
+            self.assertEqual(json.loads(streamed), json.loads(expected))
+
 
 class TestUpdate(TestBase):
     resource_base = restmixins.Update
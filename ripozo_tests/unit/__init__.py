@@ -1 +1,2 @@
-from . import dispatch, managers, resources, decorators, exceptions, tests_utilities, tests
\ No newline at end of file
+from . import dispatch, managers, resources, aggregates, decorators, exceptions, filters, \
+    instrumentation, profiling, tests_utilities, tests
@@ -0,0 +1,48 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo.aggregates import COUNT, SUM, MIN, MAX, Aggregation, aggregate_rows, parse_aggregates
+from ripozo.exceptions import ValidationException
+
+import unittest2
+
+_FIELDS = ('id', 'team', 'price')
+
+
+class TestParseAggregates(unittest2.TestCase):
+    def test_parse(self):
+        aggregations = parse_aggregates('count, SUM(price),max( price ),count(team),count', _FIELDS)
+        self.assertEqual(aggregations, [Aggregation(COUNT), Aggregation(SUM, 'price'), Aggregation(MAX, 'price'),
+                                        Aggregation(COUNT, 'team')])
+        self.assertEqual([aggregation.name for aggregation in aggregations],
+                         ['count', 'sum_price', 'max_price', 'count_team'])
+        self.assertEqual(parse_aggregates(['min(price)', 'count'], _FIELDS),
+                         [Aggregation(MIN, 'price'), Aggregation(COUNT)])
+        self.assertEqual(parse_aggregates('', _FIELDS), [])
+
+    def test_invalid(self):
+        for text in ['avg(price)', 'sum', 'sum(blah)', 'count(', 'sum(price) price']:
+            self.assertRaises(ValidationException, parse_aggregates, text, _FIELDS)
+
+
+class TestAggregateRows(unittest2.TestCase):
+    rows = [dict(team='a', price=1), dict(team='b', price=None), dict(team=None, price=3),
+            dict(team='a', price=4), dict(team='b', price=None)]
+    aggregations = [Aggregation(COUNT), Aggregation(COUNT, 'price'), Aggregation(SUM, 'price'),
+                    Aggregation(MIN, 'price'), Aggregation(MAX, 'price')]
+
+    def test_totals(self):
+        self.assertEqual(aggregate_rows(self.rows, self.aggregations),
+                         [dict(count=5, count_price=3, sum_price=8, min_price=1, max_price=4)])
+        self.assertEqual(aggregate_rows([], self.aggregations),
+                         [dict(count=0, count_price=0, sum_price=None, min_price=None, max_price=None)])
+
+    def test_group_by(self):
+        self.assertEqual(aggregate_rows(iter(self.rows), self.aggregations, ['team']), [
+            dict(team=None, count=1, count_price=1, sum_price=3, min_price=3, max_price=3),
+            dict(team='a', count=2, count_price=2, sum_price=5, min_price=1, max_price=4),
+            dict(team='b', count=2, count_price=0, sum_price=None, min_price=None, max_price=None),
+        ])
+        self.assertEqual(aggregate_rows([], self.aggregations, ['team']), [])
@@ -3,4 +3,4 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from ripozo_tests.unit.dispatch.adapters import base, boring_json, hal, siren
\ No newline at end of file
+from ripozo_tests.unit.dispatch.adapters import base, boring_json, hal, representation, siren
\ No newline at end of file
@@ -5,6 +5,7 @@ from __future__ import unicode_literals
 
 import unittest2
 import json
+import mock
 
 from ripozo import RequestContainer
 from ripozo.adapters.base import AdapterBase
@@ -98,4 +99,41 @@ class TestAdapterBase(unittest2.TestCase):
         """Dumb test for format_request"""
         request = RequestContainer()
         response = TestAdapter.format_request(request)
-        self.assertIs(response, request)
\ No newline at end of file
+        self.assertIs(response, request)
+
+    def test_render_memoized(self):
+        """A resource is only built once per render"""
+        class MemoResource(ResourceBase):
+            pks = 'id',
+
+        adapter = TestAdapter(None)
+        build = mock.Mock(side_effect=lambda res: dict(res.properties))
+        first = adapter.render_memoized(MemoResource(properties=dict(id=1)), True, build)
+        second = adapter.render_memoized(MemoResource(properties=dict(id=1)), True, build)
+        self.assertIs(first, second)
+        self.assertEqual(build.call_count, 1)
+        adapter.render_memoized(MemoResource(properties=dict(id=1)), False, build)
+        adapter.render_memoized(MemoResource(properties=dict(id=2)), True, build)
+        adapter.render_memoized(MemoResource(properties=dict(id=2), no_pks=True), True, build)
+        self.assertEqual(build.call_count, 4)
+        adapter.reset_render_memo()
+        adapter.render_memoized(MemoResource(properties=dict(id=1)), True, build)
+        self.assertEqual(build.call_count, 5)
+
+    def test_render_reference_while_rendering(self):
+        """The reference hook gets None for a resource that is still being built"""
+        class MemoResource(ResourceBase):
+            pks = 'id',
+
+        adapter = TestAdapter(None)
+        res = MemoResource(properties=dict(id=1))
+        adapter.render_reference = mock.Mock(return_value='reference')
+        inner = []
+
+        def build(resource):
+            inner.append(adapter.render_memoized(resource, True, build))
+            return 'built'
+
+        self.assertEqual(adapter.render_memoized(res, True, build), 'built')
+        self.assertListEqual(inner, ['reference'])
+        adapter.render_reference.assert_called_once_with(res, True, None)
@@ -7,7 +7,7 @@ import json
 import six
 import unittest2
 
-from ripozo import ResourceBase
+from ripozo import ResourceBase, Relationship
 from ripozo.adapters import HalAdapter
 from ripozo.resources.constructor import ResourceMetaClass
 from ripozo.resources.request import RequestContainer
@@ -101,6 +101,29 @@ class TestHalAdapter(unittest2.TestCase):
         resp = adapter._generate_relationship([rel1, rel2], True)
         self.assertListEqual([props, props2], resp)
 
+    def test_repeated_embedded_resource(self):
+        """A repeated embedded resource is only constructed once"""
+        class Fake(ResourceBase):
+            pks = 'id',
+
+        adapter = HalAdapter(None)
+        resp = adapter._generate_relationship([Fake(properties=dict(id=1)),
+                                               Fake(properties=dict(id=1))], True)
+        self.assertEqual(len(resp), 2)
+        self.assertIs(resp[0], resp[1])
+
+    def test_self_embedded_reference(self):
+        """A resource embedded in itself is represented by its self link"""
+        class SelfReferencing(ResourceBase):
+            pks = 'id',
+
+        SelfReferencing._links = Relationship('me', relation='SelfReferencing', embedded=True),
+        res = SelfReferencing(properties=dict(id=1), meta=dict(links=dict(me=dict(id=1))))
+        body = json.loads(HalAdapter(res).formatted_body)
+        self.assertEqual(body['id'], 1)
+        self.assertDictEqual(body['_embedded']['me'],
+                             dict(_links=dict(self=dict(href='/self_referencing/1'))))
+
     def test_not_all_pks(self):
         class Fake(ResourceBase):
             pks = ['id']
@@ -106,6 +106,121 @@ class TestJSONAPIAdapter(unittest2.TestCase):
         resp = JSONAPIAdapter.format_request(req)
         self.assertDictEqual(resp.body_args, dict(id=1))
 
+    def test_format_request_fieldsets(self):
+        """The fields[type] query args are collected into a dictionary"""
+        req = RequestContainer(query_args={'fields[people]': 'a,b', 'fields[dogs]': ['c'], 'x': 1})
+        resp = JSONAPIAdapter.format_request(req)
+        self.assertDictEqual(resp.query_args, dict(x=1, fields=dict(people='a,b', dogs=['c'])))
+
+    def test_construct_data_fieldsets(self):
+        """Only the requested attributes are included"""
+        class MyResource(ResourceBase):
+            pks = 'id',
+
+        res = MyResource(properties=dict(id=1, field='value', other='thing'))
+        req = JSONAPIAdapter.format_request(RequestContainer(query_args={'fields[my_resource]': 'field'}))
+        adapter = JSONAPIAdapter(resource=res, request=req)
+        resp = adapter._construct_data(res, embedded=True)
+        self.assertDictEqual(resp['attributes'], dict(field='value'))
+        self.assertEqual(resp['id'], '1')
+        adapter = JSONAPIAdapter(resource=res, request=RequestContainer())
+        resp = adapter._construct_data(res, embedded=True)
+        self.assertDictEqual(resp['attributes'], res.properties)
+
+    def test_format_request_include(self):
+        """The include query arg is moved to the adapter options"""
+        req = RequestContainer(query_args=dict(include='customer, customer.address', x=1))
+        resp = JSONAPIAdapter.format_request(req)
+        self.assertDictEqual(resp.query_args, dict(x=1))
+        self.assertListEqual(resp.adapter_options['include'], ['customer', 'customer.address'])
+        adapter = JSONAPIAdapter(resource=None, request=resp)
+        self.assertDictEqual(adapter.include_tree, dict(customer=dict(address={})))
+
+    def test_compound_document_deduplicates(self):
+        """Related resources are only included once"""
+        class IncludedCustomer(ResourceBase):
+            pks = 'customer_id',
+
+        class IncludedOrder(ResourceBase):
+            pks = 'id',
+            _relationships = (
+                Relationship('customer', relation='IncludedCustomer', embedded=True),
+                ListRelationship('included_order', relation='IncludedOrder', embedded=True),
+            )
+
+        orders = [dict(id=i, customer=dict(customer_id=1, name='bob')) for i in range(3)]
+        res = IncludedOrder(properties=dict(included_order=orders), no_pks=True)
+        req = JSONAPIAdapter.format_request(RequestContainer(query_args=dict(include='customer')))
+        for body in [JSONAPIAdapter(res, request=req).formatted_body,
+                     ''.join(JSONAPIAdapter(res, request=req).iter_formatted_body())]:
+            body = json.loads(body)
+            orders = body['data']['relationships']['included_order']['data']
+            self.assertEqual(len(orders), 3)
+            for order in orders:
+                self.assertEqual(order['type'], 'included_order')
+                self.assertListEqual(order['relationships']['customer']['data'],
+                                     [dict(type='included_customer', id='1')])
+            self.assertEqual(len(body['included']), 1)
+            customer = body['included'][0]
+            self.assertEqual(customer['id'], '1')
+            self.assertEqual(customer['attributes']['name'], 'bob')
+
+    def test_compound_document_nested_include(self):
+        """Nested include paths include the related resources' relationships"""
+        class IncludedAddress(ResourceBase):
+            pks = 'address_id',
+
+        class IncludedCustomer(ResourceBase):
+            pks = 'customer_id',
+            _relationships = Relationship('address', relation='IncludedAddress', embedded=True),
+
+        class IncludedOrder(ResourceBase):
+            pks = 'id',
+            _relationships = Relationship('customer', relation='IncludedCustomer', embedded=True),
+
+        res = IncludedOrder(properties=dict(id=1, customer=dict(customer_id=2, address=dict(address_id=3))))
+        query_args = dict(include='customer.address,unknown')
+        req = JSONAPIAdapter.format_request(RequestContainer(query_args=query_args))
+        body = json.loads(JSONAPIAdapter(res, request=req).formatted_body)
+        self.assertListEqual(body['data']['relationships']['customer']['data'],
+                             [dict(type='included_customer', id='2')])
+        included = [(item['type'], item['id']) for item in body['included']]
+        self.assertListEqual(included, [('included_customer', '2'), ('included_address', '3')])
+        self.assertListEqual(body['included'][0]['relationships']['address']['data'],
+                             [dict(type='included_address', id='3')])
+
+        req = JSONAPIAdapter.format_request(RequestContainer(query_args=dict(include='customer')))
+        body = json.loads(JSONAPIAdapter(res, request=req).formatted_body)
+        self.assertEqual(len(body['included']), 1)
+
+    def test_compound_document_lazy_nested_include(self):
+        """Resources included through lazy relationships of included resources are included"""
+        class LazyIncludedOrder(ResourceBase):
+            pks = 'order_id',
+
+        class LazyIncludedCustomer(ResourceBase):
+            pks = 'customer_id',
+            _relationships = ListRelationship('lazy_included_order', relation='LazyIncludedOrder'),
+
+        class LazyIncludingOrder(ResourceBase):
+            pks = 'id',
+            _relationships = Relationship('customer', relation='LazyIncludedCustomer', embedded=True),
+
+        def get_resource():
+            orders = (dict(order_id=i) for i in range(2))
+            return LazyIncludingOrder(properties=dict(id=1, customer=dict(customer_id=2, lazy_included_order=orders)))
+
+        req = JSONAPIAdapter.format_request(RequestContainer(query_args=dict(include='customer.lazy_included_order')))
+        for body in [JSONAPIAdapter(get_resource(), request=req).formatted_body,
+                     ''.join(JSONAPIAdapter(get_resource(), request=req).iter_formatted_body(chunk_size=1))]:
+            body = json.loads(body)
+            included = [(item['type'], item['id']) for item in body['included']]
+            self.assertListEqual(included, [('lazy_included_customer', '2'), ('lazy_included_order', '0'),
+                                            ('lazy_included_order', '1')])
+            self.assertListEqual(body['included'][0]['relationships']['lazy_included_order']['data'],
+                                 [dict(type='lazy_included_order', id='0'),
+                                  dict(type='lazy_included_order', id='1')])
+
     def test_format_request_improper_request(self):
         """
         Ensures that the appropriate exception is raised when
@@ -0,0 +1,82 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+
+import unittest2
+
+from ripozo import ResourceBase, Relationship, ListRelationship
+from ripozo.adapters import BasicJSONAdapter, HalAdapter, JSONAPIAdapter, SirenAdapter
+from ripozo.adapters.representation import represent, ResourceNode
+
+
+class TestRepresentation(unittest2.TestCase):
+    def get_resource(self):
+        class RepresentedChild(ResourceBase):
+            pks = 'child_id',
+
+        class Represented(ResourceBase):
+            pks = 'id',
+            _relationships = (
+                Relationship('child', relation='RepresentedChild', embedded=True),
+                ListRelationship('children', relation='RepresentedChild'),
+            )
+
+        props = dict(id=1, child=dict(child_id=2),
+                     represented_child=[dict(child_id=3), dict(child_id=4)])
+        return Represented(properties=props)
+
+    def test_represent(self):
+        """The nodes have absolute urls and mirror the relationships"""
+        res = self.get_resource()
+        node = represent(res, base_url='/api')
+        self.assertIsInstance(node, ResourceNode)
+        self.assertIs(node.resource, res)
+        self.assertEqual(node.url, '/api/represented/1')
+        self.assertEqual(node.resource_name, 'represented')
+        self.assertDictEqual(node.item_pks, dict(id=1))
+        self.assertTrue(node.has_all_pks)
+        child, name, embedded = node.related_resources[0]
+        self.assertEqual(name, 'child')
+        self.assertTrue(embedded)
+        self.assertEqual(child.url, '/api/represented_child/2')
+        children = node.related_resources[1].resource
+        self.assertListEqual([c.url for c in children],
+                             ['/api/represented_child/3', '/api/represented_child/4'])
+
+    def test_represent_cached(self):
+        """The representation is only built once per base url"""
+        res = self.get_resource()
+        node = represent(res, base_url='/api')
+        self.assertIs(represent(res, base_url='/api'), node)
+        self.assertIs(represent(node), node)
+        self.assertIsNot(represent(res), node)
+        self.assertEqual(represent(res).url, '/represented/1')
+
+    def test_adapters_share_representation(self):
+        """Every adapter encodes the same representation"""
+        res = self.get_resource()
+        node = represent(res, base_url='/api')
+        for adapter_class in [BasicJSONAdapter, HalAdapter, JSONAPIAdapter, SirenAdapter]:
+            adapter = adapter_class(res, base_url='/api')
+            self.assertIs(adapter.representation, node)
+            json.loads(adapter.formatted_body)
+
+    def test_adapter_combines_urls(self):
+        """Adapters overriding combine_base_url_with_resource_url build the urls"""
+        class VersionedAdapter(HalAdapter):
+            def combine_base_url_with_resource_url(self, resource_url):
+                return super(VersionedAdapter, self).combine_base_url_with_resource_url(resource_url) + '?v=2'
+
+        res = self.get_resource()
+        node = represent(res, base_url='/api')
+        adapter = VersionedAdapter(res, base_url='/api')
+        self.assertIsNot(adapter.representation, node)
+        self.assertIs(VersionedAdapter(res, base_url='/api').representation, adapter.representation)
+        self.assertEqual(adapter.representation.url, '/api/represented/1?v=2')
+        body = json.loads(adapter.formatted_body)
+        self.assertEqual(body['_links']['self']['href'], '/api/represented/1?v=2')
+        self.assertEqual(body['_embedded']['child']['_links']['self']['href'], '/api/represented_child/2?v=2')
+        self.assertEqual(node.url, '/api/represented/1')
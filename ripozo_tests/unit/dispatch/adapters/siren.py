@@ -248,3 +248,15 @@ class TestSirenAdapter(TestAdapterBase):
         request = RequestContainer()
         response = SirenAdapter.format_request(request)
         self.assertIs(response, request)
+
+    def test_repeated_entity(self):
+        """Repeated embedded entities are only constructed once"""
+        class RepeatedEntity(ResourceBase):
+            pks = 'id',
+
+        adapter = SirenAdapter(None)
+        resources = [RepeatedEntity(properties=dict(id=1)), RepeatedEntity(properties=dict(id=1))]
+        first, second = list(adapter.generate_entity(resources, 'name', True))
+        self.assertDictEqual(first, second)
+        self.assertIs(first['properties'], second['properties'])
+        self.assertListEqual(first['rel'], ['name'])
@@ -7,10 +7,11 @@ from mock import Mock, MagicMock
 import mock
 import unittest2
 
-from ripozo import ResourceBase
+from ripozo import ResourceBase, RequestContainer
 from ripozo.adapters import BasicJSONAdapter, HalAdapter, SirenAdapter
 from ripozo.dispatch_base import DispatcherBase
 from ripozo.exceptions import AdapterFormatAlreadyRegisteredException
+from ripozo.instrumentation import DispatchObserver
 from ripozo.resources.constructor import ResourceMetaClass
 from ripozo_tests.helpers.dispatcher import FakeDispatcher
 
@@ -48,6 +49,43 @@ class TestDispatchBase(unittest2.TestCase):
         self.assertEqual(adapter.call_count, 1)
         self.assertEqual(endpoint_func.call_count, 1)
 
+    def test_dispatch_adapter_without_request(self):
+        """Adapters whose __init__ does not accept the request still get it"""
+        class LegacyAdapter(BasicJSONAdapter):
+            formats = ['legacy']
+
+            def __init__(self, resource, base_url=''):
+                super(LegacyAdapter, self).__init__(resource, base_url=base_url)
+
+        request = RequestContainer()
+        for dispatcher in [FakeDispatcher(), FakeDispatcher(observers=[DispatchObserver()])]:
+            dispatcher.register_adapters(LegacyAdapter)
+            adapter = dispatcher.dispatch(lambda req: ResourceBase(), ['legacy'], request)
+            self.assertIsInstance(adapter, LegacyAdapter)
+            self.assertIs(adapter.request, request)
+            self.assertEqual(adapter.base_url, dispatcher.base_url)
+
+    def test_auto_options_invalidated(self):
+        """
+        Tests that registering a resource rebuilds
+        the cached auto options resource.
+        """
+        class FirstOptioned(ResourceBase):
+            pks = ('id',)
+
+        class SecondOptioned(ResourceBase):
+            pks = ('id',)
+
+        dispatcher = FakeDispatcher(auto_options_name='InvalidatedOptions')
+        dispatcher.register_resources(FirstOptioned)
+        options_class = dispatcher.auto_options_class
+        options = options_class.all_options(RequestContainer())
+        self.assertIs(options_class.all_options(RequestContainer()), options)
+        dispatcher.register_resources(SecondOptioned)
+        updated = options_class.all_options(RequestContainer())
+        self.assertIsNot(updated, options)
+        self.assertListEqual(options_class.linked_resource_classes, [FirstOptioned, SecondOptioned])
+
     def test_register_adapters(self):
         """Tests whether adapters are properly registered"""
         adapters = (SirenAdapter, HalAdapter, BasicJSONAdapter,)
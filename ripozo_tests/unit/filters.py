@@ -0,0 +1,113 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo import fields
+from ripozo.exceptions import ValidationException
+from ripozo.filters import EQUAL, NOT_EQUAL, IN, NOT_IN, GREATER_EQUAL, LESS, Condition, And, \
+    Or, PredicateCompiler, SelectivityCompiler, conjunction, conjuncts, parse_expression, \
+    parse_query_args
+
+import unittest2
+
+_FIELDS = ('id', 'name', 'age', 'team')
+_VALIDATORS = [fields.IntegerField('id'), fields.StringField('name'),
+               fields.IntegerField('age'), None]
+
+
+class TestParseQueryArgs(unittest2.TestCase):
+    def test_equality_and_operators(self):
+        node = parse_query_args(dict(name='bob', age__gte='10', count=5, blah__lt=1),
+                                _FIELDS, _VALIDATORS)
+        self.assertEqual(node, And([Condition('age', GREATER_EQUAL, 10),
+                                    Condition('name', EQUAL, 'bob')]))
+
+    def test_in(self):
+        self.assertEqual(parse_query_args(dict(age__in='1,2'), _FIELDS, _VALIDATORS),
+                         Condition('age', IN, (1, 2)))
+        self.assertEqual(parse_query_args(dict(team__nin=['a']), _FIELDS, _VALIDATORS),
+                         Condition('team', NOT_IN, ('a',)))
+
+    def test_single_item_lists_are_unwrapped(self):
+        self.assertEqual(parse_query_args(dict(age=['3']), _FIELDS, _VALIDATORS),
+                         Condition('age', EQUAL, 3))
+
+    def test_nothing_filtered(self):
+        self.assertIsNone(parse_query_args(dict(count=1, unknown__in='a'), _FIELDS, _VALIDATORS))
+
+    def test_invalid_values(self):
+        self.assertRaises(ValidationException, parse_query_args,
+                          dict(age='old'), _FIELDS, _VALIDATORS)
+        self.assertRaises(ValidationException, parse_query_args,
+                          dict(age__gt=None), _FIELDS, _VALIDATORS)
+
+
+class TestParseExpression(unittest2.TestCase):
+    def parse(self, text):
+        return parse_expression(text, _FIELDS, _VALIDATORS)
+
+    def test_precedence(self):
+        node = self.parse('age >= 10 and name = bob or team = a')
+        self.assertEqual(node, Or([And([Condition('age', GREATER_EQUAL, 10),
+                                        Condition('name', EQUAL, 'bob')]),
+                                   Condition('team', EQUAL, 'a')]))
+        node = self.parse('age >= 10 AND (name = bob OR team = a)')
+        self.assertEqual(node, And([Condition('age', GREATER_EQUAL, 10),
+                                    Or([Condition('name', EQUAL, 'bob'),
+                                        Condition('team', EQUAL, 'a')])]))
+
+    def test_not_is_pushed_down(self):
+        node = self.parse('not (name = bob or age < 5)')
+        self.assertEqual(node, And([Condition('name', NOT_EQUAL, 'bob'),
+                                    Or([Condition('age', GREATER_EQUAL, 5),
+                                        Condition('age', EQUAL, None)])]))
+        self.assertEqual(self.parse('not not name = bob'), Condition('name', EQUAL, 'bob'))
+
+    def test_in_and_null(self):
+        self.assertEqual(self.parse('age in (1, 2, null)'), Condition('age', IN, (1, 2, None)))
+        self.assertEqual(self.parse('team not in (a)'), Condition('team', NOT_IN, ('a',)))
+        self.assertEqual(self.parse('team is null'), Condition('team', EQUAL, None))
+        self.assertEqual(self.parse('team is not null'), Condition('team', NOT_EQUAL, None))
+
+    def test_quoted_values(self):
+        self.assertEqual(self.parse('name = "Bob and Sue"'),
+                         Condition('name', EQUAL, 'Bob and Sue'))
+        self.assertEqual(self.parse("name in ('a, b', Or)"), Condition('name', IN, ('a, b', 'Or')))
+
+    def test_invalid_expressions(self):
+        for text in ['name =', 'name = bob and', '(name = bob', 'name bob', 'name = bob)',
+                     'blah = 1', 'age = old', 'age > null', 'name in ()', 'name = "bob']:
+            self.assertRaises(ValidationException, self.parse, text)
+
+
+class TestNodes(unittest2.TestCase):
+    def test_conjunction(self):
+        first, second = Condition('age', LESS, 5), Condition('name', EQUAL, 'bob')
+        self.assertIsNone(conjunction([None]))
+        self.assertEqual(conjunction([None, first]), first)
+        self.assertEqual(conjunction([And([first]), second]), And([first, second]))
+        self.assertEqual(conjuncts(And([first, second])), [first, second])
+        self.assertEqual(conjuncts(None), [])
+
+    def test_predicate_compiler(self):
+        node = parse_expression('age >= 10 and (team in (a, null) or name != bob)',
+                                _FIELDS, _VALIDATORS)
+        predicate = PredicateCompiler().compile(node)
+        rows = [dict(age=10, team=None, name='bob'), dict(age=12, team='b', name='bob'),
+                dict(age=None, team='a', name='sue'), dict(age=11, team='b', name=None)]
+        self.assertEqual([predicate(row) for row in rows], [True, False, False, True])
+        self.assertEqual([node.matches(row) for row in rows], [True, False, False, True])
+        negated = PredicateCompiler().compile(node.negate())
+        self.assertEqual([negated(row) for row in rows], [False, True, True, False])
+
+    def test_selectivity_compiler(self):
+        compiler = SelectivityCompiler(dict(team=4))
+        parse = lambda text: parse_expression(text, _FIELDS, _VALIDATORS)
+        self.assertAlmostEqual(compiler.compile(parse('team = a')), 0.25)
+        self.assertAlmostEqual(compiler.compile(parse('team != a')), 0.75)
+        self.assertAlmostEqual(compiler.compile(parse('team in (a, b, a)')), 0.5)
+        self.assertAlmostEqual(compiler.compile(parse('team not in (a, b, c, d, e)')), 0)
+        self.assertAlmostEqual(compiler.compile(parse('name = bob')), 0.1)
+        self.assertAlmostEqual(compiler.compile(parse('team = a and age > 3')), 0.25 / 3)
+        self.assertAlmostEqual(compiler.compile(parse('team = a or name = bob')), 1 - 0.75 * 0.9)
@@ -0,0 +1,6 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo_tests.unit.instrumentation import base, managers, memory, metrics, profiler, tracing
@@ -0,0 +1,162 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import gc
+
+import unittest2
+
+from ripozo import ResourceBase, apimethod, RequestContainer
+from ripozo.adapters import AdapterBase, SirenAdapter
+from ripozo.instrumentation import DispatchObserver, current_context, stage
+from ripozo.instrumentation.base import RequestContext, observe_request, endpoint_name
+from ripozo_tests.helpers.dispatcher import FakeDispatcher
+
+
+class RecordingObserver(DispatchObserver):
+    def __init__(self, observe=True):
+        self.observe = observe
+        self.calls = []
+
+    def should_observe(self, endpoint_func, request):
+        return self.observe
+
+    def request_started(self, context):
+        self.calls.append(('request_started', context.endpoint))
+
+    def stage_started(self, context, stage_name):
+        self.calls.append(('stage_started', stage_name))
+
+    def stage_finished(self, context, stage_name, duration):
+        self.calls.append(('stage_finished', stage_name))
+
+    def request_finished(self, context, exc=None):
+        self.calls.append(('request_finished', exc))
+
+
+class ChunkedAdapter(AdapterBase):
+    formats = ['chunked']
+    extra_headers = {}
+
+    def __init__(self, *args, **kwargs):
+        super(ChunkedAdapter, self).__init__(*args, **kwargs)
+        self.contexts = []
+
+    @property
+    def formatted_body(self):
+        return ''.join(self.iter_formatted_body())
+
+    def iter_formatted_body(self, chunk_size=8192):
+        for chunk in ('a', 'b'):
+            self.contexts.append(current_context())
+            yield chunk
+
+
+class ObservedResource(ResourceBase):
+    pks = ('id',)
+
+    @apimethod(methods=['GET'])
+    def observed(cls, request):
+        return cls(properties=dict(id=1))
+
+    @apimethod(methods=['POST'])
+    def broken(cls, request):
+        raise ValueError('broken')
+
+
+class TestInstrumentation(unittest2.TestCase):
+    def test_stage_without_context(self):
+        """A stage does nothing when the request is not observed."""
+        self.assertIsNone(current_context())
+        with stage('something') as stg:
+            pass
+        self.assertIsNone(stg.context)
+
+    def test_stage_not_nested_in_itself(self):
+        observer = RecordingObserver()
+        context = RequestContext([observer], ObservedResource.observed, None)
+        with observe_request(context):
+            self.assertIs(current_context(), context)
+            with stage('outer'):
+                with stage('inner'):
+                    with stage('outer'):
+                        pass
+        self.assertIsNone(current_context())
+        self.assertListEqual(observer.calls, [
+            ('request_started', 'ObservedResource__observed'),
+            ('stage_started', 'outer'),
+            ('stage_started', 'inner'),
+            ('stage_finished', 'inner'),
+            ('stage_finished', 'outer'),
+            ('request_finished', None),
+        ])
+
+    def test_endpoint_name(self):
+        self.assertEqual(endpoint_name(ObservedResource.observed), 'ObservedResource__observed')
+        self.assertEqual(endpoint_name(len), 'len')
+
+    def test_dispatch_observed(self):
+        observer = RecordingObserver()
+        dispatcher = FakeDispatcher(observers=[observer])
+        dispatcher.register_adapters(SirenAdapter)
+        adapter = dispatcher.dispatch(ObservedResource.observed, [], RequestContainer())
+        stages = [name for call, name in observer.calls if call == 'stage_started']
+        self.assertListEqual(stages, ['negotiation', 'format_request', 'apimethod', 'resource', 'adapter'])
+        self.assertNotIn(('request_finished', None), observer.calls)
+        self.assertIsNone(current_context())
+        self.assertIs(type(adapter), SirenAdapter)
+        self.assertEqual(adapter.formatted_body, SirenAdapter(adapter.resource, base_url=dispatcher.base_url).formatted_body)
+        self.assertListEqual(observer.calls[-3:], [('stage_started', 'render'), ('stage_finished', 'render'),
+                                                   ('request_finished', None)])
+        calls = len(observer.calls)
+        self.assertEqual(''.join(adapter.iter_formatted_body()), adapter.formatted_body)
+        self.assertEqual(len(observer.calls), calls)
+
+    def test_dispatch_observed_streamed(self):
+        observer = RecordingObserver()
+        dispatcher = FakeDispatcher(observers=[observer])
+        dispatcher.register_adapters(ChunkedAdapter)
+        adapter = dispatcher.dispatch(ObservedResource.observed, ['chunked'], RequestContainer())
+        chunks = adapter.iter_formatted_body()
+        self.assertEqual(next(chunks), 'a')
+        self.assertIsNone(current_context())
+        self.assertEqual(adapter.contexts[0].endpoint, 'ObservedResource__observed')
+        self.assertEqual(observer.calls[-1], ('stage_started', 'render'))
+        self.assertEqual(list(chunks), ['b'])
+        self.assertListEqual(observer.calls[-2:], [('stage_finished', 'render'), ('request_finished', None)])
+
+        adapter = dispatcher.dispatch(ObservedResource.observed, ['chunked'], RequestContainer())
+        chunks = adapter.iter_formatted_body()
+        next(chunks)
+        chunks.close()
+        self.assertListEqual(observer.calls[-2:], [('stage_finished', 'render'), ('request_finished', None)])
+
+    def test_dispatch_observed_not_rendered(self):
+        observer = RecordingObserver()
+        dispatcher = FakeDispatcher(observers=[observer])
+        dispatcher.register_adapters(SirenAdapter)
+        adapter = dispatcher.dispatch(ObservedResource.observed, [], RequestContainer())
+        del adapter
+        gc.collect()
+        self.assertEqual(observer.calls[-2:], [('stage_finished', 'adapter'), ('request_finished', None)])
+        self.assertIsNone(current_context())
+
+    def test_dispatch_not_observed(self):
+        observer = RecordingObserver(observe=False)
+        dispatcher = FakeDispatcher()
+        dispatcher.add_observer(observer)
+        dispatcher.register_adapters(SirenAdapter)
+        adapter = dispatcher.dispatch(ObservedResource.observed, [], RequestContainer())
+        self.assertListEqual(observer.calls, [])
+        self.assertIs(type(adapter), SirenAdapter)
+
+    def test_dispatch_exception(self):
+        observer = RecordingObserver()
+        dispatcher = FakeDispatcher(observers=[observer])
+        dispatcher.register_adapters(SirenAdapter)
+        self.assertRaises(ValueError, dispatcher.dispatch, ObservedResource.broken, [], RequestContainer())
+        call, exc = observer.calls[-1]
+        self.assertEqual(call, 'request_finished')
+        self.assertIsInstance(exc, ValueError)
+        self.assertIsNone(current_context())
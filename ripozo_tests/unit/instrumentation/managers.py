@@ -0,0 +1,82 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import logging
+
+import mock
+import unittest2
+
+from ripozo import RequestContainer
+from ripozo.adapters import SirenAdapter
+from ripozo.exceptions import ManagerCallBudgetExceeded
+from ripozo.instrumentation import ManagerCallCounter
+from ripozo.resources.restmixins import RetrieveList
+from ripozo_tests.helpers.dispatcher import FakeDispatcher
+from ripozo_tests.helpers.inmemory_manager import InMemoryManager
+
+
+class CountedManager(InMemoryManager):
+    def retrieve(self, lookup_keys, *args, **kwargs):
+        return super(CountedManager, self).retrieve(lookup_keys, *args, **kwargs)
+
+
+def hydrate(cls, function_name, request, resource):
+    """A postprocessor that retrieves each row separately."""
+    for row in resource.properties[cls.resource_name]:
+        cls.manager.retrieve(dict(id=row['id']))
+
+
+class TestManagerCallCounter(unittest2.TestCase):
+    def setUp(self):
+        class CountedResource(RetrieveList):
+            manager = CountedManager()
+            pks = ('id',)
+            postprocessors = [hydrate]
+
+        self.resource_class = CountedResource
+        for model_id in range(5):
+            CountedResource.manager.objects[model_id] = dict(id=model_id)
+
+    def dispatch(self, counter):
+        dispatcher = FakeDispatcher(observers=[counter])
+        dispatcher.register_adapters(SirenAdapter)
+        return dispatcher.dispatch(self.resource_class.retrieve_list, [], RequestContainer()).formatted_body
+
+    def test_counts(self):
+        counter = ManagerCallCounter()
+        self.dispatch(counter)
+        self.dispatch(counter)
+        stats = counter.stats('CountedResource__retrieve_list')
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['calls'], 12)
+        self.assertEqual(stats['max_calls'], 6)
+        self.assertEqual(stats['methods']['CountedManager.retrieve']['calls'], 10)
+        self.assertEqual(stats['methods']['CountedManager.retrieve']['max_calls'], 5)
+        self.assertEqual(stats['methods']['CountedManager.retrieve_list']['calls'], 2)
+        self.assertGreaterEqual(stats['methods']['CountedManager.retrieve']['seconds'], 0)
+        self.assertListEqual(list(counter.stats()), ['CountedResource__retrieve_list'])
+        self.assertEqual(counter.stats('missing')['requests'], 0)
+
+    def test_budget_raises(self):
+        counter = ManagerCallCounter(budget=3, on_exceeded='raise')
+        self.assertRaises(ManagerCallBudgetExceeded, self.dispatch, counter)
+        stats = counter.stats('CountedResource__retrieve_list')
+        self.assertEqual(stats['max_calls'], 4)
+        self.assertEqual(stats['methods']['CountedManager.retrieve']['calls'], 2)
+
+    def test_budget_logs_once(self):
+        logger = mock.MagicMock(spec=logging.Logger)
+        counter = ManagerCallCounter(budget=10, budgets=dict(CountedResource__retrieve_list=2), logger=logger)
+        self.dispatch(counter)
+        self.assertEqual(logger.warning.call_count, 1)
+        self.assertIn('CountedResource__retrieve_list', logger.warning.call_args[0][0])
+
+    def test_within_budget(self):
+        counter = ManagerCallCounter(budget=6, on_exceeded='raise')
+        self.dispatch(counter)
+        self.assertEqual(counter.stats('CountedResource__retrieve_list')['calls'], 6)
+
+    def test_invalid_on_exceeded(self):
+        self.assertRaises(ValueError, ManagerCallCounter, on_exceeded='explode')
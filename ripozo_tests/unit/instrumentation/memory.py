@@ -0,0 +1,100 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import unittest2
+
+from ripozo import ResourceBase, apimethod, RequestContainer
+from ripozo.adapters import SirenAdapter
+from ripozo.instrumentation import memory
+from ripozo.instrumentation.base import RequestContext
+from ripozo.instrumentation.memory import MemoryProfiler, ListSink
+from ripozo_tests.helpers.dispatcher import FakeDispatcher
+
+
+class MemoryProfiledResource(ResourceBase):
+    pks = ('id',)
+
+    @apimethod(methods=['GET'])
+    def profiled(cls, request):
+        return cls(properties=dict(id=1, values=list(range(1000))))
+
+
+@unittest2.skipIf(memory.tracemalloc is None, 'tracemalloc is not available')
+class TestMemoryProfiler(unittest2.TestCase):
+    def dispatch(self, profiler):
+        dispatcher = FakeDispatcher(observers=[profiler])
+        dispatcher.register_adapters(SirenAdapter)
+        return dispatcher.dispatch(MemoryProfiledResource.profiled, [], RequestContainer()).formatted_body
+
+    def test_report(self):
+        sink = ListSink()
+        self.dispatch(MemoryProfiler(sink=sink))
+        self.assertEqual(len(sink.reports), 1)
+        report = sink.reports[0]
+        self.assertEqual(report['endpoint'], 'MemoryProfiledResource__profiled')
+        self.assertEqual(report['adapter'], 'SirenAdapter')
+        self.assertIsNone(report['error'])
+        stages = dict((stg['name'], stg) for stg in report['stages'])
+        self.assertIn('apimethod', stages)
+        self.assertIn('render', stages)
+        self.assertGreater(stages['render']['peak'], 0)
+        for stg in report['stages']:
+            self.assertGreaterEqual(stg['peak'], 0)
+            for module in stg['modules']:
+                self.assertTrue(module == memory.OTHER_MODULES or module.startswith('ripozo'))
+        self.assertFalse(memory.tracemalloc.is_tracing())
+
+    def test_overlapping_requests(self):
+        """Requests overlapping a profiled request are skipped"""
+        sink = ListSink()
+        profiler = MemoryProfiler(sink=sink)
+        other = MemoryProfiler(sink=sink)
+        first = RequestContext([profiler], MemoryProfiledResource.profiled, RequestContainer())
+        second = RequestContext([profiler], MemoryProfiledResource.profiled, RequestContainer())
+        third = RequestContext([other], MemoryProfiledResource.profiled, RequestContainer())
+        profiler.request_started(first)
+        profiler.request_started(second)
+        other.request_started(third)
+        profiler.stage_started(first, 'apimethod')
+        profiler.stage_started(second, 'apimethod')
+        other.stage_started(third, 'apimethod')
+        profiler.stage_finished(second, 'apimethod', 0)
+        profiler.request_finished(second)
+        other.stage_finished(third, 'apimethod', 0)
+        other.request_finished(third)
+        self.assertTrue(memory.tracemalloc.is_tracing())
+        profiler.stage_finished(first, 'apimethod', 0)
+        profiler.request_finished(first)
+        self.assertFalse(memory.tracemalloc.is_tracing())
+        self.assertEqual(len(sink.reports), 1)
+        self.assertEqual(len(sink.reports[0]['stages']), 1)
+        self.dispatch(profiler)
+        self.assertEqual(len(sink.reports), 2)
+
+    def test_tracing_stopped_elsewhere(self):
+        sink = ListSink()
+        profiler = MemoryProfiler(sink=sink)
+        context = RequestContext([profiler], MemoryProfiledResource.profiled, RequestContainer())
+        profiler.request_started(context)
+        profiler.stage_started(context, 'apimethod')
+        memory.tracemalloc.stop()
+        profiler.stage_finished(context, 'apimethod', 0)
+        profiler.stage_started(context, 'render')
+        profiler.stage_finished(context, 'render', 0)
+        profiler.request_finished(context)
+        self.assertListEqual(sink.reports, [])
+        self.dispatch(profiler)
+        self.assertEqual(len(sink.reports), 1)
+        self.assertFalse(memory.tracemalloc.is_tracing())
+
+    def test_not_sampled(self):
+        sink = ListSink()
+        self.dispatch(MemoryProfiler(sample_rate=0, sink=sink))
+        self.assertListEqual(sink.reports, [])
+
+    def test_module_name(self):
+        profiler = MemoryProfiler(sink=ListSink())
+        self.assertEqual(profiler._module_name(memory.__file__), 'ripozo.instrumentation.memory')
+        self.assertEqual(profiler._module_name(unittest2.__file__), memory.OTHER_MODULES)
@@ -0,0 +1,123 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import threading
+
+import unittest2
+
+from ripozo import ResourceBase, ListRelationship, apimethod, RequestContainer
+from ripozo.adapters import SirenAdapter
+from ripozo.instrumentation import DispatchMetrics, Histogram
+from ripozo_tests.helpers.dispatcher import FakeDispatcher
+
+
+class MeasuredResource(ResourceBase):
+    pks = ('id',)
+
+    @apimethod(methods=['GET'])
+    def measured(cls, request):
+        return cls(properties=dict(id=1))
+
+    @apimethod(methods=['POST'])
+    def failing(cls, request):
+        raise KeyError('failing')
+
+
+class TestHistogram(unittest2.TestCase):
+    def test_observe(self):
+        histogram = Histogram(buckets=(1, 2, 4))
+        for value in (0.5, 1, 1.5, 3, 10):
+            histogram.observe(value)
+        cumulative, total, count = histogram.snapshot()
+        self.assertListEqual(cumulative, [2, 3, 4, 5])
+        self.assertEqual(total, 16)
+        self.assertEqual(count, 5)
+
+    def test_threads(self):
+        histogram = Histogram(buckets=(1,))
+
+        def record():
+            for _ in range(1000):
+                histogram.observe(0.5)
+
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(histogram.count, 4000)
+        self.assertEqual(len(histogram._shards), 4)
+
+    def test_quantile(self):
+        histogram = Histogram(buckets=(1, 2))
+        self.assertIsNone(histogram.quantile(0.5))
+        for value in (0.5, 1.5, 1.5, 1.5):
+            histogram.observe(value)
+        self.assertAlmostEqual(histogram.quantile(0.25), 1)
+        self.assertAlmostEqual(histogram.quantile(0.5), 1 + 1 / 3)
+        histogram.observe(5)
+        self.assertEqual(histogram.quantile(1), 2)
+
+
+class TestDispatchMetrics(unittest2.TestCase):
+    def setUp(self):
+        self.metrics = DispatchMetrics(buckets=(0.5, 1))
+        self.dispatcher = FakeDispatcher(observers=[self.metrics])
+        self.dispatcher.register_adapters(SirenAdapter)
+
+    def test_stages_recorded(self):
+        self.dispatcher.dispatch(MeasuredResource.measured, [], RequestContainer()).formatted_body
+        self.dispatcher.dispatch(MeasuredResource.measured, [], RequestContainer()).formatted_body
+        stages = dict((histogram['stage'], histogram) for histogram in self.metrics.collect())
+        self.assertSetEqual(set(stages), set(['request', 'negotiation', 'format_request', 'apimethod',
+                                              'resource', 'adapter', 'render']))
+        for histogram in stages.values():
+            self.assertEqual(histogram['endpoint'], 'MeasuredResource__measured')
+            self.assertEqual(histogram['count'], 2)
+            self.assertEqual(histogram['buckets'][-1], (float('inf'), 2))
+        self.assertEqual(self.metrics.histogram('MeasuredResource__measured', 'render').count, 2)
+
+    def test_streamed_body(self):
+        consumed = []
+
+        class StreamedResource(ResourceBase):
+            pks = ('id',)
+            _relationships = (ListRelationship('children', relation='StreamedResource'),)
+
+            @apimethod(methods=['GET'])
+            def streamed(cls, request):
+                def children():
+                    for id_ in range(2, 5):
+                        consumed.append(id_)
+                        yield dict(id=id_)
+                return cls(properties=dict(id=1, children=children()))
+
+        adapter = self.dispatcher.dispatch(StreamedResource.streamed, [], RequestContainer())
+        self.assertListEqual(consumed, [])
+        self.assertEqual(self.metrics.histogram('StreamedResource__streamed', 'render').count, 0)
+        body = ''.join(adapter.iter_formatted_body(chunk_size=10))
+        self.assertListEqual(consumed, [2, 3, 4])
+        self.assertIn('children', body)
+        self.assertEqual(self.metrics.histogram('StreamedResource__streamed', 'render').count, 1)
+        self.assertEqual(self.metrics.histogram('StreamedResource__streamed', 'request').count, 1)
+
+    def test_errors(self):
+        self.assertRaises(KeyError, self.dispatcher.dispatch, MeasuredResource.failing, [], RequestContainer())
+        self.assertDictEqual(self.metrics.errors(), {('MeasuredResource__failing', 'KeyError'): 1})
+        self.assertEqual(self.metrics.histogram('MeasuredResource__failing', 'request').count, 1)
+
+    def test_exposition(self):
+        self.dispatcher.dispatch(MeasuredResource.measured, [], RequestContainer()).formatted_body
+        self.assertRaises(KeyError, self.dispatcher.dispatch, MeasuredResource.failing, [], RequestContainer())
+        text = self.metrics.exposition()
+        self.assertIn('# TYPE ripozo_dispatch_stage_seconds histogram\n', text)
+        self.assertIn('ripozo_dispatch_stage_seconds_bucket{endpoint="MeasuredResource__measured",'
+                      'stage="render",le="0.5"} 1\n', text)
+        self.assertIn('ripozo_dispatch_stage_seconds_bucket{endpoint="MeasuredResource__measured",'
+                      'stage="render",le="+Inf"} 1\n', text)
+        self.assertIn('ripozo_dispatch_stage_seconds_count{endpoint="MeasuredResource__measured",'
+                      'stage="request"} 1\n', text)
+        self.assertIn('ripozo_dispatch_errors_total{endpoint="MeasuredResource__failing",'
+                      'exception="KeyError"} 1\n', text)
@@ -0,0 +1,97 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+import threading
+
+import unittest2
+
+from ripozo import ResourceBase, apimethod, RequestContainer
+from ripozo.adapters import SirenAdapter
+from ripozo.instrumentation import SlowRequestProfiler
+from ripozo_tests.helpers.dispatcher import FakeDispatcher
+
+
+class ProfiledResource(ResourceBase):
+    pks = ('id',)
+
+    @apimethod(methods=['GET'])
+    def profiled(cls, request):
+        return cls(properties=dict(id=1))
+
+    @apimethod(methods=['POST'])
+    def other(cls, request):
+        return cls(properties=dict(id=2))
+
+
+class TestSlowRequestProfiler(unittest2.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def dispatch(self, profiler, endpoint_func, query_args=None):
+        dispatcher = FakeDispatcher(observers=[profiler])
+        dispatcher.register_adapters(SirenAdapter)
+        dispatcher.dispatch(endpoint_func, [], RequestContainer(query_args=query_args)).formatted_body
+
+    def files(self, extension):
+        return sorted(filename for filename in os.listdir(self.directory) if filename.endswith(extension))
+
+    def test_fast_requests_not_profiled(self):
+        profiler = SlowRequestProfiler(self.directory, threshold=60)
+        self.dispatch(profiler, ProfiledResource.profiled)
+        self.dispatch(profiler, ProfiledResource.profiled)
+        self.assertEqual(profiler.armed('ProfiledResource__profiled'), 0)
+        self.assertListEqual(os.listdir(self.directory), [])
+
+    def test_slow_request_captures_next(self):
+        profiler = SlowRequestProfiler(self.directory, threshold=60, captures=2,
+                                       thresholds=dict(ProfiledResource__profiled=0))
+        self.dispatch(profiler, ProfiledResource.profiled)
+        self.assertEqual(profiler.armed('ProfiledResource__profiled'), 2)
+        self.assertListEqual(os.listdir(self.directory), [])
+        self.dispatch(profiler, ProfiledResource.other)
+        self.assertListEqual(os.listdir(self.directory), [])
+        self.dispatch(profiler, ProfiledResource.profiled, query_args=dict(a=1, b=2))
+        self.dispatch(profiler, ProfiledResource.profiled)
+        self.assertEqual(len(self.files('.prof')), 2)
+        with open(os.path.join(self.directory, self.files('.json')[0])) as metadata_file:
+            metadata = json.load(metadata_file)
+        self.assertEqual(metadata['endpoint'], 'ProfiledResource__profiled')
+        self.assertEqual(metadata['adapter'], 'SirenAdapter')
+        self.assertEqual(metadata['query_args'], 2)
+        self.assertIn(metadata['profile'], self.files('.prof'))
+        stats = pstats.Stats(os.path.join(self.directory, metadata['profile']))
+        self.assertGreater(stats.total_calls, 0)
+
+    def test_streamed_in_another_thread(self):
+        """The profile is stopped by the dispatching thread"""
+        profiler = SlowRequestProfiler(self.directory, threshold=0, captures=1)
+        self.dispatch(profiler, ProfiledResource.profiled)
+        dispatcher = FakeDispatcher(observers=[profiler])
+        dispatcher.register_adapters(SirenAdapter)
+        adapter = dispatcher.dispatch(ProfiledResource.profiled, [], RequestContainer())
+        self.assertIsNone(sys.getprofile())
+        self.assertListEqual(self.files('.prof'), [])
+        chunks = []
+        thread = threading.Thread(target=lambda: chunks.extend(adapter.iter_formatted_body()))
+        thread.start()
+        thread.join()
+        self.assertTrue(chunks)
+        self.assertEqual(len(self.files('.prof')), 1)
+        stats = pstats.Stats(os.path.join(self.directory, self.files('.prof')[0]))
+        self.assertGreater(stats.total_calls, 0)
+
+    def test_rotation(self):
+        profiler = SlowRequestProfiler(self.directory, threshold=0, captures=10, max_files=2)
+        for _ in range(5):
+            self.dispatch(profiler, ProfiledResource.profiled)
+        self.assertEqual(len(self.files('.prof')), 2)
+        self.assertEqual(len(self.files('.json')), 2)
@@ -0,0 +1,138 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import os
+import shutil
+import tempfile
+
+import unittest2
+
+from ripozo import RequestContainer, Relationship, apimethod
+from ripozo.adapters import SirenAdapter
+from ripozo.instrumentation import Tracer, InMemoryExporter, FileExporter, SpanContext, \
+    span, current_span, parse_traceparent
+from ripozo.resources.restmixins import Retrieve
+from ripozo_tests.helpers.dispatcher import FakeDispatcher
+from ripozo_tests.helpers.inmemory_manager import InMemoryManager
+
+TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+PARENT_ID = '00f067aa0ba902b7'
+
+
+class TracedManager(InMemoryManager):
+    def retrieve(self, lookup_keys, *args, **kwargs):
+        with span('lookup'):
+            current = current_span()
+            downstream = current.context.traceparent if current else None
+        props = super(TracedManager, self).retrieve(lookup_keys, *args, **kwargs)
+        props['downstream'] = downstream
+        return props
+
+
+class TestTraceparent(unittest2.TestCase):
+    def test_parse_traceparent(self):
+        context = parse_traceparent('00-{0}-{1}-01'.format(TRACE_ID, PARENT_ID))
+        self.assertEqual(context, SpanContext(TRACE_ID, PARENT_ID, sampled=True))
+        self.assertEqual(context.traceparent, '00-{0}-{1}-01'.format(TRACE_ID, PARENT_ID))
+        self.assertFalse(parse_traceparent('00-{0}-{1}-00'.format(TRACE_ID, PARENT_ID)).sampled)
+        self.assertIsNone(parse_traceparent(None))
+        self.assertIsNone(parse_traceparent('garbage'))
+        self.assertIsNone(parse_traceparent('00-{0}-{1}-01'.format('0' * 32, PARENT_ID)))
+        self.assertIsNone(parse_traceparent('ff-{0}-{1}-01'.format(TRACE_ID, PARENT_ID)))
+
+    def test_request_trace_context(self):
+        request = RequestContainer(headers={'Traceparent': '00-{0}-{1}-01'.format(TRACE_ID, PARENT_ID)})
+        self.assertEqual(request.trace_context, SpanContext(TRACE_ID, PARENT_ID))
+        self.assertIsNone(RequestContainer().trace_context)
+
+
+class TestTracer(unittest2.TestCase):
+    def setUp(self):
+        class TracedOwner(Retrieve):
+            manager = TracedManager()
+            pks = ('owner_id',)
+
+        class TracedResource(Retrieve):
+            manager = TracedManager()
+            pks = ('id',)
+            _relationships = (
+                Relationship('owner', property_map=dict(owner='owner_id'), relation='TracedOwner'),
+            )
+
+            @apimethod(route='/broken', methods=['POST'])
+            def broken(cls, request):
+                cls.manager.delete(dict(id='missing'))
+
+        self.resource_class = TracedResource
+        self.manager = TracedResource.manager
+        self.manager.objects[1] = dict(id=1, owner=2)
+        self.exporter = InMemoryExporter()
+        self.dispatcher = FakeDispatcher(observers=[Tracer(self.exporter)])
+        self.dispatcher.register_adapters(SirenAdapter)
+
+    def dispatch(self, endpoint_func, headers=None, url_params=None):
+        request = RequestContainer(url_params=url_params, headers=headers)
+        self.dispatcher.dispatch(endpoint_func, [], request).formatted_body
+        return request
+
+    def test_trace(self):
+        headers = dict(traceparent='00-{0}-{1}-01'.format(TRACE_ID, PARENT_ID))
+        request = self.dispatch(self.resource_class.retrieve, headers=headers, url_params=dict(id=1))
+        self.assertEqual(len(self.exporter.traces), 1)
+        spans = self.exporter.traces[0]
+        by_name = dict((item.name, item) for item in spans)
+        root = spans[0]
+        self.assertEqual(root.name, 'TracedResource__retrieve')
+        self.assertEqual(root.parent_id, PARENT_ID)
+        self.assertEqual(root.attributes['adapter'], 'SirenAdapter')
+        self.assertEqual(request.trace_context, root.context)
+        for item in spans:
+            self.assertEqual(item.context.trace_id, TRACE_ID)
+            self.assertIsNotNone(item.end)
+        self.assertSetEqual(set(by_name), set(['TracedResource__retrieve', 'negotiation', 'format_request',
+                                               'apimethod', 'resource', 'adapter', 'render',
+                                               'TracedManager.retrieve', 'lookup', 'relationship.owner']))
+        manager_span = by_name['TracedManager.retrieve']
+        self.assertEqual(manager_span.parent_id, by_name['apimethod'].context.span_id)
+        self.assertEqual(manager_span.attributes, dict(manager='TracedManager', method='retrieve'))
+        self.assertEqual(by_name['lookup'].parent_id, manager_span.context.span_id)
+        self.assertEqual(by_name['relationship.owner'].parent_id, by_name['resource'].context.span_id)
+        self.assertEqual(by_name['render'].parent_id, root.context.span_id)
+
+    def test_downstream_propagation(self):
+        self.dispatch(self.resource_class.retrieve, url_params=dict(id=1))
+        spans = self.exporter.traces[0]
+        lookup = [item for item in spans if item.name == 'lookup'][0]
+        self.assertIsNone(spans[0].parent_id)
+        self.assertEqual(self.manager.objects[1]['downstream'], lookup.context.traceparent)
+
+    def test_not_sampled(self):
+        headers = dict(traceparent='00-{0}-{1}-00'.format(TRACE_ID, PARENT_ID))
+        self.dispatch(self.resource_class.retrieve, headers=headers, url_params=dict(id=1))
+        self.assertListEqual(self.exporter.traces, [])
+
+    def test_error(self):
+        self.assertRaises(Exception, self.dispatch, self.resource_class.broken)
+        spans = self.exporter.traces[0]
+        errors = dict((item.name, item.error) for item in spans if item.error)
+        self.assertIn('TracedManager.delete', errors)
+        self.assertIn('TracedResource__broken', errors)
+
+    def test_untraced_manager_call(self):
+        self.assertIsNone(current_span())
+        self.assertEqual(self.manager.retrieve(dict(id=1))['id'], 1)
+        self.assertListEqual(self.exporter.traces, [])
+
+    def test_file_exporter(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'traces.jsonl')
+        self.dispatcher.observers = [Tracer(FileExporter(filename))]
+        self.dispatch(self.resource_class.retrieve, url_params=dict(id=1))
+        with open(filename) as trace_file:
+            spans = [json.loads(line) for line in trace_file]
+        self.assertEqual(spans[0]['name'], 'TracedResource__retrieve')
+        self.assertEqual(len(set(item['trace_id'] for item in spans)), 1)
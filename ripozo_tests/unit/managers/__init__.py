@@ -1 +1 @@
-from . import base
+from . import base, identity_map, memory, columnar, sqlite
@@ -3,8 +3,12 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+from ripozo.aggregates import COUNT, SUM, Aggregation
+from ripozo.exceptions import ValidationException
+from ripozo.filters import EQUAL, NOT_EQUAL, And, Condition, Or
 from ripozo.manager_base import BaseManager
 
+import mock
 import six
 import unittest2
 
@@ -86,3 +90,165 @@ class TestBaseManager(unittest2.TestCase):
         m = FakeManager()
         self.assertEqual(m.paginate_by, m.get_pagination_count(dict())[0])
         self.assertEqual(1, m.get_pagination_count(dict(count=1))[0])
+        self.assertEqual(3, m.get_pagination_count(dict(count=['3']))[0])
+        for count in (0, '-1', 'abc', None):
+            self.assertRaises(ValidationException, m.get_pagination_count, dict(count=count))
+
+    def test_get_projection(self):
+        """Comma delimited strings and lists are both valid"""
+        class M(FakeManager):
+            fields = ('id', 'first', 'second',)
+
+        m = M()
+        self.assertEqual((None, dict(first=1)), m.get_projection(dict(first=1)))
+        projection, filters = m.get_projection(dict(fields='first, id', first=1))
+        self.assertListEqual(projection, ['first', 'id'])
+        self.assertDictEqual(filters, dict(first=1))
+        projection, filters = m.get_projection(dict(fields=['first', 'second,first']))
+        self.assertListEqual(projection, ['first', 'second'])
+
+    def test_get_projection_by_resource_name(self):
+        """JSON API style projections are keyed by the resource name"""
+        class M(FakeManager):
+            fields = ('id', 'first', 'second',)
+
+        m = M()
+        filters = dict(fields=dict(mine='first', other='blah'))
+        self.assertListEqual(['first'], m.get_projection(filters, resource_name='mine')[0])
+        self.assertIsNone(m.get_projection(filters, resource_name='nope')[0])
+
+    def test_get_filter(self):
+        """The field args and the filter expression are combined"""
+        class M(FakeManager):
+            fields = ('id', 'first', 'second',)
+
+        m = M()
+        self.assertEqual((None, dict(count=1)), m.get_filter(dict(count=1, filter='')))
+        node, filters = m.get_filter(dict(first='a', filter='second != b or id is null', count=1))
+        self.assertEqual(node, And([Condition('first', EQUAL, 'a'),
+                                    Or([Condition('second', NOT_EQUAL, 'b'), Condition('id', EQUAL, None)])]))
+        self.assertDictEqual(filters, dict(first='a', count=1))
+        node, _ = m.get_filter(dict(filter=['first = a', 'second = b']))
+        self.assertEqual(node, And([Condition('first', EQUAL, 'a'), Condition('second', EQUAL, 'b')]))
+        self.assertRaises(ValidationException, m.get_filter, dict(filter='blah = 1'))
+
+    def test_get_filter_args(self):
+        class M(FakeManager):
+            fields = ('id', 'first',)
+
+        m = M()
+        self.assertDictEqual(m.get_filter_args(dict(id__in=['1', '2'], first=['a'], first__blah='b', count=1,
+                                                    filter='id > 1')),
+                             dict(id__in='1,2', first='a', filter='id > 1'))
+        self.assertDictEqual(m.get_filter_args(dict(filter=['id > 1', '', 'first = a or id = 1'])),
+                             dict(filter='(id > 1) and (first = a or id = 1)'))
+        self.assertDictEqual(m.get_filter_args(dict(filter=[''], count=1)), {})
+
+    def test_get_sort(self):
+        """The sort is validated against the sortable fields"""
+        class M(FakeManager):
+            fields = ('id', 'first', 'second',)
+
+        m = M()
+        self.assertEqual((None, dict(first=1)), m.get_sort(dict(first=1, sort='')))
+        sort, filters = m.get_sort(dict(sort='-second, first', first=1))
+        self.assertListEqual(sort, ['-second', 'first'])
+        self.assertDictEqual(filters, dict(first=1))
+        self.assertListEqual(m.get_sort(dict(sort=['id', '-first']))[0], ['id', '-first'])
+        self.assertRaises(ValidationException, m.get_sort, dict(sort='blah'))
+        self.assertRaises(ValidationException, m.get_sort, dict(sort='first,-first'))
+        m.sortable_fields = ('id',)
+        self.assertRaises(ValidationException, m.get_sort, dict(sort='first'))
+
+    def test_get_aggregates(self):
+        """The rows are counted by default"""
+        class M(FakeManager):
+            fields = ('id', 'first', 'second',)
+
+        m = M()
+        self.assertEqual(([Aggregation(COUNT)], [], dict(first=1)), m.get_aggregates(dict(first=1)))
+        aggregations, group_by, filters = m.get_aggregates(dict(aggregate='sum(second)', group_by='first, id',
+                                                                first=1))
+        self.assertEqual(aggregations, [Aggregation(SUM, 'second')])
+        self.assertListEqual(group_by, ['first', 'id'])
+        self.assertDictEqual(filters, dict(first=1))
+        self.assertRaises(ValidationException, m.get_aggregates, dict(group_by='blah'))
+        self.assertRaises(ValidationException, m.get_aggregates, dict(aggregate='sum(blah)'))
+
+    def test_aggregate_retrieves_every_page(self):
+        """Managers without aggregate follow the next links of retrieve_list"""
+        class M(FakeManager):
+            fields = ('id', 'first', 'second',)
+            pages = [[dict(id=1, first='a', second=2), dict(id=2, first='b', second=3)],
+                     [dict(id=3, first='a', second=4)]]
+
+            def retrieve_list(self, filters, *args, **kwargs):
+                self.queries.append(filters)
+                page = filters.get(self.pagination_pk_query_arg, 0)
+                links = dict(next={self.pagination_pk_query_arg: page + 1, self.pagination_count_query_arg: 2})
+                return self.pages[page] if page < len(self.pages) else [], dict(links=links)
+
+        m = M()
+        m.queries = []
+        results = m.aggregate(dict(first='a', count=10), [Aggregation(COUNT), Aggregation(SUM, 'second')])
+        self.assertEqual(results, [dict(count=3, sum_second=9)])
+        self.assertListEqual(m.queries, [dict(first='a'), dict(first='a', pagination_pk=1, count=2),
+                                         dict(first='a', pagination_pk=2, count=2)])
+        m.queries = []
+        results = m.aggregate({}, [Aggregation(COUNT)], group_by=['first'])
+        self.assertEqual(results, [dict(first='a', count=2), dict(first='b', count=1)])
+        self.assertEqual(m.count({}), 3)
+        self.assertEqual(m.get_total_count({}, 'estimated'), 3)
+
+    def test_aggregate_without_next_link(self):
+        """The pages end when the next link is missing or repeated"""
+        class M(FakeManager):
+            fields = ('id',)
+
+            def retrieve_list(self, filters, *args, **kwargs):
+                self.calls += 1
+                return [dict(id=self.calls)], dict(links=self.links)
+
+        m = M()
+        m.calls, m.links = 0, {}
+        self.assertEqual(m.count({}), 1)
+        m.calls, m.links = 0, dict(next=dict(pagination_pk=1))
+        self.assertEqual(m.count({}), 2)
+
+    def test_get_total_count(self):
+        class M(FakeManager):
+            fields = ('id', 'first',)
+            count_cache_size = 2
+
+            def aggregate(self, filters, aggregations, group_by=None, *args, **kwargs):
+                self.counted += 1
+                return [dict(count=self.counted)]
+
+            def statistics(self):
+                return 100, dict(first=4)
+
+        m = M()
+        m.counted = 0
+        self.assertIsNone(m.get_total_count(dict(first='a')))
+        self.assertEqual(m.get_total_count(dict(first='a'), 'exact'), 1)
+        self.assertEqual(m.get_total_count(dict(first='a', count=5), 'estimated'), 25)
+        self.assertEqual(m.get_total_count(dict(count=5), 'estimated'), 100)
+        with mock.patch('ripozo.manager_base.time.time', return_value=1000):
+            self.assertEqual(m.get_total_count(dict(first='a'), 'cached'), 2)
+            self.assertEqual(m.get_total_count(dict(first='a', count=1, pagination_pk='x'), 'cached'), 2)
+            self.assertEqual(m.get_total_count(dict(first='b'), 'cached'), 3)
+            self.assertEqual(m.get_total_count(dict(first='c'), 'cached'), 4)
+            self.assertEqual(m.get_total_count(dict(first='a'), 'cached'), 5)
+        with mock.patch('ripozo.manager_base.time.time', return_value=1000 + m.count_cache_ttl):
+            self.assertEqual(m.get_total_count(dict(first='a'), 'cached'), 6)
+        self.assertRaises(ValueError, m.get_total_count, {}, 'blah')
+
+    def test_get_projection_invalid(self):
+        """Fields that are not valid raise a ValidationException"""
+        class M(FakeManager):
+            fields = ('id', 'first', 'second',)
+
+        m = M()
+        self.assertRaises(ValidationException, m.get_projection, dict(fields='blah'))
+        self.assertRaises(ValidationException, m.get_projection,
+                          dict(fields='second'), valid_fields=('first',))
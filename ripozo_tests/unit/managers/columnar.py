@@ -0,0 +1,180 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import random
+
+import unittest2
+
+from ripozo.aggregates import parse_aggregates
+from ripozo.exceptions import NotFoundException, ValidationException
+from ripozo.managers.columnar import ColumnarManager, numpy, INTEGER, FLOAT, STRING, OBJECT
+from ripozo_tests.helpers.paging import MemoryPeopleManager, retrieve_all
+
+
+class PeopleManager(ColumnarManager):
+    _fields = ('id', 'name', 'age', 'score', 'team')
+    _field_validators = dict(MemoryPeopleManager._field_validators)
+    use_numpy = False
+    chunk_size = 16
+
+
+_FILTERS = [
+    {},
+    dict(team='a'),
+    dict(name='person3'),
+    dict(name__in='person1,person2,missing'),
+    dict(name__gte='person5'),
+    dict(age__gte='10', age__lt='20'),
+    dict(age__in=['3', '5', '500']),
+    dict(age=None),
+    dict(score__gt='50.5', team__in='a,b'),
+    dict(name='missing'),
+]
+
+_EXPRESSIONS = [
+    'age >= 5 and (team = a or not name in (person1, person2))',
+    'not (age < 10 or score > 20.5)',
+    'team != a and age is not null',
+    'name not in (person1, null) or age = 3',
+]
+
+
+class TestColumnarManager(unittest2.TestCase):
+    manager_class = PeopleManager
+
+    def setUp(self):
+        random.seed(2)
+        self.manager = self.manager_class()
+        self.memory = MemoryPeopleManager()
+        for i in range(200):
+            row = dict(name='person{0}'.format(i % 13), team=random.choice('abc'),
+                       age=random.choice([None] + list(range(40))),
+                       score=random.choice([None, i * 0.5]))
+            self.manager.create(row)
+            self.memory.create(row)
+
+    def list_ids(self, manager, filters, count=7):
+        return [row['id'] for row in retrieve_all(manager, filters, count=count)]
+
+    def assert_same_as_memory(self):
+        for filters in _FILTERS:
+            self.assertEqual(self.list_ids(self.manager, filters),
+                             self.list_ids(self.memory, filters), msg=filters)
+
+    def test_column_types(self):
+        self.assertEqual(PeopleManager.column_type('age'), INTEGER)
+        self.assertEqual(PeopleManager.column_type('score'), FLOAT)
+        self.assertEqual(PeopleManager.column_type('name'), STRING)
+        self.assertEqual(PeopleManager.column_type('team'), OBJECT)
+
+        class OverriddenManager(PeopleManager):
+            column_types = dict(team=STRING)
+
+        self.assertEqual(OverriddenManager.column_type('team'), STRING)
+
+    def test_retrieve_list_matches_memory_manager(self):
+        self.assert_same_as_memory()
+
+    def test_filter_expressions_match_memory_manager(self):
+        for expression in _EXPRESSIONS:
+            filters = dict(filter=expression)
+            self.assertEqual(self.list_ids(self.manager, filters),
+                             self.list_ids(self.memory, filters), msg=expression)
+        filters = dict(filter='age > 10', team='b')
+        self.assertEqual(self.list_ids(self.manager, filters), self.list_ids(self.memory, filters))
+
+    def test_crud(self):
+        created = self.manager.create(dict(name='bob', age=10, unknown=1))
+        self.assertEqual(created, dict(id=201, name='bob', age=10, score=None, team=None))
+        self.assertEqual(self.manager.retrieve(dict(id=201)), created)
+        self.assertEqual(self.manager.retrieve(dict(id=201), fields=['name']), dict(name='bob'))
+        updated = self.manager.update(dict(id=201), dict(team='z', age=None, score=1.5))
+        self.assertEqual(updated, dict(id=201, name='bob', age=None, score=1.5, team='z'))
+        self.assertEqual(self.list_ids(self.manager, dict(team='z')), [201])
+        self.manager.delete(dict(id=201))
+        self.assertRaises(NotFoundException, self.manager.retrieve, dict(id=201))
+        self.assertRaises(NotFoundException, self.manager.delete, dict(id=201))
+        self.assertEqual(self.list_ids(self.manager, dict(team='z')), [])
+        self.assertRaises(ValidationException, self.manager.create, dict(id=1))
+        self.assertRaises(ValidationException, self.manager.update, dict(id=1), dict(id=2))
+
+    def test_type_validation(self):
+        class ObjectManager(PeopleManager):
+            _field_validators = {}
+            column_types = dict(age=INTEGER, name=STRING)
+
+        manager = ObjectManager()
+        self.assertRaises(ValidationException, manager.create, dict(age='old'))
+        self.assertRaises(ValidationException, manager.create, dict(age=1, name=5))
+        self.assertEqual(len(manager), 0)
+        manager.create(dict(age=1, name='bob'))
+        self.assertRaises(ValidationException, manager.update, dict(id=1),
+                          dict(name='sue', age=2 ** 70))
+        self.assertEqual(manager.retrieve(dict(id=1)),
+                         dict(id=1, name='bob', age=1, score=None, team=None))
+
+    def test_updates_and_deletes_match_memory_manager(self):
+        for i in range(1, 201, 3):
+            for manager in (self.manager, self.memory):
+                manager.update(dict(id=i),
+                               dict(age=i % 7, name='person{0}'.format(i % 5), team=None))
+        for i in range(2, 201, 4):
+            for manager in (self.manager, self.memory):
+                manager.delete(dict(id=i))
+        self.assertEqual(len(self.manager), len(self.memory))
+        self.assert_same_as_memory()
+
+    def test_pagination_skips_deleted_rows(self):
+        page, meta = self.manager.retrieve_list(dict(count=10))
+        for row in page:
+            self.manager.delete(dict(id=row['id']))
+        second, _ = self.manager.retrieve_list(meta['links']['next'])
+        self.assertEqual([row['id'] for row in second], list(range(11, 21)))
+
+    def test_compact(self):
+        for i in range(1, 151):
+            self.manager.delete(dict(id=i))
+            self.memory.delete(dict(id=i))
+        self.manager.compact()
+        self.assertEqual(len(self.manager._sequence), 50)
+        self.assertEqual(self.manager.retrieve(dict(id=175)), self.memory.retrieve(dict(id=175)))
+        self.assert_same_as_memory()
+        page, meta = self.manager.retrieve_list(dict(count=5, pagination_pk=160))
+        self.assertEqual([row['id'] for row in page], list(range(162, 167)))
+
+    def test_aggregate_matches_memory_manager(self):
+        aggregations = parse_aggregates('count,sum(score),min(age),max(name),count(age)',
+                                        self.manager.fields)
+        for i in range(1, 201, 3):
+            self.manager.delete(dict(id=i))
+            self.memory.delete(dict(id=i))
+        for filters in _FILTERS + [dict(filter=expression) for expression in _EXPRESSIONS]:
+            for group_by in ([], ['team'], ['name', 'age']):
+                self.assertEqual(self.manager.aggregate(filters, aggregations, group_by=group_by),
+                                 self.memory.aggregate(filters, aggregations, group_by=group_by),
+                                 msg='{0} {1}'.format(filters, group_by))
+
+    def test_statistics(self):
+        self.manager.delete(dict(id=1))
+        self.assertEqual(self.manager.statistics(), (199, dict(id=199, name=13)))
+        self.assertEqual(self.manager.estimate_count(dict(name='person1')), 15)
+
+    def test_sort_is_rejected(self):
+        self.assertRaises(ValidationException, self.manager.retrieve_list, dict(sort='id'))
+        self.assertRaises(ValidationException, self.manager.retrieve_list, {}, sort=['id'])
+
+    def test_invalid_token(self):
+        self.assertRaises(ValidationException, self.manager.retrieve_list,
+                          dict(pagination_pk='nope'))
+
+    def test_projection(self):
+        page, _ = self.manager.retrieve_list(dict(count=1), fields=['id'])
+        self.assertEqual(page, [dict(id=1)])
+
+
+@unittest2.skipIf(numpy is None, 'numpy is not installed')
+class TestNumpyColumnarManager(TestColumnarManager):
+    class manager_class(PeopleManager):
+        use_numpy = True
@@ -0,0 +1,106 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import unittest2
+
+from ripozo import RequestContainer
+from ripozo.adapters import SirenAdapter
+from ripozo.resources.restmixins import Retrieve
+from ripozo.resources.request import IdentityMap, current_request, request_scope
+from ripozo_tests.helpers.dispatcher import FakeDispatcher
+from ripozo_tests.helpers.inmemory_manager import InMemoryManager
+
+
+class CountingManager(InMemoryManager):
+    use_identity_map = True
+
+    def __init__(self):
+        super(CountingManager, self).__init__()
+        self.retrieved = 0
+
+    def retrieve(self, lookup_keys, *args, **kwargs):
+        self.retrieved += 1
+        return super(CountingManager, self).retrieve(lookup_keys, *args, **kwargs)
+
+
+class TestIdentityMap(unittest2.TestCase):
+    def setUp(self):
+        self.manager = CountingManager()
+        self.manager.objects[1] = dict(id=1, name='first')
+        self.manager.objects[2] = dict(id=2, name='second')
+        self.request = RequestContainer()
+
+    def test_repeated_retrieve(self):
+        with request_scope(self.request) as request:
+            self.assertIs(current_request(), request)
+            first = self.manager.retrieve(dict(id=1))
+            first['name'] = 'modified by the caller'
+            second = self.manager.retrieve(dict(id=1))
+            self.manager.retrieve(dict(id=2))
+            self.assertEqual(second, dict(id=1, name='first'))
+            self.assertEqual(self.manager.retrieve(dict(id=1), fields=['name']), dict(id=1, name='first'))
+            self.assertEqual(len(request.identity_map), 3)
+        self.assertEqual(self.manager.retrieved, 3)
+        self.assertIsNone(current_request())
+        self.assertEqual(len(self.request.identity_map), 0)
+
+    def test_discarded_between_requests(self):
+        with request_scope(self.request):
+            self.manager.retrieve(dict(id=1))
+        with request_scope(RequestContainer()):
+            self.manager.retrieve(dict(id=1))
+        self.assertEqual(self.manager.retrieved, 2)
+
+    def test_write_evicts(self):
+        with request_scope(self.request):
+            self.manager.retrieve(dict(id=1))
+            self.manager.retrieve(dict(id=1), fields=['name'])
+            self.manager.retrieve(dict(id=2))
+            self.manager.update(dict(id=1), dict(name='updated'))
+            self.assertEqual(len(self.request.identity_map), 1)
+            self.assertEqual(self.manager.retrieve(dict(id=1))['name'], 'updated')
+            self.manager.delete(dict(id=2))
+            self.assertEqual(len(self.request.identity_map), 1)
+        self.assertEqual(self.manager.retrieved, 4)
+
+    def test_not_opted_in(self):
+        manager = CountingManager()
+        manager.use_identity_map = False
+        manager.objects[1] = dict(id=1)
+        with request_scope(self.request):
+            manager.retrieve(dict(id=1))
+            manager.retrieve(dict(id=1))
+        self.assertEqual(manager.retrieved, 2)
+
+    def test_outside_request(self):
+        self.manager.retrieve(dict(id=1))
+        self.manager.retrieve(dict(id=1))
+        self.assertEqual(self.manager.retrieved, 2)
+
+    def test_unhashable_lookup_keys(self):
+        identity_map = IdentityMap()
+        self.assertIsNone(identity_map.key(dict(id=[1, 2])))
+        key = identity_map.key(dict(id=1), fields=['name'])
+        identity_map.set(self.manager, key, dict(id=1))
+        self.assertEqual(identity_map.get(self.manager, key), dict(id=1))
+        identity_map.evict(self.manager, dict(id=[1, 2]))
+        self.assertIsNone(identity_map.get(self.manager, key))
+
+    def test_dispatch(self):
+        def check_owner(cls, function_name, request):
+            cls.manager.retrieve(request.url_params)
+
+        class IdentityMappedResource(Retrieve):
+            manager = self.manager
+            pks = ('id',)
+            preprocessors = [check_owner]
+
+        dispatcher = FakeDispatcher()
+        dispatcher.register_adapters(SirenAdapter)
+        request = RequestContainer(url_params=dict(id=1))
+        adapter = dispatcher.dispatch(IdentityMappedResource.retrieve, [], request)
+        self.assertEqual(adapter.resource.properties['name'], 'first')
+        self.assertEqual(self.manager.retrieved, 1)
+        self.assertIsNone(current_request())
@@ -0,0 +1,380 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import base64
+import json
+import random
+
+import unittest2
+
+from ripozo import fields, RequestContainer
+from ripozo.aggregates import aggregate_rows, parse_aggregates
+from ripozo.exceptions import NotFoundException, ValidationException
+from ripozo.managers.memory import InMemoryManager, SortedList, TextIndex
+from ripozo.resources.restmixins import RetrieveList
+from ripozo_tests.helpers.paging import retrieve_all
+
+
+class PeopleManager(InMemoryManager):
+    _fields = ('id', 'name', 'age', 'team')
+    _field_validators = {
+        'id': fields.IntegerField('id'),
+        'age': fields.IntegerField('age'),
+    }
+    indexes = ('team',)
+    sorted_indexes = ('age',)
+
+
+class ProductManager(InMemoryManager):
+    _fields = ('id', 'name', 'description', 'team')
+    indexes = ('team',)
+    text_indexes = ('name', 'description')
+
+
+_WORDS = ['blue', 'bluebird', 'widget', 'gadget', 'red', 'Green', 'gizmo', 'tool']
+
+
+def _sort_key(row, order):
+    key = []
+    for name in order:
+        value = row.get(name.lstrip('-'))
+        key.append((0,) if value is None else (1, value))
+    return key
+
+
+class TestSortedList(unittest2.TestCase):
+    def test_add_remove_irange(self):
+        random.seed(0)
+        keys = random.sample(range(1000), 300)
+        sorted_list = SortedList(load=4)
+        for key in keys:
+            sorted_list.add(key)
+        for key in keys[:100]:
+            sorted_list.remove(key)
+        remaining = sorted(keys[100:])
+        self.assertEqual(list(sorted_list), remaining)
+        self.assertEqual(len(sorted_list), 200)
+        self.assertRaises(ValueError, sorted_list.remove, keys[0])
+        for start in [None, -1, 1000] + remaining[:20]:
+            self.assertEqual(list(sorted_list.irange(start)),
+                             [key for key in remaining if start is None or key >= start])
+            self.assertEqual(list(sorted_list.irange(start, inclusive=False)),
+                             [key for key in remaining if start is None or key > start])
+            self.assertEqual(list(sorted_list.irange(start, reverse=True)),
+                             [key for key in reversed(remaining) if start is None or key <= start])
+            self.assertEqual(list(sorted_list.irange(start, inclusive=False, reverse=True)),
+                             [key for key in reversed(remaining) if start is None or key < start])
+
+
+class TestInMemoryManager(unittest2.TestCase):
+    def setUp(self):
+        random.seed(1)
+        self.manager = PeopleManager()
+        for i in range(200):
+            self.manager.create(dict(name='person{0}'.format(i % 13), team=random.choice('abc'),
+                                     age=random.choice([None] + list(range(40)))))
+
+    def list_all(self, filters, order_by=None, count=7):
+        self.manager.order_by = order_by
+        return retrieve_all(self.manager, filters, count=count)
+
+    def test_crud(self):
+        created = self.manager.create(dict(name='bob', age=10, unknown=1))
+        self.assertEqual(created, dict(id=201, name='bob', age=10))
+        self.assertEqual(self.manager.retrieve(dict(id=201)), created)
+        self.assertEqual(self.manager.retrieve(dict(id=201), fields=['name']), dict(name='bob'))
+        updated = self.manager.update(dict(id=201), dict(team='z', age=50))
+        self.assertEqual(updated['team'], 'z')
+        self.assertEqual([row['id'] for row in self.list_all(dict(team='z'))], [201])
+        self.assertEqual([row['id'] for row in self.list_all(dict(age__gte=50))], [201])
+        self.manager.delete(dict(id=201))
+        self.assertRaises(NotFoundException, self.manager.retrieve, dict(id=201))
+        self.assertRaises(NotFoundException, self.manager.delete, dict(id=201))
+        self.assertEqual(self.list_all(dict(team='z')), [])
+        self.assertRaises(ValidationException, self.manager.create, dict(id=1))
+        self.assertRaises(ValidationException, self.manager.update, dict(id=1), dict(id=2))
+
+    def test_retrieve_list_matches_sorting(self):
+        filters = [
+            ({}, lambda row: True),
+            (dict(team='a'), lambda row: row['team'] == 'a'),
+            (dict(team__in='a,b', age__gt='20'),
+             lambda row: row['team'] in ('a', 'b') and row['age'] is not None and row['age'] > 20),
+            (dict(age__gte='10', age__lt=['20']),
+             lambda row: row['age'] is not None and 10 <= row['age'] < 20),
+            (dict(name='person3', age__lte=30),
+             lambda row: row['name'] == 'person3' and row['age'] is not None and row['age'] <= 30),
+            (dict(id__in=['3', '5', '500']), lambda row: row['id'] in (3, 5)),
+        ]
+        rows = list(self.manager._rows.values())
+        for order_by in ([], ['age'], ['-age'], ['name'], ['-team', 'age']):
+            for query, predicate in filters:
+                expected = sorted((row for row in rows if predicate(row)),
+                                  key=lambda row: row['id'],
+                                  reverse=bool(order_by) and order_by[-1].startswith('-'))
+                for name in reversed(order_by):
+                    expected.sort(key=lambda row: _sort_key(row, [name]),
+                                  reverse=name.startswith('-'))
+                actual = self.list_all(query, order_by=order_by)
+                self.assertEqual([row['id'] for row in actual], [row['id'] for row in expected],
+                                 msg='{0} {1}'.format(order_by, query))
+
+    def test_filter_expressions(self):
+        expressions = [
+            ('team = a and age >= 30', lambda row: row['team'] == 'a' and (row['age'] or 0) >= 30),
+            ('team in (a, b) and (age < 3 or name = person4)',
+             lambda row: row['team'] != 'c' and (row['age'] is not None and row['age'] < 3 or
+                                                  row['name'] == 'person4')),
+            ('not (team = a or age >= 5)',
+             lambda row: row['team'] != 'a' and (row['age'] is None or row['age'] < 5)),
+            ('age is null and team != c', lambda row: row['age'] is None and row['team'] != 'c'),
+        ]
+        rows = list(self.manager._rows.values())
+        for order_by in ([], ['-age']):
+            for expression, predicate in expressions:
+                expected = sorted(row['id'] for row in rows if predicate(row))
+                actual = self.list_all(dict(filter=expression), order_by=order_by, count=5)
+                self.assertEqual(sorted(row['id'] for row in actual), expected, msg=expression)
+        self.assertRaises(ValidationException, self.manager.retrieve_list, dict(filter='age >'))
+
+    def test_sort(self):
+        expected = [row['id'] for row in self.list_all({}, order_by=['-age'])]
+        self.manager.order_by = ['name']
+        rows, query = [], dict(sort='-age', count=7)
+        while query:
+            page, meta = self.manager.retrieve_list(query)
+            rows.extend(page)
+            query = meta['links'].get('next')
+        self.assertEqual([row['id'] for row in rows], expected)
+        self.assertRaises(ValidationException, self.manager.retrieve_list, dict(sort='name'))
+
+    def test_aggregate(self):
+        aggregations = parse_aggregates('count,sum(age),min(age),max(name),count(age)',
+                                        self.manager.fields)
+        rows = list(self.manager._rows.values())
+        queries = [
+            ({}, lambda row: True),
+            (dict(team='a'), lambda row: row['team'] == 'a'),
+            (dict(age__gte='30'), lambda row: (row['age'] or 0) >= 30),
+            (dict(filter='team != b and name = person3'),
+             lambda row: row['team'] != 'b' and row['name'] == 'person3'),
+        ]
+        for query, predicate in queries:
+            for group_by in ([], ['team'], ['team', 'age']):
+                expected = aggregate_rows([row for row in rows if predicate(row)], aggregations,
+                                          group_by)
+                self.assertEqual(self.manager.aggregate(query, aggregations, group_by=group_by),
+                                 expected, msg='{0} {1}'.format(query, group_by))
+            count, = self.manager.aggregate(query, parse_aggregates('count', self.manager.fields))
+            self.assertEqual(count, dict(count=len([row for row in rows if predicate(row)])))
+
+    def test_keyset_pagination_is_stable(self):
+        self.manager.order_by = ['age']
+        page, meta = self.manager.retrieve_list(dict(count=10))
+        for row in page:
+            self.manager.delete(dict(id=row['id']))
+        second, _ = self.manager.retrieve_list(meta['links']['next'])
+        self.assertEqual(len(second), 10)
+        self.assertTrue(set(row['id'] for row in page).isdisjoint(row['id'] for row in second))
+
+    def test_invalid_token(self):
+        self.assertRaises(ValidationException, self.manager.retrieve_list,
+                          dict(pagination_pk='nope'))
+        for position in ([['x'], [1]], [[[1]], [1]], [[1], [{}]], [[1], ['x']]):
+            token = base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+            self.assertRaises(ValidationException, self.manager.retrieve_list,
+                              dict(pagination_pk=token, sort='age'), msg=position)
+        for count in (0, -1, 'abc'):
+            self.assertRaises(ValidationException, self.manager.retrieve_list, dict(count=count))
+
+    def test_projection(self):
+        page, _ = self.manager.retrieve_list(dict(count=1), fields=['id'])
+        self.assertEqual(page, [dict(id=1)])
+
+    def test_retrieve_list_resource(self):
+        class MemoryPeople(RetrieveList):
+            manager = PeopleManager()
+            resource_name = 'memory_people'
+
+        MemoryPeople.manager.create(dict(name='bob', age=1))
+        MemoryPeople.manager.create(dict(name='sue', age=2))
+        resource = MemoryPeople.retrieve_list(RequestContainer(query_args=dict(count=1)))
+        self.assertEqual(resource.properties['memory_people'][0]['name'], 'bob')
+        links = dict((link.name, link.resource) for link in resource.linked_resources)
+        self.assertIn('pagination_pk=', links['next'].url)
+
+    def test_filter_resource_links(self):
+        class FilteredPeople(RetrieveList):
+            manager = PeopleManager()
+            resource_name = 'filtered_people'
+
+        for age in range(5):
+            FilteredPeople.manager.create(dict(name='bob', age=age))
+        query_args = dict(count=1, filter='age >= 2')
+        resource = FilteredPeople.retrieve_list(RequestContainer(query_args=query_args))
+        self.assertEqual(resource.properties['filtered_people'][0]['age'], 2)
+        links = dict((link.name, link.resource) for link in resource.linked_resources)
+        self.assertIn('filter=age', links['next'].url)
+
+    def test_statistics(self):
+        rows, distinct = self.manager.statistics()
+        self.assertEqual(rows, 200)
+        self.assertEqual(distinct, dict(id=200, team=3))
+        self.assertEqual(self.manager.estimate_count(dict(team='a')), 67)
+        self.assertEqual(self.manager.get_total_count(dict(team='a', count=1), 'exact'),
+                         len(self.list_all(dict(team='a'))))
+
+    def test_total_count_resource(self):
+        class CountedPeople(RetrieveList):
+            manager = PeopleManager()
+            resource_name = 'counted_people'
+
+        for age in range(5):
+            CountedPeople.manager.create(dict(name='bob', age=age, team='ab'[age % 2]))
+        query_args = dict(count=1, team='a')
+        resource = CountedPeople.retrieve_list(RequestContainer(query_args=query_args))
+        self.assertNotIn('total_count', resource.meta)
+        links = dict((link.name, link.resource) for link in resource.linked_resources)
+        self.assertIn('pagination_pk=', links['next'].url)
+        for strategy, total in (('exact', 3), ('estimated', 2), ('cached', 3)):
+            CountedPeople.count_strategy = strategy
+            resource = CountedPeople.retrieve_list(RequestContainer(query_args=query_args))
+            self.assertEqual(resource.meta['total_count'], total)
+            self.assertEqual(resource.meta['count_strategy'], strategy)
+            self.assertEqual(resource.properties['total_count'], total)
+            links = dict((link.name, link.resource) for link in resource.linked_resources)
+            self.assertIn('pagination_pk=', links['next'].url)
+            self.assertNotIn('total_count', links['next'].url)
+
+    def test_sort_resource_links(self):
+        class SortedPeople(RetrieveList):
+            manager = PeopleManager()
+            resource_name = 'sorted_people'
+
+        for age in range(5):
+            SortedPeople.manager.create(dict(name='bob', age=age))
+        request = RequestContainer(query_args=dict(count=2, sort='-age'))
+        resource = SortedPeople.retrieve_list(request)
+        self.assertEqual([row['age'] for row in resource.properties['sorted_people']], [4, 3])
+        links = dict((link.name, link.resource) for link in resource.linked_resources)
+        self.assertIn('sort=-age', links['next'].url)
+        request = RequestContainer(query_args=dict(sort='team'))
+        self.assertRaises(ValidationException, SortedPeople.retrieve_list, request)
+
+    def test_follow_filtered_resource_links(self):
+        class PagedPeople(RetrieveList):
+            manager = PeopleManager()
+            resource_name = 'paged_people'
+
+        for age in range(10):
+            PagedPeople.manager.create(dict(name='bob', age=age, team='ab'[age % 2]))
+        query_args = dict(count=2, age__gte=['5'], team__in='a,b', filter='age != 7')
+        ages = []
+        while query_args:
+            resource = PagedPeople.retrieve_list(RequestContainer(query_args=query_args))
+            ages.extend(row['age'] for row in resource.properties['paged_people'])
+            links = dict((link.name, link.resource) for link in resource.linked_resources)
+            query_args = links['next'].get_query_arg_dict() if 'next' in links else None
+            if query_args:
+                self.assertEqual(query_args['age__gte'], '5')
+                self.assertEqual(query_args['team__in'], 'a,b')
+                self.assertIn('age__gte=5', links['next'].url)
+        self.assertEqual(sorted(ages), [5, 6, 8, 9])
+
+
+class TestTextIndex(unittest2.TestCase):
+    def test_search(self):
+        index = TextIndex()
+        index.add((1,), index.tokenize('Blue widget, big!'))
+        index.add((2,), index.tokenize('blue-bird gadget'))
+        index.add((3,), index.tokenize(None))
+        self.assertEqual(index.tokenize('Blue widget, big!'), set(['blue', 'widget', 'big']))
+        self.assertEqual(index.search('BLUE'), set([(1,), (2,)]))
+        self.assertEqual(index.search('blue wid*'), set([(1,)]))
+        self.assertEqual(index.search('b*'), set([(1,), (2,)]))
+        self.assertEqual(index.search('bi*, gadget'), set([(2,)]))
+        self.assertEqual(index.search('blue missing'), set())
+        self.assertEqual(index.search('zz*'), set())
+        self.assertIsNone(index.search(' ,* '))
+        index.remove((2,), index.tokenize('blue-bird gadget'))
+        self.assertEqual(index.search('b*'), set([(1,)]))
+        self.assertEqual(len(index), 3)
+
+
+class TestInMemoryManagerSearch(unittest2.TestCase):
+    def setUp(self):
+        random.seed(3)
+        self.manager = ProductManager()
+        for i in range(150):
+            description = random.choice([None, ' '.join(random.sample(_WORDS, 3))])
+            self.manager.create(dict(name=' '.join(random.sample(_WORDS, 2)),
+                                     team=random.choice('ab'), description=description))
+
+    def search_ids(self, filters, order_by=None, count=4):
+        self.manager.order_by = order_by
+        return [row['id'] for row in retrieve_all(self.manager, filters, count=count)]
+
+    def expected_ids(self, terms, prefixes=(), team=None, reverse=False):
+        ids = []
+        for row in sorted(self.manager._rows.values(), key=lambda row: row['id'], reverse=reverse):
+            words = ' '.join(row[name] or '' for name in ('name', 'description')).lower().split()
+            if all(term in words for term in terms) \
+                    and all(any(word.startswith(prefix) for word in words) for prefix in prefixes) \
+                    and team in (None, row['team']):
+                ids.append(row['id'])
+        return ids
+
+    def test_search_matches_scan(self):
+        searches = [
+            (dict(q='blue'), ['blue'], (), None),
+            (dict(q='Blue gadget'), ['blue', 'gadget'], (), None),
+            (dict(q='blue*'), [], ['blue'], None),
+            (dict(q='g* tool', team='a'), ['tool'], ['g'], 'a'),
+            (dict(q='missing'), ['missing'], (), None),
+        ]
+        for query, terms, prefixes, team in searches:
+            self.assertEqual(self.search_ids(query), self.expected_ids(terms, prefixes, team),
+                             msg=query)
+            self.assertEqual(self.search_ids(query, order_by=['-id']),
+                             self.expected_ids(terms, prefixes, team, reverse=True), msg=query)
+
+    def test_search_is_maintained(self):
+        created = self.manager.create(dict(name='unique thing'))
+        self.assertEqual(self.search_ids(dict(q='uniq*')), [created['id']])
+        self.manager.update(dict(id=created['id']), dict(name='other thing', description='unique'))
+        self.assertEqual(self.search_ids(dict(q='thing uniq*')), [created['id']])
+        self.manager.update(dict(id=created['id']), dict(description=None))
+        self.assertEqual(self.search_ids(dict(q='uniq*')), [])
+        self.assertEqual(self.search_ids(dict(q='other')), [created['id']])
+        self.manager.delete(dict(id=created['id']))
+        self.assertEqual(self.search_ids(dict(q='other')), [])
+        self.assertNotIn('unique', self.manager._text_index._postings)
+
+    def test_empty_search(self):
+        self.assertEqual(self.search_ids(dict(q='')), self.search_ids({}))
+
+    def test_aggregate_search(self):
+        aggregations = parse_aggregates('count', self.manager.fields)
+        searches = (dict(q='blue'), dict(q='gadget wid*', team='a'), dict(q='!!', team='a'),
+                    dict(q='!!'))
+        for filters in searches:
+            rows = [self.manager.retrieve(dict(id=pk)) for pk in self.search_ids(filters)]
+            self.assertEqual(self.manager.aggregate(filters, aggregations, group_by=['team']),
+                             aggregate_rows(rows, aggregations, ['team']))
+            self.assertEqual(self.manager.get_total_count(dict(filters, count=4), 'exact'),
+                             len(rows))
+
+    def test_search_resource_links(self):
+        class SearchedProducts(RetrieveList):
+            manager = ProductManager()
+            resource_name = 'searched_products'
+
+        for name in ('blue widget', 'red widget', 'blue gadget', 'blue tool'):
+            SearchedProducts.manager.create(dict(name=name))
+        request = RequestContainer(query_args=dict(count=1, q='blue'))
+        resource = SearchedProducts.retrieve_list(request)
+        self.assertEqual(resource.properties['searched_products'][0]['name'], 'blue widget')
+        links = dict((link.name, link.resource) for link in resource.linked_resources)
+        self.assertIn('q=blue', links['next'].url)
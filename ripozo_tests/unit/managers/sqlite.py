@@ -0,0 +1,242 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import base64
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import types
+
+import unittest2
+
+from ripozo.aggregates import parse_aggregates
+from ripozo.exceptions import NotFoundException, ValidationException
+from ripozo.managers.sqlite import ConnectionPool, SqliteManager
+from ripozo_tests.helpers.paging import MemoryPeopleManager, retrieve_all
+
+
+class PeopleManager(SqliteManager):
+    table = 'people'
+    _fields = ('id', 'name', 'age', 'team')
+    _field_validators = dict(MemoryPeopleManager._field_validators)
+    indexes = ('age', ('team', 'age'))
+    fetch_size = 5
+
+
+class TestSqliteManager(unittest2.TestCase):
+    def setUp(self):
+        random.seed(4)
+        self.manager = PeopleManager()
+        self.manager.create_table()
+        self.memory = MemoryPeopleManager()
+        for i in range(60):
+            row = dict(name='person{0}'.format(i % 11), team=random.choice(['a', 'b', None]),
+                       age=random.choice([None] + list(range(20))))
+            self.assertEqual(self.manager.create(row), self.memory.create(row))
+
+    def list_ids(self, manager, filters, order_by=None, count=7):
+        manager.order_by = order_by
+        return [row['id'] for row in retrieve_all(manager, filters, count=count)]
+
+    def test_retrieve_list_matches_memory_manager(self):
+        filters = [{}, dict(team='a'), dict(age=None), dict(age__gte='5', age__lt='12'),
+                   dict(team__in='a,b'), dict(name='person3', age__lte=10),
+                   dict(age__in=['1', '2', '99'])]
+        for order_by in ([], ['age'], ['-age'], ['team', '-age'], ['-team', 'name'], ['-id']):
+            for query in filters:
+                for count in (3, 7, 100):
+                    self.assertEqual(self.list_ids(self.manager, query, order_by, count),
+                                     self.list_ids(self.memory, query, order_by, count),
+                                     msg='{0} {1} {2}'.format(order_by, query, count))
+
+    def test_filter_expressions_match_memory_manager(self):
+        expressions = ['age >= 5 and (team = a or not name in (person1, person2))',
+                       'not (age < 10 or team in (b, null))', 'team != a and age is not null',
+                       'name not in (person1, null) or age in (3, null)']
+        for order_by in ([], ['-age'], ['team', 'name']):
+            for expression in expressions:
+                filters = dict(filter=expression)
+                self.assertEqual(self.list_ids(self.manager, filters, order_by, 4),
+                                 self.list_ids(self.memory, filters, order_by, 4),
+                                 msg='{0} {1}'.format(order_by, expression))
+
+    def test_sort_matches_memory_manager(self):
+        sorts = (('-age', ['-age']), ('team,-age', ['team', '-age']), ('-id', ['-id']))
+        for sort, order_by in sorts:
+            filters = dict(sort=sort, team__in='a,b')
+            self.assertEqual(self.list_ids(self.manager, filters, ['name'], 4),
+                             self.list_ids(self.memory, dict(team__in='a,b'), order_by, 4),
+                             msg=sort)
+        self.assertEqual(PeopleManager.sortable_fields, ('id', 'age', 'team'))
+        self.assertRaises(ValidationException, self.manager.retrieve_list, dict(sort='name'))
+
+    def test_aggregate_matches_memory_manager(self):
+        aggregations = parse_aggregates('count,sum(age),min(age),max(name),count(team)',
+                                        self.manager.fields)
+        queries = ({}, dict(team='a'), dict(age__gte='5', age__lt='12'),
+                   dict(filter='age is null or team = b'))
+        for filters in queries:
+            for group_by in ([], ['team'], ['team', 'age']):
+                self.assertEqual(self.manager.aggregate(filters, aggregations, group_by=group_by),
+                                 self.memory.aggregate(filters, aggregations, group_by=group_by),
+                                 msg='{0} {1}'.format(filters, group_by))
+        statements = len(self.manager._statements)
+        self.manager.aggregate(dict(team='b'), aggregations, group_by=['team'])
+        self.assertEqual(len(self.manager._statements), statements)
+
+    def test_statistics(self):
+        self.assertEqual(self.manager.statistics(), (60, dict(id=60)))
+        self.manager.analyze()
+        rows, distinct = self.manager.statistics()
+        self.assertEqual(rows, 60)
+        self.assertEqual(distinct['id'], 60)
+        self.assertIn('age', distinct)
+        self.assertIn('team', distinct)
+        self.assertEqual(self.manager.estimate_count(dict(team='a')), 60 // distinct['team'])
+        self.assertEqual(self.manager.get_total_count(dict(team='a'), 'exact'),
+                         len(self.list_ids(self.manager, dict(team='a'))))
+
+    def test_crud(self):
+        created = self.manager.create(dict(name='bob', age=10, unknown=1))
+        self.assertEqual(created, dict(id=61, name='bob', age=10, team=None))
+        self.assertEqual(self.manager.retrieve(dict(id=61)), created)
+        self.assertEqual(self.manager.retrieve(dict(id=61), fields=['name']), dict(name='bob'))
+        updated = self.manager.update(dict(id=61), dict(team='z', age=None, id=61))
+        self.assertEqual(updated, dict(id=61, name='bob', age=None, team='z'))
+        self.assertEqual(self.list_ids(self.manager, dict(team='z')), [61])
+        self.manager.delete(dict(id=61))
+        self.assertRaises(NotFoundException, self.manager.retrieve, dict(id=61))
+        self.assertRaises(NotFoundException, self.manager.update, dict(id=61), dict(age=1))
+        self.assertRaises(NotFoundException, self.manager.delete, dict(id=61))
+        self.assertRaises(ValidationException, self.manager.create, dict(id=1))
+        self.assertRaises(ValidationException, self.manager.update, dict(id=1), dict(id=2))
+
+    def test_bulk_operations(self):
+        rows = [dict(id=100 + i, name='bulk', age=i) for i in range(10)] + [dict(name='bulk')]
+        created = self.manager.bulk_create(rows)
+        self.assertEqual(created, 11)
+        self.assertEqual(len(self.list_ids(self.manager, dict(name='bulk'))), 11)
+        updates = [(dict(id=100 + i), dict(age=50)) for i in range(5)]
+        updates += [(dict(id=999), dict(age=50)), (dict(id=106), dict(team='c'))]
+        updated = self.manager.bulk_update(updates)
+        self.assertEqual(updated, 6)
+        self.assertEqual(self.list_ids(self.manager, dict(age=50)), list(range(100, 105)))
+        self.assertEqual(self.manager.retrieve(dict(id=106))['team'], 'c')
+        lookups = [dict(id=100 + i) for i in range(10)] + [dict(id=999)]
+        self.assertEqual(self.manager.bulk_delete(lookups), 10)
+        self.assertEqual(len(self.list_ids(self.manager, dict(name='bulk'))), 1)
+
+    def test_bulk_create_is_atomic(self):
+        rows = [dict(id=200, name='new'), dict(id=1, name='duplicate')]
+        self.assertRaises(ValidationException, self.manager.bulk_create, rows)
+        self.assertRaises(NotFoundException, self.manager.retrieve, dict(id=200))
+
+    def test_large_pages_are_streamed(self):
+        page, meta = self.manager.retrieve_list(dict(count=20))
+        self.assertIsInstance(page, types.GeneratorType)
+        rows = []
+        for row in page:
+            # Calls while the page is streamed reuse the connection.
+            rows.append(self.manager.retrieve(dict(id=row['id'])))
+        self.assertEqual([row['id'] for row in rows], list(range(1, 21)))
+        second, _ = self.manager.retrieve_list(meta['links']['next'])
+        self.assertEqual([row['id'] for row in second], list(range(21, 41)))
+        small, _ = self.manager.retrieve_list(dict(count=5))
+        self.assertIsInstance(small, list)
+
+    def test_streamed_page_is_stable(self):
+        page, meta = self.manager.retrieve_list(dict(count=20))
+        self.manager.delete(dict(id=3))
+        self.assertEqual(len(list(page)), 19)
+        second, _ = self.manager.retrieve_list(meta['links']['next'])
+        self.assertEqual([row['id'] for row in second], list(range(21, 41)))
+
+    def test_statements_are_cached(self):
+        self.list_ids(self.manager, dict(team='a', age__gte='3'), ['age'])
+        statements = dict(self.manager._statements)
+        self.list_ids(self.manager, dict(team='b', age__gte='7'), ['age'])
+        self.assertEqual(self.manager._statements, statements)
+
+    def test_statement_cache_is_bounded(self):
+        self.manager.statement_cache_size = 3
+        for size in range(1, 10):
+            filters = dict(age__in=','.join(str(age) for age in range(size)))
+            ids = self.list_ids(self.manager, filters)
+            self.assertEqual(sorted(ids), self.list_ids(self.memory, filters))
+        self.assertEqual(len(self.manager._statements), 3)
+        recent = list(self.manager._statements)[-1]
+        self.manager.retrieve(dict(id=1))
+        self.assertIn(recent, self.manager._statements)
+
+    def test_projection(self):
+        page, _ = self.manager.retrieve_list(dict(count=1), fields=['name'])
+        self.assertEqual(page, [dict(name='person0')])
+
+    def test_invalid_token(self):
+        self.assertRaises(ValidationException, self.manager.retrieve_list,
+                          dict(pagination_pk='nope'))
+        for position in ([[[1]], [1]], [[{}]], [[1, [2]]]):
+            token = base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+            self.assertRaises(ValidationException, self.manager.retrieve_list,
+                              dict(pagination_pk=token, sort='age'), msg=position)
+        for count in (0, -1, 'abc'):
+            self.assertRaises(ValidationException, self.manager.retrieve_list, dict(count=count))
+
+
+class TestConnectionPool(unittest2.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pool = ConnectionPool(os.path.join(self.directory, 'test.db'), size=3)
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.directory)
+
+    def test_memory_database_has_one_connection(self):
+        self.assertEqual(ConnectionPool(':memory:', size=5).size, 1)
+
+    def test_nested_connections(self):
+        with self.pool.connection() as connection:
+            connection.execute('CREATE TABLE numbers (value INTEGER)')
+            with self.pool.connection() as nested:
+                self.assertIs(nested, connection)
+        try:
+            with self.pool.connection() as connection:
+                connection.execute('INSERT INTO numbers VALUES (1)')
+                raise ValueError()
+        except ValueError:
+            pass
+        with self.pool.connection() as connection:
+            self.assertEqual(connection.execute('SELECT COUNT(*) FROM numbers').fetchone()[0], 0)
+
+    def test_threads(self):
+        class NumberManager(SqliteManager):
+            table = 'numbers'
+            _fields = ('id', 'value')
+
+        manager = NumberManager(pool=self.pool)
+        manager.create_table()
+        errors = []
+
+        def work(thread):
+            try:
+                for value in range(20):
+                    created = manager.create(dict(value=thread * 100 + value))
+                    manager.retrieve(created)
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=work, args=(thread,)) for thread in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        page, _ = manager.retrieve_list(dict(count=1000))
+        self.assertEqual(len(list(page)), 120)
+        self.assertLessEqual(self.pool._opened, 3)
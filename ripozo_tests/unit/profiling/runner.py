@@ -0,0 +1,178 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo_profiling.runner import ScalingBenchmark, compare, fit_exponent, main, run_scaling, \
+    save_results, select_benchmarks, summarize, time_scaling_benchmark
+
+import json
+import logging
+import mock
+import os
+import shutil
+import six
+import tempfile
+import unittest2
+import warnings
+
+
+def _results(**medians):
+    return dict(meta={}, benchmarks=dict((name, dict(median=median, min=median))
+                                         for name, median in six.iteritems(medians)))
+
+
+class TestSummarize(unittest2.TestCase):
+    def test_summarize(self):
+        stats = summarize([3.0, 1.0, 2.0, 6.0], number=10)
+        self.assertEqual(stats['number'], 10)
+        self.assertEqual(stats['repeats'], 4)
+        self.assertListEqual(stats['timings'], [3.0, 1.0, 2.0, 6.0])
+        self.assertEqual(stats['min'], 1.0)
+        self.assertEqual(stats['max'], 6.0)
+        self.assertEqual(stats['mean'], 3.0)
+        self.assertEqual(stats['median'], 2.5)
+        self.assertAlmostEqual(stats['stdev'], (14 / 3) ** 0.5)
+
+    def test_summarize_single(self):
+        stats = summarize([2.0])
+        self.assertEqual(stats['median'], 2.0)
+        self.assertEqual(stats['stdev'], 0.0)
+
+
+class TestCompare(unittest2.TestCase):
+    def test_compare(self):
+        """Slowdowns beyond the threshold are regressions"""
+        comparisons = compare(_results(fast=1.0, slow=1.0, zero=0.0),
+                              _results(fast=0.5, slow=1.2, zero=1.0))
+        by_name = dict((comp['name'], comp) for comp in comparisons)
+        self.assertAlmostEqual(by_name['fast']['change'], -0.5)
+        self.assertFalse(by_name['fast']['regression'])
+        self.assertAlmostEqual(by_name['slow']['change'], 0.2)
+        self.assertTrue(by_name['slow']['regression'])
+        self.assertEqual(by_name['zero']['change'], 0.0)
+        comparisons = compare(_results(slow=1.0), _results(slow=1.2), threshold=0.5)
+        self.assertFalse(comparisons[0]['regression'])
+        self.assertTrue(compare(_results(a=2.0), _results(a=1.0), statistic='min')[0]['change'] < 0)
+
+    def test_compare_missing_and_new(self):
+        """Benchmarks only in one of the results are reported"""
+        comparisons = compare(_results(kept=1.0, renamed=1.0), _results(kept=1.0, added=1.0))
+        by_name = dict((comp['name'], comp) for comp in comparisons)
+        self.assertEqual(set(by_name), set(['kept', 'renamed', 'added']))
+        self.assertTrue(by_name['renamed']['missing'])
+        self.assertIsNone(by_name['renamed']['current'])
+        self.assertTrue(by_name['added']['new'])
+        self.assertFalse(by_name['added']['regression'])
+        self.assertFalse(by_name['kept']['missing'] or by_name['kept']['new'])
+
+
+class TestSelectBenchmarks(unittest2.TestCase):
+    def test_select_benchmarks(self):
+        names = [bench.name for bench in select_benchmarks()]
+        self.assertIn('adapters.hal.formatted_body', names)
+        self.assertFalse([name for name in names if name.startswith('scaling.')])
+        selected = [bench.name for bench in select_benchmarks(['adapters.*', 'urls.create_url'])]
+        self.assertTrue(selected)
+        self.assertTrue(all(name.startswith('adapters.') or name == 'urls.create_url'
+                            for name in selected))
+        self.assertIn('urls.create_url', selected)
+        self.assertListEqual(select_benchmarks(['nothing.*']), [])
+        scaling = [bench.name for bench in select_benchmarks(scaling=True)]
+        self.assertIn('scaling.memory_manager_last_page', scaling)
+
+
+class TestMain(unittest2.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def main(self, *argv):
+        try:
+            with warnings.catch_warnings():
+                with mock.patch('sys.stdout', new_callable=six.StringIO) as stdout:
+                    code = main(list(argv))
+        finally:
+            logging.disable(logging.NOTSET)
+        return code, stdout.getvalue()
+
+    def save(self, name, results):
+        path = os.path.join(self.directory, name)
+        save_results(results, path)
+        return path
+
+    def test_compare_exit_codes(self):
+        baseline = self.save('baseline.json', _results(a=1.0, b=1.0))
+        same = self.save('same.json', _results(a=1.0, b=1.05))
+        slow = self.save('slow.json', _results(a=1.0, b=2.0))
+        missing = self.save('missing.json', _results(a=1.0, c=1.0))
+        code, output = self.main('compare', baseline, same)
+        self.assertEqual(code, 0)
+        self.assertNotIn('REGRESSION', output)
+        code, output = self.main('compare', baseline, slow)
+        self.assertEqual(code, 1)
+        self.assertIn('REGRESSION', output)
+        code, output = self.main('compare', baseline, slow, '--threshold', '1.5')
+        self.assertEqual(code, 0)
+        code, output = self.main('compare', baseline, missing)
+        self.assertEqual(code, 1)
+        self.assertIn('MISSING', output)
+        self.assertIn('NEW', output)
+
+    def test_list_and_run(self):
+        code, output = self.main('list', '-k', 'urls.*')
+        self.assertEqual(code, 0)
+        self.assertIn('urls.create_url', output.split())
+        path = os.path.join(self.directory, 'results.json')
+        code, output = self.main('run', '-k', 'urls.join_url_parts', '--repeats', '1',
+                                 '--warmup', '0', '--number', '1', '--output', path)
+        self.assertEqual(code, 0)
+        with open(path) as results_file:
+            results = json.load(results_file)
+        self.assertListEqual(list(results['benchmarks']), ['urls.join_url_parts'])
+        code, output = self.main('scale', '-k', 'nothing.*')
+        self.assertEqual(code, 0)
+
+
+class TestScaling(unittest2.TestCase):
+    def test_fit_exponent(self):
+        """The exponent of the growth is fitted from the logarithms"""
+        sizes = [10, 100, 1000]
+        self.assertAlmostEqual(fit_exponent(sizes, [size * 2e-6 for size in sizes]), 1.0)
+        self.assertAlmostEqual(fit_exponent(sizes, [size ** 2 * 1e-9 for size in sizes]), 2.0)
+        self.assertAlmostEqual(fit_exponent(sizes, [1e-3, 1e-3, 1e-3]), 0.0)
+        self.assertRaises(ValueError, fit_exponent, [10], [1e-3])
+
+    def test_time_scaling_benchmark(self):
+        """Each size is timed and the growth is fitted"""
+        calls = []
+
+        def setup(size):
+            calls.append(size)
+            return lambda: None
+
+        bench = ScalingBenchmark('scaling.nothing', setup, [10, 100, 1000], expected=1.0)
+        result = time_scaling_benchmark(bench, repeats=1, max_size=100, min_time=0)
+        self.assertListEqual(result['sizes'], [10, 100])
+        self.assertListEqual(calls, [10, 100])
+        self.assertEqual(len(result['timings']), 2)
+        self.assertFalse(result['skipped'])
+        self.assertIsInstance(result['exponent'], float)
+
+    def test_time_scaling_benchmark_skipped(self):
+        """Benchmarks with fewer than two sizes left are skipped"""
+        def setup(size):
+            raise AssertionError('A skipped benchmark is not set up')
+
+        bench = ScalingBenchmark('scaling.large', setup, [1000, 10000], expected=1.0)
+        result = time_scaling_benchmark(bench, max_size=1000)
+        self.assertTrue(result['skipped'])
+        self.assertIsNone(result['exponent'])
+        self.assertListEqual(result['sizes'], [1000])
+
+        stream = six.StringIO()
+        results = run_scaling([bench], max_size=100, stream=stream)
+        self.assertFalse(results['scaling']['scaling.large']['failed'])
+        self.assertIn('SKIPPED', stream.getvalue())
@@ -1 +1 @@
-from . import base, common
+from . import base, common, datetime_parser
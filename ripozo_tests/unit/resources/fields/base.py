@@ -5,9 +5,11 @@ from __future__ import unicode_literals
 
 import unittest2
 
-from ripozo.exceptions import ValidationException, TranslationException, RestException
+from ripozo.exceptions import ValidationException, TranslationException, RestException, \
+    BatchValidationException
 from ripozo.resources.constants import input_categories
-from ripozo.resources.fields.base import BaseField, translate_fields
+from ripozo.resources.fields.base import BaseField, translate_fields, translate_records
+from ripozo.resources.fields.common import IntegerField, StringField
 from ripozo import RequestContainer
 from ripozo_tests.bases.field import FieldTestBase
 
@@ -101,3 +103,29 @@ class TestTranslateFields(unittest2.TestCase):
         field = BaseField('field', required=True, arg_type='fake')
         req = RequestContainer(query_args=test_input, url_params=test_input, body_args=test_input)
         self.assertRaises(RestException, translate_fields, req, fields=[field], validate=True)
+
+    def test_translate_many(self):
+        f = BaseField('field', required=True)
+        self.assertEqual(f.translate_many([1, [2], 'a'], validate=True), [1, 2, 'a'])
+        with self.assertRaises(BatchValidationException) as ctx:
+            f.translate_many([1, None, None], validate=True)
+        self.assertEqual([error[:2] for error in ctx.exception.errors], [(1, 'field'), (2, 'field')])
+        self.assertEqual(f.translate_many([None], skip_required=True, validate=True), [None])
+
+    def test_translate_records(self):
+        fields = [IntegerField('id', required=True), StringField('name', maximum=3)]
+        records = [dict(id='1', name='abc', other=1), dict(id='2')]
+        translated = translate_records(records, fields=fields, validate=True)
+        self.assertEqual(translated, [dict(id=1, name='abc', other=1), dict(id=2)])
+        self.assertEqual(records[0]['id'], '1')
+
+        records = [dict(id='a', name='abcd'), dict(name='ab'), dict(id='3')]
+        with self.assertRaises(BatchValidationException) as ctx:
+            translate_records(records, fields=fields, validate=True)
+        self.assertEqual([error[:2] for error in ctx.exception.errors],
+                         [(0, 'id'), (0, 'name'), (1, 'id')])
+        self.assertIsInstance(ctx.exception.errors[0][2], TranslationException)
+
+        # Missing fields are skipped like translate_fields does
+        translated = translate_records([dict(name='ab')], fields=fields, skip_required=True, validate=True)
+        self.assertEqual(translated, [dict(name='ab')])
@@ -9,7 +9,8 @@ import re
 import six
 import unittest2
 
-from ripozo.exceptions import ValidationException, TranslationException
+from ripozo.exceptions import ValidationException, TranslationException, \
+    BatchValidationException
 from ripozo.resources.fields.common import StringField, BooleanField, FloatField,\
     DateTimeField, IntegerField, ListField, DictField
 from ripozo_tests.bases.field import FieldTestBase
@@ -53,6 +54,30 @@ class IntegerFieldTest(FieldTestBase2, unittest2.TestCase):
     def test_size(self):
         self.size_test_helper(1, 7, 12)
 
+    def test_translate_many(self):
+        """
+        Tests that translate_many gives the same values and
+        errors as translating the values one at a time.
+        """
+        f = IntegerField('field', required=True, minimum=3, maximum=10)
+        values = [5, '7', 4.5, ['8'], None, 'abc', 2, 11]
+        for validate in (False, True):
+            expected, expected_errors = [], []
+            for index, value in enumerate(values):
+                try:
+                    expected.append(f.translate(value, validate=validate))
+                except ValidationException as exc:
+                    expected_errors.append((index, type(exc), six.text_type(exc)))
+            try:
+                self.assertEqual(f.translate_many(values, validate=validate), expected)
+            except BatchValidationException as exc:
+                errors = [(index, type(error), six.text_type(error)) for index, name, error in exc.errors]
+                self.assertEqual(errors, expected_errors)
+                self.assertEqual(exc.status_code, 400)
+            else:
+                self.assertEqual(expected_errors, [])
+        self.assertEqual(f.translate_many(list(range(3, 11)), validate=True), list(range(3, 11)))
+
 
 class FloatFieldTest(FieldTestBase2, unittest2.TestCase):
     field_type = FloatField
@@ -63,6 +88,16 @@ class FloatFieldTest(FieldTestBase2, unittest2.TestCase):
     def test_size(self):
         self.size_test_helper(1.0, 7.0, 12.0)
 
+    def test_translate_many(self):
+        f = FloatField('field', minimum=1.0)
+        values = f.translate_many(['1.5', 2, 'nan'], validate=True)
+        self.assertEqual(values[:2], [1.5, 2.0])
+        with self.assertRaises(BatchValidationException) as ctx:
+            f.translate_many(['2', '0.5', 'abc'], validate=True)
+        self.assertEqual([(index, name) for index, name, error in ctx.exception.errors],
+                         [(1, 'field'), (2, 'field')])
+        self.assertIsInstance(ctx.exception.errors[1][2], TranslationException)
+
 
 class BoolFieldTest(FieldTestBase2, unittest2.TestCase):
     field_type = BooleanField
@@ -144,6 +179,23 @@ class TestListField(FieldTestBase2, unittest2.TestCase):
         items = [15, 0]
         self.assertRaises(ValidationException, l.translate, items, validate=True)
 
+    def test_validate_items_subclassed_field(self):
+        """
+        Tests that the overridden validation of an item
+        field is used.
+        """
+        class EvenField(IntegerField):
+            def _validate(self, obj, skip_required=False):
+                obj = super(EvenField, self)._validate(obj, skip_required=skip_required)
+                if obj % 2:
+                    raise ValidationException('odd')
+                return obj
+
+        l = ListField('field', indv_field=EvenField('int'))
+        self.assertEqual(l.translate([2, '4'], validate=True), [2, 4])
+        self.assertRaises(ValidationException, l.translate, [1, 2, 3], validate=True)
+        self.assertEqual(l.translate([1, 2, 3]), [1, 2, 3])
+
 
 class TestDictField(unittest2.TestCase):
     def test_required(self):
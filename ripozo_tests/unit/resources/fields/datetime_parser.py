@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from datetime import datetime, timedelta
+
+import unittest2
+
+from ripozo.resources.fields.common import DateTimeField
+from ripozo.resources.fields.datetime_parser import DateTimeParser, FormatParser, \
+    StrptimeFormatParser, get_format_parser
+
+FORMATS = [
+    '%Y-%m-%dT%H:%M:%S.%fZ',
+    '%Y-%m-%dT%H:%M:%SZ',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%d %H:%M:%S.%f',
+    '%Y-%m-%d',
+    '%Y%m%d',
+    '%Y%m%d%H%M%S',
+    '%m/%d/%Y',
+    '%d/%m/%Y',
+    '%m/%d/%y %H:%M',
+    '%d.%m.%Y  %H.%M',
+    '%H:%M',
+    '%Y-%m-%d %%',
+    '[%Y] (%m) {%d} ^$*+?|',
+]
+
+VALUES = [
+    '2015-02-10T18:15:15.123456Z', '2015-02-10t18:15:15.123456z', '2015-02-10T18:15:15.1Z',
+    '2015-02-10T18:15:15.123Z', '2015-2-1T8:5:5.0Z', '2015-02-10T18:15:15.1234567Z',
+    '2015-02-10T18:15:15Z', '2015-02-10T18:15:15', '2015-02-10T24:15:15', '2015-02-10T18:60:15',
+    '2015-02-10T18:15:60', '2015-02-10T18:15:61', '2015-02-29T18:15:15', '2016-02-29T18:15:15',
+    '2015-13-10T18:15:15', '2015-00-10T18:15:15', '2015-02-00T18:15:15', '2015-02-31T18:15:15',
+    '2015-02-10 18:15:15.5', '2015-02-10  18:15:15.5', '2015-02-10\t18:15:15.5', '2015-02-10',
+    '2015-02- 1', '2015-02-1', '20150210', '2015021', '20151231', '20151310', '20150210181515',
+    '2015021018155', '02/10/2015', '2/1/2015', '13/02/2015', '02/10/15', '02/10/68 18:15',
+    '02/10/69 18:15', '02/10/99 1:5', '10.02.2015  18.15', '10.02.2015 18.15', '18:15', '8:5',
+    '24:00', '2015-02-10 %', '[2015] (02) {10} ^$*+?|', '[2015] (2) {1} ^$*+?|',
+    '0000-01-01', '9999-12-31T23:59:59.999999Z', '2015-02-10T18:15:15.123456Z ',
+    '٢٠١٥-٠٢-١٠', '2015-02-10T18:15:15.１２３Z', '', 'something', '2/15/2012', '+2015-02-10',
+    '2015-02-10T18:15:15.12345', '2015-02-10T18:15:15.123456',
+]
+
+
+def strptime(value, date_format):
+    try:
+        return datetime.strptime(value, date_format)
+    except ValueError:
+        return None
+
+
+class TestFormatParser(unittest2.TestCase):
+    def test_same_as_strptime(self):
+        """Every format and value gives the same result as strptime."""
+        for date_format in FORMATS:
+            parser = get_format_parser(date_format)
+            self.assertIsInstance(parser, FormatParser)
+            for value in VALUES:
+                self.assertEqual(parser.parse(value), strptime(value, date_format),
+                                 msg='{0!r} {1!r}'.format(date_format, value))
+
+    def test_generated_values(self):
+        """Formats the datetimes of a year with each format and parses them back."""
+        start = datetime(2012, 1, 1, 0, 0, 0, 1)
+        for date_format in FORMATS:
+            parser = get_format_parser(date_format)
+            for hours in range(0, 24 * 366, 7):
+                value = (start + timedelta(hours=hours, seconds=hours, microseconds=hours)).strftime(date_format)
+                self.assertEqual(parser.parse(value), strptime(value, date_format),
+                                 msg='{0!r} {1!r}'.format(date_format, value))
+
+    def test_fast_path(self):
+        parser = get_format_parser('%Y-%m-%dT%H:%M:%S.%fZ')
+        self.assertIsNotNone(parser.fast_regex.match('2015-02-10T18:15:15.123Z'))
+        self.assertIsNone(parser.fast_regex.match('2015-2-10T18:15:15.123Z'))
+        self.assertEqual(parser.parse('2015-2-10T18:15:15.123z'), datetime(2015, 2, 10, 18, 15, 15, 123000))
+        self.assertIsNone(parser.parse('2015-02-30T18:15:15.123Z'))
+        self.assertIsNone(get_format_parser('%H%M%S%f%d').fast_regex)
+        self.assertIsNone(get_format_parser('%S.%f1').fast_regex)
+        self.assertIsNotNone(get_format_parser('%d/%m/%y %f ms').fast_regex)
+
+    def test_unsupported_formats(self):
+        for date_format in ('%b %d %Y', '%Y-%m-%dT%H:%M:%S%z', '%Y %y', '%Y %', '%Y %Q'):
+            parser = get_format_parser(date_format)
+            self.assertIsInstance(parser, StrptimeFormatParser)
+            for value in ('Feb 10 2015', '2015-02-10T18:15:15+0100', '2015 15', '2015 %'):
+                self.assertEqual(parser.parse(value), strptime(value, date_format))
+        self.assertIs(get_format_parser('%b %d %Y'), get_format_parser('%b %d %Y'))
+
+
+class TestDateTimeParser(unittest2.TestCase):
+    def test_most_recent_first(self):
+        parser = DateTimeParser(['%Y-%m-%dT%H:%M:%S.%fZ', '%Y-%m-%d', '%H:%M'])
+        self.assertTrue(parser.reorder)
+        self.assertEqual(parser.parse('2015-02-10'), datetime(2015, 2, 10))
+        self.assertEqual(parser._order[0].date_format, '%Y-%m-%d')
+        self.assertEqual(parser.parse('18:15'), datetime(1900, 1, 1, 18, 15))
+        self.assertEqual(parser._order[0].date_format, '%H:%M')
+        self.assertEqual(parser.parse('2015-02-10T18:15:15.123456Z'), datetime(2015, 2, 10, 18, 15, 15, 123456))
+        self.assertIsNone(parser.parse('something'))
+
+    def test_ambiguous_formats_keep_order(self):
+        parser = DateTimeParser(['%m/%d/%Y', '%d/%m/%Y'])
+        self.assertFalse(parser.reorder)
+        self.assertEqual(parser.parse('13/02/2015'), datetime(2015, 2, 13))
+        self.assertEqual(parser.parse('02/10/2015'), datetime(2015, 2, 10))
+        self.assertFalse(DateTimeParser(['%Y-%m-%d', '%b %d %Y']).reorder)
+
+    def test_same_as_strptime_in_order(self):
+        """A field gives the first result in order of its formats, as before."""
+        field = DateTimeField('field', valid_formats=FORMATS)
+        for value in VALUES * 2:
+            expected = None
+            for date_format in FORMATS:
+                expected = strptime(value.strip(), date_format)
+                if expected is not None:
+                    break
+            self.assertEqual(field.parser.parse(value.strip()), expected, msg=value)
+
+    def test_field_parser_rebuilt(self):
+        field = DateTimeField('field')
+        parser = field.parser
+        self.assertIs(field.parser, parser)
+        field.valid_formats = ['%Y-%m-%d']
+        self.assertIsNot(field.parser, parser)
+        self.assertEqual(field.translate('2015-02-10'), datetime(2015, 2, 10))
@@ -6,6 +6,7 @@ from __future__ import unicode_literals
 from ripozo.resources.relationships.list_relationship import ListRelationship
 from ripozo.resources.resource_base import ResourceBase
 
+import types
 import unittest2
 
 
@@ -49,6 +50,37 @@ class TestListRelationship(unittest2.TestCase):
         self.assertIsInstance(res_list, list)
         self.assertEqual(len(res_list), 0)
 
+    def test_construct_resource_generator(self):
+        """
+        Tests that a generator of properties is
+        lazily turned into a generator of resources
+        """
+        class LazyResource(ResourceBase):
+            pks = ['pk']
+
+        list_name = 'lazy_resource'
+        lr = ListRelationship(list_name, relation='LazyResource')
+        props = {list_name: (dict(pk=i) for i in range(10))}
+        res_list = lr.construct_resource(props)
+        self.assertIsInstance(res_list, types.GeneratorType)
+        res_list = list(res_list)
+        self.assertEqual(len(res_list), 10)
+        for i, res in enumerate(res_list):
+            self.assertIsInstance(res, LazyResource)
+            self.assertEqual(res.properties['pk'], i)
+
+    def test_construct_resource_empty_generator(self):
+        """
+        An empty generator should be treated like an empty list
+        """
+        class LazyResource(ResourceBase):
+            pks = ['pk']
+
+        list_name = 'lazy_resource'
+        lr = ListRelationship(list_name, relation='LazyResource')
+        res_list = lr.construct_resource({list_name: iter([])})
+        self.assertIsNone(res_list)
+
     def test_remove_child_properties(self):
         """
         Test remove child properties
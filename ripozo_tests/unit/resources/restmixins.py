@@ -6,7 +6,7 @@ from __future__ import unicode_literals
 from ripozo import ResourceBase, apimethod, RequestContainer
 from ripozo.resources.constructor import ResourceMetaClass
 from ripozo.resources.restmixins import Create, Retrieve, Update, \
-    Delete, RetrieveRetrieveList, AllOptionsResource
+    Delete, RetrieveRetrieveList, AllOptionsResource, Aggregate
 
 import mock
 import unittest2
@@ -49,6 +49,10 @@ class TestMixins(unittest2.TestCase):
     def test_retrieve_list(self):
         manager2 = mock.MagicMock()
         manager2.retrieve_list = mock.MagicMock(return_value=(mock.MagicMock(), mock.MagicMock()))
+        manager2.get_projection = mock.MagicMock(return_value=(None, {}))
+        manager2.get_filter = mock.MagicMock(return_value=(None, {}))
+        manager2.get_sort = mock.MagicMock(return_value=(None, {}))
+        manager2.get_total_count = mock.MagicMock(return_value=None)
 
         class T1(RetrieveRetrieveList):
             manager = manager2
@@ -58,8 +62,26 @@ class TestMixins(unittest2.TestCase):
         self.assertEqual(manager2.retrieve_list.call_count, 1)
         self.assertIsInstance(response, T1)
 
+    def test_aggregate(self):
+        manager2 = mock.MagicMock()
+        manager2.get_aggregates = mock.MagicMock(return_value=(['count'], ['team'], {'team': 'a'}))
+        manager2.get_filter = mock.MagicMock(return_value=('node', {}))
+        manager2.aggregate = mock.MagicMock(return_value=[dict(team='a', count=2)])
+
+        class T1(Aggregate):
+            manager = manager2
+            resource_name = 't1'
+
+        response = T1.aggregate(RequestContainer(query_args=dict(team='a')))
+        manager2.aggregate.assert_called_once_with({'team': 'a'}, ['count'], group_by=['team'], filter='node')
+        self.assertEqual(response.properties, dict(aggregates=[dict(team='a', count=2)]))
+        self.assertEqual(response.url, '/t1/aggregate')
+        endpoints = T1.endpoint_dictionary()
+        self.assertEqual(endpoints['aggregate'][0]['route'], '/t1/aggregate')
+
     def test_retrieve(self):
         manager2 = mock.MagicMock()
+        manager2.get_projection = mock.MagicMock(return_value=(None, {}))
 
         class T1(Retrieve):
             manager = manager2
@@ -166,3 +188,34 @@ class TestMixins(unittest2.TestCase):
                 found_fake_list = True
         self.assertTrue(found_fake)
         self.assertTrue(found_fake_list)
+
+    def test_all_options_cached(self):
+        """
+        Tests that the options resource is only rebuilt
+        when the linked resource classes change.
+        """
+        class Cached(ResourceBase):
+            pks = ('id',)
+
+            @apimethod()
+            def cached(cls, request):
+                return cls()
+
+        class Other(ResourceBase):
+            @apimethod(no_pks=True)
+            def other(cls, request):
+                return cls()
+
+        class CachedOptions(AllOptionsResource):
+            linked_resource_classes = [Cached]
+
+        options = CachedOptions.all_options(RequestContainer())
+        self.assertIs(CachedOptions.all_options(RequestContainer()), options)
+        self.assertEqual(len(CachedOptions.links), 1)
+        CachedOptions.linked_resource_classes.append(Other)
+        updated = CachedOptions.all_options(RequestContainer())
+        self.assertIsNot(updated, options)
+        self.assertEqual(len(updated.linked_resources), 2)
+        self.assertEqual(len(CachedOptions.links), 2)
+        CachedOptions.invalidate_options()
+        self.assertIsNot(CachedOptions.all_options(RequestContainer()), updated)
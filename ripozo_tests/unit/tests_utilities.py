@@ -5,13 +5,17 @@ from __future__ import unicode_literals
 
 import datetime
 import decimal
+import uuid
 
 import mock
 import six
 import unittest2
 
 from ripozo.utilities import titlize_endpoint, join_url_parts, \
-    picky_processor, convert_to_underscore, make_json_safe, get_or_pop
+    picky_processor, convert_to_underscore, make_json_safe, get_or_pop, \
+    is_iterator, iter_json, json_default, register_json_type
+
+import json
 
 
 class UtilitiesTestCase(unittest2.TestCase):
@@ -164,4 +168,76 @@ class UtilitiesTestCase(unittest2.TestCase):
         val = get_or_pop(x, 'x', default=1, pop=True)
         self.assertEqual(val, 1)
 
-
+    def test_is_iterator(self):
+        """Only lazy iterators are iterators"""
+        self.assertTrue(is_iterator(i for i in range(2)))
+        self.assertTrue(is_iterator(iter([1, 2])))
+        self.assertFalse(is_iterator([1, 2]))
+        self.assertFalse(is_iterator((1, 2)))
+        self.assertFalse(is_iterator(dict(a=1)))
+
+    def test_json_default(self):
+        """Iterators are materialized.  Anything else raises a TypeError"""
+        self.assertEqual(json_default(i for i in range(3)), [0, 1, 2])
+        self.assertRaises(TypeError, json_default, object())
+        self.assertEqual(json.dumps(dict(a=(i for i in range(2))), default=json_default),
+                         '{"a": [0, 1]}')
+
+    def test_json_default_builtin_types(self):
+        """The builtin types are converted while encoding"""
+        now = datetime.datetime.now()
+        self.assertEqual(json_default(now), six.text_type(now))
+        self.assertEqual(json_default(now.date()), six.text_type(now.date()))
+        self.assertEqual(json_default(now.time()), six.text_type(now.time()))
+        self.assertEqual(json_default(datetime.timedelta(days=1)), '1 day, 0:00:00')
+        self.assertEqual(json_default(decimal.Decimal('1.02')), 1.02)
+        self.assertEqual(json_default(uuid.UUID(int=1)), '00000000-0000-0000-0000-000000000001')
+        self.assertEqual(json_default(set([1])), [1])
+        original = dict(a=now, b=[decimal.Decimal('1.5')])
+        body = json.loads(json.dumps(original, default=json_default))
+        self.assertDictEqual(body, dict(a=six.text_type(now), b=[1.5]))
+        self.assertIsInstance(original['a'], datetime.datetime)
+
+    def test_register_json_type(self):
+        """Registered handlers are used for the type and its subclasses"""
+        class Money(object):
+            def __init__(self, amount):
+                self.amount = amount
+
+        class Dollars(Money):
+            pass
+
+        self.assertRaises(TypeError, json_default, Money(1))
+
+        @register_json_type(Money)
+        def encode_money(value):
+            return value.amount
+
+        self.assertEqual(json_default(Money(1)), 1)
+        self.assertEqual(json_default(Dollars(2)), 2)
+        register_json_type(Dollars, lambda value: '${0}'.format(value.amount))
+        self.assertEqual(json_default(Dollars(2)), '$2')
+        self.assertEqual(json_default(Money(1)), 1)
+
+    def test_iter_json(self):
+        """The streamed document is equivalent to json.dumps"""
+        obj = {'a': [1, 'two', None, {'b': 2.5}], 'c': {}, 'd': [], 1: True}
+        self.assertEqual(''.join(iter_json(obj)), json.dumps(obj))
+        self.assertEqual(''.join(iter_json(obj, chunk_size=1)), json.dumps(obj))
+
+    def test_iter_json_generator(self):
+        """Generators are consumed one item at a time"""
+        consumed = []
+
+        def gen():
+            for i in range(3):
+                consumed.append(i)
+                yield dict(id=i)
+
+        chunks = iter_json(dict(items=gen()), chunk_size=1)
+        first = next(chunks)
+        self.assertEqual(consumed, [])
+        body = first + ''.join(chunks)
+        self.assertEqual(consumed, [0, 1, 2])
+        self.assertEqual(json.loads(body), dict(items=[dict(id=0), dict(id=1), dict(id=2)]))
+        self.assertEqual(''.join(iter_json(iter([]))), '[]')